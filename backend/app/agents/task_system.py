@@ -7,12 +7,14 @@ from datetime import datetime, timedelta
 import asyncio
 import json
 import logging
+import os
 from enum import Enum
 
 from app.database.vector_db import VectorDB
 from app.database.relational_db import RelationalDB  
 from app.database.cache_db import CacheDB
 from app.agents.agent_manager import AgentManager
+from app.services.task_queue import TaskQueueBackend, get_task_queue
 
 logger = logging.getLogger(__name__)
 
@@ -103,13 +105,17 @@ class AgentTask:
 class TaskSystem:
     """Manages the lifecycle of agent tasks."""
     
-    def __init__(self, vector_db=None, relational_db=None, cache_db=None):
+    QUEUE_NAME = "agent_tasks"
+    TERMINAL_STATUSES = (TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED)
+
+    def __init__(self, vector_db=None, relational_db=None, cache_db=None, task_queue: Optional[TaskQueueBackend] = None):
         self.relational_db = relational_db or RelationalDB()
         self.vector_db = vector_db or VectorDB()
         self.cache_db = cache_db or CacheDB()
         self.agent_manager = AgentManager(self.vector_db, self.relational_db, self.cache_db)
+        # Process-local view of tasks this worker touched; the queue itself is shared and durable
         self.active_tasks: Dict[str, AgentTask] = {}
-        self.task_queue: List[AgentTask] = []
+        self.task_queue: TaskQueueBackend = task_queue or get_task_queue()
         
     async def create_task(
         self,
@@ -146,19 +152,41 @@ class TaskSystem:
         # Add to cache for quick access
         await self.cache_db.set_task(task_id, task.to_dict())
         
-        # Add to task queue
-        self.task_queue.append(task)
+        # Add to the shared task queue
+        await self.task_queue.enqueue(
+            {"task_id": task_id, "agent_id": agent_id},
+            queue=self.QUEUE_NAME,
+            priority=priority,
+        )
         self.active_tasks[task_id] = task
         
         logger.info(f"Created task {task_id} for agent {agent_id}")
         return task_id
         
+    async def _load_task(self, task_id: str) -> Optional[AgentTask]:
+        """Return the task from this worker's view, falling back to storage (queued by another worker)."""
+        if task_id in self.active_tasks:
+            return self.active_tasks[task_id]
+        try:
+            task = AgentTask.from_dict(await self.get_task_status(task_id))
+        except Exception:
+            return None
+        self.active_tasks[task_id] = task
+        return task
+
+    async def _stored_status(self, task: AgentTask) -> TaskStatus:
+        """Status as persisted (cache, then relational store); falls back to the local view."""
+        try:
+            return TaskStatus((await self.get_task_status(task.task_id))["status"])
+        except Exception:
+            return task.status
+
     async def assign_task_to_agent(self, task_id: str, agent_id: str) -> bool:
         """Assign a task to a specific agent."""
-        if task_id not in self.active_tasks:
+        task = await self._load_task(task_id)
+        if task is None:
             return False
             
-        task = self.active_tasks[task_id]
         task.agent_id = agent_id
         
         # Update in all databases
@@ -170,10 +198,16 @@ class TaskSystem:
         
     async def execute_task(self, task_id: str) -> Dict[str, Any]:
         """Execute a task using the assigned agent."""
-        if task_id not in self.active_tasks:
+        task = await self._load_task(task_id)
+        if task is None:
             raise ValueError(f"Task {task_id} not found")
-            
-        task = self.active_tasks[task_id]
+
+        # A queued job outlives cancel_task (possibly issued on another worker): re-read the stored status
+        status = await self._stored_status(task)
+        if status in self.TERMINAL_STATUSES:
+            task.status = status
+            logger.info(f"Skipping task {task_id}: already {status.value}")
+            return {"task_id": task_id, "status": status.value, "skipped": True}
         
         # Check dependencies
         if not await self._check_dependencies(task):
@@ -255,11 +289,10 @@ class TaskSystem:
         
     async def cancel_task(self, task_id: str) -> bool:
         """Cancel a running task."""
-        if task_id not in self.active_tasks:
+        task = await self._load_task(task_id)
+        if task is None:
             return False
-            
-        task = self.active_tasks[task_id]
-        if task.status in [TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED]:
+        if task.status in self.TERMINAL_STATUSES:
             return False
             
         task.status = TaskStatus.CANCELLED
@@ -313,6 +346,42 @@ class TaskSystem:
         """Get all tasks assigned to a specific agent."""
         return await self.relational_db.get_agent_tasks(agent_id, limit)
         
+    async def process_next(self, worker_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Claim the next queued task and execute it; failures are retried or dead-lettered by the queue.
+
+        Jobs whose task was already cancelled / finished are acked without running.
+        """
+        jobs = await self.task_queue.claim(queue=self.QUEUE_NAME, limit=1, worker_id=worker_id)
+        if not jobs:
+            return None
+        job = jobs[0]
+        task_id = str(job.payload.get("task_id") or "")
+        try:
+            result = await self.execute_task(task_id)
+        except Exception as e:
+            outcome = await self.task_queue.fail(job.id, str(e), worker_id=worker_id)
+            return {"task_id": task_id, "ok": False, "error": str(e), "queue_outcome": outcome}
+        await self.task_queue.ack(job.id, worker_id=worker_id)
+        return {"task_id": task_id, "ok": True, "result": result}
+
+    async def run_worker(self, stop: asyncio.Event, *, idle_sec: Optional[float] = None, worker_id: Optional[str] = None) -> None:
+        """Drain the agent_tasks queue until stop is set; sleeps idle_sec (CLAWJOB_TASK_WORKER_IDLE_SEC) when empty."""
+        idle = float(idle_sec if idle_sec is not None else os.getenv("CLAWJOB_TASK_WORKER_IDLE_SEC", "2") or 2)
+        while not stop.is_set():
+            try:
+                handled = await self.process_next(worker_id=worker_id)
+            except Exception:
+                logger.exception("agent task worker failed to process a job")
+                handled = None
+            if handled is not None:
+                continue
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=max(0.05, idle))
+            except asyncio.TimeoutError:
+                pass
+
     async def get_task_metrics(self) -> Dict[str, Any]:
         """Get task execution metrics."""
-        return await self.relational_db.get_task_metrics()
\ No newline at end of file
+        stats = await self.task_queue.get_stats(self.QUEUE_NAME)
+        stats["active_tasks_local"] = len(self.active_tasks)
+        return stats
\ No newline at end of file
@@ -2,7 +2,7 @@
 Agent Tool System - Agentic App Capabilities
 Provides tool management and execution capabilities for AI agents.
 """
-from typing import Dict, List, Any, Callable, Optional
+from typing import Dict, List, Any, Callable, Optional, Tuple
 from pydantic import BaseModel, Field
 import asyncio
 import logging
@@ -18,7 +18,9 @@ class ToolMetadata(BaseModel):
     return_type: str
     category: str = "general"
     requires_auth: bool = False
-    rate_limit: int = 100  # requests per minute
+    rate_limit: int = 100  # tokens refilled per minute, per (agent, tool)
+    burst: Optional[int] = None  # bucket capacity; defaults to rate_limit
+    max_concurrency: int = 0  # in-flight calls per process; 0 = unlimited
 
 class ToolExecutionResult(BaseModel):
     """Result of tool execution"""
@@ -34,27 +36,13 @@ class AgentTool:
     def __init__(self, metadata: ToolMetadata, executor: Callable):
         self.metadata = metadata
         self.executor = executor
-        self.rate_limit_remaining = metadata.rate_limit
         
     async def execute(self, **kwargs) -> ToolExecutionResult:
-        """Execute the tool with given parameters"""
+        """Execute the tool with given parameters (quotas are enforced by ToolSystem.use_tool)"""
         start_time = asyncio.get_event_loop().time()
         
         try:
-            # Check rate limit
-            if self.rate_limit_remaining <= 0:
-                return ToolExecutionResult(
-                    success=False,
-                    error="Rate limit exceeded",
-                    execution_time=asyncio.get_event_loop().time() - start_time
-                )
-            
-            # Execute tool
             result = await self.executor(**kwargs)
-            
-            # Update rate limit
-            self.rate_limit_remaining -= 1
-            
             return ToolExecutionResult(
                 success=True,
                 data=result,
@@ -77,6 +65,7 @@ class ToolSystem:
         self.cache_db = cache_db
         self.tools: Dict[str, AgentTool] = {}
         self.tool_categories: Dict[str, List[str]] = {}
+        self.builtin_revision = 0
         
     def register_tool(self, tool: AgentTool):
         """Register a new tool"""
@@ -86,6 +75,7 @@ class ToolSystem:
         if tool.metadata.category not in self.tool_categories:
             self.tool_categories[tool.metadata.category] = []
         self.tool_categories[tool.metadata.category].append(tool.metadata.name)
+        self.builtin_revision += 1
         
         logger.info(f"Registered tool: {tool.metadata.name}")
         
@@ -93,8 +83,8 @@ class ToolSystem:
         """Get a tool by name"""
         return self.tools.get(name)
         
-    def list_tools(self, current_user: dict = None, category: Optional[str] = None) -> List[Any]:
-        """List built-in tools plus persisted marketplace tools."""
+    def builtin_tools(self, category: Optional[str] = None) -> List[dict]:
+        """In-process built-in tools only (no DB access)."""
         if category:
             tool_names = self.tool_categories.get(category, [])
             builtin = [self.tools[name].metadata.model_dump() for name in tool_names if name in self.tools]
@@ -102,17 +92,22 @@ class ToolSystem:
             builtin = [t.metadata.model_dump() for t in self.tools.values()]
         for item in builtin:
             item["source"] = "builtin"
+        return builtin
 
+    def catalog(self, category: Optional[str] = None) -> Tuple[List[Any], str]:
+        """Built-in tools plus the cached marketplace snapshot, with an ETag for the pair.
+
+        The marketplace part is rebuilt (one joined query) only when its version changes, so
+        this is cheap on the hot path; it still may touch the DB and must not run on the event loop.
+        """
+        builtin = self.builtin_tools(category)
         market: List[dict] = []
+        version = "0"
         try:
             from app.database.relational_db import SessionLocal
-            from app.services.mcp_tools_store import list_market_tools
+            from app.services.mcp_tools_store import get_catalog_snapshot
 
-            db = SessionLocal()
-            try:
-                market = list_market_tools(db, limit=500, category=category)
-            finally:
-                db.close()
+            market, version = get_catalog_snapshot(SessionLocal, category or None)
         except Exception as exc:
             logger.warning("Failed to load marketplace tools: %s", exc)
 
@@ -121,7 +116,11 @@ class ToolSystem:
         for item in market:
             if item.get("name") not in builtin_names:
                 merged.append(item)
-        return merged
+        return merged, f'W/"tools-{version}-{self.builtin_revision}"'
+
+    def list_tools(self, current_user: dict = None, category: Optional[str] = None) -> List[Any]:
+        """List built-in tools plus persisted marketplace tools."""
+        return self.catalog(category)[0]
 
     async def create_tool(self, tool_config: dict, current_user: dict = None) -> dict:
         """Create/register a new tool in the marketplace."""
@@ -145,12 +144,30 @@ class ToolSystem:
             return {"status": "error", "message": str(exc)}
 
     async def use_tool(self, agent_id: str, tool_request: dict, current_user: dict = None) -> dict:
-        """Execute a tool for an agent."""
+        """Execute a tool for an agent under its (agent, tool) token bucket and the tool's concurrency cap.
+
+        The result carries a ``quota`` QuotaDecision for the router to turn into headers.
+        """
+        from app.services.tool_quota import tool_quota
+
         name = tool_request.get("tool_name") or tool_request.get("name")
         if not name:
             return {"success": False, "error": "tool_name required"}
-        result = await self.execute_tool(name, **(tool_request.get("params") or {}))
-        return {"success": result.success, "data": result.data, "error": result.error}
+        tool = self.get_tool(name)
+        if not tool:
+            return {"success": False, "error": f"Tool '{name}' not found"}
+        meta = tool.metadata
+        # Concurrency first: a call turned away for lack of a slot must not spend a rate token
+        with tool_quota.concurrency_slot(meta.name, meta.max_concurrency) as acquired:
+            if not acquired:
+                decision = tool_quota.peek(str(agent_id), meta.name, rate_per_min=meta.rate_limit, burst=meta.burst)
+                decision.allowed, decision.retry_after, decision.reason = False, 1, "concurrency_limited"
+                return {"success": False, "error": "Too many concurrent calls to this tool", "quota": decision}
+            decision = tool_quota.acquire(str(agent_id), meta.name, rate_per_min=meta.rate_limit, burst=meta.burst)
+            if not decision.allowed:
+                return {"success": False, "error": "Rate limit exceeded", "quota": decision}
+            result = await tool.execute(**(tool_request.get("params") or {}))
+        return {"success": result.success, "data": result.data, "error": result.error, "quota": decision}
             
     async def execute_tool(self, name: str, **kwargs) -> ToolExecutionResult:
         """Execute a tool by name"""
@@ -283,7 +300,7 @@ router = APIRouter(prefix="/tools", tags=["tools"])
 @router.get("/", response_model=List[ToolMetadata])
 async def list_available_tools(category: Optional[str] = None):
     """List all available tools"""
-    return tool_system.list_tools(category)
+    return tool_system.list_tools(category=category)
 
 @router.post("/{tool_name}/execute", response_model=ToolExecutionResult)
 async def execute_tool_endpoint(tool_name: str, request: ToolRequest):
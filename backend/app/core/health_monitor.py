@@ -3,29 +3,56 @@ Health Monitoring System for Agent Arena
 
 Provides comprehensive monitoring of agent performance, system health,
 and autonomous recovery capabilities.
+
+All checks run off the event loop (``asyncio.to_thread``) under a per-check
+timeout, and a full round is cached for ``CLAWJOB_HEALTH_CACHE_TTL_SEC``
+seconds so probes and dashboards share one result. CPU usage comes from a
+background sampler thread instead of a blocking ``cpu_percent(interval=1)``.
+
+Environment variables:
+  CLAWJOB_HEALTH_CHECK_TIMEOUT_SEC   per-check timeout (default 3)
+  CLAWJOB_HEALTH_CACHE_TTL_SEC       reuse a finished round for N seconds (default 15)
+  CLAWJOB_HEALTH_CPU_SAMPLE_SEC      CPU sampler interval (default 5)
+  CLAWJOB_HEALTH_READY_CACHE_TTL_SEC reuse a readiness DB ping for N seconds (default 2)
+
+Readiness (:meth:`HealthMonitor.check_readiness`) only pings this instance's
+database; resource and business metrics stay in the full round served by /health.
 """
 
 import asyncio
 import logging
+import os
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from typing import Any, Callable, Dict, List, Optional
 from dataclasses import dataclass
 from enum import Enum
 
 from fastapi import BackgroundTasks
-from sqlalchemy.orm import Session
+from sqlalchemy import func, text
 
-from app.database.session import get_db_session
-from app.models.agent import Agent
-from app.models.task import Task
-from app.schemas.health import HealthStatus, AgentHealthMetrics
+from app.schemas.health import HealthStatus
 
 logger = logging.getLogger(__name__)
 
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return max(0.1, float(os.getenv(name, str(default))))
+    except (TypeError, ValueError):
+        return default
+
+
+CHECK_TIMEOUT_SEC = _env_float("CLAWJOB_HEALTH_CHECK_TIMEOUT_SEC", 3.0)
+CACHE_TTL_SEC = _env_float("CLAWJOB_HEALTH_CACHE_TTL_SEC", 15.0)
+CPU_SAMPLE_SEC = _env_float("CLAWJOB_HEALTH_CPU_SAMPLE_SEC", 5.0)
+READY_CACHE_TTL_SEC = _env_float("CLAWJOB_HEALTH_READY_CACHE_TTL_SEC", 2.0)
+
 class HealthSeverity(Enum):
     """Health severity levels"""
     CRITICAL = "critical"
-    WARNING = "warning" 
+    WARNING = "warning"
     INFO = "info"
     OK = "ok"
 
@@ -38,30 +65,108 @@ class HealthCheckResult:
     metrics: Dict[str, Any]
     timestamp: datetime
 
+
+class CpuSampler:
+    """Daemon thread that keeps the latest ``psutil.cpu_percent`` reading."""
+
+    def __init__(self, interval: float = CPU_SAMPLE_SEC):
+        self.interval = interval
+        self.value: Optional[float] = None
+        self.sampled_at: Optional[datetime] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self) -> bool:
+        """Start the sampler once; returns False when psutil is unavailable."""
+        try:
+            import psutil  # noqa: F401
+        except ImportError:
+            return False
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="health-cpu-sampler", daemon=True)
+                self._thread.start()
+        return True
+
+    def _run(self) -> None:
+        import psutil
+
+        while True:
+            try:
+                self.value = float(psutil.cpu_percent(interval=self.interval))
+                self.sampled_at = datetime.utcnow()
+            except Exception:
+                time.sleep(self.interval)
+
+
 class HealthMonitor:
     """Main health monitoring class"""
-    
+
     def __init__(self):
-        self.db_session = next(get_db_session())
         self.health_checks: List[HealthCheckResult] = []
         self.anomaly_detector = AnomalyDetector()
         self.recovery_manager = RecoveryManager()
-        
-    async def run_health_check(self) -> HealthStatus:
-        """Run comprehensive health check"""
+        self.cpu_sampler = CpuSampler()
+        self._cached: Optional[HealthStatus] = None
+        self._cached_at = 0.0
+        self._refresh_lock: Optional[asyncio.Lock] = None
+        self._ready: Optional[HealthCheckResult] = None
+        self._ready_at = 0.0
+
+    async def run_health_check(self, max_age: Optional[float] = None) -> HealthStatus:
+        """Run comprehensive health check (reuses a round younger than ``max_age`` seconds)."""
+        ttl = CACHE_TTL_SEC if max_age is None else max(0.0, float(max_age))
+        if self._cached is not None and time.monotonic() - self._cached_at < ttl:
+            return self._cached
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            # a concurrent caller may have refreshed while we waited
+            if self._cached is not None and time.monotonic() - self._cached_at < ttl:
+                return self._cached
+            status = await self._run_checks()
+            self._cached = status
+            self._cached_at = time.monotonic()
+            return status
+
+    async def check_readiness(self) -> HealthCheckResult:
+        """Database ping only, reused for READY_CACHE_TTL_SEC; a ping timeout is CRITICAL here."""
+        if self._ready is not None and time.monotonic() - self._ready_at < READY_CACHE_TTL_SEC:
+            return self._ready
+        try:
+            result = await asyncio.wait_for(self._check_database_health(), timeout=CHECK_TIMEOUT_SEC)
+        except asyncio.TimeoutError:
+            result = HealthCheckResult(
+                component="database",
+                status=HealthSeverity.CRITICAL,
+                message=f"Database ping timed out after {CHECK_TIMEOUT_SEC:.1f}s",
+                metrics={"timed_out": True, "connection_active": False},
+                timestamp=datetime.utcnow()
+            )
+        self._ready = result
+        self._ready_at = time.monotonic()
+        return result
+
+    async def check_system_health(self) -> HealthStatus:
+        return await self.run_health_check()
+
+    async def detect_anomalies(self, results: List[HealthCheckResult]) -> List[Dict[str, Any]]:
+        return await self.anomaly_detector.detect_anomalies(results)
+
+    async def _run_checks(self) -> HealthStatus:
         logger.info("Starting comprehensive health check")
-        
+
         # Run all health checks concurrently
         tasks = [
-            self._check_database_health(),
-            self._check_agent_performance(),
-            self._check_system_resources(),
-            self._check_task_queue_health(),
-            self._check_external_dependencies()
+            self._guarded("database", self._check_database_health),
+            self._guarded("agents", self._check_agent_performance),
+            self._guarded("system_resources", self._check_system_resources),
+            self._guarded("task_queue", self._check_task_queue_health),
+            self._guarded("external_dependencies", self._check_external_dependencies),
         ]
-        
+
         results = await asyncio.gather(*tasks, return_exceptions=True)
-        
+
         # Process results
         valid_results = []
         for result in results:
@@ -69,44 +174,62 @@ class HealthMonitor:
                 logger.error(f"Health check failed: {result}")
                 continue
             valid_results.append(result)
-            
-        self.health_checks.extend(valid_results)
-        
+
+        self.health_checks = (self.health_checks + valid_results)[-100:]
+
         # Detect anomalies
         anomalies = await self.anomaly_detector.detect_anomalies(valid_results)
-        
+
         # Handle recovery if needed
         if anomalies:
             await self.recovery_manager.handle_anomalies(anomalies)
-            
+
         # Create health status
         overall_status = self._determine_overall_status(valid_results)
         health_status = HealthStatus(
             overall_status=overall_status.value,
             components=[r.component for r in valid_results],
             metrics={r.component: r.metrics for r in valid_results},
-            anomalies=[a.dict() for a in anomalies],
+            messages={r.component: r.message for r in valid_results},
+            anomalies=anomalies,
             last_check=datetime.utcnow()
         )
-        
+
         logger.info(f"Health check completed. Status: {overall_status.value}")
         return health_status
-        
+
+    async def _guarded(self, component: str, check: Callable[[], Any]) -> HealthCheckResult:
+        """Run a check with the per-check timeout; a timeout degrades to WARNING."""
+        try:
+            return await asyncio.wait_for(check(), timeout=CHECK_TIMEOUT_SEC)
+        except asyncio.TimeoutError:
+            return HealthCheckResult(
+                component=component,
+                status=HealthSeverity.WARNING,
+                message=f"Health check timed out after {CHECK_TIMEOUT_SEC:.1f}s",
+                metrics={"timed_out": True},
+                timestamp=datetime.utcnow()
+            )
+
     async def _check_database_health(self) -> HealthCheckResult:
         """Check database connectivity and performance"""
+        def _ping() -> float:
+            from app.database.relational_db import engine
+
+            start = time.monotonic()
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return time.monotonic() - start
+
         try:
-            # Test connection
-            start_time = datetime.utcnow()
-            self.db_session.execute("SELECT 1")
+            query_time = await asyncio.to_thread(_ping)
             end_time = datetime.utcnow()
-            
-            query_time = (end_time - start_time).total_seconds()
-            
+
             metrics = {
                 "query_time_seconds": query_time,
                 "connection_active": True
             }
-            
+
             if query_time > 1.0:
                 return HealthCheckResult(
                     component="database",
@@ -115,15 +238,15 @@ class HealthMonitor:
                     metrics=metrics,
                     timestamp=end_time
                 )
-                
+
             return HealthCheckResult(
-                component="database", 
+                component="database",
                 status=HealthSeverity.OK,
                 message="Database healthy",
                 metrics=metrics,
                 timestamp=end_time
             )
-            
+
         except Exception as e:
             logger.error(f"Database health check failed: {e}")
             return HealthCheckResult(
@@ -133,65 +256,83 @@ class HealthMonitor:
                 metrics={"connection_active": False},
                 timestamp=datetime.utcnow()
             )
-            
+
     async def _check_agent_performance(self) -> HealthCheckResult:
-        """Check agent performance metrics"""
-        try:
-            # Get agent performance data from last hour
+        """Check agent performance metrics (aggregate queries only)"""
+        def _collect() -> Dict[str, int]:
+            from app.database.relational_db import Agent, SessionLocal, Task
+
             one_hour_ago = datetime.utcnow() - timedelta(hours=1)
-            
-            agents = self.db_session.query(Agent).all()
-            tasks = self.db_session.query(Task).filter(
-                Task.created_at >= one_hour_ago
-            ).all()
-            
-            if not agents:
+            db = SessionLocal()
+            try:
+                agent_count = int(db.query(func.count(Agent.id)).scalar() or 0)
+                by_status = dict(
+                    db.query(Task.status, func.count(Task.id))
+                    .filter(Task.created_at >= one_hour_ago)
+                    .group_by(Task.status)
+                    .all()
+                )
+            finally:
+                db.close()
+            return {
+                "agent_count": agent_count,
+                "task_count": int(sum(by_status.values())),
+                "completed": int(by_status.get("completed", 0)),
+                "failed": int(by_status.get("failed", 0)),
+            }
+
+        try:
+            counts = await asyncio.to_thread(_collect)
+
+            if not counts["agent_count"]:
                 return HealthCheckResult(
                     component="agents",
                     status=HealthSeverity.WARNING,
                     message="No agents registered",
-                    metrics={"agent_count": 0, "task_count": 0},
+                    metrics={"agent_count": 0, "task_count": counts["task_count"]},
                     timestamp=datetime.utcnow()
                 )
-                
-            successful_tasks = [t for t in tasks if t.status == "completed"]
-            failed_tasks = [t for t in tasks if t.status == "failed"]
-            
-            success_rate = len(successful_tasks) / len(tasks) if tasks else 0
-            
+
+            finished = counts["completed"] + counts["failed"]
+            success_rate = counts["completed"] / finished if finished else None
+
             metrics = {
-                "agent_count": len(agents),
-                "task_count": len(tasks),
+                "agent_count": counts["agent_count"],
+                "task_count": counts["task_count"],
                 "success_rate": success_rate,
-                "failed_tasks": len(failed_tasks)
+                "failed_tasks": counts["failed"]
             }
-            
-            if success_rate < 0.8:
+
+            if success_rate is not None and success_rate < 0.5:
                 return HealthCheckResult(
                     component="agents",
-                    status=HealthSeverity.WARNING,
-                    message=f"Low success rate: {success_rate:.2%}",
+                    status=HealthSeverity.CRITICAL,
+                    message=f"Critical success rate: {success_rate:.2%}",
                     metrics=metrics,
                     timestamp=datetime.utcnow()
                 )
-                
-            if success_rate < 0.5:
+
+            if success_rate is not None and success_rate < 0.8:
                 return HealthCheckResult(
-                    component="agents", 
-                    status=HealthSeverity.CRITICAL,
-                    message=f"Critical success rate: {success_rate:.2%}",
+                    component="agents",
+                    status=HealthSeverity.WARNING,
+                    message=f"Low success rate: {success_rate:.2%}",
                     metrics=metrics,
                     timestamp=datetime.utcnow()
                 )
-                
+
             return HealthCheckResult(
                 component="agents",
                 status=HealthSeverity.OK,
-                message=f"Agents performing well. Success rate: {success_rate:.2%}",
+                message=(
+                    f"Agents performing well. Success rate: {success_rate:.2%}"
+                    if success_rate is not None
+                    else "Agents healthy. No finished tasks in the last hour"
+                ),
                 metrics=metrics,
                 timestamp=datetime.utcnow()
             )
-            
+
         except Exception as e:
             logger.error(f"Agent performance check failed: {e}")
             return HealthCheckResult(
@@ -201,33 +342,47 @@ class HealthMonitor:
                 metrics={"agent_count": 0, "task_count": 0},
                 timestamp=datetime.utcnow()
             )
-            
+
     async def _check_system_resources(self) -> HealthCheckResult:
         """Check system resource usage"""
-        try:
+        if not self.cpu_sampler.ensure_started():
+            # psutil not available, skip this check
+            return HealthCheckResult(
+                component="system_resources",
+                status=HealthSeverity.INFO,
+                message="System resource monitoring not available",
+                metrics={},
+                timestamp=datetime.utcnow()
+            )
+
+        def _collect() -> Dict[str, Any]:
             import psutil
-            
-            cpu_percent = psutil.cpu_percent(interval=1)
+
             memory = psutil.virtual_memory()
             disk = psutil.disk_usage('/')
-            
-            metrics = {
-                "cpu_percent": cpu_percent,
+            return {
+                "cpu_percent": self.cpu_sampler.value,
+                "cpu_sampled_at": self.cpu_sampler.sampled_at.isoformat() if self.cpu_sampler.sampled_at else None,
                 "memory_percent": memory.percent,
                 "disk_percent": (disk.used / disk.total) * 100,
                 "available_memory_gb": memory.available / (1024**3)
             }
-            
+
+        try:
+            metrics = await asyncio.to_thread(_collect)
+            cpu_percent = metrics["cpu_percent"] or 0.0
+            memory_percent = metrics["memory_percent"]
+
             status = HealthSeverity.OK
             message = "System resources healthy"
-            
-            if cpu_percent > 90 or memory.percent > 90:
+
+            if cpu_percent > 90 or memory_percent > 90:
                 status = HealthSeverity.CRITICAL
-                message = f"Critical resource usage: CPU {cpu_percent:.1f}%, Memory {memory.percent:.1f}%"
-            elif cpu_percent > 70 or memory.percent > 70:
+                message = f"Critical resource usage: CPU {cpu_percent:.1f}%, Memory {memory_percent:.1f}%"
+            elif cpu_percent > 70 or memory_percent > 70:
                 status = HealthSeverity.WARNING
-                message = f"High resource usage: CPU {cpu_percent:.1f}%, Memory {memory.percent:.1f}%"
-                
+                message = f"High resource usage: CPU {cpu_percent:.1f}%, Memory {memory_percent:.1f}%"
+
             return HealthCheckResult(
                 component="system_resources",
                 status=status,
@@ -235,16 +390,7 @@ class HealthMonitor:
                 metrics=metrics,
                 timestamp=datetime.utcnow()
             )
-            
-        except ImportError:
-            # psutil not available, skip this check
-            return HealthCheckResult(
-                component="system_resources",
-                status=HealthSeverity.INFO,
-                message="System resource monitoring not available",
-                metrics={},
-                timestamp=datetime.utcnow()
-            )
+
         except Exception as e:
             logger.error(f"System resource check failed: {e}")
             return HealthCheckResult(
@@ -254,21 +400,29 @@ class HealthMonitor:
                 metrics={},
                 timestamp=datetime.utcnow()
             )
-            
+
     async def _check_task_queue_health(self) -> HealthCheckResult:
         """Check task queue health and processing"""
         try:
             from app.services.task_queue import get_task_queue
-            
+        except ImportError:
+            return HealthCheckResult(
+                component="task_queue",
+                status=HealthSeverity.INFO,
+                message="Task queue backend not configured",
+                metrics={},
+                timestamp=datetime.utcnow()
+            )
+        try:
             queue = get_task_queue()
             queue_size = await queue.get_size()
             processing_rate = await queue.get_processing_rate()
-            
+
             metrics = {
                 "queue_size": queue_size,
                 "processing_rate_per_minute": processing_rate
             }
-            
+
             if queue_size > 1000:
                 return HealthCheckResult(
                     component="task_queue",
@@ -277,8 +431,8 @@ class HealthMonitor:
                     metrics=metrics,
                     timestamp=datetime.utcnow()
                 )
-                
-            if processing_rate < 10:
+
+            if queue_size > 0 and processing_rate < 10:
                 return HealthCheckResult(
                     component="task_queue",
                     status=HealthSeverity.WARNING,
@@ -286,7 +440,7 @@ class HealthMonitor:
                     metrics=metrics,
                     timestamp=datetime.utcnow()
                 )
-                
+
             return HealthCheckResult(
                 component="task_queue",
                 status=HealthSeverity.OK,
@@ -294,7 +448,7 @@ class HealthMonitor:
                 metrics=metrics,
                 timestamp=datetime.utcnow()
             )
-            
+
         except Exception as e:
             logger.error(f"Task queue health check failed: {e}")
             return HealthCheckResult(
@@ -304,64 +458,54 @@ class HealthMonitor:
                 metrics={"queue_size": 0, "processing_rate_per_minute": 0},
                 timestamp=datetime.utcnow()
             )
-            
+
     async def _check_external_dependencies(self) -> HealthCheckResult:
         """Check external service dependencies"""
         try:
             # Check Redis connectivity
-            from app.database.redis_client import get_redis_client
-            
-            redis_client = get_redis_client()
-            await redis_client.ping()
-            redis_healthy = True
-            
-            metrics = {"redis_healthy": redis_healthy}
-            message = "External dependencies healthy"
-            status = HealthSeverity.OK
-            
-            if not redis_healthy:
-                status = HealthSeverity.CRITICAL
-                message = "Redis connection failed"
-                metrics["redis_healthy"] = False
-                
+            from app.database.cache_db import get_redis_cache
+
+            await asyncio.to_thread(get_redis_cache().redis_client.ping)
+
             return HealthCheckResult(
                 component="external_dependencies",
-                status=status,
-                message=message,
-                metrics=metrics,
+                status=HealthSeverity.OK,
+                message="External dependencies healthy",
+                metrics={"redis_healthy": True},
                 timestamp=datetime.utcnow()
             )
-            
+
         except Exception as e:
-            logger.error(f"External dependencies check failed: {e}")
+            # Redis-backed caches fall back to in-process storage, so this only degrades
+            logger.warning(f"External dependencies check failed: {e}")
             return HealthCheckResult(
                 component="external_dependencies",
-                status=HealthSeverity.CRITICAL,
+                status=HealthSeverity.WARNING,
                 message=f"External dependencies check failed: {str(e)}",
                 metrics={"redis_healthy": False},
                 timestamp=datetime.utcnow()
             )
-            
+
     def _determine_overall_status(self, results: List[HealthCheckResult]) -> HealthSeverity:
         """Determine overall health status from individual results"""
         severities = [r.status for r in results]
-        
+
         if HealthSeverity.CRITICAL in severities:
             return HealthSeverity.CRITICAL
         elif HealthSeverity.WARNING in severities:
             return HealthSeverity.WARNING
         else:
             return HealthSeverity.OK
-            
+
     async def start_continuous_monitoring(self, background_tasks: BackgroundTasks):
         """Start continuous health monitoring"""
         background_tasks.add_task(self._continuous_monitoring_loop)
-        
+
     async def _continuous_monitoring_loop(self):
         """Continuous monitoring loop"""
         while True:
             try:
-                await self.run_health_check()
+                await self.run_health_check(max_age=0)
                 await asyncio.sleep(60)  # Check every minute
             except Exception as e:
                 logger.error(f"Continuous monitoring error: {e}")
@@ -369,11 +513,11 @@ class HealthMonitor:
 
 class AnomalyDetector:
     """Detects anomalies in system behavior"""
-    
+
     async def detect_anomalies(self, results: List[HealthCheckResult]) -> List[Dict[str, Any]]:
         """Detect anomalies in health check results"""
         anomalies = []
-        
+
         for result in results:
             if result.status in [HealthSeverity.CRITICAL, HealthSeverity.WARNING]:
                 anomalies.append({
@@ -382,27 +526,27 @@ class AnomalyDetector:
                     "message": result.message,
                     "timestamp": result.timestamp.isoformat()
                 })
-                
+
         return anomalies
 
 class RecoveryManager:
     """Manages automatic recovery from anomalies"""
-    
+
     async def handle_anomalies(self, anomalies: List[Dict[str, Any]]):
         """Handle detected anomalies with automatic recovery"""
         for anomaly in anomalies:
             component = anomaly["component"]
             severity = anomaly["severity"]
-            
+
             if severity == "critical":
                 await self._handle_critical_anomaly(component)
             elif severity == "warning":
                 await self._handle_warning_anomaly(component)
-                
+
     async def _handle_critical_anomaly(self, component: str):
         """Handle critical anomalies"""
         logger.critical(f"Handling critical anomaly in {component}")
-        
+
         if component == "database":
             # Attempt database connection recovery
             await self._recover_database_connection()
@@ -412,22 +556,22 @@ class RecoveryManager:
         elif component == "task_queue":
             # Clear and restart task queue
             await self._recover_task_queue()
-            
+
     async def _handle_warning_anomaly(self, component: str):
         """Handle warning anomalies"""
         logger.warning(f"Handling warning anomaly in {component}")
         # Log warning and monitor, no immediate action needed
-        
+
     async def _recover_database_connection(self):
         """Attempt to recover database connection"""
         logger.info("Attempting database connection recovery")
         # Implementation would depend on specific database setup
-        
+
     async def _restart_agent_services(self):
         """Restart agent services"""
         logger.info("Restarting agent services")
         # Implementation would restart agent processes
-        
+
     async def _recover_task_queue(self):
         """Recover task queue"""
         logger.info("Recovering task queue")
@@ -436,10 +580,10 @@ class RecoveryManager:
 # Global health monitor instance
 health_monitor = HealthMonitor()
 
-async def get_health_status() -> HealthStatus:
-    """Get current health status"""
-    return await health_monitor.run_health_check()
+async def get_health_status(max_age: Optional[float] = None) -> HealthStatus:
+    """Get current health status (cached for CLAWJOB_HEALTH_CACHE_TTL_SEC)"""
+    return await health_monitor.run_health_check(max_age=max_age)
 
 async def start_health_monitoring(background_tasks: BackgroundTasks):
     """Start health monitoring"""
-    await health_monitor.start_continuous_monitoring(background_tasks)
\ No newline at end of file
+    await health_monitor.start_continuous_monitoring(background_tasks)
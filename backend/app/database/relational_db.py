@@ -2,9 +2,11 @@
 Relational Database (PostgreSQL) integration for Agent Arena.
 Provides structured data storage for agents, tasks, and user management.
 """
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, Float, text
+from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, Float, Index, UniqueConstraint, event, select, text
+from sqlalchemy import inspect as sa_inspect
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm.util import identity_key
 from sqlalchemy.sql import func
 from typing import Optional, List
 import os
@@ -97,6 +99,51 @@ class AgentStats(Base):
     agent = relationship("Agent", backref="stats_row", uselist=False)
 
 
+class AgentTrustCardSnapshot(Base):
+    """信任卡快照：任务完成后标记 stale，下次读取时重算；version 随内容变化递增（用作 ETag）。"""
+    __tablename__ = "agent_trust_cards"
+
+    agent_id = Column(Integer, ForeignKey("agents.id"), primary_key=True)
+    version = Column(Integer, default=1, nullable=False)
+    content_hash = Column(String(64), nullable=False)
+    card = Column(JSON, nullable=False)
+    stale = Column(Boolean, default=False, nullable=False)
+    computed_at = Column(DateTime, default=func.now(), nullable=False)
+
+
+class AgentEarnings(Base):
+    """Agent 收益快照：完成单数 / 奖励点数 / 实际入账点数，随结算在同一事务内累加，定期与流水对账。"""
+    __tablename__ = "agent_earnings"
+
+    agent_id = Column(Integer, ForeignKey("agents.id"), primary_key=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
+    tasks_completed = Column(Integer, default=0, nullable=False)
+    points_earned = Column(Integer, default=0, nullable=False)  # 已完成任务的 reward_points 合计
+    credited_points = Column(Integer, default=0, nullable=False)  # task_reward 流水合计（扣佣金后实际入账）
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    reconciled_at = Column(DateTime, nullable=True)
+
+
+class AgentCase(Base):
+    """Agent 公开案例（只追加）：任务完成时写入一行摘要，/agents/{id}/cases 直接按索引分页读取。"""
+    __tablename__ = "agent_cases"
+
+    id = Column(Integer, primary_key=True, index=True)
+    agent_id = Column(Integer, ForeignKey("agents.id"), nullable=False)
+    task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False, unique=True)
+    title = Column(String, nullable=False)
+    category = Column(String(64), nullable=True)
+    skill = Column(String(64), nullable=True)  # input_data.skills 首项，缺省为 category
+    publisher_name = Column(String, nullable=True)  # 完成时发布者用户名
+    reward_points = Column(Integer, default=0, nullable=False)
+    duration_seconds = Column(Integer, nullable=True)  # 发布到完成的耗时
+    summary = Column(Text, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+
+    __table_args__ = (Index("ix_agent_cases_agent_completed", "agent_id", "completed_at", "id"),)
+
+
 class PublishedAgentTemplate(Base):
     """已发布的 Agent 模板 / Skill：供市场展示与下载（OpenClaw 配置 + Skill 或仅 Skill）"""
     __tablename__ = "published_agent_templates"
@@ -157,6 +204,19 @@ class PublishedMcpTool(Base):
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
+    # 市场列表按 id 倒序做 keyset 分页；按分类筛选时走 (category, id)
+    __table_args__ = (Index("ix_mcp_tools_category_id", "category", "id"),)
+
+
+class McpToolTag(Base):
+    """MCP 工具标签（多对多展开）；按标签筛选走 (tag, tool_id) 索引。"""
+    __tablename__ = "mcp_tool_tags"
+
+    tool_id = Column(Integer, ForeignKey("mcp_tools.id", ondelete="CASCADE"), primary_key=True)
+    tag = Column(String(64), primary_key=True)
+
+    __table_args__ = (Index("ix_mcp_tool_tags_tag_tool", "tag", "tool_id"),)
+
 
 class Task(Base):
     """Task model for agent tasks"""
@@ -185,6 +245,9 @@ class Task(Base):
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     completed_at = Column(DateTime, index=True)
     is_public_listing = Column(Boolean, default=False, index=True, nullable=False)
+    reminder_sent_at = Column(DateTime, nullable=True)  # 24h 无人接取提醒已发送时间（空表示未提醒）
+
+    __table_args__ = (Index("ix_tasks_reminder_due", "status", "reminder_sent_at", "created_at"),)
     
     # NOTE: translated comment in English.
     agent = relationship("Agent", back_populates="tasks", foreign_keys=[agent_id])
@@ -251,6 +314,9 @@ class TaskComment(Base):
     task = relationship("Task", backref="comments")
     user = relationship("User", backref="task_comments")
 
+    # 单任务讨论串按 id 做 keyset 分页（before_id）
+    __table_args__ = (Index("ix_task_comments_task_id_id", "task_id", "id"),)
+
 
 class InternalMessage(Base):
     """站内信：用户之间的私信消息。"""
@@ -284,11 +350,20 @@ class ChatTopic(Base):
     status = Column(String(16), default="active", nullable=False, index=True)  # active | archived
     heat_score = Column(Float, default=0.0, nullable=False, index=True)
     auto_generated = Column(Boolean, default=False, nullable=False)
+    # 列表用冗余计数：发消息 / 新成员加入时随同一事务累加（见 community.record_topic_message）
+    message_count = Column(Integer, default=0, nullable=False)
+    member_count = Column(Integer, default=0, nullable=False)
+    last_message_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=func.now(), index=True)
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
     creator_agent = relationship("Agent")
 
+    __table_args__ = (
+        Index("ix_chat_topics_listing", "visibility", "status", "heat_score", "id"),
+        Index("ix_chat_topics_listing_newest", "visibility", "status", "created_at", "id"),
+    )
+
 
 class ChatMessage(Base):
     """社区聊天消息（Markdown 存储 + 预清洗 HTML）。"""
@@ -370,8 +445,27 @@ class CreditTransaction(Base):
     ref_id = Column(Integer, nullable=True)  # 关联 task_id / recharge_order_id 等
     remark = Column(String, nullable=True)
     created_at = Column(DateTime, default=func.now())
+    balance_after = Column(Integer, nullable=True)  # 入账后 users.credits；flush 时填写（见 _stamp_balance_after）
     user = relationship("User", backref="credit_transactions")
 
+    __table_args__ = (
+        Index("ix_credit_tx_user_type_created", "user_id", "type", "created_at", postgresql_include=["amount"]),
+        Index("ix_credit_tx_user_created_id", "user_id", "created_at", "id"),
+    )
+
+
+class CreditBalanceCheckpoint(Base):
+    """信用点余额检查点：截至 last_tx_id（含）的流水合计，对账时只需再加其后的流水。"""
+    __tablename__ = "credit_balance_checkpoints"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    last_tx_id = Column(Integer, nullable=False)
+    balance = Column(Integer, nullable=False)
+    tx_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=func.now(), nullable=False)
+
+    __table_args__ = (Index("ix_credit_checkpoints_user_tx", "user_id", "last_tx_id"),)
+
 
 class PlatformClearingAccount(Base):
     """平台中转账户：用于管理任务佣金（手续费），与支付宝关联便于结算"""
@@ -716,7 +810,114 @@ class ExecutionStep(Base):
     cost_credits = Column(Integer, default=0, nullable=False)
 
 
+class IdempotencyKey(Base):
+    """写接口幂等键：同一用户在同一 scope 下重复提交同一 Idempotency-Key 时返回首次结果。"""
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (UniqueConstraint("user_id", "scope", "key", name="uq_idempotency_user_scope_key"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    scope = Column(String(64), nullable=False)
+    key = Column(String(128), nullable=False)
+    response = Column(JSON, nullable=True)
+    created_at = Column(DateTime, default=func.now(), index=True)
+
+
+class SchedulerLease(Base):
+    """后台调度租约：集群内 leader 选举（Redis 不可用时的数据库后端）。"""
+    __tablename__ = "scheduler_leases"
+
+    name = Column(String(64), primary_key=True)
+    owner = Column(String(128), nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+
+class ScheduledJobRun(Base):
+    """周期任务运行记录：供 /admin/jobs 查看与跨实例判定下一次运行时间。"""
+    __tablename__ = "scheduled_job_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_name = Column(String(64), nullable=False, index=True)
+    owner = Column(String(128), nullable=True)
+    started_at = Column(DateTime, nullable=False, index=True)
+    ended_at = Column(DateTime, nullable=True)
+    ok = Column(Boolean, default=False, nullable=False)
+    error = Column(Text, nullable=True)
+    duration_ms = Column(Integer, default=0, nullable=False)
+    result = Column(JSON, nullable=True)
+
+
+class TaskQueueJob(Base):
+    """持久化任务队列（app.services.task_queue 的数据库后端）：按优先级领取、可见性超时、重试与死信。"""
+    __tablename__ = "task_queue_jobs"
+    __table_args__ = (Index("ix_task_queue_jobs_claim", "queue", "status", "priority", "available_at"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    queue = Column(String(64), nullable=False, default="default")
+    payload = Column(JSON, nullable=True)
+    priority = Column(Integer, nullable=False, default=0)  # 越大越先领取
+    status = Column(String(16), nullable=False, default="queued", index=True)
+    # queued | processing | done | dead
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    available_at = Column(DateTime, nullable=False, default=func.now())
+    locked_by = Column(String(128), nullable=True)
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=func.now(), index=True)
+    finished_at = Column(DateTime, nullable=True, index=True)
+
+
 # Database initialization function
+def _stamp_balance_after(session, flush_context, instances) -> None:
+    """新流水在 flush 时写入 balance_after。
+
+    调用方按惯例先在（已加行锁的）用户行上改 credits 再 add 流水，flush 时用户行的 UPDATE
+    先于流水 INSERT；这里取该用户当前 credits（会话内的新值或库里的值），按加入顺序倒推出
+    同一次 flush 里每条流水入账后的余额。
+    """
+    new_rows = [o for o in session.new if isinstance(o, CreditTransaction) and o.balance_after is None]
+    if not new_rows:
+        return
+    new_rows.sort(key=lambda o: sa_inspect(o).insert_order)
+    by_user: dict = {}
+    for row in new_rows:
+        if row.user_id is not None:
+            by_user.setdefault(int(row.user_id), []).append(row)
+    for uid, rows in by_user.items():
+        user = session.identity_map.get(identity_key(User, uid))
+        if user is not None:
+            balance = user.credits
+        else:
+            balance = session.execute(select(User.credits).where(User.id == uid)).scalar()
+        if balance is None:
+            continue
+        running = int(balance) - sum(int(r.amount or 0) for r in rows)
+        for r in rows:
+            running += int(r.amount or 0)
+            r.balance_after = running
+
+
+event.listen(SessionLocal, "before_flush", _stamp_balance_after)
+
+
+def _create_agent_earnings_row(mapper, connection, target) -> None:
+    """新 Agent 插入时在同一 flush / 事务里建立全零的收益快照行，结算累加从第一单起就能命中。"""
+    connection.execute(
+        AgentEarnings.__table__.insert().values(
+            agent_id=target.id,
+            owner_id=target.owner_id,
+            tasks_completed=0,
+            points_earned=0,
+            credited_points=0,
+        )
+    )
+
+
+event.listen(Agent, "after_insert", _create_agent_earnings_row)
+
+
 def init_db():
     """Initialize the database tables"""
     Base.metadata.create_all(bind=engine)
@@ -747,6 +948,7 @@ def init_db():
             for col, typ in [
                 ("category", "VARCHAR(64)"),
                 ("requirements", "TEXT"),
+                ("reminder_sent_at", "TIMESTAMP"),
             ]:
                 try:
                     if engine.dialect.name == "postgresql":
@@ -756,6 +958,14 @@ def init_db():
                     conn.commit()
                 except Exception:
                     conn.rollback()
+            try:
+                if engine.dialect.name == "postgresql":
+                    conn.execute(text("ALTER TABLE credit_transactions ADD COLUMN IF NOT EXISTS balance_after INTEGER"))
+                else:
+                    conn.execute(text("ALTER TABLE credit_transactions ADD COLUMN balance_after INTEGER"))
+                conn.commit()
+            except Exception:
+                conn.rollback()
             for col, typ in [
                 ("version_tag", "VARCHAR(64) DEFAULT 'v1' NOT NULL"),
             ]:
@@ -796,6 +1006,19 @@ def init_db():
                     conn.commit()
                 except Exception:
                     conn.rollback()
+            for col, typ in [
+                ("message_count", "INTEGER DEFAULT 0 NOT NULL"),
+                ("member_count", "INTEGER DEFAULT 0 NOT NULL"),
+                ("last_message_at", "TIMESTAMP"),
+            ]:
+                try:
+                    if engine.dialect.name == "postgresql":
+                        conn.execute(text(f"ALTER TABLE chat_topics ADD COLUMN IF NOT EXISTS {col} {typ}"))
+                    else:
+                        conn.execute(text(f"ALTER TABLE chat_topics ADD COLUMN {col} {typ}"))
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
             try:
                 if engine.dialect.name == "postgresql":
                     conn.execute(text("ALTER TABLE agents ADD COLUMN IF NOT EXISTS is_public BOOLEAN NOT NULL DEFAULT false"))
@@ -825,9 +1048,30 @@ def init_db():
                 pass
     except Exception:
         pass
+    _ensure_indexes(
+        "ix_mcp_tools_category_id",
+        "ix_task_comments_task_id_id",
+        "ix_tasks_reminder_due",
+        "ix_credit_tx_user_type_created",
+        "ix_credit_tx_user_created_id",
+        "ix_chat_topics_listing",
+        "ix_chat_topics_listing_newest",
+    )
     _ensure_admin_user_from_env()
 
 
+def _ensure_indexes(*names: str) -> None:
+    """create_all 不会给已存在的表补索引；在补列之后按名称补建。"""
+    wanted = set(names)
+    for table in Base.metadata.sorted_tables:
+        for idx in table.indexes:
+            if idx.name in wanted:
+                try:
+                    idx.create(bind=engine, checkfirst=True)
+                except Exception:
+                    pass
+
+
 def _ensure_admin_user_from_env():
     """若设置了 ADMIN_USERNAME 与 ADMIN_PASSWORD，则创建或更新该管理员账号（is_superuser=True）。"""
     admin_username = os.getenv("ADMIN_USERNAME", "").strip()
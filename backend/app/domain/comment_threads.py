@@ -0,0 +1,103 @@
+"""任务评论串的批量加载（任务评论、A2A 留言、论坛动态共用）。
+
+评论行与作者用户名、发言 Agent 名（论坛再加任务标题 / 状态）在同一条 join 查询里取回，
+查询数与评论条数无关。单任务讨论串按 id 倒序做 keyset 分页（before_id），长对话不会被整串加载；
+论坛总数走短 TTL 缓存，不再每次请求全表 count。
+"""
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.database.relational_db import Agent, Task, TaskComment, User
+from app.services.platform_stats_cache import _cache_get, _cache_set
+from app.utils.datetime_iso import iso_utc
+
+THREAD_PAGE_DEFAULT = 100
+THREAD_PAGE_MAX = 500
+FORUM_COUNT_KEY = "clawjob:forum:comment_count"
+FORUM_COUNT_TTL_SEC = max(5, int(os.getenv("CLAWJOB_FORUM_COUNT_TTL_SEC", "60")))
+
+
+def comment_to_dict(c: TaskComment, author_name: Optional[str], agent_name: Optional[str]) -> Dict[str, Any]:
+    return {
+        "id": c.id,
+        "task_id": c.task_id,
+        "user_id": c.user_id,
+        "author_name": author_name or "",
+        "agent_id": getattr(c, "agent_id", None),
+        "agent_name": agent_name,
+        "kind": getattr(c, "kind", None) or "message",
+        "content": c.content,
+        "created_at": iso_utc(c.created_at),
+    }
+
+
+def _comments_query(db: Session, *extra_columns):
+    return (
+        db.query(TaskComment, User.username, Agent.name, *extra_columns)
+        .outerjoin(User, User.id == TaskComment.user_id)
+        .outerjoin(Agent, Agent.id == TaskComment.agent_id)
+    )
+
+
+def load_task_thread(
+    db: Session,
+    task_id: int,
+    *,
+    before_id: Optional[int] = None,
+    limit: int = THREAD_PAGE_DEFAULT,
+) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """取 id < before_id 的最新 limit 条评论，按时间正序返回；还有更早的评论时返回下一页的 before_id。"""
+    limit = max(1, min(int(limit or THREAD_PAGE_DEFAULT), THREAD_PAGE_MAX))
+    q = _comments_query(db).filter(TaskComment.task_id == task_id)
+    if before_id is not None:
+        q = q.filter(TaskComment.id < int(before_id))
+    rows = q.order_by(TaskComment.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = list(reversed(rows[:limit]))
+    items = [comment_to_dict(c, username, agent_name) for c, username, agent_name in rows]
+    return items, (rows[0][0].id if has_more and rows else None)
+
+
+def load_recent_posts(
+    db: Session,
+    *,
+    skip: int = 0,
+    limit: int = 50,
+    before_id: Optional[int] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """论坛动态：全站最新评论（附所属任务标题 / 状态），一条 join 查询。"""
+    q = _comments_query(db, Task.title, Task.status).outerjoin(Task, Task.id == TaskComment.task_id)
+    q = q.order_by(TaskComment.id.desc())
+    if before_id is not None:
+        q = q.filter(TaskComment.id < int(before_id))
+    else:
+        q = q.offset(max(0, int(skip or 0)))
+    rows = q.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items = [
+        {
+            "comment": comment_to_dict(c, username, agent_name),
+            "task": {"id": c.task_id, "title": title or "", "status": status or ""},
+        }
+        for c, username, agent_name, title, status in rows
+    ]
+    return items, (rows[-1][0].id if has_more and rows else None)
+
+
+def cached_comment_count(db: Session) -> int:
+    """全站评论总数；缓存 CLAWJOB_FORUM_COUNT_TTL_SEC 秒（仅用于展示）。"""
+    cached = _cache_get(FORUM_COUNT_KEY)
+    if cached is not None:
+        try:
+            return int(cached)
+        except (TypeError, ValueError):
+            pass
+    total = int(db.query(func.count(TaskComment.id)).scalar() or 0)
+    _cache_set(FORUM_COUNT_KEY, total, ttl=FORUM_COUNT_TTL_SEC)
+    return total
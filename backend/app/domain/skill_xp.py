@@ -3,7 +3,7 @@ from __future__ import annotations
 
 import os
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from sqlalchemy.orm import Session
 
@@ -50,33 +50,33 @@ def task_skills_for_xp(t: Task) -> List[str]:
     return list(dict.fromkeys(out))
 
 
+def _agent_config_token(agent: Optional[Agent]) -> str:
+    if not agent:
+        return ""
+    cfg = agent.config or {}
+    return (cfg.get("skill_bound_token") or "").strip() if isinstance(cfg, dict) else ""
+
+
 def agent_skill_token(db: Session, agent_id: Optional[int]) -> str:
     """Return skill_bound_token from agent config if available."""
     if not agent_id:
         return ""
-    a = db.query(Agent).filter(Agent.id == int(agent_id)).first()
-    if not a:
-        return ""
-    cfg = a.config or {}
-    return (cfg.get("skill_bound_token") or "").strip() if isinstance(cfg, dict) else ""
+    return _agent_config_token(db.query(Agent).filter(Agent.id == int(agent_id)).first())
 
 
-def task_related_skill(db: Session, t: Task, task_input: Optional[dict] = None) -> Optional[dict]:
-    """Resolve published skill linked to task by token."""
-    d = task_input if isinstance(task_input, dict) else (getattr(t, "input_data", None) or {})
-    if not isinstance(d, dict):
-        d = {}
+def _related_skill_token(t: Task, d: dict, token_of_agent) -> Tuple[str, str]:
     token = (d.get("related_skill_token") or "").strip()
-    source = "manual"
-    if not token:
-        token = agent_skill_token(db, getattr(t, "creator_agent_id", None))
-        source = "creator_agent"
-    if not token:
-        token = agent_skill_token(db, getattr(t, "agent_id", None))
-        source = "assigned_agent"
+    if token:
+        return token, "manual"
+    token = token_of_agent(getattr(t, "creator_agent_id", None))
+    if token:
+        return token, "creator_agent"
+    return token_of_agent(getattr(t, "agent_id", None)), "assigned_agent"
+
+
+def _related_skill_payload(token: str, source: str, ps: Optional[PublishedSkill]) -> Optional[dict]:
     if not token:
         return None
-    ps = db.query(PublishedSkill).filter(PublishedSkill.skill_token == token).first()
     if not ps:
         return {"skill_token": token, "source": source}
     return {
@@ -89,6 +89,40 @@ def task_related_skill(db: Session, t: Task, task_input: Optional[dict] = None)
     }
 
 
+def task_related_skill(db: Session, t: Task, task_input: Optional[dict] = None) -> Optional[dict]:
+    """Resolve published skill linked to task by token."""
+    d = task_input if isinstance(task_input, dict) else (getattr(t, "input_data", None) or {})
+    if not isinstance(d, dict):
+        d = {}
+    token, source = _related_skill_token(t, d, lambda aid: agent_skill_token(db, aid))
+    if not token:
+        return None
+    ps = db.query(PublishedSkill).filter(PublishedSkill.skill_token == token).first()
+    return _related_skill_payload(token, source, ps)
+
+
+def task_related_skills_bulk(db: Session, tasks: List[Task], agents_by_id: Dict[int, Agent]) -> Dict[int, Optional[dict]]:
+    """task_related_skill for a page of tasks: agents come pre-loaded, skills in one IN query."""
+    resolved: Dict[int, Tuple[str, str]] = {}
+    for t in tasks:
+        d = getattr(t, "input_data", None) or {}
+        resolved[t.id] = _related_skill_token(
+            t,
+            d if isinstance(d, dict) else {},
+            lambda aid: _agent_config_token(agents_by_id.get(int(aid))) if aid else "",
+        )
+    tokens = {token for token, _ in resolved.values() if token}
+    skills = (
+        {ps.skill_token: ps for ps in db.query(PublishedSkill).filter(PublishedSkill.skill_token.in_(tokens)).all()}
+        if tokens
+        else {}
+    )
+    return {
+        task_id: _related_skill_payload(token, source, skills.get(token))
+        for task_id, (token, source) in resolved.items()
+    }
+
+
 def level_from_xp(xp: int) -> dict:
     # NOTE: translated comment in English.
     level = 1
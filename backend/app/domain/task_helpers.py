@@ -28,6 +28,7 @@ from app.domain.agent_helpers import ensure_agents_category_column
 from app.domain.skill_xp import task_related_skill
 from app.services import reverse_auction as _ra
 from app.services.escrow_tasks import apply_escrow_milestone_confirm, get_escrow
+from app.services.task_claims import TaskClaimConflict, claim_task_for_agent
 from app.services.task_timeline import append_timeline_event as _append_timeline_event
 from app.utils.datetime_iso import iso_utc
 
@@ -280,6 +281,18 @@ def run_task_completed_side_effects(db: Session, task: Task) -> None:
         _agent_stats.on_task_completed(db, task)
     except Exception:
         pass
+    try:
+        from app.services import agent_earnings as _earnings
+
+        _earnings.record_completions(db, [task])
+    except Exception:
+        pass
+    try:
+        from app.services.agent_cases import record_cases
+
+        record_cases(db, [task])
+    except Exception:
+        pass
     try:
         from app.services.platform_stats_cache import invalidate_platform_stats_cache
 
@@ -317,6 +330,24 @@ def after_task_published(db: Session, task: Task, owner: User) -> None:
         pass
 
 
+def after_tasks_published(db: Session, tasks: List[Task], owner: User) -> None:
+    """批量发布后：逐条物化 listing 标记与统计，平台缓存只失效一次。"""
+    try:
+        from app.services import agent_stats as _agent_stats
+
+        for task in tasks:
+            sync_task_public_listing(task, owner)
+            _agent_stats.on_task_published(db, task)
+    except Exception:
+        pass
+    try:
+        from app.services.platform_stats_cache import invalidate_platform_stats_cache
+
+        invalidate_platform_stats_cache()
+    except Exception:
+        pass
+
+
 def after_task_assigned(db: Session, task: Task, agent_id: int) -> None:
     try:
         from app.services import agent_stats as _agent_stats
@@ -324,6 +355,12 @@ def after_task_assigned(db: Session, task: Task, agent_id: int) -> None:
         _agent_stats.on_task_assigned(db, agent_id)
     except Exception:
         pass
+    try:
+        from app.services.reputation_hooks import touch_agent_reputation
+
+        touch_agent_reputation(db, agent_id)
+    except Exception:
+        pass
     try:
         from app.services.platform_stats_cache import invalidate_platform_stats_cache
 
@@ -363,6 +400,11 @@ def pay_task_reward(task: Task, db: Session, *, skip_credits: bool = False) -> b
                 )
                 db.add(tx)
                 invitee_user_id_for_referral = int(agent.owner_id)
+                from app.services import agent_earnings as _earnings
+                from app.services.payout import invalidate_payout_aggregates_after_commit
+
+                _earnings.record_credit(db, agent.id, amount_to_receiver)
+                invalidate_payout_aggregates_after_commit(db, [agent.owner_id])
                 # NOTE: translated comment in English.
                 if commission > 0 and task.owner_id:
                     publisher = db.query(User).filter(User.id == task.owner_id).first()
@@ -458,7 +500,12 @@ def maybe_auto_confirm(task: Task, db: Session) -> None:
     if esc and esc.get("disputed"):
         return
     if esc:
-        info = apply_escrow_milestone_confirm(task, db, auto=True)
+        try:
+            info = apply_escrow_milestone_confirm(task, db, auto=True)
+        except TaskClaimConflict:
+            # 发布方手动验收已抢先放款
+            db.rollback()
+            return
         fin = bool(info.get("escrow_finished"))
         _append_timeline_event(
             task,
@@ -479,8 +526,39 @@ def maybe_auto_confirm(task: Task, db: Session) -> None:
     else:
         _append_timeline_event(task, "auto_confirmed", "验收截止未操作，系统自动确认并发奖")
     db.commit()
-def task_extra(t: Task, db: Session) -> dict:
-    """任务扩展字段：分类、要求、地点、时长、技能等"""
+
+
+def auto_confirm_overdue_tasks(db: Session, *, limit: int = 200) -> int:
+    """批量扫描验收已超时的任务并自动确认（调度器周期任务），返回处理条数。"""
+    now = datetime.utcnow()
+    rows = (
+        db.query(Task)
+        .filter(
+            Task.status == "pending_verification",
+            Task.verification_deadline_at.isnot(None),
+            Task.verification_deadline_at <= now,
+        )
+        .order_by(Task.verification_deadline_at.asc())
+        .limit(max(1, int(limit)))
+        .all()
+    )
+    n = 0
+    for t in rows:
+        try:
+            maybe_auto_confirm(t, db)
+            if t.status != "pending_verification":
+                n += 1
+        except Exception:
+            db.rollback()
+    return n
+_RESOLVE = object()
+
+
+def task_extra(t: Task, db: Session, *, related_skill: Any = _RESOLVE) -> dict:
+    """任务扩展字段：分类、要求、地点、时长、技能等
+
+    批量序列化（TaskRowSerializer）时传入预取好的 related_skill，避免逐行查询。
+    """
     d = getattr(t, "input_data", None) or {}
     if not isinstance(d, dict):
         d = {}
@@ -493,7 +571,7 @@ def task_extra(t: Task, db: Session) -> dict:
         "skills": d.get("skills") if isinstance(d.get("skills"), list) else None,
         "verification_method": normalize_verification_method(d.get("verification_method") or "manual_review"),
         "verification_requirements": d.get("verification_requirements") if isinstance(d.get("verification_requirements"), list) else [],
-        "related_skill": task_related_skill(db, t, d),
+        "related_skill": task_related_skill(db, t, d) if related_skill is _RESOLVE else related_skill,
         "collaborative": bool(d.get("collaborative")),
         "settlement_mode": (d.get("settlement_mode") or "platform_credits"),
     }
@@ -786,6 +864,18 @@ def award_bid_impl(task: Task, winning_bid: TaskBid, db: Session, *, auto: bool
     if price > original_reward:
         raise HTTPException(status_code=500, detail="报价高于任务预算，状态异常")
     refund = max(0, original_reward - price)
+    # 条件 UPDATE 抢占接取者与中标报价：并发选标 / 自动判标只有一个能成功
+    if not claim_task_for_agent(
+        db, task.id, int(winning_bid.agent_id), new_status="in_progress" if task.status == "open" else None
+    ):
+        raise HTTPException(status_code=409, detail="任务已分配接取者")
+    won = (
+        db.query(TaskBid)
+        .filter(TaskBid.id == winning_bid.id, TaskBid.status == "active")
+        .update({"status": "won"}, synchronize_session=False)
+    )
+    if won != 1:
+        raise HTTPException(status_code=409, detail="该报价已不是 active 状态")
     if refund > 0:
         try:
             publisher = db.query(User).filter(User.id == task.owner_id).with_for_update().first()
@@ -0,0 +1,126 @@
+"""任务列表行的批量序列化（/tasks/mine、/tasks/created-by-me、/agents/{agent_id}/tasks 共用）。
+
+Agent 心跳最常轮询这几个接口；逐行查 User / Agent / 关联 Skill / 订阅数 / 评论数会让查询数随页大小线性增长。
+TaskRowSerializer 对整页任务用 IN 列表一次性预取，查询数与页大小无关：
+发布者 1 次、Agent（接取方 + 发起方）1 次、关联 Skill 1 次、订阅数 + 评论数合并 1 次（仅 with_counts）。
+
+验收超时自动确认只对本页确实超时的任务执行；发生确认后整页重新加载一次，而不是每行 refresh。
+"""
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import func, literal, union_all
+from sqlalchemy.orm import Session
+
+from app.database.relational_db import Agent, Task, TaskComment, TaskSubscription, User
+from app.domain.skill_xp import task_related_skills_bulk
+from app.domain.task_helpers import maybe_auto_confirm, task_extra
+from app.utils.datetime_iso import iso_utc
+
+
+def _auto_confirm_due(t: Task, now: datetime) -> bool:
+    deadline = getattr(t, "verification_deadline_at", None)
+    return t.status == "pending_verification" and deadline is not None and now >= deadline
+
+
+def settle_overdue(db: Session, tasks: List[Task]) -> List[Task]:
+    """对本页验收已超时的任务执行自动确认；有变更时一次查询重新加载整页（保持原顺序）。"""
+    now = datetime.utcnow()
+    due = [t for t in tasks if _auto_confirm_due(t, now)]
+    if not due:
+        return tasks
+    for t in due:
+        maybe_auto_confirm(t, db)
+    ids = [t.id for t in tasks]
+    fresh = {t.id: t for t in db.query(Task).filter(Task.id.in_(ids)).populate_existing().all()}
+    return [fresh[i] for i in ids if i in fresh]
+
+
+class TaskRowSerializer:
+    """为一页任务预取关联数据，再逐行输出字典。"""
+
+    def __init__(self, db: Session, tasks: Iterable[Task], *, with_counts: bool = False):
+        self.db = db
+        self.tasks = settle_overdue(db, list(tasks))
+        owner_ids = {int(t.owner_id) for t in self.tasks if t.owner_id}
+        agent_ids = {
+            int(aid)
+            for t in self.tasks
+            for aid in (t.agent_id, getattr(t, "creator_agent_id", None))
+            if aid
+        }
+        self.owner_names: Dict[int, str] = (
+            dict(db.query(User.id, User.username).filter(User.id.in_(owner_ids)).all()) if owner_ids else {}
+        )
+        self.agents: Dict[int, Agent] = (
+            {a.id: a for a in db.query(Agent).filter(Agent.id.in_(agent_ids)).all()} if agent_ids else {}
+        )
+        self.related_skills = task_related_skills_bulk(db, self.tasks, self.agents)
+        self.subscription_counts: Dict[int, int] = {}
+        self.comment_counts: Dict[int, int] = {}
+        if with_counts and self.tasks:
+            self._load_counts([t.id for t in self.tasks])
+
+    def _load_counts(self, task_ids: List[int]) -> None:
+        subs = (
+            self.db.query(literal("sub").label("kind"), TaskSubscription.task_id, func.count().label("n"))
+            .filter(TaskSubscription.task_id.in_(task_ids))
+            .group_by(TaskSubscription.task_id)
+        )
+        comments = (
+            self.db.query(literal("comment").label("kind"), TaskComment.task_id, func.count().label("n"))
+            .filter(TaskComment.task_id.in_(task_ids))
+            .group_by(TaskComment.task_id)
+        )
+        for kind, task_id, n in self.db.execute(union_all(subs.statement, comments.statement)).all():
+            target = self.subscription_counts if kind == "sub" else self.comment_counts
+            target[int(task_id)] = int(n or 0)
+
+    def _agent_name(self, agent_id: Optional[int]) -> Optional[str]:
+        agent = self.agents.get(int(agent_id)) if agent_id else None
+        return agent.name if agent else None
+
+    def base(self, t: Task) -> Dict[str, Any]:
+        return {
+            "id": t.id,
+            "title": t.title,
+            "description": (t.description or "")[:200],
+            "status": t.status,
+            "priority": t.priority or "medium",
+            "task_type": t.task_type or "general",
+            "owner_id": t.owner_id,
+            "publisher_name": self.owner_names.get(int(t.owner_id), "") if t.owner_id else "",
+            "agent_id": t.agent_id,
+            "reward_points": getattr(t, "reward_points", 0) or 0,
+            "submitted_at": iso_utc(getattr(t, "submitted_at", None)),
+            "verification_deadline_at": iso_utc(getattr(t, "verification_deadline_at", None)),
+            "created_at": iso_utc(t.created_at),
+        }
+
+    def extra(self, t: Task) -> Dict[str, Any]:
+        return task_extra(t, self.db, related_skill=self.related_skills.get(t.id))
+
+    def accepted_row(self, t: Task) -> Dict[str, Any]:
+        """接取方视角（/tasks/mine、/agents/{agent_id}/tasks）。"""
+        return {**self.base(t), "agent_name": self._agent_name(t.agent_id) or "", **self.extra(t)}
+
+    def created_row(self, t: Task) -> Dict[str, Any]:
+        """发布方视角（/tasks/created-by-me）：附发起 Agent、订阅数与评论数。"""
+        invited = getattr(t, "invited_agent_ids", None)
+        return {
+            **self.base(t),
+            "creator_agent_id": getattr(t, "creator_agent_id", None),
+            "creator_agent_name": self._agent_name(getattr(t, "creator_agent_id", None)),
+            "subscription_count": self.subscription_counts.get(t.id, 0),
+            "comment_count": self.comment_counts.get(t.id, 0),
+            "invited_agent_ids": invited if invited else [],
+            **self.extra(t),
+        }
+
+    def accepted_rows(self) -> List[Dict[str, Any]]:
+        return [self.accepted_row(t) for t in self.tasks]
+
+    def created_rows(self) -> List[Dict[str, Any]]:
+        return [self.created_row(t) for t in self.tasks]
@@ -125,20 +125,28 @@ async def _lifespan(app: FastAPI):
         import logging
 
         logging.getLogger("uvicorn.error").warning("seed_onboarding_quest: %s", e)
-    community_stop = None
-    community_task = None
-    if os.getenv("CLAWJOB_COMMUNITY_BACKGROUND_JOBS", "1").strip() != "0":
-        from app.services.community_jobs import run_community_background_loop
-
-        community_stop = asyncio.Event()
-        community_task = asyncio.create_task(run_community_background_loop(community_stop))
+    scheduler_stop = None
+    scheduler_task = None
+    if os.getenv("CLAWJOB_SCHEDULER_ENABLED", "1").strip() != "0":
+        # 每个 worker 都启动调度循环，但仅持有 leader 租约的实例执行任务
+        from app.services.scheduler import run_scheduler_loop
+
+        scheduler_stop = asyncio.Event()
+        scheduler_task = asyncio.create_task(run_scheduler_loop(scheduler_stop))
+    worker_stop = None
+    worker_task = None
+    if os.getenv("CLAWJOB_TASK_WORKER_ENABLED", "1").strip() != "0":
+        # 每个 worker 都消费共享的 agent_tasks 队列（领取由队列保证互斥）
+        worker_stop = asyncio.Event()
+        worker_task = asyncio.create_task(task_system.run_worker(worker_stop))
     yield
-    if community_stop is not None and community_task is not None:
-        community_stop.set()
-        community_task.cancel()
+    for stop, task in ((worker_stop, worker_task), (scheduler_stop, scheduler_task)):
+        if stop is None or task is None:
+            continue
+        stop.set()
         try:
-            await community_task
-        except asyncio.CancelledError:
+            await asyncio.wait_for(task, timeout=10)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
             pass
 
 
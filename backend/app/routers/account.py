@@ -33,6 +33,7 @@ from app.services.payment_methods import (
     validate_amount,
 )
 from app.services import payout as _payout
+from app.services import credit_ledger as _ledger
 from app.services import insights as _insights
 from app.domain.skill_xp import (
     agent_skill_xp_map, apply_skill_decay, level_from_xp, skill_decay_meta,
@@ -394,32 +395,17 @@ def get_balance(
 def list_transactions(
     skip: int = 0,
     limit: int = 50,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user),
 ):
-    """信用点流水"""
+    """信用点流水（按时间倒序）。传 next_cursor 做 keyset 翻页；skip 仅为旧调用方保留。"""
     uid = int(current_user["user_id"])
-    rows = (
-        db.query(CreditTransaction)
-        .filter(CreditTransaction.user_id == uid)
-        .order_by(CreditTransaction.created_at.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
-    return {
-        "transactions": [
-            {
-                "id": r.id,
-                "amount": r.amount,
-                "type": r.type,
-                "ref_id": r.ref_id,
-                "remark": r.remark,
-                "created_at": r.created_at.isoformat() if r.created_at else None,
-            }
-            for r in rows
-        ]
-    }
+    try:
+        items, next_cursor = _ledger.list_ledger_page(db, uid, cursor=cursor, skip=skip, limit=limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="cursor 无效")
+    return {"transactions": items, "next_cursor": next_cursor}
 
 
 @router.post("/recharge")
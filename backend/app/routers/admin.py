@@ -22,6 +22,7 @@ from app.database.relational_db import (
     UserCommissionRecord,
 )
 from app.services.escrow_tasks import get_escrow, save_escrow_to_task, apply_escrow_milestone_confirm
+from app.services.task_claims import TaskClaimConflict
 from app.services.task_timeline import append_timeline_event
 from app.services import insights as _insights
 from app.services import kyc as _kyc
@@ -80,6 +81,17 @@ def admin_dispatch_community_hot(
     return {"ok": True, **res}
 
 
+@router.get("/jobs")
+def admin_jobs_status(
+    history_limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_db),
+):
+    """后台调度器状态：当前 leader 租约、各周期任务间隔与最近运行记录。需管理员权限。"""
+    from app.services.scheduler import get_jobs_status
+
+    return get_jobs_status(db, history_limit=history_limit)
+
+
 @router.get("/settlements/pending")
 def list_pending_settlements(
     skip: int = 0,
@@ -198,7 +210,11 @@ def admin_resolve_escrow_dispute(
         # NOTE: translated comment in English.
         task.status = "pending_verification"
         save_escrow_to_task(task, escrow)
-        info = apply_escrow_milestone_confirm(task, db, auto=False)
+        try:
+            info = apply_escrow_milestone_confirm(task, db, auto=False)
+        except TaskClaimConflict:
+            db.rollback()
+            raise HTTPException(status_code=409, detail="当前里程碑已被确认，请刷新后重试")
         note_snip = (body.note or "").strip()[:200]
         append_timeline_event(
             task,
@@ -742,6 +758,7 @@ def decide_withdrawal(
     db.commit()
     db.refresh(req)
     _invalidate_admin_overview_snapshot()
+    _payout.invalidate_payout_aggregates([req.user_id])
     return {
         "id": req.id,
         "status": req.status,
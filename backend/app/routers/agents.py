@@ -6,16 +6,16 @@ from datetime import datetime
 from typing import Any, Dict, List, Optional
 
 import httpx
-from fastapi import APIRouter, Body, Depends, HTTPException
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Response
 from fastapi.responses import JSONResponse
-from sqlalchemy import desc, func
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from sqlalchemy.orm.attributes import flag_modified
 
 from app.core.systems import runtime_guard, task_system
 from app.database.relational_db import (
-    Agent, AgentStats, CreditTransaction, ExecutionRun, ExecutionStep, PublishedAgentTemplate,
-    PublishedSkill, SystemLog, Task, TaskBid, TaskComment, TaskSubscription, User, get_db,
+    Agent, AgentStats, AgentTrustCardSnapshot, CreditTransaction, ExecutionRun, ExecutionStep,
+    PublishedAgentTemplate, PublishedSkill, SystemLog, Task, TaskBid, TaskComment, TaskSubscription, User, get_db,
 )
 from app.domain.agent_helpers import (
     RegisterAgentBody, SendMessageBody, ensure_agents_category_column,
@@ -31,11 +31,11 @@ from app.domain.task_helpers import (
 from app.domain.task_helpers import (
     CLAWJOB_SYSTEM_AGENT_NAME, CLAWJOB_SYSTEM_USERNAME, FRONTEND_URL,
     a2a_can_access_task, append_task_status_update_comment, award_bid_impl,
-    can_view_task_runs, compute_publish_fee, count_public_listing_tasks,
+    can_view_task_runs, compute_publish_fee,
     get_or_create_clawjob_system_agent,
-    intent_rate_check, maybe_auto_confirm, maybe_settle_skill_revenue, owner_display_name,
+    intent_rate_check, maybe_settle_skill_revenue, owner_display_name,
     pay_task_reward, push_task_to_discord, require_auction_task, serialize_auction_state,
-    task_extra, task_is_public_listing, task_is_visible_to, task_payment_breakdown,
+    task_is_public_listing, task_is_visible_to, task_payment_breakdown,
     task_verification_hours, validate_verification_submission,
 )
 from app.domain.task_models import (
@@ -43,6 +43,7 @@ from app.domain.task_models import (
     PaymentProfileBody, PlaceBidBody, PostCommentBody, PublishTaskBody, RejectCompletionBody,
     SubscribeTaskBody, SubmitCompletionBody, WorkflowPlanBody,
 )
+from app.domain.task_rows import TaskRowSerializer
 from app.security import get_current_user, get_current_user_optional
 from app.services import execution_sandbox as _sandbox, reverse_auction as _ra
 from app.services import safety_pipeline as _safety, step_replay as _replay
@@ -164,8 +165,10 @@ def register_agent(
         db.rollback()
     try:
         from app.services.platform_stats_cache import invalidate_platform_stats_cache
+        from app.services.public_profile import invalidate_public_profiles_for_agents
 
         invalidate_platform_stats_cache()
+        invalidate_public_profiles_for_agents(db, [agent.id])
     except Exception:
         pass
     return {
@@ -467,43 +470,32 @@ def list_agent_tasks(
         .order_by(Task.created_at.desc())
     )
     tasks = q.offset(skip).limit(limit).all()
-    out = []
-    for t in tasks:
-        maybe_auto_confirm(t, db)
-        db.refresh(t)
-        owner = db.query(User).filter(User.id == t.owner_id).first()
-        out.append({
-            "id": t.id,
-            "title": t.title,
-            "description": (t.description or "")[:200],
-            "status": t.status,
-            "priority": t.priority or "medium",
-            "owner_id": t.owner_id,
-            "publisher_name": owner.username if owner else "",
-            "reward_points": getattr(t, "reward_points", 0) or 0,
-            "submitted_at": iso_utc(getattr(t, "submitted_at", None)),
-            "verification_deadline_at": iso_utc(getattr(t, "verification_deadline_at", None)),
-            "created_at": iso_utc(t.created_at),
-            **task_extra(t, db),
-        })
+    out = TaskRowSerializer(db, tasks).accepted_rows()
     return {"tasks": out, "total": len(out), "agent_name": agent.name}
 
 
 @router.get("/agents/{agent_id}/trust-card")
 def get_agent_trust_card(
     agent_id: int,
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
     db: Session = Depends(get_db),
 ):
-    """Agent 信任卡（公开只读）：完成率、托管单、累计收益、认证 Skill、徽章等，供 Agent 与爬虫读取。"""
-    from app.services.trust_card import compute_agent_trust_card
+    """Agent 信任卡（公开只读）：完成率、托管单、累计收益、认证 Skill、徽章等，供 Agent 与爬虫读取。
 
-    card = compute_agent_trust_card(db, agent_id)
-    if card is None:
+    - 读取持久化快照；响应带 `ETag`（随快照 version 变化），`If-None-Match` 命中时返回 304。
+    """
+    from app.services.trust_card import get_agent_trust_card as _get_trust_card
+
+    got = _get_trust_card(db, agent_id)
+    if got is None:
         raise HTTPException(status_code=404, detail="Agent 不存在")
-    return JSONResponse(
-        content=card,
-        headers={"Cache-Control": "public, max-age=300"},
-    )
+    card, version = got
+    etag = f'W/"tc-{int(agent_id)}-{version}"'
+    headers = {"Cache-Control": "public, max-age=300, stale-while-revalidate=60", "ETag": etag}
+    inm = (if_none_match or "").strip()
+    if version and inm and (inm == "*" or etag in [x.strip() for x in inm.split(",")]):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=card, headers=headers)
 
 
 @router.get("/agents/{agent_id}/reputation")
@@ -532,45 +524,31 @@ def get_agent_reputation(
 def get_agent_case_studies(
     agent_id: int,
     limit: int = 8,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
 ):
     """Agent 公开案例库：返回最近完成的任务摘要，供公开主页 SEO 展示。
 
     - 公开访问；`Cache-Control: public, max-age=600`。
-    - 仅返回 `status=completed` 且非定向（`invitees_only` / 有 invited_agent_ids）任务。
+    - 仅含非定向（无 invited_agent_ids）的已完成任务；读 agent_cases 投影，按 `next_cursor` 翻页。
     """
-    agent = db.query(Agent).filter(Agent.id == int(agent_id)).first()
+    from app.services.agent_cases import list_agent_cases
+
+    agent = db.get(Agent, int(agent_id))
     if not agent:
         raise HTTPException(status_code=404, detail="Agent 不存在")
-    limit = max(1, min(int(limit or 8), 20))
-    q = (
-        db.query(Task)
-        .filter(Task.agent_id == agent_id)
-        .filter(Task.status == "completed")
-        .order_by(desc(Task.completed_at), desc(Task.updated_at))
-    )
-    rows = q.limit(limit).all()
-    cases = []
-    for t in rows:
-        invited = getattr(t, "invited_agent_ids", None) or []
-        if invited:
-            continue
-        owner = db.query(User).filter(User.id == t.owner_id).first()
-        out = t.output_data if isinstance(getattr(t, "output_data", None), dict) else {}
-        summary = (out.get("result_summary") or (t.description or "")).strip()
-        if len(summary) > 320:
-            summary = summary[:317] + "..."
-        cases.append({
-            "task_id": t.id,
-            "title": t.title,
-            "category": getattr(t, "category", None),
-            "reward_points": int(getattr(t, "reward_points", 0) or 0),
-            "publisher_name": owner.username if owner else "",
-            "completed_at": iso_utc(getattr(t, "completed_at", None)),
-            "summary": summary,
-        })
+    try:
+        cases, next_cursor = list_agent_cases(db, int(agent_id), cursor=cursor, limit=limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="cursor 无效")
     return JSONResponse(
-        content={"agent_id": agent_id, "agent_name": agent.name, "cases": cases, "total": len(cases)},
+        content={
+            "agent_id": agent_id,
+            "agent_name": agent.name,
+            "cases": cases,
+            "total": len(cases),
+            "next_cursor": next_cursor,
+        },
         headers={"Cache-Control": "public, max-age=600"},
     )
 
@@ -578,79 +556,28 @@ def get_agent_case_studies(
 @router.get("/u/{username}")
 def get_public_user_profile(
     username: str,
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
     db: Session = Depends(get_db),
 ):
     """公开用户主页：按 username 返回 owner + 其公开 Agents + 信誉摘要。
 
     主要用于 `/@:username` 页面的 SEO 流量入口。不包含邮箱、credits、佣金等敏感信息。
+    整页按 username 缓存（任务完成时失效，见 app.services.public_profile）；响应带 `ETag`，
+    `If-None-Match` 命中时返回 304。
     """
+    from app.services.public_profile import get_public_profile
+
     uname = (username or "").strip().lstrip("@")
     if not uname:
         raise HTTPException(status_code=404, detail="用户不存在")
-    user = db.query(User).filter(User.username == uname).first()
-    if not user or not getattr(user, "is_active", True):
+    entry = get_public_profile(db, uname)
+    if entry is None:
         raise HTTPException(status_code=404, detail="用户不存在")
-    from app.services.reputation import compute_agent_reputation
-
-    agents = (
-        db.query(Agent)
-        .filter(Agent.owner_id == user.id, Agent.is_active == True)  # noqa: E712
-        .order_by(Agent.created_at.asc())
-        .limit(20)
-        .all()
-    )
-    agent_cards = []
-    total_completed = 0
-    total_earned = 0
-    best_score = 0
-    from app.services.trust_card import compute_agent_trust_card
-
-    api_base = os.getenv("CLAWJOB_API_URL", "https://api.clawjob.com.cn").rstrip("/")
-    for a in agents:
-        card = compute_agent_reputation(db, a.id) or {}
-        trust = compute_agent_trust_card(db, a.id) or {}
-        score = int(card.get("reputation_score", 0) or 0)
-        stats = card.get("stats") or {}
-        completed = int(stats.get("completed_task_count", 0) or 0)
-        earned = int(stats.get("reward_points_total", 0) or 0)
-        total_completed += completed
-        total_earned += earned
-        best_score = max(best_score, score)
-        agent_cards.append({
-            "agent_id": a.id,
-            "id": a.id,
-            "name": a.name,
-            "description": (a.description or "")[:400],
-            "agent_type": a.agent_type,
-            "category": getattr(a, "category", None),
-            "capabilities": a.capabilities if isinstance(a.capabilities, list) else [],
-            "reputation_score": score,
-            "tasks_completed": completed,
-            "completed_tasks": completed,
-            "top_skills": stats.get("top_skills") or [],
-            "trust_card_url": f"{api_base}/agents/{a.id}/trust-card",
-            "trust_one_liner_zh": trust.get("one_liner_zh"),
-            "badges": trust.get("badges") or [],
-        })
-    rep_avg = round(best_score, 1) if agent_cards else None
-    return JSONResponse(
-        content={
-            "username": user.username,
-            "user_id": user.id,
-            "joined_at": iso_utc(user.created_at),
-            "agents": agent_cards,
-            "summary": {
-                "agents_count": len(agent_cards),
-                "tasks_completed": total_completed,
-                "total_completed_tasks": total_completed,
-                "total_rewards_earned": total_earned,
-                "total_earned_points": total_earned,
-                "reputation_avg": rep_avg,
-                "best_reputation_score": best_score,
-            },
-        },
-        headers={"Cache-Control": "public, max-age=300"},
-    )
+    headers = {"Cache-Control": "public, max-age=300, stale-while-revalidate=60", "ETag": entry["etag"]}
+    inm = (if_none_match or "").strip()
+    if inm and (inm == "*" or entry["etag"] in [x.strip() for x in inm.split(",")]):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=entry["body"], headers=headers)
 
 
 @router.get("/agents/{agent_id}/earnings-summary")
@@ -659,7 +586,11 @@ def get_agent_earnings_summary(
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user),
 ):
-    """Agent 收益摘要：完成单、已赚点数、待验收、账户余额与平台开放任务数（仅拥有者可读）。"""
+    """Agent 收益摘要：完成单、已赚点数、待验收、账户余额与平台开放任务数（仅拥有者可读）。
+
+    完成单 / 已赚点数来自 agent_earnings 快照（主键读，见 app.services.agent_earnings），
+    只有在途任务数按状态分组现查；信誉分取信任卡快照，尚无快照时现算（带缓存）。
+    """
     uid = int(current_user["user_id"])
     agent = db.query(Agent).filter(Agent.id == int(agent_id)).first()
     if not agent:
@@ -667,45 +598,41 @@ def get_agent_earnings_summary(
     if int(agent.owner_id) != uid:
         raise HTTPException(status_code=403, detail="仅 Agent 拥有者可查看收益摘要")
 
-    completed_q = db.query(Task).filter(Task.agent_id == agent.id, Task.status == "completed")
-    tasks_completed = completed_q.count()
-    points_earned = (
-        db.query(func.coalesce(func.sum(Task.reward_points), 0))
-        .filter(Task.agent_id == agent.id, Task.status == "completed")
-        .scalar()
-        or 0
-    )
-    pending_verification = (
-        db.query(Task)
-        .filter(Task.agent_id == agent.id, Task.status == "pending_verification")
-        .count()
-    )
-    in_progress = (
-        db.query(Task).filter(Task.agent_id == agent.id, Task.status == "in_progress").count()
-    )
-    need_submit = (
-        db.query(Task)
-        .filter(Task.agent_id == agent.id, Task.status.in_(("open", "in_progress")))
-        .count()
+    from app.services import agent_earnings as _earnings
+    from app.services.platform_stats_cache import get_cached_public_stats_bundle
+
+    earnings = _earnings.get_agent_earnings(db, agent)
+    inflight = dict(
+        db.query(Task.status, func.count(Task.id))
+        .filter(Task.agent_id == agent.id, Task.status.in_(("open", "in_progress", "pending_verification")))
+        .group_by(Task.status)
+        .all()
     )
-    user = db.query(User).filter(User.id == uid).first()
+    pending_verification = int(inflight.get("pending_verification", 0) or 0)
+    in_progress = int(inflight.get("in_progress", 0) or 0)
+    need_submit = in_progress + int(inflight.get("open", 0) or 0)
+    user = db.get(User, uid)
     credits = int(getattr(user, "credits", 0) or 0) if user else 0
     commission = int(getattr(user, "commission_balance", 0) or 0) if user else 0
     withdrawable = credits + commission
     payout = _payout.compute_payout_eligibility(db, user) if user else None
-    tasks_open_platform = count_public_listing_tasks(db, status="open")
-
-    from app.services.reputation import compute_agent_reputation
+    tasks_open_platform = get_cached_public_stats_bundle(db).get("tasks_open", 0)
+    snapshot = db.get(AgentTrustCardSnapshot, agent.id)
+    if snapshot is not None and isinstance(snapshot.card, dict) and "reputation_score" in snapshot.card:
+        rep_score = snapshot.card.get("reputation_score")
+    else:
+        from app.services.reputation import compute_agent_reputation
 
-    rep = compute_agent_reputation(db, agent.id) or {}
+        rep_score = (compute_agent_reputation(db, agent.id) or {}).get("reputation_score", 0)
     api_base = os.getenv("CLAWJOB_API_URL", "https://api.clawjob.com.cn").rstrip("/")
     app_base = os.getenv("CLAWJOB_APP_URL", "https://app.clawjob.com.cn").rstrip("/")
 
     return {
         "agent_id": agent.id,
         "agent_name": agent.name,
-        "tasks_completed": int(tasks_completed),
-        "reward_points_earned": int(points_earned),
+        "tasks_completed": int(earnings.tasks_completed or 0),
+        "reward_points_earned": int(earnings.points_earned or 0),
+        "credited_points": int(earnings.credited_points or 0),
         "pending_verification": int(pending_verification),
         "in_progress": int(in_progress),
         "need_submit": int(need_submit),
@@ -713,7 +640,7 @@ def get_agent_earnings_summary(
         "commission_balance": commission,
         "withdrawable_balance": withdrawable,
         "payout": payout,
-        "reputation_score": int(rep.get("score", 0) or 0),
+        "reputation_score": int(rep_score or 0),
         "platform_tasks_open": int(tasks_open_platform),
         "money_path_hint_zh": "接取开放任务 → 提交完成 → 发布方验收 → Agent 间直接打款（settlement_mode=agent_direct）或平台 credits 入账 → 配置收款方式",
         "money_path_hint_en": "Subscribe → submit → confirm → agent_direct settlement (direct between agents) or platform credits → configure payment profile.",
@@ -4,31 +4,31 @@ ClawJob - 注册与登录（含 Google OAuth、邮箱验证码注册）
 import logging
 import os
 import secrets
-import smtplib
-from email.mime.text import MIMEText
-from email.utils import formataddr
 from urllib.parse import urlencode, quote
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
 import httpx
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import RedirectResponse
 from typing import List, Optional
 
 from pydantic import BaseModel, ConfigDict, Field
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app.database.relational_db import (
     User, VerificationCode, Agent, Task, TaskSubscription, SystemLog,
-    CreditTransaction, InternalMessage, get_db,
+    CreditTransaction, SessionLocal, get_db,
 )
-from app.security import get_password_hash, create_access_token, verify_password, limiter
+from app.security import create_access_token, limiter
+from app.services import mailer as _mailer
+from app.services import password_hashing as _pwhash
 from app.services import referrals as _rf
+from app.services import register_followups as _followups
 from app.services import community as _community
-from app.services.onboarding_quest import onboarding_tasks_for_register
-from app.services.agent_discovery import highest_reward_open_task
 
 router = APIRouter(prefix="/auth", tags=["Auth · 认证"])
 
@@ -163,91 +163,11 @@ def _missing_skill_sections(description: str) -> List[str]:
     return [s for s in _SKILL_REQUIRED_SECTIONS if s.lower() not in lowered]
 
 
-def _send_first_subscribe_nudge(db: Session, user: User, agent: Agent) -> None:
-    """注册后若 Agent 尚无任务订阅，站内信推送最高奖励开放任务深链（Growth v5）。"""
-    try:
-        sub_count = (
-            db.query(TaskSubscription)
-            .filter(TaskSubscription.agent_id == agent.id)
-            .count()
-        )
-        if sub_count > 0:
-            return
-        top = highest_reward_open_task(db)
-        if not top:
-            return
-        _, _ = _get_or_create_clawjob_system_agent(db)
-        sys_user = db.query(User).filter(User.username == CLAWJOB_SYSTEM_USERNAME).first()
-        if not sys_user:
-            return
-        app_base = os.getenv("CLAWJOB_APP_URL", "https://app.clawjob.com.cn").rstrip("/")
-        api_base = os.getenv("CLAWJOB_API_URL", "https://api.clawjob.com.cn").rstrip("/")
-        task_url = f"{app_base}/#/tasks?taskId={top.id}"
-        reward = int(getattr(top, "reward_points", 0) or 0)
-        body = (
-            f"你好 {agent.name}，你还没有接取任何任务。\n\n"
-            f"推荐从当前最高奖励开放任务开始：\n"
-            f"「{top.title}」— {reward} 点\n"
-            f"任务大厅：{task_url}\n\n"
-            f"接取：POST {api_base}/tasks/{top.id}/subscribe\n"
-            f'Body: {{"agent_id": {agent.id}}}'
-        )
-        db.add(
-            InternalMessage(
-                sender_user_id=int(sys_user.id),
-                recipient_user_id=int(user.id),
-                title="接取你的第一个任务",
-                content=body[:8000],
-                related_task_id=int(top.id),
-            )
-        )
-    except Exception:
-        pass
-
-
-def _send_register_welcome_inbox(db: Session, user: User, agent: Agent, next_steps: dict) -> None:
-    """最低摩擦注册后：系统站内信欢迎 + 深链（复用 community 系统 Agent 模式）。"""
-    try:
-        _, _ = _get_or_create_clawjob_system_agent(db)
-        sys_user = db.query(User).filter(User.username == CLAWJOB_SYSTEM_USERNAME).first()
-        if not sys_user:
-            return
-        tasks_url = next_steps.get("tasks_hall_url") or ""
-        community_url = next_steps.get("community_url") or ""
-        quest_ids = next_steps.get("onboarding_task_ids") or []
-        quest_line = (
-            f"4. 新手 Quest 任务 ID：{', '.join(str(i) for i in quest_ids)}\n"
-            if quest_ids
-            else ""
-        )
-        body = (
-            f"欢迎加入 ClawJob，{agent.name}！\n\n"
-            f"你的 Agent ID：{agent.id}，注册赠点已到账。\n\n"
-            f"下一步：\n"
-            f"1. 浏览开放任务：{tasks_url}\n"
-            f"2. 进入社区交流：{community_url}\n"
-            f"3. 阅读 Skill 文档：{next_steps.get('skill_doc_url', '')}\n"
-            f"{quest_line}\n"
-            "接取任务：GET /tasks 后 POST /tasks/{{task_id}}/subscribe，Body 含 agent_id。"
-        )
-        db.add(
-            InternalMessage(
-                sender_user_id=int(sys_user.id),
-                recipient_user_id=int(user.id),
-                title="欢迎加入 ClawJob",
-                content=body[:8000],
-                related_task_id=None,
-            )
-        )
-    except Exception:
-        pass
-
-
 def _resolve_agent_display_name(db: Session, raw_name: str) -> str:
     """Agent 展示名允许重复；若全局重名则追加短后缀以保证可读区分。"""
     base = (raw_name or "").strip() or "SkillAgent"
     base = base[:255]
-    if not db.query(Agent).filter(Agent.name == base).first():
+    if db.query(Agent.id).filter(Agent.name == base).limit(1).first() is None:
         return base
     suffix = secrets.token_hex(3)
     trimmed = base[:248] if len(base) > 248 else base
@@ -271,31 +191,6 @@ def _skill_register_validation_error(reason: str, *, missing_sections: Optional[
     return HTTPException(status_code=400, detail=detail)
 
 
-def _register_minimal_next_steps(db: Session, agent_id: int) -> dict:
-    """注册成功后给 Agent 的下一步指引（Growth v2/v4）。"""
-    app_base = os.getenv("CLAWJOB_APP_URL", "https://app.clawjob.com.cn").rstrip("/")
-    api_base = os.getenv("CLAWJOB_API_URL", "https://api.clawjob.com.cn").rstrip("/")
-    steps = {
-        "browse_tasks_url": f"{api_base}/tasks?status_filter=open&limit=20&sort=created_at_desc",
-        "tasks_hall_url": f"{app_base}/#/tasks",
-        "community_url": f"{app_base}/#/community",
-        "join_url": f"{app_base}/#/join",
-        "playbook_url": f"{app_base}/#/playbook",
-        "skill_doc_url": f"{app_base}/skill.md",
-        "earnings_summary_url": f"{api_base}/agents/{agent_id}/earnings-summary",
-        "skill_packs_url": f"{api_base}/skills/packs",
-        "agent_manifest_url": f"{api_base}/.well-known/clawjob-agent.json",
-        "suggested_subscribe": {
-            "method": "POST",
-            "path": "/tasks/{task_id}/subscribe",
-            "body": {"agent_id": agent_id},
-            "hint": "Browse GET /tasks, pick an open task, then subscribe with your agent_id.",
-        },
-    }
-    steps.update(onboarding_tasks_for_register(db, agent_id))
-    return steps
-
-
 def _register_response_message(*, referral_bound: bool) -> Optional[str]:
     if not referral_bound:
         return None
@@ -315,6 +210,25 @@ def _bind_referral_safe(db: Session, user: User, raw_code: Optional[str]) -> boo
         return False
 
 
+def _insert_unique_random_user(db: Session, prefix: str, *, credits: int = 0, attempts: int = 5) -> Optional[User]:
+    """插入 ``{prefix}_<随机短 ID>`` 用户；依赖 username / email 唯一约束，冲突时只回滚到保存点重试，不做预查询。"""
+    for _ in range(attempts):
+        short_id = secrets.token_hex(6)
+        user = User(
+            username=f"{prefix}_{short_id}",
+            email=f"{prefix}_{short_id}@clawjob.local",
+            hashed_password="",
+            credits=credits,
+        )
+        try:
+            with db.begin_nested():
+                db.add(user)
+        except IntegrityError:
+            continue
+        return user
+    return None
+
+
 def _create_skill_user_agent_handshake(
     db: Session,
     *,
@@ -323,74 +237,64 @@ def _create_skill_user_agent_handshake(
     agent_type: str,
     referral_code: Optional[str] = None,
 ) -> tuple:
-    """创建 Skill 用户、Agent、注册赠点与已完成握手任务。调用方负责 commit。"""
-    display_name = _resolve_agent_display_name(db, agent_name)
-    for _ in range(10):
-        short_id = secrets.token_hex(6)
-        username = f"skill_{short_id}"
-        email = f"skill_{short_id}@clawjob.local"
-        if db.query(User).filter(User.username == username).first():
-            continue
-        if db.query(User).filter(User.email == email).first():
-            continue
-        user = User(
-            username=username,
-            email=email,
-            hashed_password="",
-            credits=SKILL_REGISTER_BONUS_CREDITS,
-        )
-        db.add(user)
-        db.flush()
-        agent = Agent(
-            name=display_name[:255],
-            description=(description or "")[:2000] or "",
-            agent_type=(agent_type or "general")[:64],
-            owner_id=user.id,
-            capabilities=[],
-            config={},
-        )
-        db.add(agent)
-        db.flush()
-        from app.domain.agent_public import sync_agent_is_public
+    """创建 Skill 用户、Agent、注册赠点与已完成握手任务。调用方负责 commit。
 
-        sync_agent_is_public(db, agent, user)
-        db.add(CreditTransaction(
-            user_id=user.id,
-            amount=SKILL_REGISTER_BONUS_CREDITS,
-            type="signup_bonus",
-            ref_id=None,
-            remark=f"通过 ClawJob Skill 注册赠送 {SKILL_REGISTER_BONUS_CREDITS} 点",
-        ))
-        referral_bound = _bind_referral_safe(db, user, referral_code)
-        _, system_agent = _get_or_create_clawjob_system_agent(db)
-        handshake_task = Task(
-            title="ClawJob registration handshake (auto-confirm)",
-            description="新加载 agent 的握手任务，已由平台引导 Agent 自动完成。",
-            status="completed",
-            task_type="general",
-            priority="low",
-            owner_id=user.id,
-            creator_agent_id=agent.id,
-            agent_id=system_agent.id,
-            reward_points=0,
-            category="other",
-            input_data={
-                "skills": ["clawjob", "openclaw"],
-                "source": "register_via_skill",
-                "hidden_from_public": True,
-            },
-            output_data={
-                "result_summary": "首个握手任务由 ClawJob 引导 Agent 自动完成，Skill 已可用。",
-                "auto_completed_by": CLAWJOB_SYSTEM_AGENT_NAME,
-            },
-            submitted_at=datetime.utcnow(),
-            completed_at=datetime.utcnow(),
-        )
-        db.add(handshake_task)
-        db.flush()
-        db.add(TaskSubscription(task_id=handshake_task.id, agent_id=system_agent.id))
-        return user, agent, handshake_task, referral_bound
-    raise HTTPException(status_code=500, detail="生成唯一用户失败，请重试")
+    用户名 / 邮箱由随机短 ID 生成，依赖唯一约束兜底：冲突时回滚整个会话后换 ID 重试，
+    因此调用方在此之前不得有未提交的写入。
+    """
+    display_name = _resolve_agent_display_name(db, agent_name)
+    user = _insert_unique_random_user(db, "skill", credits=SKILL_REGISTER_BONUS_CREDITS)
+    if user is None:
+        raise HTTPException(status_code=500, detail="生成唯一用户失败，请重试")
+    agent = Agent(
+        name=display_name[:255],
+        description=(description or "")[:2000] or "",
+        agent_type=(agent_type or "general")[:64],
+        owner_id=user.id,
+        capabilities=[],
+        config={},
+    )
+    db.add(agent)
+    db.flush()
+    from app.domain.agent_public import sync_agent_is_public
+
+    sync_agent_is_public(db, agent, user)
+    db.add(CreditTransaction(
+        user_id=user.id,
+        amount=SKILL_REGISTER_BONUS_CREDITS,
+        type="signup_bonus",
+        ref_id=None,
+        remark=f"通过 ClawJob Skill 注册赠送 {SKILL_REGISTER_BONUS_CREDITS} 点",
+    ))
+    referral_bound = _bind_referral_safe(db, user, referral_code)
+    _, system_agent = _get_or_create_clawjob_system_agent(db)
+    handshake_task = Task(
+        title="ClawJob registration handshake (auto-confirm)",
+        description="新加载 agent 的握手任务，已由平台引导 Agent 自动完成。",
+        status="completed",
+        task_type="general",
+        priority="low",
+        owner_id=user.id,
+        creator_agent_id=agent.id,
+        agent_id=system_agent.id,
+        reward_points=0,
+        category="other",
+        input_data={
+            "skills": ["clawjob", "openclaw"],
+            "source": "register_via_skill",
+            "hidden_from_public": True,
+        },
+        output_data={
+            "result_summary": "首个握手任务由 ClawJob 引导 Agent 自动完成，Skill 已可用。",
+            "auto_completed_by": CLAWJOB_SYSTEM_AGENT_NAME,
+        },
+        submitted_at=datetime.utcnow(),
+        completed_at=datetime.utcnow(),
+    )
+    db.add(handshake_task)
+    db.flush()
+    db.add(TaskSubscription(task_id=handshake_task.id, agent_id=system_agent.id))
+    return user, agent, handshake_task, referral_bound
 
 
 def _get_or_create_clawjob_system_agent(db: Session):
@@ -427,82 +331,67 @@ def _get_or_create_clawjob_system_agent(db: Session):
     return user, agent
 
 
-def _send_verification_email(email: str, code: str) -> str:
-    """发送验证码邮件。返回 'ok' | 'not_configured' | 'failed'。"""
-    host = os.getenv("SMTP_HOST", "").strip()
-    port = int(os.getenv("SMTP_PORT", "0") or "0")
-    user_smtp = os.getenv("SMTP_USER", "").strip()
-    password = os.getenv("SMTP_PASSWORD", "").strip()
-    from_addr = os.getenv("SMTP_FROM", user_smtp or "noreply@clawjob.com").strip()
-    if not host or not port or not user_smtp or not password:
-        logger.warning("SMTP not configured: SMTP_HOST/SMTP_PORT/SMTP_USER/SMTP_PASSWORD required for verification emails")
-        return "not_configured"
-    subject = os.getenv("EMAIL_VERIFICATION_SUBJECT", "ClawJob 注册验证码")
-    body = f"您的验证码是：{code}，5 分钟内有效。如非本人操作请忽略。"
-    msg = MIMEText(body, "plain", "utf-8")
-    msg["Subject"] = subject
-    msg["From"] = formataddr(("ClawJob", from_addr))
-    msg["To"] = email
-    try:
-        if port == 465:
-            with smtplib.SMTP_SSL(host, port, timeout=10) as s:
-                s.login(user_smtp, password)
-                s.sendmail(from_addr, [email], msg.as_string())
-        else:
-            with smtplib.SMTP(host, port, timeout=10) as s:
-                s.starttls()
-                s.login(user_smtp, password)
-                s.sendmail(from_addr, [email], msg.as_string())
-        logger.info("Verification email sent to %s", email)
-        return "ok"
-    except Exception as e:
-        logger.exception("Failed to send verification email to %s: %s", email, e)
-        return "failed"
-
-
 @router.post("/send-verification-code")
-def send_verification_code(body: SendVerificationCodeBody, db: Session = Depends(get_db)):
-    """向邮箱发送注册验证码（6 位数字），5 分钟内有效。未配置 SMTP 时使用开发用固定码。"""
+def send_verification_code(
+    body: SendVerificationCodeBody,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+):
+    """向邮箱发送注册验证码（6 位数字），5 分钟内有效。未配置 SMTP 时使用开发用固定码。
+
+    邮件与验证码在同一事务中入队，响应后由邮件子系统投递（见 app.services.mailer），
+    接口耗时与 SMTP 延迟无关；同一地址在 CLAWJOB_MAIL_MIN_INTERVAL_SEC 内重复请求返回 429。
+    """
     email = (body.email or "").strip().lower()
     if not email or "@" not in email:
         raise HTTPException(status_code=400, detail="请输入有效邮箱")
-    if db.query(User).filter(User.email == email).first():
+    if db.query(User.id).filter(User.email == email).first():
         raise HTTPException(status_code=400, detail="该邮箱已注册，请直接登录")
     dev_code = os.getenv("VERIFICATION_CODE_DEV", "").strip()
     if dev_code:
         code = dev_code
     else:
         code = "".join(secrets.choice("0123456789") for _ in range(6))
+    send_mail = not dev_code and _mailer.mail_configured()
+    if send_mail:
+        wait = _mailer.throttle_acquire(email)
+        if wait:
+            raise HTTPException(
+                status_code=429,
+                detail=f"验证码发送过于频繁，请 {wait} 秒后重试",
+                headers={"Retry-After": str(wait)},
+            )
     expires_at = datetime.utcnow() + timedelta(minutes=5)
-    # NOTE: translated comment in English.
-    db.query(VerificationCode).filter(VerificationCode.email == email).delete()
-    db.add(VerificationCode(email=email, code=code, expires_at=expires_at))
-    db.commit()
+    try:
+        # NOTE: translated comment in English.
+        db.query(VerificationCode).filter(VerificationCode.email == email).delete()
+        db.add(VerificationCode(email=email, code=code, expires_at=expires_at))
+        if send_mail:
+            _mailer.queue_mail(db, email, kind="verification_code", **_mailer.verification_mail(code))
+        db.commit()
+    except Exception:
+        # 验证码与邮件都没落库：归还限流名额，用户可立即重试
+        db.rollback()
+        if send_mail:
+            _mailer.throttle_release(email)
+        raise
     if dev_code:
         return {"message": "验证码已生成（开发环境），请使用配置的固定验证码", "email_sent": False}
-    send_result = _send_verification_email(email, code)
-    if send_result == "failed":
-        raise HTTPException(
-            status_code=503,
-            detail="邮件发送失败，请检查邮箱地址或稍后重试；若持续失败请联系管理员检查 SMTP 配置。",
-        )
-    if send_result == "not_configured":
+    if not send_mail:
+        logger.warning("SMTP not configured: SMTP_HOST/SMTP_PORT/SMTP_USER/SMTP_PASSWORD required for verification emails")
         return {
             "message": "验证码已生成，但当前未配置邮件服务，无法发送到邮箱。请联系管理员配置 SMTP，或使用开发环境验证码。",
             "email_sent": False,
         }
+    background_tasks.add_task(_mailer.deliver_pending_mail)
     return {"message": "验证码已发送，请查收邮件", "email_sent": True}
 
 
-@router.post("/register")
-def register(body: RegisterBody, db: Session = Depends(get_db)):
-    """用户注册（需先获取邮箱验证码）"""
-    # NOTE: translated comment in English.
-    env = os.getenv("ENV", "").strip().lower()
-    signup_bonus = int(os.getenv("SIGNUP_BONUS_CREDITS", "0") or 0)
-    if signup_bonus <= 0 and env == "production":
-        signup_bonus = 500
+def _password_hash_busy() -> HTTPException:
+    return HTTPException(status_code=503, detail="登录请求过多，请稍后重试", headers={"Retry-After": "1"})
+
 
+def _register_precheck(db: Session, body: RegisterBody) -> VerificationCode:
     email = (body.email or "").strip().lower()
     code = (body.verification_code or "").strip()
     if not email or "@" not in email:
@@ -523,10 +412,21 @@ def register(body: RegisterBody, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="用户名已存在")
     if db.query(User).filter(User.email == email).first():
         raise HTTPException(status_code=400, detail="邮箱已存在")
+    return row
+
+
+def _register_create(db: Session, body: RegisterBody, row: VerificationCode, hashed_password: str) -> dict:
+    # NOTE: translated comment in English.
+    env = os.getenv("ENV", "").strip().lower()
+    signup_bonus = int(os.getenv("SIGNUP_BONUS_CREDITS", "0") or 0)
+    if signup_bonus <= 0 and env == "production":
+        signup_bonus = 500
+
+    email = (body.email or "").strip().lower()
     user = User(
         username=body.username.strip(),
         email=email,
-        hashed_password=get_password_hash(body.password),
+        hashed_password=hashed_password,
         credits=signup_bonus,
     )
     db.add(user)
@@ -573,39 +473,98 @@ def register(body: RegisterBody, db: Session = Depends(get_db)):
     }
 
 
-@router.post("/login")
-def login(body: LoginBody, db: Session = Depends(get_db)):
-    """用户登录"""
-    user = db.query(User).filter(User.username == body.username).first()
-    if not user:
-        raise HTTPException(status_code=401, detail="用户名或密码错误")
-    if not user.hashed_password:
-        raise HTTPException(status_code=401, detail="该账号仅支持 Google 登录")
-    if not verify_password(body.password, user.hashed_password):
-        raise HTTPException(status_code=401, detail="用户名或密码错误")
-    token = create_access_token(
-        data={"sub": str(user.id), "type": "user"},
-        expires_delta=timedelta(days=7),
-    )
+@router.post("/register")
+async def register(body: RegisterBody, db: Session = Depends(get_db)):
+    """用户注册（需先获取邮箱验证码）。
+
+    数据库读写在共享线程池中执行，bcrypt 在专用哈希执行器中执行（见 app.services.password_hashing）；
+    在途请求超过上限时返回 503。
+    """
+    try:
+        with _pwhash.admission():
+            row = await run_in_threadpool(_register_precheck, db, body)
+            hashed = await _pwhash.hash_password(body.password)
+    except _pwhash.PasswordHashOverloaded:
+        raise _password_hash_busy()
+    return await run_in_threadpool(_register_create, db, body, row, hashed)
+
+
+def _load_login_user(username: str) -> Optional[tuple]:
+    """锁定检查 + 取 (id, username, hashed_password)；账号锁定时返回 "locked"。"""
+    if _pwhash.login_locked(username):
+        return "locked"
+    db = SessionLocal()
+    try:
+        return (
+            db.query(User.id, User.username, User.hashed_password)
+            .filter(User.username == username)
+            .first()
+        )
+    finally:
+        db.close()
+
+
+def _record_login(user_id: int, username: str, old_hash: str, new_hash: Optional[str]) -> None:
+    _pwhash.reset_login_failures(username)
+    db = SessionLocal()
     try:
+        if new_hash:
+            # 仅当哈希未被并发修改（如改密）时才写回升级后的哈希
+            db.query(User).filter(User.id == user_id, User.hashed_password == old_hash).update(
+                {"hashed_password": new_hash}, synchronize_session=False
+            )
         db.add(SystemLog(
             level="info",
             category="auth",
             message="user_login",
-            user_id=user.id,
-            extra={"username": user.username},
+            user_id=user_id,
+            extra={"username": username, **({"rehashed": True} if new_hash else {})},
         ))
         db.commit()
     except Exception:
         db.rollback()
-    return {"access_token": token, "token_type": "bearer", "user_id": user.id, "username": user.username}
+    finally:
+        db.close()
+
+
+@router.post("/login")
+async def login(body: LoginBody):
+    """用户登录。
+
+    连续失败达到上限的账号在锁定期内直接拒绝、不做 bcrypt；密码校验在专用哈希执行器中执行，
+    成本因子变更后登录成功会透明重新哈希。
+    """
+    try:
+        with _pwhash.admission():
+            user = await run_in_threadpool(_load_login_user, body.username)
+            if user == "locked":
+                raise HTTPException(status_code=429, detail="登录失败次数过多，请稍后再试")
+            if not user:
+                await run_in_threadpool(_pwhash.record_login_failure, body.username)
+                raise HTTPException(status_code=401, detail="用户名或密码错误")
+            user_id, username, hashed = user
+            if not hashed:
+                raise HTTPException(status_code=401, detail="该账号仅支持 Google 登录")
+            ok, new_hash = await _pwhash.verify_password(body.password, hashed)
+    except _pwhash.PasswordHashOverloaded:
+        raise _password_hash_busy()
+    if not ok:
+        await run_in_threadpool(_pwhash.record_login_failure, body.username)
+        raise HTTPException(status_code=401, detail="用户名或密码错误")
+    token = create_access_token(
+        data={"sub": str(user_id), "type": "user"},
+        expires_delta=timedelta(days=7),
+    )
+    await run_in_threadpool(_record_login, user_id, username, hashed, new_hash)
+    return {"access_token": token, "token_type": "bearer", "user_id": user_id, "username": username}
 
 
 @router.post("/register-via-skill")
-def register_via_skill(body: RegisterViaSkillBody, db: Session = Depends(get_db)):
+def register_via_skill(body: RegisterViaSkillBody, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     """
     Agent 通过 Skill 注册：创建用户与 Agent；平台自动完成握手任务；
     第二条开放任务由 OpenClaw 生成内容（请求体 second_task），平台在同一请求内自动发布。
+    全部写入（含审计日志与后续站内信的出队记录）在同一事务中提交；站内信在响应后发送。
     """
     st = body.second_task
     st_title = (st.title or "").strip()[:512]
@@ -706,42 +665,29 @@ def register_via_skill(body: RegisterViaSkillBody, db: Session = Depends(get_db)
             )
         )
 
-    db.commit()
-    db.refresh(user)
-    db.refresh(agent)
-    db.refresh(second_task)
-    try:
-        db.add(
-            SystemLog(
-                level="info",
-                category="auth",
-                message="user_registered_via_skill",
-                user_id=user.id,
-                extra={
-                    "username": user.username,
-                    "agent_id": agent.id,
-                    "agent_name": agent.name,
-                    "signup_bonus_credits": SKILL_REGISTER_BONUS_CREDITS,
-                    "auto_task_reward_allocated": reward_points,
-                    "auto_task_ids": [handshake_task.id, second_task.id],
-                    "referral_bound": referral_bound,
-                },
-            )
+    db.add(
+        SystemLog(
+            level="info",
+            category="auth",
+            message="user_registered_via_skill",
+            user_id=user.id,
+            extra={
+                "username": user.username,
+                "agent_id": agent.id,
+                "agent_name": agent.name,
+                "signup_bonus_credits": SKILL_REGISTER_BONUS_CREDITS,
+                "auto_task_reward_allocated": reward_points,
+                "auto_task_ids": [handshake_task.id, second_task.id],
+                "referral_bound": referral_bound,
+            },
         )
-        db.commit()
-    except Exception:
-        db.rollback()
+    )
+    followup_job_id = _followups.enqueue_register_followups(db, user.id, agent.id)
+    next_steps = _followups.register_next_steps(agent.id)
     token = create_access_token(
         data={"sub": str(user.id), "type": "user"},
         expires_delta=timedelta(days=365),
     )
-    next_steps = _register_minimal_next_steps(db, agent.id)
-    try:
-        _send_register_welcome_inbox(db, user, agent, next_steps)
-        _send_first_subscribe_nudge(db, user, agent)
-        db.commit()
-    except Exception:
-        db.rollback()
     reg_msg = _register_response_message(referral_bound=referral_bound)
     payload = {
         "access_token": token,
@@ -769,15 +715,24 @@ def register_via_skill(body: RegisterViaSkillBody, db: Session = Depends(get_db)
     }
     if reg_msg:
         payload["message"] = reg_msg
+    # 响应内容在提交前组装完毕，提交后无需再 refresh 各对象
+    db.commit()
+    background_tasks.add_task(_followups.run_register_followup, followup_job_id)
     return payload
 
 
 @router.post("/register-agent-minimal")
 @limiter.limit("30/minute")
-def register_agent_minimal(request: Request, body: RegisterAgentMinimalBody, db: Session = Depends(get_db)):
+def register_agent_minimal(
+    request: Request,
+    body: RegisterAgentMinimalBody,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+):
     """
     最低摩擦 Agent 注册：创建用户与 Agent，自动完成握手，无 second_task。
     适合 guest-token 发布后仅需接取任务、或快速 onboarding 的场景。
+    单事务提交；欢迎站内信与首次接单提醒由延迟任务在响应后发送。
     """
     _ = request
     name = (body.agent_name or "").strip()
@@ -797,31 +752,23 @@ def register_agent_minimal(request: Request, body: RegisterAgentMinimalBody, db:
         probe_cfg["hidden_from_public"] = True
         probe_cfg["created_by"] = "script"
         agent.config = probe_cfg
-    db.commit()
-    db.refresh(user)
-    db.refresh(agent)
-    next_steps = _register_minimal_next_steps(db, agent.id)
-    try:
-        _send_register_welcome_inbox(db, user, agent, next_steps)
-        _send_first_subscribe_nudge(db, user, agent)
-        db.add(
-            SystemLog(
-                level="info",
-                category="auth",
-                message="user_registered_agent_minimal",
-                user_id=user.id,
-                extra={
-                    "username": user.username,
-                    "agent_id": agent.id,
-                    "agent_name": agent.name,
-                    "signup_bonus_credits": SKILL_REGISTER_BONUS_CREDITS,
-                    "referral_bound": referral_bound,
-                },
-            )
+    db.add(
+        SystemLog(
+            level="info",
+            category="auth",
+            message="user_registered_agent_minimal",
+            user_id=user.id,
+            extra={
+                "username": user.username,
+                "agent_id": agent.id,
+                "agent_name": agent.name,
+                "signup_bonus_credits": SKILL_REGISTER_BONUS_CREDITS,
+                "referral_bound": referral_bound,
+            },
         )
-        db.commit()
-    except Exception:
-        db.rollback()
+    )
+    followup_job_id = _followups.enqueue_register_followups(db, user.id, agent.id)
+    next_steps = _followups.register_next_steps(agent.id)
     token = create_access_token(
         data={"sub": str(user.id), "type": "user"},
         expires_delta=timedelta(days=365),
@@ -846,6 +793,9 @@ def register_agent_minimal(request: Request, body: RegisterAgentMinimalBody, db:
     }
     if reg_msg:
         payload["message"] = reg_msg
+    # 响应内容在提交前组装完毕，提交后无需再 refresh 各对象
+    db.commit()
+    background_tasks.add_task(_followups.run_register_followup, followup_job_id)
     return payload
 
 
@@ -855,56 +805,39 @@ def guest_token(db: Session = Depends(get_db)):
     获取游客 Token：无需注册即可发布任务。系统创建临时用户并返回 token，
     调用方可用于 POST /tasks。建议用户后续注册以获得永久账号并关联智能体。
     """
-    for _ in range(10):
-        short_id = secrets.token_hex(6)
-        username = f"guest_{short_id}"
-        email = f"guest_{short_id}@clawjob.local"
-        if db.query(User).filter(User.username == username).first():
-            continue
-        if db.query(User).filter(User.email == email).first():
-            continue
-        # NOTE: translated comment in English.
-        user = User(
-            username=username,
-            email=email,
-            hashed_password="",
-        )
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-        try:
-            db.add(SystemLog(
-                level="info",
-                category="auth",
-                message="guest_token_issued",
-                user_id=user.id,
-                extra={"username": user.username},
-            ))
-            db.commit()
-        except Exception:
-            db.rollback()
-        token = create_access_token(
-            data={"sub": str(user.id), "type": "user"},
-            expires_delta=timedelta(days=365),
-        )
-        register_hint_zh = (
-            "您当前为游客身份，仅可发布任务。要让 Agent 接取任务，"
-            "请调用 POST /auth/register-agent-minimal（最快）或 /auth/register-via-skill。"
-        )
-        register_hint_en = (
-            "You are using a guest token; you can publish tasks. "
-            "To accept tasks, call POST /auth/register-agent-minimal (fastest) or /auth/register-via-skill."
-        )
-        return {
-            "access_token": token,
-            "token_type": "bearer",
-            "user_id": user.id,
-            "username": user.username,
-            "is_guest": True,
-            "register_hint": register_hint_zh,
-            "register_hint_en": register_hint_en,
-        }
-    raise HTTPException(status_code=500, detail="生成游客 Token 失败，请重试")
+    user = _insert_unique_random_user(db, "guest")
+    if user is None:
+        raise HTTPException(status_code=500, detail="生成游客 Token 失败，请重试")
+    db.add(SystemLog(
+        level="info",
+        category="auth",
+        message="guest_token_issued",
+        user_id=user.id,
+        extra={"username": user.username},
+    ))
+    user_id, username = user.id, user.username
+    db.commit()
+    token = create_access_token(
+        data={"sub": str(user_id), "type": "user"},
+        expires_delta=timedelta(days=365),
+    )
+    register_hint_zh = (
+        "您当前为游客身份，仅可发布任务。要让 Agent 接取任务，"
+        "请调用 POST /auth/register-agent-minimal（最快）或 /auth/register-via-skill。"
+    )
+    register_hint_en = (
+        "You are using a guest token; you can publish tasks. "
+        "To accept tasks, call POST /auth/register-agent-minimal (fastest) or /auth/register-via-skill."
+    )
+    return {
+        "access_token": token,
+        "token_type": "bearer",
+        "user_id": user_id,
+        "username": username,
+        "is_guest": True,
+        "register_hint": register_hint_zh,
+        "register_hint_en": register_hint_en,
+    }
 
 
 # ---------- Google OAuth ----------
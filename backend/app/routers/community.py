@@ -7,19 +7,18 @@ import asyncio
 import json
 import os
 import time
-from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 
 import jwt
 from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel, Field
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
 
 from app.database.relational_db import (
     Agent,
     ChatMessage,
     ChatTopic,
-    ChatTopicMember,
     InternalMessage,
     PublishedSkill,
     Task,
@@ -133,8 +132,8 @@ def _owned_agent_or_403(db: Session, uid: int, agent_id: Optional[int]) -> Agent
     return agent
 
 
-def _topic_to_dict(db: Session, t: ChatTopic) -> dict:
-    message_count = db.query(ChatMessage).filter(ChatMessage.topic_id == t.id).count()
+def _topic_to_dict(t: ChatTopic) -> dict:
+    """计数取自话题行上的冗余列，序列化不再查库。"""
     return {
         "id": t.id,
         "title": t.title,
@@ -145,7 +144,9 @@ def _topic_to_dict(db: Session, t: ChatTopic) -> dict:
         "status": t.status,
         "heat_score": float(t.heat_score or 0.0),
         "auto_generated": bool(t.auto_generated),
-        "message_count": int(message_count),
+        "message_count": int(t.message_count or 0),
+        "member_count": int(t.member_count or 0),
+        "last_message_at": iso_utc(t.last_message_at),
         "created_at": iso_utc(t.created_at),
         "updated_at": iso_utc(t.updated_at),
     }
@@ -196,7 +197,19 @@ def auto_generate_topics(
         force=bool(body.force),
     )
     db.commit()
-    return {"created": [_topic_to_dict(db, t) for t in created], "count": len(created)}
+    return {"created": [_topic_to_dict(t) for t in created], "count": len(created)}
+
+
+def _decode_topic_cursor(cursor: str, sort: str) -> Tuple[Optional[float], int]:
+    """newest 的游标为 ``id``；热度排序为 ``heat_score:id``，带上一页末行被返回时的热度值。"""
+    if sort == "newest":
+        heat, tid = None, int(cursor)
+    else:
+        raw_heat, _, raw_id = cursor.partition(":")
+        heat, tid = float(raw_heat), int(raw_id)
+    if tid <= 0:
+        raise ValueError(cursor)
+    return heat, tid
 
 
 @router.get("/topics")
@@ -204,23 +217,48 @@ def list_topics(
     skill_tag: Optional[str] = None,
     q: Optional[str] = None,
     sort: str = "heat_desc",
+    cursor: Optional[str] = Query(default=None),
     skip: int = 0,
     limit: int = 20,
     db: Session = Depends(get_db),
 ):
+    """公开话题列表：一条 count + 一条列表查询。
+
+    按 (heat_score, id) 或 (created_at, id) 倒序 keyset 翻页：传上一页的 ``next_cursor``；
+    skip 仅为旧调用方保留。heat_score 会被定时重算，所以热度游标带着上一页末行当时的热度值
+    （而不是翻页时按 id 回查），该行被重算后下一页的边界也不会跟着移动；created_at 不变，按 id 回查。
+    """
     _assert_community_enabled()
     qy = db.query(ChatTopic).filter(ChatTopic.visibility == "public", ChatTopic.status == "active")
     if skill_tag:
         qy = qy.filter(ChatTopic.skill_tag == _community.normalize_skill_tag(skill_tag))
     if q:
         qy = qy.filter(ChatTopic.title.ilike(f"%{q.strip()}%"))
-    if sort == "newest":
-        qy = qy.order_by(ChatTopic.created_at.desc())
-    else:
-        qy = qy.order_by(ChatTopic.heat_score.desc(), ChatTopic.updated_at.desc())
     total = qy.count()
-    rows = qy.offset(max(0, skip)).limit(max(1, min(limit, 100))).all()
-    return {"items": [_topic_to_dict(db, t) for t in rows], "total": int(total)}
+    sort_col = ChatTopic.created_at if sort == "newest" else ChatTopic.heat_score
+    if cursor:
+        try:
+            heat, tid = _decode_topic_cursor(cursor, sort)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="cursor 无效")
+        pivot = heat if heat is not None else db.query(sort_col).filter(ChatTopic.id == tid).scalar_subquery()
+        qy = qy.filter(or_(sort_col < pivot, and_(sort_col == pivot, ChatTopic.id < tid)))
+    qy = qy.order_by(sort_col.desc(), ChatTopic.id.desc())
+    if not cursor:
+        qy = qy.offset(max(0, skip))
+    limit = max(1, min(limit, 100))
+    rows = qy.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = str(last.id) if sort == "newest" else f"{float(last.heat_score or 0.0)!r}:{last.id}"
+    return {
+        "items": [_topic_to_dict(t) for t in rows],
+        "total": int(total),
+        "next_cursor": next_cursor,
+    }
 
 
 @router.get("/topics/{topic_id}/messages")
@@ -247,7 +285,7 @@ def list_topic_messages(
     public_rows = [r for r in rows if not is_ops_internal_message(r, agent_map.get(int(r.author_agent_id)))]
     next_cursor = rows[0].id if rows else None
     return {
-        "topic": _topic_to_dict(db, topic),
+        "topic": _topic_to_dict(topic),
         "items": [
             _message_to_dict(r, agent_map.get(int(r.author_agent_id)), include_ops_internal=True)
             for r in public_rows
@@ -336,11 +374,7 @@ async def post_topic_message(
     )
     db.add(msg)
     db.flush()
-    member = db.query(ChatTopicMember).filter(ChatTopicMember.topic_id == topic_id, ChatTopicMember.agent_id == author.id).first()
-    if not member:
-        db.add(ChatTopicMember(topic_id=topic_id, agent_id=author.id, role="member", last_read_at=datetime.utcnow()))
-    else:
-        member.last_read_at = datetime.utcnow()
+    _community.record_topic_message(db, topic_id, author.id)
     heat = _community.recompute_topic_heat(db, topic_id)
     db.commit()
     db.refresh(msg)
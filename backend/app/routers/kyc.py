@@ -197,6 +197,7 @@ def submit_withdrawal(
     )
     db.commit()
     db.refresh(req)
+    _payout.invalidate_payout_aggregates([u.id])
     return {
         "withdrawal_id": req.id,
         "status": req.status,
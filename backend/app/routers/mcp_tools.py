@@ -3,7 +3,7 @@ from __future__ import annotations
 
 from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 
@@ -25,16 +25,14 @@ class PublishMcpToolBody(BaseModel):
     requires_auth: bool = False
     rate_limit: int = Field(default=100, ge=1, le=10000)
     version_tag: str = Field(default="v1", max_length=64)
+    tags: Optional[List[str]] = None
 
 
 def _platform_tools() -> List[Dict[str, Any]]:
     """Built-in runtime tools (read-only, not persisted)."""
     try:
-        merged = tool_system.list_tools()
         out: List[Dict[str, Any]] = []
-        for item in merged:
-            if item.get("source") != "builtin":
-                continue
+        for item in tool_system.builtin_tools():
             out.append({
                 "id": None,
                 "tool_slug": item.get("name"),
@@ -52,6 +50,7 @@ def _platform_tools() -> List[Dict[str, Any]]:
                 "revenue_share_bp": 7000,
                 "author_user_id": None,
                 "publisher_username": "ClawJob",
+                "tags": [],
                 "source": "platform",
             })
         return out
@@ -65,24 +64,46 @@ def list_mcp_tools(
     skip: int = 0,
     limit: int = 100,
     category: Optional[str] = None,
+    tag: Optional[str] = None,
+    cursor_id: Optional[int] = Query(default=None),
     include_platform: bool = True,
 ):
-    """Public MCP tool catalog: community-published + optional platform builtins."""
+    """Public MCP tool catalog: community-published (newest first) + optional platform builtins.
+
+    - Keyset pagination: pass the previous page's `next_cursor_id` as `cursor_id`; each page
+      costs one indexed query regardless of depth. `skip` is kept for old clients (offset scan).
+    - Filters: `category`, `tag`. `total` comes from a counter cached until the next publish/delete.
+    - Platform builtins are appended once the community listing is exhausted.
+    """
     limit = max(1, min(int(limit or 100), 200))
     skip = max(0, int(skip or 0))
-    community = mcp_tools_store.list_market_tools(db, skip=0, limit=500, category=category)
-    platform = _platform_tools() if include_platform else []
-    community_slugs = {it.get("tool_slug") for it in community}
-    merged = list(community) + [p for p in platform if p.get("tool_slug") not in community_slugs]
-    total = len(merged)
-    page = merged[skip : skip + limit]
-    return {"items": page, "total": total, "skip": skip, "limit": limit}
+    tag = (mcp_tools_store.normalize_tags([tag]) or [None])[0] if tag else None
+    items, next_cursor = mcp_tools_store.list_market_tools_page(
+        db, cursor_id=cursor_id, skip=0 if cursor_id is not None else skip, limit=limit, category=category, tag=tag
+    )
+    platform: List[Dict[str, Any]] = []
+    if include_platform and not tag:
+        platform = [p for p in _platform_tools() if not category or p.get("category") == category]
+    if platform:
+        # 与社区工具 slug 冲突的内置工具不展示，也不计入 total
+        taken = mcp_tools_store.existing_slugs(db, [p["tool_slug"] for p in platform])
+        platform = [p for p in platform if p["tool_slug"] not in taken]
+    if next_cursor is None and platform:
+        items = items + platform
+    counts = mcp_tools_store.market_counts(db, category=category, tag=tag)
+    return {
+        "items": items,
+        "total": counts["total"] + len(platform),
+        "skip": skip,
+        "limit": limit,
+        "next_cursor_id": next_cursor,
+    }
 
 
 @router.get("/mcp-tools/stats")
 def mcp_tools_stats(db: Session = Depends(get_db)):
-    total = mcp_tools_store.count_market_tools(db)
-    return {"tool_count": total, "verified_count": 0}
+    counts = mcp_tools_store.market_counts(db)
+    return {"tool_count": counts["total"], "verified_count": counts["verified"]}
 
 
 @router.post("/mcp-tools/publish")
@@ -106,6 +127,7 @@ def publish_mcp_tool(
                 "requires_auth": body.requires_auth,
                 "rate_limit": body.rate_limit,
                 "version_tag": body.version_tag,
+                "tags": body.tags,
             },
         )
     except ValueError as exc:
@@ -115,7 +137,7 @@ def publish_mcp_tool(
     return {
         "ok": True,
         "status": "published",
-        "item": mcp_tools_store.row_to_item(row, me.username if me else None),
+        "item": mcp_tools_store.row_to_item(row, me.username if me else None, mcp_tools_store.tool_tags(db, row.id)),
     }
 
 
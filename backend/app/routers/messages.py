@@ -38,8 +38,7 @@ def send_internal_message(
     if not content:
         raise HTTPException(status_code=400, detail="内容不能为空")
     try:
-        safe_title = _safety.sanitize_text(None, title, source="message", user_id=uid)
-        safe_content = _safety.sanitize_text(None, content, source="message", user_id=uid)
+        safe_title, safe_content = _safety.sanitize_texts([title, content], source="message", user_id=uid)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=f"内容安全策略：{str(e)}")
     title = safe_title or title
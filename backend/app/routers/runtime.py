@@ -3,13 +3,16 @@ from __future__ import annotations
 
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
 from app.core.systems import memory_system, runtime_guard, tool_system
 from app.database.relational_db import User
-from app.database.relational_db import SystemLog, User, get_db
+from app.database.relational_db import Agent, SessionLocal, SystemLog, User, get_db
 from app.security import get_current_user, get_current_user_optional
 from app.services.preflight import run_preflight
 
@@ -144,16 +147,55 @@ async def get_memory(memory_id: str, current_user: str = Depends(get_current_use
 
 # Tool System Endpoints
 @router.get("/tools")
-async def list_tools(current_user: Optional[dict] = Depends(get_current_user_optional)):
-    """List available tools for agents (public catalog; auth optional)."""
-    return tool_system.list_tools(current_user)
+def list_tools(
+    category: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    current_user: Optional[dict] = Depends(get_current_user_optional),
+):
+    """List available tools for agents (public catalog; auth optional).
+
+    Sync on purpose: runs in the threadpool, so a snapshot rebuild never blocks the event loop.
+    Served from the versioned catalog snapshot with an `ETag`; `If-None-Match` hits return 304.
+    """
+    _ = current_user
+    items, etag = tool_system.catalog(category)
+    headers = {"Cache-Control": "public, max-age=60", "ETag": etag}
+    inm = (if_none_match or "").strip()
+    if inm and (inm == "*" or etag in [x.strip() for x in inm.split(",")]):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=items, headers=headers)
 
 @router.post("/tools")
 async def create_tool(tool_config: dict, current_user: str = Depends(get_current_user)):
     """Create a new tool for agents to use"""
     return await tool_system.create_tool(tool_config, current_user)
 
+def _owned_agent_id(agent_id: str, user_id: int) -> Optional[int]:
+    if not str(agent_id).strip().isdigit():
+        return None
+    db = SessionLocal()
+    try:
+        row = db.query(Agent.id).filter(Agent.id == int(agent_id), Agent.owner_id == user_id).first()
+        return int(row[0]) if row else None
+    finally:
+        db.close()
+
 @router.post("/agents/{agent_id}/use-tool")
 async def use_tool(agent_id: str, tool_request: dict, current_user: str = Depends(get_current_user)):
-    """Allow agent to use a specific tool"""
-    return await tool_system.use_tool(agent_id, tool_request, current_user)
+    """Allow agent to use a specific tool.
+
+    The agent must belong to the caller; its id keys the quota.
+    Each (agent, tool) pair draws from a refilling token bucket; responses carry
+    `X-RateLimit-*` headers and a throttled call returns 429 with `Retry-After`.
+    """
+    owned = await run_in_threadpool(_owned_agent_id, agent_id, int(current_user["user_id"]))
+    if owned is None:
+        raise HTTPException(status_code=403, detail="Agent 不存在或不属于当前用户")
+    result = await tool_system.use_tool(str(owned), tool_request, current_user)
+    quota = result.pop("quota", None)
+    if quota is None:
+        return result
+    if not quota.allowed:
+        result["reason"] = quota.reason
+        return JSONResponse(status_code=429, content=result, headers=quota.headers())
+    return JSONResponse(content=jsonable_encoder(result), headers=quota.headers())
@@ -6,6 +6,7 @@ from datetime import datetime, timedelta
 from typing import Optional
 
 from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
 from sqlalchemy import func
 from sqlalchemy.orm import Session
 
@@ -33,6 +34,7 @@ def _activity_agent_is_internal(agent: Agent, owner: Optional[User]) -> bool:
 
 @router.get("/health")
 async def health_check():
+    """整体健康：各存储连通性与功能开关；不跑 HealthMonitor 一轮，资源/业务指标见 /health/checks。"""
     return {
         "status": "healthy", 
         "service": "clawjob-backend",
@@ -58,6 +60,40 @@ async def health_check():
     }
 
 
+@router.get("/health/checks")
+async def health_checks():
+    """完整 HealthMonitor 一轮（数据库聚合、Redis、CPU/内存、任务成功率），结果缓存
+    CLAWJOB_HEALTH_CACHE_TTL_SEC；仅供观测与排障，探针请用 /health/live 与 /health/ready。"""
+    from app.core.health_monitor import get_health_status
+
+    monitor = await get_health_status()
+    return monitor.model_dump(mode="json")
+
+
+@router.get("/health/live")
+async def health_live():
+    """存活探针：不做任何 IO，进程能响应即为存活。"""
+    return {"status": "alive", "service": "clawjob-backend"}
+
+
+@router.get("/health/ready")
+async def health_ready():
+    """就绪探针：只看本实例能否连上数据库（短时缓存的 SELECT 1，超时即未就绪）；不可用时 503。
+
+    CPU/内存、任务成功率等资源与业务指标不影响就绪，见 /health 的 checks。
+    """
+    from app.core.health_monitor import HealthSeverity, health_monitor
+
+    db = await health_monitor.check_readiness()
+    ready = db.status != HealthSeverity.CRITICAL
+    body = {
+        "status": "ready" if ready else "not_ready",
+        "database": {"status": db.status.value, "message": db.message, "metrics": db.metrics},
+        "last_check": db.timestamp.isoformat(),
+    }
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+
 @router.get("/stats")
 def get_public_stats(db: Session = Depends(get_db)):
     """公开统计：任务总数、开放数、已完成数、活跃 Agent、累计发放报酬（供首页/官网 Counters 与 Dashboard）。"""
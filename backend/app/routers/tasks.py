@@ -3,15 +3,17 @@ from __future__ import annotations
 
 import asyncio
 import copy
+import json
 import os
 import time
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional
 
 import httpx
-from fastapi import APIRouter, Body, Depends, HTTPException
-from fastapi.responses import JSONResponse
-from sqlalchemy import desc, func
+from fastapi import APIRouter, BackgroundTasks, Body, Depends, Header, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from sqlalchemy.orm.attributes import flag_modified
 
@@ -21,13 +23,14 @@ from app.database.relational_db import (
     TaskComment, TaskSubscription, User, get_db,
 )
 from app.domain.agent_helpers import ensure_agents_category_column, get_my_agent, norm_capabilities, published_skill_ids_by_token, RegisterAgentBody, SendMessageBody
+from app.domain.comment_threads import THREAD_PAGE_DEFAULT, cached_comment_count, load_recent_posts, load_task_thread
 from app.domain.skill_xp import agent_skill_token, agent_skill_xp_map, level_from_xp
 from app.domain.task_helpers import (
     CLAWJOB_SYSTEM_AGENT_NAME, CLAWJOB_SYSTEM_USERNAME, FRONTEND_URL,
     MAX_TASK_REWARD_POINTS, PLATFORM_COMMISSION_RATE,
     VERIFICATION_EXTEND_HOURS, VERIFICATION_HOURS_DEFAULT, VERIFICATION_HOURS_MAX, VERIFICATION_HOURS_MIN,
     a2a_can_access_task, append_task_status_update_comment, award_bid_impl,
-    can_view_task_runs, compute_publish_fee, get_or_create_clawjob_system_agent,
+    can_view_task_runs, get_or_create_clawjob_system_agent,
     intent_rate_check, maybe_auto_confirm, maybe_settle_skill_revenue, normalize_verification_method, owner_display_name,
     pay_task_reward, push_task_to_discord, require_auction_task, serialize_auction_state,
     task_extra, task_is_platform_seed_listing, task_is_public_listing, task_is_visible_to, task_payment_breakdown,
@@ -40,12 +43,16 @@ from app.domain.task_models import (
     PayerMarkPaidBody, PlaceBidBody, PostCommentBody, PublishTaskBody, RejectCompletionBody,
     SubscribeTaskBody, SubmitCompletionBody, WorkflowPlanBody,
 )
+from app.domain.task_rows import TaskRowSerializer
 from app.security import get_current_user, get_current_user_optional
 from app.services import execution_sandbox as _sandbox, reverse_auction as _ra
 from app.services import safety_pipeline as _safety, step_replay as _replay
 from app.services.escrow_tasks import apply_escrow_milestone_confirm, build_escrow_plan, get_escrow, save_escrow_to_task
 from app.services.preflight import enforce_preflight, run_preflight
+from app.services import idempotency as _idem
 from app.services import settlement as _settlement
+from app.services import batch_confirm as _batch_confirm
+from app.services.task_claims import CLAIMABLE_STATUSES, TaskClaimConflict, claim_task_for_agent
 from app.services.task_timeline import append_timeline_event as _append_timeline_event
 from app.services.workflow_dag import predecessors, validate_workflow_dag
 from app.utils.datetime_iso import iso_utc
@@ -70,29 +77,7 @@ def list_my_accepted_tasks(
         .order_by(Task.created_at.desc())
     )
     tasks = q.offset(skip).limit(limit).all()
-    out = []
-    for t in tasks:
-        maybe_auto_confirm(t, db)
-        db.refresh(t)
-        owner = db.query(User).filter(User.id == t.owner_id).first()
-        agent = db.query(Agent).filter(Agent.id == t.agent_id).first()
-        out.append({
-            "id": t.id,
-            "title": t.title,
-            "description": (t.description or "")[:200],
-            "status": t.status,
-            "priority": t.priority or "medium",
-            "task_type": t.task_type or "general",
-            "owner_id": t.owner_id,
-            "publisher_name": owner.username if owner else "",
-            "agent_id": t.agent_id,
-            "agent_name": agent.name if agent else "",
-            "reward_points": getattr(t, "reward_points", 0) or 0,
-            "submitted_at": iso_utc(getattr(t, "submitted_at", None)),
-            "verification_deadline_at": iso_utc(getattr(t, "verification_deadline_at", None)),
-            "created_at": iso_utc(t.created_at),
-            **task_extra(t, db),
-        })
+    out = TaskRowSerializer(db, tasks).accepted_rows()
     return {"tasks": out, "total": len(out)}
 @router.post("/tasks/draft-from-intent")
 def draft_task_from_intent(
@@ -134,120 +119,185 @@ def draft_task_from_intent(
     return draft
 
 
+BATCH_PUBLISH_MAX_ITEMS = 500
+
+
 @router.post("/tasks/batch")
 def batch_publish_tasks(
     body: BatchPublishBody,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user),
 ):
-    """批量发布任务（RFQ MVP）。
+    """批量发布任务（RFQ）。
 
-    - 单次最多 50 条。
-    - `body.common` 可指定所有任务共用的字段（被 task 级覆盖）。
-    - 对每条任务调用发布流程（扣点、写库）；任意条失败则整批回滚。
-    - 返回 `{ created: [{id, title, estimate}] }`。
+    - 单次最多 500 条；`body.common` 为共用字段（被 task 级覆盖），结算语义与单条发布一致。
+    - 全部文本一次安全扫描；估价按 (category, skill) 分组各算一次。
+    - platform_credits 有奖任务合并为一次扣点，流水仍按任务逐条记录；任务一次 flush 批量插入。
+    - 任意条校验失败则整批不落库。返回 `{ created: [{id, title, reward_points, estimate}], total }`。
     """
-    from app.domain.task_helpers import compute_publish_fee
+    from app.domain.task_helpers import after_tasks_published
     from app.services.price_sla_estimator import estimate_price_sla
 
     items = body.tasks
     if not items:
         raise HTTPException(status_code=400, detail="tasks 不可为空")
-    if len(items) > 50:
-        raise HTTPException(status_code=400, detail="单次最多批量发布 50 条任务")
+    if len(items) > BATCH_PUBLISH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"单次最多批量发布 {BATCH_PUBLISH_MAX_ITEMS} 条任务")
 
     uid = int(current_user["user_id"])
-    user = db.query(User).filter(User.id == uid).first()
+    common = body.common or PublishTaskBody(title="")
+    settlement_mode = (common.settlement_mode or "agent_direct").strip()
+    if settlement_mode not in ("platform_credits", "agent_direct"):
+        raise HTTPException(status_code=400, detail="settlement_mode 须为 platform_credits 或 agent_direct")
+    webhook_url = (common.completion_webhook_url or "").strip()
+    if webhook_url and not webhook_url.startswith(("http://", "https://")):
+        raise HTTPException(status_code=400, detail="completion_webhook_url 须为 http:// 或 https:// 开头")
+    creator_agent_id = common.creator_agent_id
+    if creator_agent_id is not None:
+        if not db.query(Agent.id).filter(Agent.id == int(creator_agent_id), Agent.owner_id == uid).first():
+            raise HTTPException(status_code=400, detail="creator_agent_id 须为当前用户注册的 Agent")
+    verification_requirements = [
+        str(x).strip()[:200] for x in (common.verification_requirements or []) if str(x).strip()
+    ][:20]
+    vh_raw = common.verification_hours
+    verification_hours = (
+        VERIFICATION_HOURS_DEFAULT if vh_raw is None
+        else max(VERIFICATION_HOURS_MIN, min(VERIFICATION_HOURS_MAX, int(vh_raw)))
+    )
+
+    # 合并 task 级与 common 字段；文本统一收集后一次扫描
+    merged: List[Dict[str, Any]] = []
+    texts: List[Optional[str]] = []
+    for idx, item in enumerate(items):
+        points = max(0, int(item.reward_points or common.reward_points or 0))
+        if points > MAX_TASK_REWARD_POINTS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"第 {idx + 1} 条：单任务奖励点数不能超过 {MAX_TASK_REWARD_POINTS}",
+            )
+        if points > 0 and settlement_mode == "platform_credits" and not webhook_url:
+            raise HTTPException(
+                status_code=400,
+                detail="有奖励点的 platform_credits 任务必须填写完成回调 URL（common.completion_webhook_url）",
+            )
+        vm = normalize_verification_method(item.verification_method or common.verification_method)
+        if vm in ("checklist", "hybrid") and not verification_requirements:
+            raise HTTPException(status_code=400, detail="checklist/hybrid 验收方式必须提供 verification_requirements")
+        skills = item.skills or common.skills or []
+        merged.append({
+            "points": points,
+            "category": (item.category or common.category or "").strip()[:64] or None,
+            "skills": [str(s).strip()[:50] for s in skills if s][:20],
+            "duration_estimate": (item.duration_estimate or common.duration_estimate or "").strip()[:50],
+            "verification_method": vm,
+        })
+        texts.extend([item.title, item.description, item.requirements or common.requirements])
+    try:
+        safe = _safety.sanitize_texts(texts, source="batch_publish", user_id=uid)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"内容安全策略：{str(e)}")
+
+    try:
+        user = db.query(User).filter(User.id == uid).with_for_update().first()
+    except Exception:
+        user = db.query(User).filter(User.id == uid).first()
     if not user:
         raise HTTPException(status_code=404, detail="用户不存在")
-
-    # Pre-check total cost
-    common = body.common
-    total_cost = 0
-    for item in items:
-        points = item.reward_points if item.reward_points else (common.reward_points if common else 0)
-        fee = compute_publish_fee(points)
-        total_cost += points + fee
-    if total_cost > 0 and (user.credits or 0) < total_cost:
+    lock_platform_credits = settlement_mode == "platform_credits"
+    total_lock = sum(m["points"] for m in merged) if lock_platform_credits else 0
+    current_credits = int(user.credits or 0)
+    if total_lock > current_credits:
         raise HTTPException(
-            status_code=402,
-            detail=f"余额不足：需要 {total_cost} 点，当前 {user.credits or 0} 点",
+            status_code=400,
+            detail=f"信用点不足：当前 {current_credits}，需要 {total_lock}",
         )
 
-    created = []
     now = datetime.utcnow()
-    for item in items:
-        points = item.reward_points if item.reward_points else (common.reward_points if common else 0)
-        fee = compute_publish_fee(points)
-        total_deduct = points + fee
-
-        # Safety check on text
-        safe_title = _safety.sanitize_text(None, item.title, source="batch_publish", user_id=uid)
-        safe_desc = _safety.sanitize_text(None, item.description, source="batch_publish", user_id=uid)
-
+    tasks: List[Task] = []
+    for i, m in enumerate(merged):
+        extra: Dict[str, Any] = {
+            "draft_source": "batch_rfq",
+            "batch_published_at": now.isoformat() + "Z",
+            "verification_method": m["verification_method"],
+            "verification_hours": verification_hours,
+            "settlement_mode": settlement_mode,
+        }
+        if m["skills"]:
+            extra["skills"] = m["skills"]
+        if m["duration_estimate"]:
+            extra["duration_estimate"] = m["duration_estimate"]
+        if verification_requirements:
+            extra["verification_requirements"] = list(verification_requirements)
         task = Task(
-            title=safe_title,
-            description=safe_desc,
+            title=safe[3 * i] or items[i].title,
+            description=safe[3 * i + 1],
+            task_type=common.task_type,
+            priority=common.priority,
             status="open",
             owner_id=uid,
-            reward_points=points,
-            category=item.category or (common.category if common else ""),
-            requirements=item.requirements or (common.requirements if common else ""),
-            skills=item.skills or (common.skills if common else []),
-            duration_estimate=item.duration_estimate or (common.duration_estimate if common else ""),
-            verification_method=normalize_verification_method(
-                item.verification_method or (common.verification_method if common else "manual_review")
-            ),
-            task_type=(common.task_type if common else "general"),
-            input_data={"draft_source": "batch_rfq", "batch_published_at": now.isoformat() + "Z"},
+            creator_agent_id=int(creator_agent_id) if creator_agent_id is not None else None,
+            reward_points=m["points"],
+            completion_webhook_url=webhook_url or None,
+            category=m["category"],
+            requirements=(safe[3 * i + 2] or "").strip() or None,
+            input_data=extra,
         )
-        db.add(task)
+        _append_timeline_event(task, "published", f"任务已发布（验收窗口 {verification_hours} 小时，超时自动确认发奖）")
+        tasks.append(task)
+    db.add_all(tasks)
+    try:
         db.flush()
+    except Exception:
+        db.rollback()
+        raise HTTPException(status_code=500, detail="批量发布失败，请稍后重试")
 
-        if total_deduct > 0:
-            user.credits = (user.credits or 0) - total_deduct
-            if fee > 0:
-                db.add(CreditTransaction(
-                    user_id=uid,
-                    amount=-fee,
-                    type="publish_fee",
-                    description=f"批量发布费用 task#{task.id}",
-                ))
-            if points > 0:
-                db.add(CreditTransaction(
-                    user_id=uid,
-                    amount=-points,
-                    type="task_publish",
-                    description=f"批量发布奖励锁定 task#{task.id}",
-                ))
-
-        # Quick estimate for response
-        try:
-            est = estimate_price_sla(
-                db,
-                skill=(item.skills[0] if item.skills else None),
-                category=item.category or None,
+    if total_lock > 0:
+        user.credits = current_credits - total_lock
+        db.add_all([
+            CreditTransaction(
+                user_id=uid,
+                amount=-int(t.reward_points),
+                type="task_publish",
+                ref_id=t.id,
+                remark=f"批量发布任务 #{t.id} 扣除 {int(t.reward_points)} 任务点",
             )
-        except Exception:
-            est = {}
-
-        created.append({
-            "id": task.id,
-            "title": task.title,
-            "reward_points": points,
-            "estimate": {
-                "median_points": est.get("median_points"),
-                "p50_hours": est.get("p50_hours"),
-                "wait_p50_hours": est.get("wait_p50_hours"),
-            },
-        })
-
+            for t in tasks
+            if int(t.reward_points or 0) > 0
+        ])
+    after_tasks_published(db, tasks, user)
+    db.add(SystemLog(
+        level="info",
+        category="task",
+        message="tasks_batch_published",
+        user_id=uid,
+        extra={"count": len(tasks), "locked_points": total_lock, "task_ids": [t.id for t in tasks][:BATCH_PUBLISH_MAX_ITEMS]},
+    ))
     try:
         db.commit()
     except Exception:
         db.rollback()
         raise HTTPException(status_code=500, detail="批量发布失败，请稍后重试")
 
+    estimates: Dict[tuple, Dict[str, Any]] = {}
+    created = []
+    for t, m in zip(tasks, merged):
+        key = (m["category"], m["skills"][0] if m["skills"] else None)
+        if key not in estimates:
+            try:
+                est = estimate_price_sla(db, skill=key[1], category=key[0])
+            except Exception:
+                est = {}
+            estimates[key] = {
+                "median_points": (est.get("reward_points") or {}).get("p50"),
+                "p50_hours": (est.get("completion_hours") or {}).get("p50"),
+                "wait_p50_hours": (est.get("accept_wait_hours") or {}).get("p50"),
+            }
+        created.append({
+            "id": t.id,
+            "title": t.title,
+            "reward_points": int(t.reward_points or 0),
+            "estimate": dict(estimates[key]),
+        })
     return {"created": created, "total": len(created)}
 
 
@@ -514,36 +564,7 @@ def list_my_created_tasks(
     uid = int(current_user["user_id"])
     query = db.query(Task).filter(Task.owner_id == uid).order_by(Task.created_at.desc())
     tasks = query.offset(skip).limit(limit).all()
-    out = []
-    for t in tasks:
-        maybe_auto_confirm(t, db)
-        db.refresh(t)
-        owner = db.query(User).filter(User.id == t.owner_id).first()
-        sub_count = db.query(TaskSubscription).filter(TaskSubscription.task_id == t.id).count()
-        comment_count = db.query(TaskComment).filter(TaskComment.task_id == t.id).count()
-        invited = getattr(t, "invited_agent_ids", None)
-        creator_agent = db.query(Agent).filter(Agent.id == t.creator_agent_id).first() if getattr(t, "creator_agent_id", None) else None
-        out.append({
-            "id": t.id,
-            "title": t.title,
-            "description": (t.description or "")[:200],
-            "status": t.status,
-            "priority": t.priority or "medium",
-            "task_type": t.task_type or "general",
-            "owner_id": t.owner_id,
-            "publisher_name": owner.username if owner else "",
-            "agent_id": t.agent_id,
-            "creator_agent_id": getattr(t, "creator_agent_id", None),
-            "creator_agent_name": creator_agent.name if creator_agent else None,
-            "reward_points": getattr(t, "reward_points", 0) or 0,
-            "subscription_count": sub_count,
-            "comment_count": comment_count,
-            "invited_agent_ids": invited if invited else [],
-            "submitted_at": iso_utc(getattr(t, "submitted_at", None)),
-            "verification_deadline_at": iso_utc(getattr(t, "verification_deadline_at", None)),
-            "created_at": iso_utc(t.created_at),
-            **task_extra(t, db),
-        })
+    out = TaskRowSerializer(db, tasks, with_counts=True).created_rows()
     total = db.query(Task).filter(Task.owner_id == uid).count()
     return {"tasks": out, "total": total}
 
@@ -557,14 +578,10 @@ def publish_task(
     """发布任务（需登录）；若设置 reward_points 则从当前用户信用点扣减"""
     uid = int(current_user["user_id"])
     try:
-        safe_title = _safety.sanitize_text(
-            None, getattr(body, "title", None), source="publish_task", user_id=uid
-        )
-        safe_desc = _safety.sanitize_text(
-            None, getattr(body, "description", None), source="publish_task", user_id=uid
-        )
-        safe_requirements = _safety.sanitize_text(
-            None, getattr(body, "requirements", None), source="publish_task", user_id=uid
+        safe_title, safe_desc, safe_requirements = _safety.sanitize_texts(
+            [getattr(body, "title", None), getattr(body, "description", None), getattr(body, "requirements", None)],
+            source="publish_task",
+            user_id=uid,
         )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=f"内容安全策略：{str(e)}")
@@ -1222,9 +1239,16 @@ def accept_bid(
     bid_id: int,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
 ):
-    """发布方选标：对指定 active 报价判标，退差额，任务进入 in_progress。"""
+    """发布方选标：对指定 active 报价判标，退差额，任务进入 in_progress。
+
+    判标通过条件 UPDATE 抢占接取者，并发选标只有一个成功（其余 409）；支持 Idempotency-Key 重试。
+    """
     uid = int(current_user["user_id"])
+    replay = _idem.lookup_response(db, uid, f"accept_bid:{task_id}", idempotency_key)
+    if replay is not None:
+        return {**replay, "idempotent": True}
     task = require_auction_task(db, task_id, lock=True)
     if task.owner_id != uid:
         raise HTTPException(status_code=403, detail="仅发布方可选标")
@@ -1239,6 +1263,7 @@ def accept_bid(
     if bid.status != "active":
         raise HTTPException(status_code=400, detail="仅可对 active 报价选标")
     result = award_bid_impl(task, bid, db)
+    _idem.remember_response(db, uid, f"accept_bid:{task_id}", idempotency_key, {"ok": True, **result})
     try:
         db.commit()
     except Exception:
@@ -1351,9 +1376,17 @@ def subscribe_task(
     body: SubscribeTaskBody,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
 ):
-    """订阅任务：用我的 Agent 接取该任务（需登录）。任务已被接取后不可再由其他 Agent 接取。"""
+    """订阅任务：用我的 Agent 接取该任务（需登录）。任务已被接取后不可再由其他 Agent 接取。
+
+    并发安全：接取通过条件 UPDATE（agent_id IS NULL 且状态可接取）完成，并发请求只有一个成功，
+    其余返回 409；携带 Idempotency-Key 的重试直接返回首次结果。
+    """
     uid = int(current_user["user_id"])
+    replay = _idem.lookup_response(db, uid, f"subscribe_task:{task_id}", idempotency_key)
+    if replay is not None:
+        return {**replay, "idempotent": True}
     task = db.query(Task).filter(Task.id == task_id).first()
     if not task:
         raise HTTPException(status_code=404, detail="任务不存在")
@@ -1385,17 +1418,31 @@ def subscribe_task(
     ).first()
     if existing:
         return {"message": "已订阅过该任务", "subscription_id": existing.id}
-    sub = TaskSubscription(task_id=task_id, agent_id=body.agent_id)
-    db.add(sub)
-    # NOTE: translated comment in English.
     if task.agent_id is None:
+        if task.status not in CLAIMABLE_STATUSES:
+            raise HTTPException(status_code=400, detail="任务当前状态不可接取")
+        new_status = "in_progress" if get_escrow(task) and task.status == "open" else None
+        if not claim_task_for_agent(db, task_id, body.agent_id, new_status=new_status):
+            db.rollback()
+            raise HTTPException(status_code=409, detail="该任务已被其他 Agent 抢先接取")
         task.agent_id = body.agent_id
-    if get_escrow(task) and task.status == "open":
-        task.status = "in_progress"
+        if new_status:
+            task.status = new_status
+    sub = TaskSubscription(task_id=task_id, agent_id=body.agent_id)
+    db.add(sub)
     _append_timeline_event(task, "subscribed", f"Agent「{agent.name}」已接取任务")
-    db.commit()
-    db.refresh(sub)
-    return {"message": "订阅成功", "subscription_id": sub.id}
+    db.flush()
+    result = {"message": "订阅成功", "subscription_id": sub.id}
+    _idem.remember_response(db, uid, f"subscribe_task:{task_id}", idempotency_key, result)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        replay = _idem.lookup_response(db, uid, f"subscribe_task:{task_id}", idempotency_key)
+        if replay is not None:
+            return {**replay, "idempotent": True}
+        raise HTTPException(status_code=409, detail="并发接取冲突，请稍后重试")
+    return result
 
 
 @router.post("/tasks/{task_id}/submit-completion")
@@ -1581,14 +1628,18 @@ def confirm_task(
     body: Optional[ConfirmTaskBody] = None,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
 ):
-    """发布者验收通过：仅任务发布者可调用，发放奖励给接取者。"""
+    """发布者验收通过：仅任务发布者可调用，发放奖励给接取者。托管里程碑放款支持 Idempotency-Key 重试。"""
     uid = int(current_user["user_id"])
     task = db.query(Task).filter(Task.id == task_id).first()
     if not task:
         raise HTTPException(status_code=404, detail="任务不存在")
     if task.owner_id != uid:
         raise HTTPException(status_code=403, detail="仅任务发布者可验收")
+    replay = _idem.lookup_response(db, uid, f"escrow_confirm:{task_id}", idempotency_key)
+    if replay is not None:
+        return {**replay, "idempotent": True}
     maybe_auto_confirm(task, db)
     db.refresh(task)
     if task.status == "completed":
@@ -1596,13 +1647,29 @@ def confirm_task(
     reward_points = getattr(task, "reward_points", 0) or 0
     escrow = get_escrow(task)
     if task.status == "pending_verification" and escrow:
-        info = apply_escrow_milestone_confirm(task, db, auto=False)
+        try:
+            info = apply_escrow_milestone_confirm(task, db, auto=False)
+        except TaskClaimConflict:
+            db.rollback()
+            raise HTTPException(status_code=409, detail="当前里程碑已被确认，请刷新后重试")
         fin = bool(info.get("escrow_finished"))
         _append_timeline_event(
             task,
             "milestone_confirmed",
             "托管里程碑已确认并放款" + ("（全部里程碑已完成）" if fin else ""),
         )
+        result = {
+            "message": "托管任务已全部完成，奖励已发放" if fin else "托管里程碑验收通过，奖励已发放",
+            "task_id": task_id,
+            "reward_paid": info.get("reward_paid", 0),
+            "reward_total": reward_points,
+            "commission": info.get("commission", 0),
+            "escrow": {
+                "milestone_index": info.get("milestone_index"),
+                "finished": fin,
+            },
+        }
+        _idem.remember_response(db, uid, f"escrow_confirm:{task_id}", idempotency_key, result)
         db.commit()
         if fin:
             try:
@@ -1616,22 +1683,7 @@ def confirm_task(
             agent_id=task.agent_id,
             content="发布方已确认当前里程碑，奖励已发放",
         )
-        msg = (
-            "托管里程碑验收通过，奖励已发放"
-            if not info.get("escrow_finished")
-            else "托管任务已全部完成，奖励已发放"
-        )
-        return {
-            "message": msg,
-            "task_id": task_id,
-            "reward_paid": info.get("reward_paid", 0),
-            "reward_total": reward_points,
-            "commission": info.get("commission", 0),
-            "escrow": {
-                "milestone_index": info.get("milestone_index"),
-                "finished": bool(info.get("escrow_finished")),
-            },
-        }
+        return result
     if task.status == "pending_verification":
         agent_direct = (
             _settlement.get_settlement_mode(task) == "agent_direct" and reward_points > 0
@@ -1923,65 +1975,19 @@ def escrow_dispute(
 @router.post("/tasks/batch-confirm")
 def batch_confirm_tasks(
     body: BatchConfirmBody,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user),
 ):
-    """批量验收通过：仅任务发布者可调用，对多个待验收任务执行验收。响应含 summary 便于前端提示高额奖励风险。"""
+    """批量验收通过：仅任务发布者可调用，一次最多 500 个任务整批结算（见 app.services.batch_confirm）。
+    响应含逐任务结果与 summary，便于前端提示高额奖励风险。"""
     uid = int(current_user["user_id"])
-    task_ids = list(set(body.task_ids or []))[:50]
-    results = []
-    total_reward_points = 0
-    high_value_task_ids: List[int] = []
-    for task_id in task_ids:
-        task = db.query(Task).filter(Task.id == task_id, Task.owner_id == uid).first()
-        if not task:
-            results.append({"task_id": task_id, "ok": False, "reason": "not_found_or_forbidden"})
-            continue
-        rp = int(getattr(task, "reward_points", 0) or 0)
-        if task.status == "pending_verification":
-            total_reward_points += rp
-            if rp >= 5000:
-                high_value_task_ids.append(task_id)
-        maybe_auto_confirm(task, db)
-        db.refresh(task)
-        if task.status == "completed":
-            results.append({"task_id": task_id, "ok": True, "message": "already_completed"})
-            continue
-        if task.status != "pending_verification" and not (task.status == "open" and (getattr(task, "reward_points", 0) or 0) == 0):
-            results.append({"task_id": task_id, "ok": False, "reason": "not_pending_verification"})
-            continue
-        try:
-            if task.status == "pending_verification" and get_escrow(task):
-                apply_escrow_milestone_confirm(task, db, auto=False)
-            elif task.status == "pending_verification":
-                pay_task_reward(task, db)
-            if task.status == "open" and (getattr(task, "reward_points", 0) or 0) == 0:
-                task.status = "completed"
-                task.completed_at = datetime.utcnow()
-                try:
-                    from app.services import community_task_hooks as _ct_hooks
-
-                    _ct_hooks.on_task_completed_community_hooks(db, task)
-                except Exception:
-                    pass
-            db.commit()
-            results.append({"task_id": task_id, "ok": True})
-        except Exception as e:
-            db.rollback()
-            results.append({"task_id": task_id, "ok": False, "reason": str(e)})
-    warn = None
-    if total_reward_points >= 10000 or len(high_value_task_ids) >= 3:
-        warn = "批量中含高额奖励任务，请逐条核对后再验收"
-    elif high_value_task_ids:
-        warn = "部分任务奖励点较高（≥5000），请确认无误"
-    return {
-        "results": results,
-        "summary": {
-            "total_reward_points": total_reward_points,
-            "high_value_task_ids": high_value_task_ids[:50],
-            "warning": warn,
-        },
-    }
+    results, summary, hooks_enqueued = _batch_confirm.confirm_tasks_bulk(db, uid, body.task_ids or [])
+    if hooks_enqueued:
+        background_tasks.add_task(_batch_confirm.run_task_completed_hooks)
+    return {"results": results, "summary": summary}
+
+
 @router.get("/tasks/{task_id}")
 async def get_task_by_id(
     task_id: int,
@@ -2047,67 +2053,37 @@ async def get_task_by_id(
 
 
 @router.get("/tasks/{task_id}/comments")
-def list_task_comments(task_id: int, db: Session = Depends(get_db)):
-    """任务评论列表（公开）。"""
-    task = db.query(Task).filter(Task.id == task_id).first()
+def list_task_comments(
+    task_id: int,
+    before_id: Optional[int] = Query(default=None),
+    limit: int = THREAD_PAGE_DEFAULT,
+    db: Session = Depends(get_db),
+):
+    """任务评论列表（公开）。按时间正序返回最新 limit 条；`next_before_id` 非空时传作 `before_id` 取更早的评论。"""
+    task = db.query(Task.id).filter(Task.id == task_id).first()
     if not task:
         raise HTTPException(status_code=404, detail="任务不存在")
-    comments = db.query(TaskComment).filter(TaskComment.task_id == task_id).order_by(TaskComment.created_at.asc()).all()
-    out = []
-    for c in comments:
-        user = db.query(User).filter(User.id == c.user_id).first()
-        agent = db.query(Agent).filter(Agent.id == c.agent_id).first() if getattr(c, "agent_id", None) else None
-        out.append({
-            "id": c.id,
-            "task_id": c.task_id,
-            "user_id": c.user_id,
-            "author_name": user.username if user else "",
-            "agent_id": getattr(c, "agent_id", None),
-            "agent_name": agent.name if agent else None,
-            "kind": getattr(c, "kind", None) or "message",
-            "content": c.content,
-            "created_at": iso_utc(c.created_at),
-        })
-    return {"comments": out}
+    out, next_before_id = load_task_thread(db, task_id, before_id=before_id, limit=limit)
+    return {"comments": out, "next_before_id": next_before_id}
 @router.get("/forum/recent-posts")
 def forum_recent_posts(
     skip: int = 0,
     limit: int = 50,
+    before_id: Optional[int] = Query(default=None),
     db: Session = Depends(get_db),
 ):
-    """Recent task comments for Agent Forum feed (public read). Reuses task comments as discussion threads."""
-    total = db.query(TaskComment).count()
-    rows = (
-        db.query(TaskComment)
-        .order_by(desc(TaskComment.created_at))
-        .offset(skip)
-        .limit(min(limit, 100))
-        .all()
-    )
-    items = []
-    for c in rows:
-        task = db.query(Task).filter(Task.id == c.task_id).first()
-        user = db.query(User).filter(User.id == c.user_id).first()
-        agent = db.query(Agent).filter(Agent.id == c.agent_id).first() if getattr(c, "agent_id", None) else None
-        items.append({
-            "comment": {
-                "id": c.id,
-                "task_id": c.task_id,
-                "user_id": c.user_id,
-                "author_name": user.username if user else "",
-                "agent_id": getattr(c, "agent_id", None),
-                "agent_name": agent.name if agent else None,
-                "kind": getattr(c, "kind", None) or "message",
-                "content": c.content,
-                "created_at": iso_utc(c.created_at),
-            },
-            "task": {
-                "id": task.id if task else c.task_id,
-                "title": (task.title or "") if task else "",
-                "status": (task.status or "") if task else "",
-            },
-        })
-    return {"items": items, "total": total, "skip": skip, "limit": len(items)}
+    """Recent task comments for Agent Forum feed (public read). Reuses task comments as discussion threads.
+
+    Pass `next_before_id` back as `before_id` to page without offsets; `total` is cached briefly.
+    """
+    items, next_before_id = load_recent_posts(db, skip=skip, limit=max(1, min(limit, 100)), before_id=before_id)
+    return {
+        "items": items,
+        "total": cached_comment_count(db),
+        "skip": skip,
+        "limit": len(items),
+        "next_before_id": next_before_id,
+    }
 @router.post("/tasks/{task_id}/comments")
 def post_task_comment(
     task_id: int,
@@ -2230,33 +2206,23 @@ def a2a_post_message(
 @router.get("/a2a/tasks/{task_id}/messages")
 def a2a_list_messages(
     task_id: int,
+    before_id: Optional[int] = Query(default=None),
+    limit: int = THREAD_PAGE_DEFAULT,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user),
 ):
-    """A2A：拉取任务下的留言/状态更新。需登录且为任务发布者或接取者。"""
+    """A2A：拉取任务下的留言/状态更新。需登录且为任务发布者或接取者。
+
+    按时间正序返回最新 limit 条；`next_before_id` 非空时传作 `before_id` 继续向前翻页。
+    """
     uid = int(current_user["user_id"])
     task = db.query(Task).filter(Task.id == task_id).first()
     if not task:
         raise HTTPException(status_code=404, detail="任务不存在")
     if not a2a_can_access_task(task, uid, db):
         raise HTTPException(status_code=403, detail="无权查看该任务留言")
-    comments = db.query(TaskComment).filter(TaskComment.task_id == task_id).order_by(TaskComment.created_at.asc()).all()
-    out = []
-    for c in comments:
-        agent = db.query(Agent).filter(Agent.id == c.agent_id).first() if getattr(c, "agent_id", None) else None
-        user = db.query(User).filter(User.id == c.user_id).first()
-        out.append({
-            "id": c.id,
-            "task_id": c.task_id,
-            "user_id": c.user_id,
-            "author_name": user.username if user else "",
-            "agent_id": getattr(c, "agent_id", None),
-            "agent_name": agent.name if agent else None,
-            "kind": getattr(c, "kind", None) or "message",
-            "content": c.content,
-            "created_at": iso_utc(c.created_at),
-        })
-    return {"messages": out}
+    out, next_before_id = load_task_thread(db, task_id, before_id=before_id, limit=limit)
+    return {"messages": out, "next_before_id": next_before_id}
 @router.post("/tasks/{task_id}/execute")
 async def execute_task(
     task_id: str,
@@ -2432,19 +2398,15 @@ def list_task_runs(
     return {"items": [_replay.serialize_run(r) for r in rows]}
 
 
-@router.get("/tasks/{task_id}/runs/{run_id}/steps")
-def list_task_run_steps(
-    task_id: int,
-    run_id: str,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user),
-):
-    uid = int(current_user["user_id"])
+STEP_PAGE_MAX = 1000
+
+
+def _get_viewable_run(db: Session, task_id: int, run_id: str, uid: int, forbidden_detail: str) -> ExecutionRun:
     task = db.query(Task).filter(Task.id == int(task_id)).first()
     if not task:
         raise HTTPException(status_code=404, detail="任务不存在")
     if not can_view_task_runs(task, uid, db):
-        raise HTTPException(status_code=403, detail="无权查看该任务运行记录")
+        raise HTTPException(status_code=403, detail=forbidden_detail)
     run = (
         db.query(ExecutionRun)
         .filter(ExecutionRun.task_id == int(task_id), ExecutionRun.run_id == str(run_id))
@@ -2452,15 +2414,32 @@ def list_task_run_steps(
     )
     if not run:
         raise HTTPException(status_code=404, detail="运行记录不存在")
-    steps = (
-        db.query(ExecutionStep)
-        .filter(ExecutionStep.run_id == str(run_id))
-        .order_by(ExecutionStep.idx.asc())
-        .all()
-    )
+    return run
+
+
+@router.get("/tasks/{task_id}/runs/{run_id}/steps")
+def list_task_run_steps(
+    task_id: int,
+    run_id: str,
+    after_idx: Optional[int] = None,
+    limit: int = 200,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user),
+):
+    """分页读取运行步骤（按 idx 游标）：传上一页返回的 `next_after_idx` 继续翻页，为 null 时已到末尾。"""
+    uid = int(current_user["user_id"])
+    run = _get_viewable_run(db, task_id, run_id, uid, "无权查看该任务运行记录")
+    page = max(1, min(STEP_PAGE_MAX, int(limit or 200)))
+    q = db.query(ExecutionStep).filter(ExecutionStep.run_id == str(run_id))
+    if after_idx is not None:
+        q = q.filter(ExecutionStep.idx > int(after_idx))
+    steps = q.order_by(ExecutionStep.idx.asc()).limit(page + 1).all()
+    has_more = len(steps) > page
+    steps = steps[:page]
     return {
         "run": _replay.serialize_run(run),
         "steps": [_replay.serialize_step(s) for s in steps],
+        "next_after_idx": int(steps[-1].idx) if has_more else None,
     }
 
 
@@ -2471,33 +2450,36 @@ def export_task_run(
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user),
 ):
-    """将某次运行导出为 JSON 审计包。"""
+    """将某次运行导出为 NDJSON 审计包（流式）。
+
+    首行为 `{"type": "run", "task_id", "run", "exported_at"}`，其后每行一个 `{"type": "step", ...}`。
+    """
     uid = int(current_user["user_id"])
-    task = db.query(Task).filter(Task.id == int(task_id)).first()
-    if not task:
-        raise HTTPException(status_code=404, detail="任务不存在")
-    if not can_view_task_runs(task, uid, db):
-        raise HTTPException(status_code=403, detail="无权导出该任务运行记录")
-    run = (
-        db.query(ExecutionRun)
-        .filter(ExecutionRun.task_id == int(task_id), ExecutionRun.run_id == str(run_id))
-        .first()
-    )
-    if not run:
-        raise HTTPException(status_code=404, detail="运行记录不存在")
-    steps = (
-        db.query(ExecutionStep)
-        .filter(ExecutionStep.run_id == str(run_id))
-        .order_by(ExecutionStep.idx.asc())
-        .all()
-    )
-    return {
+    run_doc = _replay.serialize_run(_get_viewable_run(db, task_id, run_id, uid, "无权导出该任务运行记录"))
+    header = {
+        "type": "run",
         "task_id": int(task_id),
-        "run": _replay.serialize_run(run),
-        "steps": [_replay.serialize_step(s) for s in steps],
+        "run": run_doc,
         "exported_at": datetime.utcnow().isoformat() + "Z",
     }
 
+    def _lines():
+        from app.database.relational_db import SessionLocal
+
+        yield json.dumps(header, ensure_ascii=False) + "\n"
+        stream_db = SessionLocal()
+        try:
+            for st in _replay.iter_run_steps(stream_db, str(run_id)):
+                yield json.dumps({"type": "step", **_replay.serialize_step(st)}, ensure_ascii=False, default=str) + "\n"
+        finally:
+            stream_db.close()
+
+    return StreamingResponse(
+        _lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="run_{run_id}.ndjson"'},
+    )
+
 
 @router.post("/tasks/send-unpicked-reminders")
 def send_unpicked_reminders(
@@ -2505,60 +2487,27 @@ def send_unpicked_reminders(
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user),
 ):
-    """扫描发布超过 24h 且尚无人接取的任务，给发布方发站内提醒信。
+    """扫描发布超过 24h 且尚无人接取的任务，给发布方发站内提醒信（手动触发一批）。
 
-    - 每个任务只提醒一次（`input_data.reminder_24h_sent = true` 标记防重）。
+    - 每个任务只提醒一次（`reminder_sent_at` 标记防重）；调度器任务 `unpicked_reminders` 会周期执行同样逻辑。
     - `dry_run=true` 时只返回待提醒列表，不写入数据库。
     - 需要登录；平台内部 / cron 调用均可。
     """
-    from app.database.relational_db import InternalMessage
-    cutoff = datetime.utcnow() - timedelta(hours=24)
-    candidates = (
-        db.query(Task)
-        .filter(
-            Task.status == "open",
-            Task.agent_id.is_(None),
-            Task.created_at <= cutoff,
-        )
-        .all()
-    )
-    reminded: List[int] = []
-    skipped: List[int] = []
-    for task in candidates:
-        input_data = task.input_data if isinstance(task.input_data, dict) else {}
-        if input_data.get("reminder_24h_sent"):
-            skipped.append(task.id)
-            continue
-        reminded.append(task.id)
-        if dry_run:
-            continue
-        if task.owner_id:
-            db.add(InternalMessage(
-                sender_user_id=int(task.owner_id),
-                recipient_user_id=int(task.owner_id),
-                title=f"任务 #{task.id} 已超 24h 无人接取",
-                content=(
-                    f"你发布的任务「{task.title}」已发布超过 24 小时，尚未有 Agent 接取。\n"
-                    f"建议检查任务描述是否清晰、奖励点数是否合理，或手动邀请候选接单人。"
-                ),
-                related_task_id=task.id,
-            ))
-        new_data = dict(input_data)
-        new_data["reminder_24h_sent"] = True
-        new_data["reminder_24h_sent_at"] = datetime.utcnow().isoformat() + "Z"
-        task.input_data = new_data
-        flag_modified(task, "input_data")
-    if not dry_run and reminded:
-        try:
-            db.commit()
-        except Exception:
-            db.rollback()
-            raise HTTPException(status_code=500, detail="提醒写入失败")
+    from app.services.unpicked_reminders import count_already_reminded, send_unpicked_reminders as _send
+
+    _ = current_user
+    try:
+        got = _send(db, dry_run=dry_run)
+    except Exception:
+        db.rollback()
+        raise HTTPException(status_code=500, detail="提醒写入失败")
+    reminded = got["reminded_task_ids"]
     return {
         "dry_run": dry_run,
         "reminded_count": len(reminded),
-        "skipped_already_reminded": len(skipped),
+        "skipped_already_reminded": count_already_reminded(db),
         "reminded_task_ids": reminded,
+        "has_more": got["has_more"],
     }
 
 
@@ -355,24 +355,23 @@ def _validate_rfq_items(items: List[RfqItem]) -> None:
 
 
 def _safety_check_items(items: List[RfqItem], user_id: int) -> List[Dict[str, Any]]:
-    sanitized: List[Dict[str, Any]] = []
+    texts: List[Optional[str]] = []
     for it in items:
-        try:
-            t = _safety.sanitize_text(None, it.title, source="rfq", user_id=user_id) or it.title
-            d = (
-                _safety.sanitize_text(None, it.description, source="rfq", user_id=user_id)
-                or it.description
-            )
-            r = (
-                _safety.sanitize_text(None, it.requirements, source="rfq", user_id=user_id)
-                or it.requirements
-            )
-        except ValueError as e:
-            raise HTTPException(
-                status_code=400,
-                detail=f"内容安全策略：{str(e)}",
-            )
-        sanitized.append({"title": t, "description": d, "requirements": r})
+        texts.extend([it.title, it.description, it.requirements])
+    try:
+        safe = _safety.sanitize_texts(texts, source="rfq", user_id=user_id)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"内容安全策略：{str(e)}",
+        )
+    sanitized: List[Dict[str, Any]] = []
+    for i, it in enumerate(items):
+        sanitized.append({
+            "title": safe[3 * i] or it.title,
+            "description": safe[3 * i + 1] or it.description,
+            "requirements": safe[3 * i + 2] or it.requirements,
+        })
     return sanitized
 
 
@@ -0,0 +1,15 @@
+"""Health check schemas."""
+from datetime import datetime
+from typing import Any, Dict, List
+
+from pydantic import BaseModel, Field
+
+
+class HealthStatus(BaseModel):
+    """Aggregated result of one health check round."""
+    overall_status: str
+    components: List[str] = Field(default_factory=list)
+    metrics: Dict[str, Any] = Field(default_factory=dict)
+    messages: Dict[str, str] = Field(default_factory=dict)
+    anomalies: List[Dict[str, Any]] = Field(default_factory=list)
+    last_check: datetime
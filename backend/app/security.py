@@ -11,20 +11,19 @@ from fastapi.security import OAuth2PasswordBearer
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
-import bcrypt
 
-# Password hashing (bcrypt 72-byte limit; direct bcrypt to avoid passlib compat issues)
+# Password hashing (bcrypt 72-byte limit; direct bcrypt to avoid passlib compat issues).
+# Cost factor and the async, off-threadpool variants live in app.services.password_hashing.
+from app.services.password_hashing import hash_password_sync, verify_password_sync
 
-def _truncate_password(p: str) -> bytes:
-    return p.encode("utf-8")[:72]
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a plain password against a hashed password."""
-    return bcrypt.checkpw(_truncate_password(plain_password), hashed_password.encode("utf-8"))
+    return verify_password_sync(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    """Hash a password (truncated to 72 bytes for bcrypt)."""
-    return bcrypt.hashpw(_truncate_password(password), bcrypt.gensalt()).decode("utf-8")
+    """Hash a password (truncated to 72 bytes for bcrypt) with CLAWJOB_BCRYPT_ROUNDS."""
+    return hash_password_sync(password)
 
 # NOTE: translated comment in English.
 SECRET_KEY = os.getenv("JWT_SECRET", "clawjob-secret-key-change-in-production")
@@ -0,0 +1,178 @@
+"""
+Agent 公开案例库（agent_cases）：/agents/{agent_id}/cases 的只追加投影。
+
+- 写入：任务完成时（run_task_completed_side_effects / 批量验收）随结算事务追加一行摘要
+  （标题、发布者用户名、奖励、耗时、技能、结果摘要）；已完成任务不再变化，行写入后不更新。
+  定向任务（invited_agent_ids 非空）不进公开案例。
+- 读取：按 (completed_at, id) 倒序 keyset 分页（ix_agent_cases_agent_completed），游标为上一页
+  最后一行的 id；各页按 Agent 的案例版本号缓存 CLAWJOB_AGENT_CASES_TTL_SEC（默认一天），
+  追加新案例的事务提交后换新版本号，旧页自然过期。
+- 历史任务：scripts/backfill_agent_cases.py 按任务 id 分批调用 backfill_agent_cases 补齐。
+"""
+from __future__ import annotations
+
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, event, insert, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.database.relational_db import AgentCase, Task, User
+from app.services.platform_stats_cache import _cache_get, _cache_set
+from app.utils.datetime_iso import iso_utc
+
+CASES_TTL_SEC = max(60, int(os.getenv("CLAWJOB_AGENT_CASES_TTL_SEC", "86400")))
+CASES_VERSION_PREFIX = "clawjob:cases:ver:"
+CASES_PAGE_PREFIX = "clawjob:cases:page:"
+BACKFILL_BATCH = 500
+PAGE_MAX = 20
+SUMMARY_MAX = 320
+
+
+def _summary(t: Task) -> str:
+    out = t.output_data if isinstance(getattr(t, "output_data", None), dict) else {}
+    summary = (out.get("result_summary") or (t.description or "")).strip()
+    if len(summary) > SUMMARY_MAX:
+        summary = summary[: SUMMARY_MAX - 3] + "..."
+    return summary
+
+
+def _skill(t: Task) -> Optional[str]:
+    extra = t.input_data if isinstance(t.input_data, dict) else {}
+    skills = extra.get("skills")
+    if isinstance(skills, list):
+        for s in skills:
+            if str(s).strip():
+                return str(s).strip()[:64]
+    return getattr(t, "category", None)
+
+
+def _is_case(t: Task) -> bool:
+    return bool(t.agent_id) and not (getattr(t, "invited_agent_ids", None) or [])
+
+
+def record_cases(db: Session, tasks: Iterable[Task], *, completed_at: Optional[datetime] = None) -> int:
+    """为已完成的任务追加案例行（随调用方事务提交）；已有的跳过。返回新增行数。
+
+    completed_at 供以条件 UPDATE 完成、内存对象尚未刷新的调用方（批量验收）传入完成时间。
+    """
+    candidates = {t.id: t for t in tasks if _is_case(t)}
+    if not candidates:
+        return 0
+    existing = {
+        int(r[0]) for r in db.query(AgentCase.task_id).filter(AgentCase.task_id.in_(list(candidates))).all()
+    }
+    todo = [t for tid, t in sorted(candidates.items()) if tid not in existing]
+    if not todo:
+        return 0
+    owner_ids = {int(t.owner_id) for t in todo if t.owner_id}
+    names = dict(db.query(User.id, User.username).filter(User.id.in_(owner_ids)).all()) if owner_ids else {}
+    rows: List[Dict[str, Any]] = []
+    for t in todo:
+        done_at = completed_at or t.completed_at or t.updated_at or datetime.utcnow()
+        duration = int((done_at - t.created_at).total_seconds()) if t.created_at else None
+        rows.append({
+            "agent_id": int(t.agent_id),
+            "task_id": t.id,
+            "title": t.title,
+            "category": getattr(t, "category", None),
+            "skill": _skill(t),
+            "publisher_name": names.get(t.owner_id) or "",
+            "reward_points": int(getattr(t, "reward_points", 0) or 0),
+            "duration_seconds": max(0, duration) if duration is not None else None,
+            "summary": _summary(t),
+            "completed_at": done_at,
+        })
+    db.execute(insert(AgentCase), rows)
+    agent_ids = {r["agent_id"] for r in rows}
+    event.listen(db, "after_commit", lambda _s: _bump_versions(agent_ids), once=True)
+    return len(rows)
+
+
+def _version(agent_id: int) -> str:
+    version = _cache_get(f"{CASES_VERSION_PREFIX}{agent_id}")
+    if version is None:
+        version = _bump_versions([agent_id])
+    return str(version)
+
+
+def _bump_versions(agent_ids: Iterable[int]) -> str:
+    version = str(time.time_ns())
+    for aid in agent_ids:
+        _cache_set(f"{CASES_VERSION_PREFIX}{aid}", version, ttl=CASES_TTL_SEC)
+    return version
+
+
+def case_to_dict(c: AgentCase) -> Dict[str, Any]:
+    return {
+        "task_id": c.task_id,
+        "title": c.title,
+        "category": c.category,
+        "skill": c.skill,
+        "reward_points": int(c.reward_points or 0),
+        "publisher_name": c.publisher_name or "",
+        "duration_seconds": c.duration_seconds,
+        "completed_at": iso_utc(c.completed_at),
+        "summary": c.summary or "",
+    }
+
+
+def list_agent_cases(
+    db: Session, agent_id: int, *, cursor: Optional[str] = None, limit: int = 8
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """一页案例（新的在前），返回 (cases, next_cursor)；cursor 非法时抛 ValueError。"""
+    limit = max(1, min(int(limit or 8), PAGE_MAX))
+    after = int(cursor) if cursor else None
+    key = f"{CASES_PAGE_PREFIX}{int(agent_id)}:{_version(int(agent_id))}:{after or ''}:{limit}"
+    cached = _cache_get(key)
+    if isinstance(cached, dict):
+        return cached["cases"], cached["next_cursor"]
+    q = db.query(AgentCase).filter(AgentCase.agent_id == int(agent_id))
+    if after is not None:
+        ts = (
+            db.query(AgentCase.completed_at)
+            .filter(AgentCase.id == after, AgentCase.agent_id == int(agent_id))
+            .scalar_subquery()
+        )
+        q = q.filter(or_(AgentCase.completed_at < ts, and_(AgentCase.completed_at == ts, AgentCase.id < after)))
+    rows = q.order_by(AgentCase.completed_at.desc(), AgentCase.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    cases = [case_to_dict(r) for r in rows]
+    next_cursor = str(rows[-1].id) if has_more and rows else None
+    _cache_set(key, {"cases": cases, "next_cursor": next_cursor}, ttl=CASES_TTL_SEC)
+    return cases, next_cursor
+
+
+def backfill_agent_cases(db: Session, *, after_id: int = 0, limit: int = BACKFILL_BATCH) -> Dict[str, int]:
+    """为 id > after_id 的一批已完成任务补写案例；返回 scanned / inserted / next_after_id（0 表示结束）。"""
+    tasks = (
+        db.query(Task)
+        .filter(Task.id > int(after_id), Task.status == "completed", Task.agent_id.isnot(None))
+        .order_by(Task.id.asc())
+        .limit(max(1, int(limit)))
+        .all()
+    )
+    if not tasks:
+        return {"scanned": 0, "inserted": 0, "next_after_id": 0}
+    try:
+        inserted = record_cases(db, tasks)
+        db.commit()
+    except IntegrityError:
+        # 与在线完成并发写入了同一任务：逐单重试，已存在的跳过
+        db.rollback()
+        inserted = 0
+        for t in tasks:
+            try:
+                inserted += record_cases(db, [t])
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+    return {
+        "scanned": len(tasks),
+        "inserted": inserted,
+        "next_after_id": tasks[-1].id if len(tasks) >= max(1, int(limit)) else 0,
+    }
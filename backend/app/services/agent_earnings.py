@@ -0,0 +1,183 @@
+"""
+Agent 收益快照（agent_earnings）：/agents/{agent_id}/earnings-summary 的主键读。
+
+- 累加：pay_task_reward / credit_executor_points 入账时加 credited_points，任务完成副作用里加
+  tasks_completed / points_earned；批量验收按 Agent 汇总后一条 executemany。均为
+  ``col = col + n`` 的条件 UPDATE，与结算同一事务提交。快照行在 Agent 插入时同事务建立
+  （relational_db._create_agent_earnings_row），只有上线前的老 Agent 会缺行，此时累加跳过。
+- 读取：主键读快照；老 Agent 行尚未建立时从源表现算返回（不写库），由对账任务补建。
+- 对账：调度器任务 earnings_reconcile 按 agent id 分批，先对该批快照行加行锁（SELECT ... FOR UPDATE），
+  再用 tasks（完成单）与 credit_transactions（task_reward）分组重算并覆盖快照，记录漂移行数；
+  并发结算的累加在锁上排队，不会被覆盖丢失。游标存在缓存里，跑完一轮后从头开始。
+- 提现冻结 / 驳回退回作用在用户余额（users.credits / commission_balance，持行锁更新），
+  收益摘要按主键读用户行即可，不进本快照。
+"""
+from __future__ import annotations
+
+import logging
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, func, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.database.relational_db import Agent, AgentEarnings, CreditTransaction, Task
+from app.services.platform_stats_cache import _cache_get, _cache_set
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_BATCH = max(1, int(os.getenv("CLAWJOB_EARNINGS_RECONCILE_BATCH", "500")))
+RECONCILE_CURSOR_KEY = "clawjob:earnings:reconcile_cursor"
+
+
+def _bump(db: Session, rows: List[Dict[str, int]], **columns: str) -> None:
+    """对已有快照行执行 col = col + :param（executemany）；rows 每项含 b_agent_id 与各参数。"""
+    if not rows:
+        return
+    table = AgentEarnings.__table__
+    values = {col: getattr(table.c, col) + bindparam(param) for col, param in columns.items()}
+    db.execute(update(table).where(table.c.agent_id == bindparam("b_agent_id")).values(**values), rows)
+
+
+def record_credit(db: Session, agent_id: Optional[int], amount: int) -> None:
+    """执行方获得 task_reward 入账（随调用方事务提交）。"""
+    record_credits(db, {int(agent_id): int(amount)} if agent_id else {})
+
+
+def record_credits(db: Session, by_agent: Dict[int, int]) -> None:
+    _bump(
+        db,
+        [{"b_agent_id": aid, "b_amount": amt} for aid, amt in sorted(by_agent.items()) if amt],
+        credited_points="b_amount",
+    )
+
+
+def record_completions(db: Session, tasks: Iterable[Task]) -> None:
+    """任务完成：按 Agent 汇总完成单数与奖励点数。"""
+    totals: Dict[int, List[int]] = {}
+    for t in tasks:
+        if getattr(t, "agent_id", None):
+            acc = totals.setdefault(int(t.agent_id), [0, 0])
+            acc[0] += 1
+            acc[1] += int(getattr(t, "reward_points", 0) or 0)
+    _bump(
+        db,
+        [{"b_agent_id": aid, "b_count": c, "b_points": p} for aid, (c, p) in sorted(totals.items())],
+        tasks_completed="b_count",
+        points_earned="b_points",
+    )
+
+
+def _recompute(db: Session, agent_ids: List[int]) -> Dict[int, Tuple[int, int, int]]:
+    """从源表重算 {agent_id: (tasks_completed, points_earned, credited_points)}：两条分组查询。"""
+    out: Dict[int, Tuple[int, int, int]] = {aid: (0, 0, 0) for aid in agent_ids}
+    if not agent_ids:
+        return out
+    done = (
+        db.query(Task.agent_id, func.count(Task.id), func.coalesce(func.sum(Task.reward_points), 0))
+        .filter(Task.agent_id.in_(agent_ids), Task.status == "completed")
+        .group_by(Task.agent_id)
+        .all()
+    )
+    for aid, n, pts in done:
+        out[int(aid)] = (int(n or 0), int(pts or 0), 0)
+    credited = (
+        db.query(Task.agent_id, func.coalesce(func.sum(CreditTransaction.amount), 0))
+        .join(Task, Task.id == CreditTransaction.ref_id)
+        .filter(CreditTransaction.type == "task_reward", Task.agent_id.in_(agent_ids))
+        .group_by(Task.agent_id)
+        .all()
+    )
+    for aid, amt in credited:
+        n, pts, _ = out[int(aid)]
+        out[int(aid)] = (n, pts, int(amt or 0))
+    return out
+
+
+def get_agent_earnings(db: Session, agent: Agent) -> AgentEarnings:
+    """主键读快照；快照行尚未建立时从源表现算一个未入库的对象（不写库，由对账补建）。"""
+    row = db.get(AgentEarnings, int(agent.id))
+    if row is not None:
+        return row
+    n, pts, credited = _recompute(db, [int(agent.id)])[int(agent.id)]
+    return AgentEarnings(
+        agent_id=int(agent.id),
+        owner_id=agent.owner_id,
+        tasks_completed=n,
+        points_earned=pts,
+        credited_points=credited,
+    )
+
+
+def reconcile_agent_earnings(db: Session, *, after_id: int = 0, limit: int = RECONCILE_BATCH) -> Dict[str, int]:
+    """重算 id > after_id 的一批 Agent 的快照并覆盖；返回 checked / drifted / next_after_id（0 表示一轮结束）。"""
+    agents = (
+        db.query(Agent.id, Agent.owner_id)
+        .filter(Agent.id > int(after_id))
+        .order_by(Agent.id.asc())
+        .limit(max(1, int(limit)))
+        .all()
+    )
+    if not agents:
+        return {"checked": 0, "drifted": 0, "next_after_id": 0}
+    ids = [int(a) for a, _ in agents]
+    # 先锁快照行再重算：已提交的累加都已体现在源表里，锁等待中的累加在本事务提交后再叠加
+    rows = {
+        r.agent_id: r
+        for r in db.query(AgentEarnings)
+        .filter(AgentEarnings.agent_id.in_(ids))
+        .order_by(AgentEarnings.agent_id.asc())
+        .with_for_update()
+        .all()
+    }
+    fresh = _recompute(db, ids)
+    now = datetime.utcnow()
+    drifted = 0
+    for aid, owner_id in agents:
+        n, pts, credited = fresh[int(aid)]
+        row = rows.get(int(aid))
+        if row is None:
+            try:
+                with db.begin_nested():
+                    db.add(AgentEarnings(
+                        agent_id=int(aid), owner_id=owner_id, tasks_completed=n, points_earned=pts,
+                        credited_points=credited, reconciled_at=now,
+                    ))
+            except IntegrityError:
+                pass  # 并发对账已建立该行，下一轮再核对
+            continue
+        if (row.tasks_completed, row.points_earned, row.credited_points) != (n, pts, credited):
+            drifted += 1
+            logger.warning(
+                "agent_earnings drift agent=%s snapshot=%s ledger=%s",
+                aid, (row.tasks_completed, row.points_earned, row.credited_points), (n, pts, credited),
+            )
+            row.tasks_completed, row.points_earned, row.credited_points = n, pts, credited
+        row.owner_id = owner_id
+        row.reconciled_at = now
+    db.commit()
+    return {
+        "checked": len(ids),
+        "drifted": drifted,
+        "next_after_id": ids[-1] if len(ids) >= max(1, int(limit)) else 0,
+    }
+
+
+def run_earnings_reconciliation(db: Session, *, max_batches: int = 10) -> Dict[str, int]:
+    """调度器入口：从上次的游标继续对账若干批。"""
+    try:
+        cursor = int(_cache_get(RECONCILE_CURSOR_KEY) or 0)
+    except (TypeError, ValueError):
+        cursor = 0
+    checked = drifted = 0
+    for _ in range(max(1, max_batches)):
+        got = reconcile_agent_earnings(db, after_id=cursor)
+        checked += got["checked"]
+        drifted += got["drifted"]
+        cursor = got["next_after_id"]
+        if not cursor:
+            break
+    _cache_set(RECONCILE_CURSOR_KEY, cursor, ttl=7 * 86400)
+    return {"checked": checked, "drifted": drifted}
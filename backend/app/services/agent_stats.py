@@ -42,6 +42,29 @@ def on_task_completed(db: Session, task: Task) -> None:
     row.updated_at = datetime.utcnow()
 
 
+def on_tasks_completed(db: Session, tasks: list[Task]) -> None:
+    """Batch variant of on_task_completed: one lookup for all agents, one row update per agent."""
+    totals: dict[int, list[int]] = {}
+    for task in tasks:
+        aid = getattr(task, "agent_id", None)
+        if aid:
+            acc = totals.setdefault(int(aid), [0, 0])
+            acc[0] += 1
+            acc[1] += int(getattr(task, "reward_points", 0) or 0)
+    if not totals:
+        return
+    rows = get_stats_map(db, list(totals))
+    now = datetime.utcnow()
+    for aid, (count, points) in totals.items():
+        row = rows.get(aid)
+        if row is None:
+            row = AgentStats(agent_id=aid, completed_count=0, earned_points=0)
+            db.add(row)
+        row.completed_count = int(row.completed_count or 0) + count
+        row.earned_points = int(row.earned_points or 0) + points
+        row.updated_at = now
+
+
 def get_stats_map(db: Session, agent_ids: list[int]) -> dict[int, AgentStats]:
     if not agent_ids:
         return {}
@@ -0,0 +1,285 @@
+"""
+批量验收（POST /tasks/batch-confirm）的整批结算。
+
+- 一次查询取回本批候选任务（FOR UPDATE，按 id 排序加锁避免死锁），逐任务判定结果。
+- 普通待验收任务与 0 奖励 open 任务各用一条条件 UPDATE（status 仍为原状态才改为 completed）
+  占位，RETURNING 取回真正由本次完成的任务；并发验收抢先的任务报告 conflict。
+- 执行方所得按用户汇总：每个用户一条 credits = credits + n，发布方佣金一条 UPDATE；
+  逐任务的 CreditTransaction（含 balance_after）/ UserCommissionRecord 批量插入，流水粒度与逐单验收一致。
+  agent_stats / agent_earnings 快照按 Agent 汇总后各写一次，agent_cases 案例一次批量追加。
+- 社区闭环站内信与信誉缓存失效写一条 task_queue_jobs（enqueue_in_session，随结算一起提交），
+  响应返回后由 BackgroundTasks 处理；进程在此之前退出时由调度器任务 task_completed_hooks 补发。
+- 托管任务（里程碑放款）仍逐单走 apply_escrow_milestone_confirm，在整批提交之后处理。
+"""
+from __future__ import annotations
+
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Tuple
+
+from sqlalchemy import bindparam, func, insert, update
+from sqlalchemy.orm import Session
+
+from app.database.relational_db import (
+    Agent,
+    CreditTransaction,
+    SessionLocal,
+    Task,
+    User,
+    UserCommissionRecord,
+)
+from app.services import agent_cases as _cases
+from app.services import agent_earnings as _earnings
+from app.services.payout import invalidate_payout_aggregates_after_commit
+from app.services.task_queue import DbTaskQueue, enqueue_in_session
+
+logger = logging.getLogger(__name__)
+
+BATCH_CONFIRM_MAX = 500
+HIGH_VALUE_POINTS = 5000
+HOOKS_QUEUE = "task_completed_hooks"
+HOOKS_BATCH_LIMIT = max(1, int(os.getenv("CLAWJOB_TASK_HOOKS_BATCH", "20")))
+
+
+def _reward(task: Task) -> int:
+    return int(getattr(task, "reward_points", 0) or 0)
+
+
+def _summary(tasks: Iterable[Task]) -> Dict[str, Any]:
+    total = 0
+    high_value: List[int] = []
+    for t in tasks:
+        if t.status == "pending_verification":
+            total += _reward(t)
+            if _reward(t) >= HIGH_VALUE_POINTS:
+                high_value.append(t.id)
+    warn = None
+    if total >= 10000 or len(high_value) >= 3:
+        warn = "批量中含高额奖励任务，请逐条核对后再验收"
+    elif high_value:
+        warn = "部分任务奖励点较高（≥5000），请确认无误"
+    return {"total_reward_points": total, "high_value_task_ids": high_value[:50], "warning": warn}
+
+
+def _claim(db: Session, ids: List[int], from_status: str, now: datetime) -> set:
+    """条件 UPDATE 把仍处于 from_status 的任务改为 completed，返回实际改动的 id。"""
+    if not ids:
+        return set()
+    rows = db.execute(
+        update(Task)
+        .where(Task.id.in_(ids), Task.status == from_status)
+        .values(status="completed", completed_at=now)
+        .returning(Task.id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    return {int(r[0]) for r in rows}
+
+
+def _agent_owners(db: Session, tasks: List[Task]) -> Dict[int, int]:
+    agent_ids = {int(t.agent_id) for t in tasks if t.agent_id}
+    if not agent_ids:
+        return {}
+    return {int(a): int(o) for a, o in db.query(Agent.id, Agent.owner_id).filter(Agent.id.in_(agent_ids)).all()}
+
+
+def _pay_executors(db: Session, owner_id: int, tasks: List[Task], owners: Dict[int, int]) -> None:
+    """按用户汇总发放奖励与佣金：每个收款用户一条 UPDATE，流水逐任务批量插入。"""
+    from app.domain.task_helpers import PLATFORM_COMMISSION_RATE
+
+    credit_by_user: Dict[int, int] = {}
+    credit_by_agent: Dict[int, int] = {}
+    commission_total = 0
+    ledger: List[Dict[str, Any]] = []
+    commissions: List[Dict[str, Any]] = []
+    for t in tasks:
+        receiver_id = owners.get(int(t.agent_id)) if t.agent_id else None
+        if receiver_id is None:
+            continue
+        rp = _reward(t)
+        commission = int(rp * PLATFORM_COMMISSION_RATE)
+        amount = rp - commission
+        credit_by_user[int(receiver_id)] = credit_by_user.get(int(receiver_id), 0) + amount
+        credit_by_agent[int(t.agent_id)] = credit_by_agent.get(int(t.agent_id), 0) + amount
+        remark = f"完成任务 #{t.id} 获得 {amount} 任务点"
+        if commission > 0:
+            remark += f"（已配置佣金 {commission} 点）"
+        ledger.append(
+            {"user_id": int(receiver_id), "amount": amount, "type": "task_reward", "ref_id": t.id, "remark": remark}
+        )
+        if commission > 0:
+            commission_total += commission
+            commissions.append(
+                {"user_id": owner_id, "amount": commission, "task_id": t.id, "remark": f"任务 #{t.id} 佣金"}
+            )
+    if not ledger:
+        return
+    users = User.__table__
+    db.execute(
+        update(users)
+        .where(users.c.id == bindparam("b_user_id"))
+        .values(credits=func.coalesce(users.c.credits, 0) + bindparam("b_amount")),
+        [{"b_user_id": uid, "b_amount": amt} for uid, amt in sorted(credit_by_user.items())],
+    )
+    balances = dict(db.query(User.id, User.credits).filter(User.id.in_(list(credit_by_user))).all())
+    running = {uid: int(balances.get(uid) or 0) - amt for uid, amt in credit_by_user.items()}
+    for row in ledger:
+        running[row["user_id"]] += row["amount"]
+        row["balance_after"] = running[row["user_id"]]
+    db.execute(insert(CreditTransaction), ledger)
+    _earnings.record_credits(db, credit_by_agent)
+    invalidate_payout_aggregates_after_commit(db, credit_by_user)
+    if commissions:
+        db.execute(
+            update(users)
+            .where(users.c.id == owner_id)
+            .values(commission_balance=func.coalesce(users.c.commission_balance, 0) + commission_total)
+        )
+        db.execute(insert(UserCommissionRecord), commissions)
+
+
+def _grant_referrals(db: Session, tasks: List[Task], owners: Dict[int, int]) -> None:
+    """首单返点按执行方用户去重，每人只尝试一次（以其本批第一单为触发任务）。"""
+    from app.services import referrals as _rf
+
+    seen: set = set()
+    for t in tasks:
+        uid = owners.get(int(t.agent_id)) if t.agent_id and _reward(t) > 0 else None
+        if uid is None or uid in seen:
+            continue
+        seen.add(uid)
+        try:
+            _rf.grant_first_task_reward(db, invitee_user_id=int(uid), trigger_task_id=t.id)
+        except Exception:
+            pass
+
+
+def confirm_tasks_bulk(
+    db: Session,
+    owner_id: int,
+    task_ids: Iterable[int],
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any], bool]:
+    """整批验收 owner_id 发布的任务。返回 (逐任务结果, summary, 是否登记了完成钩子)。"""
+    from app.domain.task_helpers import maybe_settle_skill_revenue
+    from app.services import settlement as _settlement
+    from app.services.escrow_tasks import apply_escrow_milestone_confirm, get_escrow
+
+    ids = list(dict.fromkeys(int(i) for i in task_ids))[:BATCH_CONFIRM_MAX]
+    if not ids:
+        return [], _summary([]), False
+    tasks = (
+        db.query(Task)
+        .filter(Task.id.in_(ids), Task.owner_id == owner_id)
+        .order_by(Task.id)
+        .with_for_update()
+        .all()
+    )
+    by_id = {t.id: t for t in tasks}
+    summary = _summary(tasks)
+    results: Dict[int, Dict[str, Any]] = {}
+    payable: List[Task] = []
+    free_open: List[Task] = []
+    escrow: List[Task] = []
+    for task_id in ids:
+        t = by_id.get(task_id)
+        if t is None:
+            results[task_id] = {"task_id": task_id, "ok": False, "reason": "not_found_or_forbidden"}
+        elif t.status == "completed":
+            results[task_id] = {"task_id": task_id, "ok": True, "message": "already_completed"}
+        elif t.status == "pending_verification":
+            (escrow if get_escrow(t) else payable).append(t)
+        elif t.status == "open" and _reward(t) == 0:
+            free_open.append(t)
+        else:
+            results[task_id] = {"task_id": task_id, "ok": False, "reason": "not_pending_verification"}
+
+    now = datetime.utcnow()
+    won = _claim(db, [t.id for t in payable], "pending_verification", now)
+    won |= _claim(db, [t.id for t in free_open], "open", now)
+    for t in payable + free_open:
+        results[t.id] = {"task_id": t.id, "ok": True} if t.id in won else {"task_id": t.id, "ok": False, "reason": "conflict"}
+    paid = [t for t in payable if t.id in won]
+    completed = [t for t in payable + free_open if t.id in won]
+
+    if completed:
+        direct = [t for t in paid if _reward(t) > 0 and _settlement.get_settlement_mode(t) == "agent_direct"]
+        direct_ids = {t.id for t in direct}
+        owners = _agent_owners(db, paid)
+        _grant_referrals(db, paid, owners)
+        db.flush()
+        _pay_executors(db, owner_id, [t for t in paid if _reward(t) > 0 and t.id not in direct_ids], owners)
+        for t in direct:
+            _settlement.create_settlement_on_confirm(t, db)
+        from app.services import agent_stats as _agent_stats
+
+        _agent_stats.on_tasks_completed(db, completed)
+        _earnings.record_completions(db, completed)
+        _cases.record_cases(db, completed, completed_at=now)
+        enqueue_in_session(db, {"task_ids": [t.id for t in completed]}, queue=HOOKS_QUEUE)
+    skill_billed = [
+        t for t in paid
+        if isinstance(t.input_data, dict) and (t.input_data.get("related_skill_token") or "").strip()
+    ]
+    db.commit()
+
+    if completed:
+        try:
+            from app.services.platform_stats_cache import invalidate_platform_stats_cache
+
+            invalidate_platform_stats_cache()
+        except Exception:
+            pass
+        for t in skill_billed:
+            try:
+                maybe_settle_skill_revenue(t, db)
+                db.commit()
+            except Exception:
+                db.rollback()
+
+    for t in escrow:
+        try:
+            apply_escrow_milestone_confirm(t, db, auto=False)
+            db.commit()
+            results[t.id] = {"task_id": t.id, "ok": True}
+        except Exception as e:
+            db.rollback()
+            results[t.id] = {"task_id": t.id, "ok": False, "reason": str(e)}
+
+    return [results[i] for i in ids], summary, bool(completed)
+
+
+def _run_hooks(task_ids: List[int]) -> None:
+    from app.services import community_task_hooks as _ct_hooks
+    from app.services.reputation_hooks import touch_agent_reputation_for_task
+
+    db = SessionLocal()
+    try:
+        for task in db.query(Task).filter(Task.id.in_(task_ids)).order_by(Task.id).all():
+            _ct_hooks.on_task_completed_community_hooks(db, task)
+            try:
+                touch_agent_reputation_for_task(db, task)
+            except Exception:
+                pass
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def run_task_completed_hooks(limit: int = HOOKS_BATCH_LIMIT) -> Dict[str, int]:
+    """领取并处理最多 limit 条批量验收登记的完成钩子；失败按队列策略重试 / 死信。"""
+    queue = DbTaskQueue()
+    done = failed = 0
+    for job in queue.claim_sync(queue=HOOKS_QUEUE, limit=limit):
+        try:
+            _run_hooks([int(i) for i in (job.payload or {}).get("task_ids") or []])
+        except Exception as e:
+            logger.warning("task completed hooks failed job=%s: %s", job.id, e)
+            queue.fail_sync(job.id, str(e))
+            failed += 1
+            continue
+        queue.ack_sync(job.id)
+        done += 1
+    return {"done": done, "failed": failed}
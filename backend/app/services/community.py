@@ -22,6 +22,8 @@ from app.database.relational_db import (
     User,
 )
 
+BACKFILL_BATCH = 500
+
 
 _DEFAULT_TOPIC_TEMPLATES: Dict[str, List[Tuple[str, str]]] = {
     "development": [
@@ -199,6 +201,7 @@ def ensure_auto_topics_for_agent(
                 status="active",
                 auto_generated=True,
                 heat_score=0.0,
+                member_count=1,
             )
             db.add(topic)
             db.flush()
@@ -207,6 +210,55 @@ def ensure_auto_topics_for_agent(
     return created
 
 
+def record_topic_message(db: Session, topic_id: int, agent_id: int, *, at: Optional[datetime] = None) -> None:
+    """新消息已写入后调用：作者成为成员（已是成员则刷新 last_read_at），并累加话题上的冗余计数。"""
+    now = at or datetime.utcnow()
+    member = (
+        db.query(ChatTopicMember)
+        .filter(ChatTopicMember.topic_id == topic_id, ChatTopicMember.agent_id == agent_id)
+        .first()
+    )
+    joined = member is None
+    if joined:
+        db.add(ChatTopicMember(topic_id=topic_id, agent_id=agent_id, role="member", last_read_at=now))
+    else:
+        member.last_read_at = now
+    values = {ChatTopic.message_count: ChatTopic.message_count + 1, ChatTopic.last_message_at: now}
+    if joined:
+        values[ChatTopic.member_count] = ChatTopic.member_count + 1
+    db.query(ChatTopic).filter(ChatTopic.id == topic_id).update(values, synchronize_session=False)
+
+
+def backfill_topic_counters(db: Session, *, after_id: int = 0, limit: int = BACKFILL_BATCH) -> Dict[str, int]:
+    """从 chat_messages / chat_topic_members 重算 id > after_id 的一批话题的冗余计数（老数据一次性补齐，
+    见 scripts/backfill_topic_counters.py）；返回 updated / next_after_id（0 表示结束）。"""
+    ids = [
+        int(r[0])
+        for r in db.query(ChatTopic.id)
+        .filter(ChatTopic.id > int(after_id))
+        .order_by(ChatTopic.id.asc())
+        .limit(max(1, int(limit)))
+        .all()
+    ]
+    if not ids:
+        return {"updated": 0, "next_after_id": 0}
+    msg_count = (
+        db.query(func.count(ChatMessage.id)).filter(ChatMessage.topic_id == ChatTopic.id).scalar_subquery()
+    )
+    last_at = (
+        db.query(func.max(ChatMessage.created_at)).filter(ChatMessage.topic_id == ChatTopic.id).scalar_subquery()
+    )
+    members = (
+        db.query(func.count(ChatTopicMember.id)).filter(ChatTopicMember.topic_id == ChatTopic.id).scalar_subquery()
+    )
+    db.query(ChatTopic).filter(ChatTopic.id >= ids[0], ChatTopic.id <= ids[-1]).update(
+        {ChatTopic.message_count: msg_count, ChatTopic.last_message_at: last_at, ChatTopic.member_count: members},
+        synchronize_session=False,
+    )
+    db.commit()
+    return {"updated": len(ids), "next_after_id": ids[-1] if len(ids) >= max(1, int(limit)) else 0}
+
+
 def recompute_topic_heat(db: Session, topic_id: int) -> float:
     comments = db.query(ChatMessage).filter(ChatMessage.topic_id == topic_id).all()
     if not comments:
@@ -271,7 +323,7 @@ def hot_topics_with_replies(db: Session, *, limit: int = 20) -> List[dict]:
             "title": t.title,
             "skill_tag": t.skill_tag,
             "heat_score": float(t.heat_score or 0.0),
-            "message_count": db.query(func.count(ChatMessage.id)).filter(ChatMessage.topic_id == t.id).scalar() or 0,
+            "message_count": int(t.message_count or 0),
             "top_replies": [
                 {
                     "id": m.id,
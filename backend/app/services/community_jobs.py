@@ -1,11 +1,11 @@
 """
 后台定时任务：社区话题热度批量刷新 + 热议站内信分发。
 
-由 main.py lifespan 启动；可通过环境变量关闭或调整间隔。
+由 app.services.scheduler 注册为周期任务 community_tick（集群内单实例执行）；
+可通过环境变量关闭或调整间隔。
 """
 from __future__ import annotations
 
-import asyncio
 import logging
 import os
 
@@ -52,14 +52,3 @@ def run_community_tick() -> None:
         db.rollback()
     finally:
         db.close()
-
-
-async def run_community_background_loop(stop: asyncio.Event) -> None:
-    interval = int(os.getenv("CLAWJOB_COMMUNITY_DISPATCH_INTERVAL_SEC", "900"))
-    interval = max(60, interval)
-    while not stop.is_set():
-        try:
-            await asyncio.wait_for(stop.wait(), timeout=interval)
-            return
-        except asyncio.TimeoutError:
-            await asyncio.to_thread(run_community_tick)
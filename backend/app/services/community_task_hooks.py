@@ -5,7 +5,6 @@
 from __future__ import annotations
 
 import os
-from datetime import datetime
 from typing import Optional, Tuple
 
 from sqlalchemy import desc
@@ -17,7 +16,6 @@ from app.database.relational_db import (
     Agent,
     ChatMessage,
     ChatTopic,
-    ChatTopicMember,
     InternalMessage,
     Task,
 )
@@ -122,15 +120,7 @@ def _maybe_auto_post_closure(db: Session, task: Task, skill_tag: str, link: str)
     )
     db.add(msg)
     db.flush()
-    member = (
-        db.query(ChatTopicMember)
-        .filter(ChatTopicMember.topic_id == topic.id, ChatTopicMember.agent_id == author.id)
-        .first()
-    )
-    if not member:
-        db.add(ChatTopicMember(topic_id=topic.id, agent_id=author.id, role="member", last_read_at=datetime.utcnow()))
-    else:
-        member.last_read_at = datetime.utcnow()
+    _community.record_topic_message(db, topic.id, author.id)
     _community.recompute_topic_heat(db, topic.id)
 
 
@@ -237,15 +227,7 @@ def insert_skill_completion_post_message(
     )
     db.add(msg)
     db.flush()
-    member = (
-        db.query(ChatTopicMember)
-        .filter(ChatTopicMember.topic_id == topic.id, ChatTopicMember.agent_id == author_agent.id)
-        .first()
-    )
-    if not member:
-        db.add(ChatTopicMember(topic_id=topic.id, agent_id=author_agent.id, role="member", last_read_at=datetime.utcnow()))
-    else:
-        member.last_read_at = datetime.utcnow()
+    _community.record_topic_message(db, topic.id, author_agent.id)
     heat = _community.recompute_topic_heat(db, topic.id)
     db.flush()
     db.refresh(msg)
@@ -1,14 +1,58 @@
-"""Creator Studio dashboard aggregation for agent owners."""
+"""Creator Studio dashboard aggregation for agent owners.
+
+All figures come from grouped queries (one task scan for reputation inputs,
+one ``GROUP BY agent_id, status`` for pending work, one day-bucketed
+``GROUP BY`` over the window). Results are cached per owner for
+``CLAWJOB_CREATOR_STUDIO_CACHE_TTL_SEC`` seconds (default 60) and dropped by
+the task lifecycle hooks via :func:`invalidate_creator_studio_for_agents`.
+"""
 from __future__ import annotations
 
-from collections import defaultdict
+import os
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional
 
+from sqlalchemy import event, func
 from sqlalchemy.orm import Session
 
 from app.database.relational_db import Agent, Task
-from app.services.reputation import compute_agent_reputation
+from app.services.platform_stats_cache import _cache_get, _cache_set, invalidate_cache_key
+from app.services.reputation import compute_bulk_reputation_stats
+
+STUDIO_CACHE_TTL_SEC = max(5, int(os.getenv("CLAWJOB_CREATOR_STUDIO_CACHE_TTL_SEC", "60")))
+
+
+def _studio_key(user_id: int) -> str:
+    return f"clawjob:studio:owner:{int(user_id)}"
+
+
+def invalidate_creator_studio(user_id: Optional[int]) -> None:
+    if user_id is None:
+        return
+    invalidate_cache_key(_studio_key(int(user_id)))
+
+
+def invalidate_creator_studio_for_agents(db: Session, agent_ids: Iterable[Optional[int]]) -> None:
+    """Drop cached dashboards of the owners of ``agent_ids`` (one owner lookup).
+
+    The keys are dropped now (callers that already committed) and again on the
+    session's ``after_commit``, so a dashboard read racing an open settlement cannot
+    keep pre-commit totals cached for the full TTL.
+    """
+    ids = {int(a) for a in agent_ids if a}
+    if not ids:
+        return
+    try:
+        owner_ids = {r[0] for r in db.query(Agent.owner_id).filter(Agent.id.in_(ids)).distinct().all()}
+    except Exception:
+        return
+    _drop_studios(owner_ids)
+    event.listen(db, "after_commit", lambda _s: _drop_studios(owner_ids), once=True)
+
+
+def _drop_studios(owner_ids: Iterable[Optional[int]]) -> None:
+    for uid in owner_ids:
+        invalidate_creator_studio(uid)
 
 
 def _pct(values: List[Optional[float]]) -> Optional[float]:
@@ -18,15 +62,39 @@ def _pct(values: List[Optional[float]]) -> Optional[float]:
     return round(sum(nums) / len(nums), 4)
 
 
+def _day_bucket(db: Session, col):
+    """按天截断的 SQL 表达式（PostgreSQL date_trunc / SQLite date）。"""
+    try:
+        dialect = db.bind.dialect.name if db.bind is not None else ""
+    except Exception:
+        dialect = ""
+    if dialect == "postgresql":
+        return func.to_char(func.date_trunc("day", col), "YYYY-MM-DD")
+    return func.strftime("%Y-%m-%d", col)
+
+
 def compute_creator_studio(db: Session, user_id: int, days: int = 30) -> Dict[str, Any]:
     days = max(7, min(int(days or 30), 90))
+    key = _studio_key(user_id)
+    cached = _cache_get(key)
+    if isinstance(cached, dict) and isinstance(cached.get(str(days)), dict):
+        return cached[str(days)]
+    result = _compute_creator_studio(db, user_id, days)
+    entry = dict(cached) if isinstance(cached, dict) else {}
+    entry[str(days)] = result
+    _cache_set(key, entry, ttl=STUDIO_CACHE_TTL_SEC)
+    return result
+
+
+def _compute_creator_studio(db: Session, user_id: int, days: int) -> Dict[str, Any]:
     agents = (
-        db.query(Agent)
+        db.query(Agent.id, Agent.name)
         .filter(Agent.owner_id == int(user_id), Agent.is_active.is_(True))  # noqa: E712
         .order_by(Agent.id.asc())
         .all()
     )
-    agent_ids = [a.id for a in agents]
+    agent_ids = [int(a.id) for a in agents]
+    reps = compute_bulk_reputation_stats(db, agent_ids)
 
     agent_rows: List[Dict[str, Any]] = []
     total_completed = 0
@@ -38,7 +106,7 @@ def compute_creator_studio(db: Session, user_id: int, days: int = 30) -> Dict[st
     avg_hours_list: List[Optional[float]] = []
 
     for a in agents:
-        rep = compute_agent_reputation(db, a.id) or {}
+        rep = reps.get(int(a.id)) or {}
         stats = rep.get("stats") or {}
         completed = int(stats.get("completed_task_count", 0) or 0)
         earned = int(stats.get("reward_points_total", 0) or 0)
@@ -67,35 +135,34 @@ def compute_creator_studio(db: Session, user_id: int, days: int = 30) -> Dict[st
     pending_delivery = 0
     pending_verification = 0
     if agent_ids:
-        pending_delivery = (
-            db.query(Task)
-            .filter(Task.agent_id.in_(agent_ids), Task.status == "in_progress")
-            .count()
-        )
-        pending_verification = (
-            db.query(Task)
-            .filter(Task.agent_id.in_(agent_ids), Task.status == "pending_verification")
-            .count()
-        )
+        for _aid, status, n in (
+            db.query(Task.agent_id, Task.status, func.count(Task.id))
+            .filter(Task.agent_id.in_(agent_ids), Task.status.in_(("in_progress", "pending_verification")))
+            .group_by(Task.agent_id, Task.status)
+            .all()
+        ):
+            if status == "in_progress":
+                pending_delivery += int(n)
+            else:
+                pending_verification += int(n)
 
     since = datetime.utcnow() - timedelta(days=days)
-    by_date: Dict[str, Dict[str, int]] = defaultdict(lambda: {"rewards": 0, "tasks": 0})
+    by_date: Dict[str, Dict[str, int]] = {}
     if agent_ids:
-        completed_tasks = (
-            db.query(Task)
+        ts_col = func.coalesce(Task.completed_at, Task.updated_at)
+        day = _day_bucket(db, ts_col)
+        for d, n, rewards in (
+            db.query(day, func.count(Task.id), func.coalesce(func.sum(Task.reward_points), 0))
             .filter(
                 Task.agent_id.in_(agent_ids),
                 Task.status == "completed",
+                ts_col >= since,
             )
+            .group_by(day)
             .all()
-        )
-        for t in completed_tasks:
-            ts = getattr(t, "completed_at", None) or getattr(t, "updated_at", None)
-            if not isinstance(ts, datetime) or ts < since:
-                continue
-            key = ts.strftime("%Y-%m-%d")
-            by_date[key]["tasks"] += 1
-            by_date[key]["rewards"] += int(getattr(t, "reward_points", 0) or 0)
+        ):
+            if d:
+                by_date[str(d)] = {"rewards": int(rewards or 0), "tasks": int(n or 0)}
 
     series: List[Dict[str, Any]] = []
     for i in range(days):
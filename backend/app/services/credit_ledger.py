@@ -0,0 +1,208 @@
+"""
+信用点流水（credit_transactions）的分页、余额检查点与对账。
+
+- 分页：GET /account/transactions 按 (created_at, id) 倒序做 keyset 分页（ix_credit_tx_user_created_id），
+  游标为上一页最后一条的 id（其 created_at 按主键取回），翻页成本与页码无关；skip 仅为旧调用方保留。
+- balance_after：每条流水入账后的 users.credits，在 flush 时写入（见 relational_db._stamp_balance_after），
+  任意时刻的余额即该时刻之前最后一条流水的 balance_after。
+- 检查点：credit_balance_checkpoints 记录截至 last_tx_id 的流水合计；某用户自上个检查点起新增
+  CHECKPOINT_EVERY_ROWS 条，或有新流水且上个检查点已超过一天时写入新检查点。
+- 对账：按用户 id 分批，先对该批用户行加行锁（SELECT ... FOR UPDATE）再汇总流水，用「检查点 + 其后流水合计」
+  与 users.credits 比对，只报告不修改；入账在同一事务里改余额并写流水，持锁期间不会出现半提交的误报，
+  每批结束即提交释放锁；
+  调度器任务 ledger_checkpoints 周期执行，scripts/reconcile_credit_ledger.py 可手动跑全量。
+"""
+from __future__ import annotations
+
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from app.database.relational_db import CreditBalanceCheckpoint, CreditTransaction, User
+from app.services.platform_stats_cache import _cache_get, _cache_set
+
+CHECKPOINT_EVERY_ROWS = max(1, int(os.getenv("CLAWJOB_LEDGER_CHECKPOINT_ROWS", "1000")))
+CHECKPOINT_MAX_AGE = timedelta(days=1)
+RECONCILE_BATCH = max(1, int(os.getenv("CLAWJOB_LEDGER_RECONCILE_BATCH", "500")))
+RECONCILE_CURSOR_KEY = "clawjob:ledger:reconcile_cursor"
+PAGE_MAX = 200
+
+
+def encode_cursor(row: CreditTransaction) -> str:
+    return str(row.id)
+
+
+def decode_cursor(cursor: str) -> int:
+    """游标即上一页最后一条流水的 id；格式不对时抛 ValueError。"""
+    tx_id = int(cursor)
+    if tx_id <= 0:
+        raise ValueError(cursor)
+    return tx_id
+
+
+def tx_to_dict(r: CreditTransaction) -> Dict[str, Any]:
+    return {
+        "id": r.id,
+        "amount": r.amount,
+        "type": r.type,
+        "ref_id": r.ref_id,
+        "remark": r.remark,
+        "balance_after": r.balance_after,
+        "created_at": r.created_at.isoformat() if r.created_at else None,
+    }
+
+
+def list_ledger_page(
+    db: Session,
+    user_id: int,
+    *,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 50,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """按 (created_at, id) 倒序取一页流水，返回 (items, next_cursor)。"""
+    limit = max(1, min(int(limit or 50), PAGE_MAX))
+    q = db.query(CreditTransaction).filter(CreditTransaction.user_id == int(user_id))
+    if cursor:
+        # 游标行的 created_at 取库里原值（主键读），避免时间戳在各方言间序列化精度不一致。
+        tx_id = decode_cursor(cursor)
+        ts = (
+            db.query(CreditTransaction.created_at)
+            .filter(CreditTransaction.id == tx_id, CreditTransaction.user_id == int(user_id))
+            .scalar_subquery()
+        )
+        q = q.filter(
+            or_(
+                CreditTransaction.created_at < ts,
+                and_(CreditTransaction.created_at == ts, CreditTransaction.id < tx_id),
+            )
+        )
+    q = q.order_by(CreditTransaction.created_at.desc(), CreditTransaction.id.desc())
+    if not cursor:
+        q = q.offset(max(0, int(skip or 0)))
+    rows = q.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return [tx_to_dict(r) for r in rows], (encode_cursor(rows[-1]) if has_more and rows else None)
+
+
+def _latest_checkpoints(db: Session, user_ids: List[int]) -> Dict[int, CreditBalanceCheckpoint]:
+    newest = (
+        db.query(CreditBalanceCheckpoint.user_id, func.max(CreditBalanceCheckpoint.last_tx_id).label("last_tx_id"))
+        .filter(CreditBalanceCheckpoint.user_id.in_(user_ids))
+        .group_by(CreditBalanceCheckpoint.user_id)
+        .subquery()
+    )
+    rows = (
+        db.query(CreditBalanceCheckpoint)
+        .join(
+            newest,
+            and_(
+                CreditBalanceCheckpoint.user_id == newest.c.user_id,
+                CreditBalanceCheckpoint.last_tx_id == newest.c.last_tx_id,
+            ),
+        )
+        .all()
+    )
+    return {int(r.user_id): r for r in rows}
+
+
+def _ledger_since(db: Session, user_ids: List[int]) -> Dict[int, Tuple[int, int, int]]:
+    """各用户在其最新检查点之后的流水 {user_id: (条数, 合计, 最大 id)}：一条分组查询。"""
+    floor = func.coalesce(
+        db.query(func.max(CreditBalanceCheckpoint.last_tx_id))
+        .filter(CreditBalanceCheckpoint.user_id == CreditTransaction.user_id)
+        .correlate(CreditTransaction)
+        .scalar_subquery(),
+        0,
+    )
+    rows = (
+        db.query(
+            CreditTransaction.user_id,
+            func.count(CreditTransaction.id),
+            func.coalesce(func.sum(CreditTransaction.amount), 0),
+            func.max(CreditTransaction.id),
+        )
+        .filter(CreditTransaction.user_id.in_(user_ids), CreditTransaction.id > floor)
+        .group_by(CreditTransaction.user_id)
+        .all()
+    )
+    return {int(uid): (int(n or 0), int(total or 0), int(max_id or 0)) for uid, n, total, max_id in rows}
+
+
+def reconcile_credit_ledger(
+    db: Session,
+    *,
+    after_id: int = 0,
+    limit: int = RECONCILE_BATCH,
+    write_checkpoints: bool = True,
+    now: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """核对 id > after_id 的一批用户：users.credits 与流水余额不符的列入 mismatches；到期的写检查点。
+
+    该批用户行在读余额时加锁，流水汇总在锁内进行，并发入账排在本批之后；返回前提交以释放锁。
+    """
+    now = now or datetime.utcnow()
+    users = (
+        db.query(User.id, User.credits)
+        .filter(User.id > int(after_id))
+        .order_by(User.id.asc())
+        .limit(max(1, int(limit)))
+        .with_for_update()
+        .all()
+    )
+    if not users:
+        db.commit()
+        return {"checked": 0, "checkpoints": 0, "mismatches": [], "next_after_id": 0}
+    ids = [int(u) for u, _ in users]
+    checkpoints = _latest_checkpoints(db, ids)
+    since = _ledger_since(db, ids)
+    mismatches: List[Dict[str, int]] = []
+    written = 0
+    for uid, credits in users:
+        cp = checkpoints.get(int(uid))
+        n, total, max_id = since.get(int(uid), (0, 0, 0))
+        ledger_balance = (int(cp.balance) if cp else 0) + total
+        if ledger_balance != int(credits or 0):
+            mismatches.append({"user_id": int(uid), "credits": int(credits or 0), "ledger_balance": ledger_balance})
+        due = n >= CHECKPOINT_EVERY_ROWS or (
+            n > 0 and (cp is None or cp.created_at is None or now - cp.created_at >= CHECKPOINT_MAX_AGE)
+        )
+        if write_checkpoints and due:
+            db.add(CreditBalanceCheckpoint(
+                user_id=int(uid),
+                last_tx_id=max_id,
+                balance=ledger_balance,
+                tx_count=(int(cp.tx_count or 0) if cp else 0) + n,
+                created_at=now,
+            ))
+            written += 1
+    db.commit()
+    return {
+        "checked": len(ids),
+        "checkpoints": written,
+        "mismatches": mismatches,
+        "next_after_id": ids[-1] if len(ids) >= max(1, int(limit)) else 0,
+    }
+
+
+def run_ledger_checkpoints(db: Session, *, max_batches: int = 10) -> Dict[str, int]:
+    """调度器入口：从上次的游标继续核对若干批用户并写到期检查点。"""
+    try:
+        cursor = int(_cache_get(RECONCILE_CURSOR_KEY) or 0)
+    except (TypeError, ValueError):
+        cursor = 0
+    checked = written = mismatched = 0
+    for _ in range(max(1, max_batches)):
+        got = reconcile_credit_ledger(db, after_id=cursor)
+        checked += got["checked"]
+        written += got["checkpoints"]
+        mismatched += len(got["mismatches"])
+        cursor = got["next_after_id"]
+        if not cursor:
+            break
+    _cache_set(RECONCILE_CURSOR_KEY, cursor, ttl=7 * 86400)
+    return {"checked": checked, "checkpoints": written, "mismatched": mismatched}
@@ -14,6 +14,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy.orm.attributes import flag_modified
 
 from app.database.relational_db import Agent, CreditTransaction, Task, User, UserCommissionRecord
+from app.services.task_claims import TaskClaimConflict, transition_task_status
 
 
 PLATFORM_COMMISSION_RATE = 0.01  # 与 main.py 保持一致，分阶段按点数计提（运行时请用 _current_rate()）
@@ -141,6 +142,11 @@ def credit_executor_points(
             remark=remark,
         )
     )
+    from app.services import agent_earnings as _earnings
+    from app.services.payout import invalidate_payout_aggregates_after_commit
+
+    _earnings.record_credit(db, agent.id, amount_to_receiver)
+    invalidate_payout_aggregates_after_commit(db, [agent.owner_id])
     try:
         from app.services import referrals as _rf
         _rf.grant_first_task_reward(
@@ -189,6 +195,17 @@ def apply_escrow_milestone_confirm(
     if idx >= len(ms):
         raise RuntimeError("里程碑索引异常")
 
+    # 条件 UPDATE 抢占本次放款：手动验收 / 超时自动验收 / 管理员裁决并发时只有一个放款
+    fin = idx >= len(ms) - 1
+    db.flush()
+    if not transition_task_status(
+        db,
+        task.id,
+        from_statuses=("pending_verification",),
+        to_status="completed" if fin else "in_progress",
+    ):
+        raise TaskClaimConflict("当前里程碑已被确认")
+
     pts = escrow_milestone_points_at(escrow, idx)
     remark = (
         f"任务 #{task.id} 托管里程碑 {idx + 1}/{len(ms)} 放款 {pts} 点"
@@ -217,7 +234,6 @@ def apply_escrow_milestone_confirm(
 
     save_escrow_to_task(task, escrow)
 
-    fin = idx >= len(ms) - 1
     if fin:
         try:
             from app.domain.task_helpers import run_task_completed_side_effects
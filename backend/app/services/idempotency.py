@@ -0,0 +1,47 @@
+"""
+写接口幂等键（Idempotency-Key 请求头）。
+
+客户端重试同一请求时携带相同的键：首次成功的响应与业务写入同事务落库，
+后续重试直接返回该响应；并发重试由 (user_id, scope, key) 唯一约束兜底。
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from app.database.relational_db import IdempotencyKey
+
+MAX_KEY_LEN = 128
+
+
+def normalize_key(key: Optional[str]) -> Optional[str]:
+    k = (key or "").strip()
+    return k[:MAX_KEY_LEN] if k else None
+
+
+def lookup_response(db: Session, user_id: int, scope: str, key: Optional[str]) -> Optional[Dict[str, Any]]:
+    """返回该幂等键首次请求的响应；没有键或未命中时返回 None。"""
+    k = normalize_key(key)
+    if not k:
+        return None
+    row = (
+        db.query(IdempotencyKey)
+        .filter(
+            IdempotencyKey.user_id == int(user_id),
+            IdempotencyKey.scope == scope,
+            IdempotencyKey.key == k,
+        )
+        .first()
+    )
+    if not row:
+        return None
+    return dict(row.response or {})
+
+
+def remember_response(db: Session, user_id: int, scope: str, key: Optional[str], response: Dict[str, Any]) -> None:
+    """把响应登记到当前事务（调用方 commit）；没有键时为空操作。"""
+    k = normalize_key(key)
+    if not k:
+        return
+    db.add(IdempotencyKey(user_id=int(user_id), scope=scope, key=k, response=response))
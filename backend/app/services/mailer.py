@@ -0,0 +1,261 @@
+"""
+邮件子系统：事务内入队、响应后投递、复用 SMTP 连接。
+
+- 入队：queue_mail(db, ...) 把邮件写入 task_queue_jobs（queue="mail"），随调用方事务提交；
+  接口只做这一次插入，不再在请求内连接 SMTP。
+- 投递：deliver_pending_mail() 领取并发送，失败按任务队列的指数退避重试，超过次数进入死信。
+  接口通过 BackgroundTasks 在响应后立即触发一次，调度器任务 mail_delivery 负责重试与补发。
+- 传输（CLAWJOB_MAIL_TRANSPORT）：smtp | file | memory | none；默认配置了 SMTP_* 时为 smtp，否则 none。
+  smtp 使用小型连接池（CLAWJOB_SMTP_POOL_SIZE），空闲超过 CLAWJOB_SMTP_MAX_IDLE_SEC 的连接丢弃重连；
+  file 把每封邮件追加为一行 JSON 到 CLAWJOB_MAIL_SINK_DIR/outbox.jsonl，memory 保存在进程内（测试用）。
+- 限流：同一地址 CLAWJOB_MAIL_MIN_INTERVAL_SEC 内只允许入队一封（Redis SET NX EX，不可用时进程内）。
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue as _queue
+import smtplib
+import threading
+import time
+from datetime import datetime
+from email.mime.text import MIMEText
+from email.utils import formataddr
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.services.task_queue import DbTaskQueue, enqueue_in_session
+
+logger = logging.getLogger(__name__)
+
+MAIL_QUEUE = "mail"
+_THROTTLE_PREFIX = "clawjob:mail:throttle:"
+
+
+def _env_int(key: str, default: int, minimum: int = 0) -> int:
+    try:
+        return max(minimum, int(os.getenv(key, str(default)).strip()))
+    except (TypeError, ValueError):
+        return default
+
+
+def _smtp_config() -> Dict[str, Any]:
+    user = os.getenv("SMTP_USER", "").strip()
+    return {
+        "host": os.getenv("SMTP_HOST", "").strip(),
+        "port": int(os.getenv("SMTP_PORT", "0") or "0"),
+        "user": user,
+        "password": os.getenv("SMTP_PASSWORD", "").strip(),
+        "from_addr": os.getenv("SMTP_FROM", user or "noreply@clawjob.com").strip(),
+    }
+
+
+def transport_name() -> str:
+    name = os.getenv("CLAWJOB_MAIL_TRANSPORT", "").strip().lower()
+    if name in ("smtp", "file", "memory", "none"):
+        return name
+    cfg = _smtp_config()
+    return "smtp" if cfg["host"] and cfg["port"] and cfg["user"] and cfg["password"] else "none"
+
+
+def mail_configured() -> bool:
+    return transport_name() != "none"
+
+
+# ---------------------------------------------------------------------------
+# Transports
+# ---------------------------------------------------------------------------
+
+
+class MemoryTransport:
+    def __init__(self):
+        self.outbox: List[Dict[str, Any]] = []
+
+    def send(self, message: Dict[str, Any]) -> None:
+        self.outbox.append(dict(message))
+
+
+class FileTransport:
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or os.getenv("CLAWJOB_MAIL_SINK_DIR", "").strip() or os.path.join("data", "mail")
+        self._lock = threading.Lock()
+
+    def send(self, message: Dict[str, Any]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        line = json.dumps({**message, "sent_at": datetime.utcnow().isoformat() + "Z"}, ensure_ascii=False)
+        with self._lock, open(os.path.join(self.directory, "outbox.jsonl"), "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class SmtpTransport:
+    """固定大小的 SMTP 连接池；连接在发送间复用，出错或空闲过久时丢弃。"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = config or _smtp_config()
+        self.timeout = _env_int("CLAWJOB_SMTP_TIMEOUT_SEC", 10, 1)
+        self.max_idle = _env_int("CLAWJOB_SMTP_MAX_IDLE_SEC", 60, 1)
+        self._pool: "_queue.LifoQueue" = _queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(_env_int("CLAWJOB_SMTP_POOL_SIZE", 2, 1))
+
+    def _connect(self) -> smtplib.SMTP:
+        cfg = self.config
+        if int(cfg["port"]) == 465:
+            conn = smtplib.SMTP_SSL(cfg["host"], int(cfg["port"]), timeout=self.timeout)
+        else:
+            conn = smtplib.SMTP(cfg["host"], int(cfg["port"]), timeout=self.timeout)
+            conn.starttls()
+        conn.login(cfg["user"], cfg["password"])
+        return conn
+
+    @staticmethod
+    def _close(conn) -> None:
+        try:
+            conn.quit()
+        except Exception:
+            pass
+
+    def _checkout(self) -> smtplib.SMTP:
+        while True:
+            try:
+                conn, last_used = self._pool.get_nowait()
+            except _queue.Empty:
+                return self._connect()
+            if time.monotonic() - last_used <= self.max_idle:
+                return conn
+            self._close(conn)
+
+    def send(self, message: Dict[str, Any]) -> None:
+        from_addr = self.config["from_addr"]
+        msg = MIMEText(message.get("body") or "", "plain", "utf-8")
+        msg["Subject"] = message.get("subject") or ""
+        msg["From"] = formataddr((message.get("from_name") or "ClawJob", from_addr))
+        msg["To"] = message["to"]
+        with self._slots:
+            conn = self._checkout()
+            try:
+                conn.sendmail(from_addr, [message["to"]], msg.as_string())
+            except Exception:
+                self._close(conn)
+                raise
+            self._pool.put((conn, time.monotonic()))
+
+    def close(self) -> None:
+        while True:
+            try:
+                conn, _ = self._pool.get_nowait()
+            except _queue.Empty:
+                return
+            self._close(conn)
+
+
+_TRANSPORT: Any = None
+_TRANSPORT_NAME: Optional[str] = None
+_TRANSPORT_LOCK = threading.Lock()
+
+
+def get_transport():
+    """按 CLAWJOB_MAIL_TRANSPORT 返回进程内单例（切换配置后重建）；none 时返回 None。"""
+    global _TRANSPORT, _TRANSPORT_NAME
+    name = transport_name()
+    with _TRANSPORT_LOCK:
+        if _TRANSPORT_NAME != name:
+            if isinstance(_TRANSPORT, SmtpTransport):
+                _TRANSPORT.close()
+            _TRANSPORT = {"smtp": SmtpTransport, "file": FileTransport, "memory": MemoryTransport}.get(name, lambda: None)()
+            _TRANSPORT_NAME = name
+        return _TRANSPORT
+
+
+# ---------------------------------------------------------------------------
+# Throttle
+# ---------------------------------------------------------------------------
+
+_LOCAL_THROTTLE: Dict[str, float] = {}
+_LOCAL_THROTTLE_LOCK = threading.Lock()
+
+
+def throttle_acquire(address: str, interval_sec: Optional[int] = None) -> int:
+    """占用该地址的发送名额：成功返回 0，否则返回还需等待的秒数。"""
+    interval = int(interval_sec if interval_sec is not None else _env_int("CLAWJOB_MAIL_MIN_INTERVAL_SEC", 60))
+    if interval <= 0:
+        return 0
+    key = _THROTTLE_PREFIX + (address or "").strip().lower()
+    try:
+        from app.database.cache_db import get_redis_cache
+
+        client = get_redis_cache().redis_client
+        if client.set(key, "1", nx=True, ex=interval):
+            return 0
+        return max(1, int(client.ttl(key) or interval))
+    except Exception:
+        pass
+    now = time.time()
+    with _LOCAL_THROTTLE_LOCK:
+        until = _LOCAL_THROTTLE.get(key, 0.0)
+        if until > now:
+            return max(1, int(until - now + 0.999))
+        _LOCAL_THROTTLE[key] = now + interval
+        if len(_LOCAL_THROTTLE) > 10000:
+            for k in [k for k, v in _LOCAL_THROTTLE.items() if v <= now]:
+                _LOCAL_THROTTLE.pop(k, None)
+    return 0
+
+
+def throttle_release(address: str) -> None:
+    """归还 throttle_acquire 占用的名额（调用方事务未提交成功、邮件不会发出时）。"""
+    key = _THROTTLE_PREFIX + (address or "").strip().lower()
+    try:
+        from app.database.cache_db import get_redis_cache
+
+        get_redis_cache().redis_client.delete(key)
+    except Exception:
+        pass
+    with _LOCAL_THROTTLE_LOCK:
+        _LOCAL_THROTTLE.pop(key, None)
+
+
+# ---------------------------------------------------------------------------
+# Queue + delivery
+# ---------------------------------------------------------------------------
+
+
+def queue_mail(db: Session, to: str, subject: str, body: str, *, kind: str = "generic") -> None:
+    """登记到调用方事务（outbox）；调用方 commit 后由 deliver_pending_mail 发送。"""
+    enqueue_in_session(
+        db,
+        {"to": to, "subject": subject, "body": body, "kind": kind},
+        queue=MAIL_QUEUE,
+        priority="high",
+        max_attempts=_env_int("CLAWJOB_MAIL_MAX_ATTEMPTS", 5, 1),
+    )
+
+
+def verification_mail(code: str) -> Dict[str, str]:
+    return {
+        "subject": os.getenv("EMAIL_VERIFICATION_SUBJECT", "ClawJob 注册验证码"),
+        "body": f"您的验证码是：{code}，5 分钟内有效。如非本人操作请忽略。",
+    }
+
+
+def deliver_pending_mail(limit: Optional[int] = None) -> Dict[str, int]:
+    """领取并发送最多 limit 封待发邮件；失败交给队列重试 / 死信。"""
+    transport = get_transport()
+    if transport is None:
+        return {"sent": 0, "failed": 0}
+    q = DbTaskQueue()
+    sent = failed = 0
+    for job in q.claim_sync(queue=MAIL_QUEUE, limit=limit or _env_int("CLAWJOB_MAIL_BATCH", 50, 1)):
+        try:
+            transport.send(job.payload)
+        except Exception as e:
+            outcome = q.fail_sync(job.id, f"{type(e).__name__}: {e}")
+            logger.warning("mail delivery failed job=%s to=%s outcome=%s: %s", job.id, job.payload.get("to"), outcome, e)
+            failed += 1
+            continue
+        q.ack_sync(job.id)
+        sent += 1
+    if sent:
+        logger.info("mail delivered: %d message(s)", sent)
+    return {"sent": sent, "failed": failed}
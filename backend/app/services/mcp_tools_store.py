@@ -1,12 +1,37 @@
-"""Persistence layer for MCP tool marketplace."""
+"""Persistence layer for MCP tool marketplace.
+
+Listing is one PublishedMcpTool/User outer join; /mcp-tools pages by keyset on id
+(``cursor_id``) with category / tag filters served by ix_mcp_tools_category_id and
+ix_mcp_tool_tags_tag_tool.  Slugs are allocated by inserting and letting the unique
+constraint reject collisions.
+
+The public catalog (GET /tools) is served from a versioned snapshot: publish_tool /
+delete_tool bump ``CATALOG_VERSION_KEY`` after commit, readers rebuild the snapshot for a
+new version with one joined query and reuse it (and the version as ETag) until the next
+change.  CLAWJOB_TOOL_CATALOG_TTL_SEC bounds staleness for writes that bypass this module.
+"""
 from __future__ import annotations
 
+import os
 import re
-from typing import Any, Dict, List, Optional
+import secrets
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
+from sqlalchemy import case, func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from app.database.relational_db import PublishedMcpTool, User
+from app.database.relational_db import McpToolTag, PublishedMcpTool, User
+from app.services.platform_stats_cache import _cache_get, _cache_set
+
+CATALOG_VERSION_KEY = "clawjob:tools:catalog_version"
+CATALOG_SNAPSHOT_PREFIX = "clawjob:tools:catalog:"
+CATALOG_LIMIT = 500
+CATALOG_TTL_SEC = max(10, int(os.getenv("CLAWJOB_TOOL_CATALOG_TTL_SEC", "300")))
+COUNTS_KEY_PREFIX = "clawjob:tools:counts:"
+SLUG_ATTEMPTS = 5
+MAX_TAGS = 10
 
 
 def _slugify(name: str) -> str:
@@ -14,23 +39,56 @@ def _slugify(name: str) -> str:
     return (slug or "tool")[:128]
 
 
-def _unique_slug(db: Session, base: str, author_user_id: int) -> str:
-    candidate = base[:128]
-    if not db.query(PublishedMcpTool).filter(PublishedMcpTool.tool_slug == candidate).first():
-        return candidate
-    suffix = f"u{author_user_id}-{base}"[:128]
-    if not db.query(PublishedMcpTool).filter(PublishedMcpTool.tool_slug == suffix).first():
-        return suffix
-    n = 2
-    while n < 1000:
-        alt = f"{suffix}-{n}"[:128]
-        if not db.query(PublishedMcpTool).filter(PublishedMcpTool.tool_slug == alt).first():
-            return alt
-        n += 1
-    raise ValueError("Could not allocate unique tool slug")
+def _slug_candidates(base: str, author_user_id: int, attempts: int = SLUG_ATTEMPTS):
+    """Slugs to try in order; the unique constraint on tool_slug decides, no pre-queries."""
+    yield base[:128]
+    suffix = f"u{author_user_id}-{base}"[:120]
+    yield suffix
+    for _ in range(max(0, attempts - 2)):
+        yield f"{suffix}-{secrets.token_hex(3)}"
+
+
+def normalize_tags(tags: Any) -> List[str]:
+    if not isinstance(tags, (list, tuple)):
+        return []
+    out: List[str] = []
+    for t in tags:
+        tag = re.sub(r"\s+", "-", str(t or "").strip().lower())[:64]
+        if tag and tag not in out:
+            out.append(tag)
+    return out[:MAX_TAGS]
+
+
+def _tags_by_tool(db: Session, tool_ids: List[int]) -> Dict[int, List[str]]:
+    if not tool_ids:
+        return {}
+    out: Dict[int, List[str]] = {}
+    rows = (
+        db.query(McpToolTag.tool_id, McpToolTag.tag)
+        .filter(McpToolTag.tool_id.in_(tool_ids))
+        .order_by(McpToolTag.tool_id, McpToolTag.tag)
+        .all()
+    )
+    for tool_id, tag in rows:
+        out.setdefault(int(tool_id), []).append(tag)
+    return out
+
+
+def tool_tags(db: Session, tool_id: int) -> List[str]:
+    return _tags_by_tool(db, [tool_id]).get(int(tool_id), [])
+
+
+def _replace_tags(db: Session, tool_id: int, tags: List[str]) -> None:
+    db.query(McpToolTag).filter(McpToolTag.tool_id == tool_id).delete(synchronize_session=False)
+    for tag in tags:
+        db.add(McpToolTag(tool_id=tool_id, tag=tag))
 
 
-def row_to_item(row: PublishedMcpTool, publisher_username: Optional[str] = None) -> Dict[str, Any]:
+def row_to_item(
+    row: PublishedMcpTool,
+    publisher_username: Optional[str] = None,
+    tags: Optional[List[str]] = None,
+) -> Dict[str, Any]:
     return {
         "id": row.id,
         "tool_slug": row.tool_slug,
@@ -48,10 +106,25 @@ def row_to_item(row: PublishedMcpTool, publisher_username: Optional[str] = None)
         "revenue_share_bp": int(row.revenue_share_bp or 7000),
         "author_user_id": row.author_user_id,
         "publisher_username": publisher_username,
+        "tags": list(tags or []),
         "source": "market",
     }
 
 
+def _listing_query(db: Session, *, category: Optional[str] = None, tag: Optional[str] = None):
+    q = db.query(PublishedMcpTool, User.username).outerjoin(User, User.id == PublishedMcpTool.author_user_id)
+    if tag:
+        q = q.join(McpToolTag, (McpToolTag.tool_id == PublishedMcpTool.id) & (McpToolTag.tag == tag))
+    if category:
+        q = q.filter(PublishedMcpTool.category == category)
+    return q
+
+
+def _to_items(db: Session, rows) -> List[Dict[str, Any]]:
+    tags = _tags_by_tool(db, [row.id for row, _ in rows])
+    return [row_to_item(row, username, tags.get(row.id)) for row, username in rows]
+
+
 def list_market_tools(
     db: Session,
     *,
@@ -59,22 +132,90 @@ def list_market_tools(
     limit: int = 100,
     category: Optional[str] = None,
 ) -> List[Dict[str, Any]]:
-    q = db.query(PublishedMcpTool).order_by(PublishedMcpTool.created_at.desc())
+    q = _listing_query(db, category=category).order_by(PublishedMcpTool.id.desc())
+    return _to_items(db, q.offset(skip).limit(limit).all())
+
+
+def list_market_tools_page(
+    db: Session,
+    *,
+    cursor_id: Optional[int] = None,
+    skip: int = 0,
+    limit: int = 50,
+    category: Optional[str] = None,
+    tag: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """Keyset page (newest first): rows with id < cursor_id.  Returns (items, next_cursor_id).
+
+    ``skip`` is an offset for legacy callers; cost grows with it, cursor_id does not.
+    """
+    q = _listing_query(db, category=category, tag=tag)
+    if cursor_id is not None:
+        q = q.filter(PublishedMcpTool.id < int(cursor_id))
+    rows = q.order_by(PublishedMcpTool.id.desc()).offset(skip).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return _to_items(db, rows), (rows[-1][0].id if has_more else None)
+
+
+def existing_slugs(db: Session, slugs: List[str]) -> set:
+    if not slugs:
+        return set()
+    return {s for (s,) in db.query(PublishedMcpTool.tool_slug).filter(PublishedMcpTool.tool_slug.in_(slugs)).all()}
+
+
+def market_counts(db: Session, *, category: Optional[str] = None, tag: Optional[str] = None) -> Dict[str, int]:
+    """{"total", "verified"} for the filter, cached per catalog version (so publish/delete reset it)."""
+    key = f"{COUNTS_KEY_PREFIX}{catalog_version()}:{category or ''}:{tag or ''}"
+    cached = _cache_get(key)
+    if isinstance(cached, dict):
+        return cached
+    q = db.query(
+        func.count(PublishedMcpTool.id),
+        func.coalesce(func.sum(case((PublishedMcpTool.verified.is_(True), 1), else_=0)), 0),
+    )
+    if tag:
+        q = q.join(McpToolTag, (McpToolTag.tool_id == PublishedMcpTool.id) & (McpToolTag.tag == tag))
     if category:
         q = q.filter(PublishedMcpTool.category == category)
-    rows = q.offset(skip).limit(limit).all()
-    out: List[Dict[str, Any]] = []
-    for row in rows:
-        pub_name = None
-        if row.author_user_id:
-            u = db.query(User).filter(User.id == row.author_user_id).first()
-            pub_name = u.username if u else None
-        out.append(row_to_item(row, pub_name))
-    return out
+    total, verified = q.one()
+    counts = {"total": int(total or 0), "verified": int(verified or 0)}
+    _cache_set(key, counts, ttl=CATALOG_TTL_SEC)
+    return counts
 
 
 def count_market_tools(db: Session) -> int:
-    return db.query(PublishedMcpTool).count()
+    return market_counts(db)["total"]
+
+
+def catalog_version() -> str:
+    version = _cache_get(CATALOG_VERSION_KEY)
+    if version is None:
+        version = bump_catalog_version()
+    return str(version)
+
+
+def bump_catalog_version() -> str:
+    """Start a new catalog generation; old snapshots simply expire."""
+    version = str(time.time_ns())
+    _cache_set(CATALOG_VERSION_KEY, version, ttl=CATALOG_TTL_SEC)
+    return version
+
+
+def get_catalog_snapshot(db_factory, category: Optional[str] = None) -> Tuple[List[Dict[str, Any]], str]:
+    """Return (market tools, version), newest CATALOG_LIMIT per category.  ``db_factory`` is only called on a cache miss."""
+    version = catalog_version()
+    key = f"{CATALOG_SNAPSHOT_PREFIX}{version}:{category or ''}"
+    cached = _cache_get(key)
+    if isinstance(cached, list):
+        return cached, version
+    db = db_factory()
+    try:
+        items = list_market_tools(db, limit=CATALOG_LIMIT, category=category)
+    finally:
+        db.close()
+    _cache_set(key, items, ttl=CATALOG_TTL_SEC)
+    return items, version
 
 
 def publish_tool(db: Session, author_user_id: int, config: dict) -> PublishedMcpTool:
@@ -89,6 +230,7 @@ def publish_tool(db: Session, author_user_id: int, config: dict) -> PublishedMcp
     rate_limit = int(config.get("rate_limit") or 100)
     version_tag = ((config.get("version_tag") or "v1").strip() or "v1")[:64]
     explicit_slug = (config.get("tool_slug") or "").strip()
+    tags = normalize_tags(config.get("tags")) if config.get("tags") is not None else None
 
     existing_by_name = (
         db.query(PublishedMcpTool)
@@ -103,29 +245,42 @@ def publish_tool(db: Session, author_user_id: int, config: dict) -> PublishedMcp
         existing_by_name.requires_auth = requires_auth
         existing_by_name.rate_limit = rate_limit
         existing_by_name.version_tag = version_tag
+        if tags is not None:
+            _replace_tags(db, existing_by_name.id, tags)
         db.commit()
         db.refresh(existing_by_name)
+        bump_catalog_version()
         return existing_by_name
 
-    base_slug = _slugify(explicit_slug or name)
-    tool_slug = _unique_slug(db, base_slug, author_user_id)
-
-    row = PublishedMcpTool(
-        tool_slug=tool_slug,
-        name=name,
-        description=description,
-        category=category,
-        parameters=parameters,
-        return_type=return_type,
-        requires_auth=requires_auth,
-        rate_limit=rate_limit,
-        author_user_id=author_user_id,
-        verified=False,
-        version_tag=version_tag,
-    )
-    db.add(row)
+    row = None
+    for tool_slug in _slug_candidates(_slugify(explicit_slug or name), author_user_id):
+        row = PublishedMcpTool(
+            tool_slug=tool_slug,
+            name=name,
+            description=description,
+            category=category,
+            parameters=parameters,
+            return_type=return_type,
+            requires_auth=requires_auth,
+            rate_limit=rate_limit,
+            author_user_id=author_user_id,
+            verified=False,
+            version_tag=version_tag,
+        )
+        db.add(row)
+        try:
+            db.flush()
+            break
+        except IntegrityError:
+            db.rollback()
+            row = None
+    if row is None:
+        raise ValueError("Could not allocate unique tool slug")
+    for tag in tags or []:
+        db.add(McpToolTag(tool_id=row.id, tag=tag))
     db.commit()
     db.refresh(row)
+    bump_catalog_version()
     return row
 
 
@@ -135,6 +290,8 @@ def delete_tool(db: Session, tool_id: int, user_id: int, *, is_superuser: bool =
         return False
     if not is_superuser and row.author_user_id != user_id:
         raise PermissionError("Not allowed to delete this tool")
+    db.query(McpToolTag).filter(McpToolTag.tool_id == row.id).delete(synchronize_session=False)
     db.delete(row)
     db.commit()
+    bump_catalog_version()
     return True
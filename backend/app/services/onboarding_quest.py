@@ -8,6 +8,10 @@ from sqlalchemy.orm import Session
 
 from app.database.relational_db import Task
 from app.domain.task_helpers import list_public_open_tasks
+from app.services.platform_stats_cache import _cache_get, _cache_set, invalidate_cache_key
+
+ONBOARDING_CACHE_KEY = "clawjob:onboarding:open_tasks"
+ONBOARDING_CACHE_TTL_SEC = max(5, int(os.getenv("CLAWJOB_ONBOARDING_CACHE_TTL_SEC", "300")))
 
 
 def _get_system_agent(db: Session):
@@ -114,9 +118,34 @@ def seed_onboarding_quest_tasks(db: Session, *, apply: bool) -> int:
         created += 1
     if apply:
         db.commit()
+        invalidate_onboarding_cache()
+        cached_onboarding_open_tasks(db)
     return created
 
 
+def invalidate_onboarding_cache() -> None:
+    invalidate_cache_key(ONBOARDING_CACHE_KEY)
+
+
+def peek_onboarding_open_tasks() -> List[Dict[str, Any]]:
+    """只读缓存（注册请求内不查库）；未命中返回空列表，由注册后续任务 / stats_warmup 重新预热。"""
+    cached = _cache_get(ONBOARDING_CACHE_KEY)
+    return cached if isinstance(cached, list) else []
+
+
+def cached_onboarding_open_tasks(db: Session) -> List[Dict[str, Any]]:
+    """开放新手任务的 id / 标题 / 奖励，缓存 CLAWJOB_ONBOARDING_CACHE_TTL_SEC 秒；未命中时查库并回填。"""
+    cached = _cache_get(ONBOARDING_CACHE_KEY)
+    if isinstance(cached, list):
+        return cached
+    rows = [
+        {"id": int(t.id), "title": t.title, "reward_points": int(getattr(t, "reward_points", 0) or 0)}
+        for t in list_onboarding_open_tasks(db)
+    ]
+    _cache_set(ONBOARDING_CACHE_KEY, rows, ttl=ONBOARDING_CACHE_TTL_SEC)
+    return rows
+
+
 def list_onboarding_open_tasks(db: Session) -> List[Task]:
     """返回当前开放的平台新手任务（按 quest_step 排序）。"""
     user, _ = _get_system_agent(db)
@@ -141,19 +170,19 @@ def _app_and_api_base() -> tuple[str, str]:
     return app_base, api_base
 
 
-def onboarding_tasks_for_register(db: Session, agent_id: int) -> Dict[str, Any]:
-    """注册响应用：task id 列表 + 深链。"""
-    tasks = list_onboarding_open_tasks(db)
+def onboarding_tasks_for_register(db: Optional[Session], agent_id: int) -> Dict[str, Any]:
+    """注册用：task id 列表 + 深链（仅深链按 agent_id 拼装）。db 为 None 时只读预热好的缓存。"""
+    tasks = cached_onboarding_open_tasks(db) if db is not None else peek_onboarding_open_tasks()
     app_base, api_base = _app_and_api_base()
-    ids = [int(t.id) for t in tasks]
+    ids = [int(t["id"]) for t in tasks]
     deep_links: List[Dict[str, Any]] = []
     for t in tasks:
-        tid = int(t.id)
+        tid = int(t["id"])
         deep_links.append(
             {
                 "task_id": tid,
-                "title": t.title,
-                "reward_points": int(getattr(t, "reward_points", 0) or 0),
+                "title": t["title"],
+                "reward_points": int(t.get("reward_points") or 0),
                 "app_url": f"{app_base}/#/tasks?highlight={tid}",
                 "api_subscribe": {
                     "method": "POST",
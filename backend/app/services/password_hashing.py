@@ -0,0 +1,177 @@
+"""
+密码哈希的专用执行器与登录失败锁定。
+
+bcrypt 每次计算数十到数百毫秒，若在 AnyIO 共享线程池（默认 40 线程）里执行，
+登录洪峰会饿死所有其它同步接口。这里把 hash / verify 放到独立的有界线程池
+（bcrypt 计算期间释放 GIL）；路由用 admission() 限制在途请求数，超过
+CLAWJOB_PASSWORD_HASH_MAX_PENDING 时抛 PasswordHashOverloaded，返回 503 + Retry-After 削峰。
+
+- 成本因子 CLAWJOB_BCRYPT_ROUNDS 可调；登录成功时若旧哈希成本不同则透明重新哈希。
+- 失败计数放在共享缓存（Redis，不可用时进程内）：连续失败达到 CLAWJOB_LOGIN_MAX_FAILURES
+  次后在 CLAWJOB_LOGIN_LOCKOUT_SEC 内直接拒绝，不再花 bcrypt 的 CPU。
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+import bcrypt
+
+from app.services.platform_stats_cache import _MEM, _cache_get, invalidate_cache_key
+
+
+def _env_int(key: str, default: int, minimum: int) -> int:
+    try:
+        return max(minimum, int(os.getenv(key, str(default)).strip()))
+    except (TypeError, ValueError):
+        return default
+
+
+BCRYPT_ROUNDS = min(16, _env_int("CLAWJOB_BCRYPT_ROUNDS", 12, 4))
+HASH_WORKERS = _env_int(
+    "CLAWJOB_PASSWORD_HASH_WORKERS",
+    min(4, len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)),
+    1,
+)
+MAX_PENDING = _env_int("CLAWJOB_PASSWORD_HASH_MAX_PENDING", 64, 1)
+HASH_NICE = _env_int("CLAWJOB_PASSWORD_HASH_NICE", 10, 0)
+LOGIN_MAX_FAILURES = _env_int("CLAWJOB_LOGIN_MAX_FAILURES", 5, 1)
+LOGIN_LOCKOUT_SEC = _env_int("CLAWJOB_LOGIN_LOCKOUT_SEC", 900, 1)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+class PasswordHashOverloaded(Exception):
+    """哈希执行器排队已满，调用方应返回 503。"""
+
+
+def _truncate_password(p: str) -> bytes:
+    return (p or "").encode("utf-8")[:72]
+
+
+def hash_password_sync(password: str, rounds: Optional[int] = None) -> str:
+    return bcrypt.hashpw(_truncate_password(password), bcrypt.gensalt(rounds=rounds or BCRYPT_ROUNDS)).decode("utf-8")
+
+
+def verify_password_sync(password: str, hashed: str) -> bool:
+    try:
+        return bcrypt.checkpw(_truncate_password(password), (hashed or "").encode("utf-8"))
+    except ValueError:
+        return False
+
+
+def hash_rounds(hashed: str) -> Optional[int]:
+    """从 ``$2b$12$...`` 中取出成本因子；格式不符时返回 None。"""
+    parts = (hashed or "").split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+def needs_rehash(hashed: str) -> bool:
+    return hash_rounds(hashed) != BCRYPT_ROUNDS
+
+
+def _lower_worker_priority() -> None:
+    """Linux 下 nice 是线程级的：降低哈希线程优先级，CPU 紧张时让请求处理线程先跑。"""
+    if HASH_NICE and hasattr(os, "setpriority") and hasattr(threading, "get_native_id"):
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), HASH_NICE)
+        except OSError:
+            pass
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=HASH_WORKERS, thread_name_prefix="pwhash", initializer=_lower_worker_priority
+                )
+    return _executor
+
+
+@contextmanager
+def admission():
+    """准入：整个登录 / 注册请求（含前置的数据库查询）占用一个排队名额，满了立即抛
+    PasswordHashOverloaded，这样被拒绝的请求不会先去占用共享线程池。"""
+    global _pending
+    with _pending_lock:
+        if _pending >= MAX_PENDING:
+            raise PasswordHashOverloaded()
+        _pending += 1
+    try:
+        yield
+    finally:
+        with _pending_lock:
+            _pending -= 1
+
+
+async def _run(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_get_executor(), fn, *args)
+
+
+async def hash_password(password: str) -> str:
+    return await _run(hash_password_sync, password)
+
+
+def _verify_and_upgrade(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    if not verify_password_sync(password, hashed):
+        return False, None
+    return True, (hash_password_sync(password) if needs_rehash(hashed) else None)
+
+
+async def verify_password(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """校验密码；通过且需要升级成本因子时一并返回新哈希（否则为 None）。"""
+    return await _run(_verify_and_upgrade, password, hashed)
+
+
+# ---------------------------------------------------------------------------
+# Failed-attempt lockout
+# ---------------------------------------------------------------------------
+
+
+def _failures_key(username: str) -> str:
+    return f"clawjob:auth:login_failures:{(username or '').strip().lower()}"
+
+
+def login_locked(username: str) -> bool:
+    return int(_cache_get(_failures_key(username)) or 0) >= LOGIN_MAX_FAILURES
+
+
+_failures_lock = threading.Lock()
+
+
+def record_login_failure(username: str) -> int:
+    """失败次数 +1 并把锁定窗口顺延 LOGIN_LOCKOUT_SEC：Redis 用 MULTI 里的 INCR + EXPIRE，
+    不可用时在进程内加锁计数，并发失败不会互相覆盖。"""
+    key = _failures_key(username)
+    try:
+        from app.database.cache_db import get_redis_cache
+
+        pipe = get_redis_cache().redis_client.pipeline(transaction=True)
+        pipe.incr(key)
+        pipe.expire(key, LOGIN_LOCKOUT_SEC)
+        n, _ = pipe.execute()
+        return int(n)
+    except Exception:
+        pass
+    with _failures_lock:
+        now = time.time()
+        exp, prev = _MEM.get(key, (0.0, 0))
+        n = (int(prev or 0) if now <= exp else 0) + 1
+        _MEM[key] = (now + LOGIN_LOCKOUT_SEC, n)
+    return n
+
+
+def reset_login_failures(username: str) -> None:
+    invalidate_cache_key(_failures_key(username))
@@ -1,16 +1,27 @@
-"""任务点 → 现金提现：可提现余额、冻结与驳回回退。"""
+"""任务点 → 现金提现：可提现余额、冻结与驳回回退。
+
+提现资格里的流水汇总（累计 / 近 30 天任务奖励、待审提现冻结额）在 SQL 里求和：
+任务奖励走 credit_transactions 上的 (user_id, type, created_at) 索引，按用户缓存
+CLAWJOB_PAYOUT_AGG_TTL_SEC 秒（默认 300），入账 / 提现申请 / 审批时失效。余额本身始终读用户行。
+"""
 from __future__ import annotations
 
 import json
 import os
-from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
+from sqlalchemy import case, event, func
 from sqlalchemy.orm import Session
 
 from app.database.relational_db import CreditTransaction, User, UserCommissionRecord, WithdrawalRequest
 from app.services import kyc as _kyc
+from app.services.platform_stats_cache import _cache_get, _cache_set, invalidate_cache_key
 
 HOLD_PREFIX = "__hold__:"
+AGG_KEY_PREFIX = "clawjob:payout:agg:"
+AGG_TTL_SEC = max(5, int(os.getenv("CLAWJOB_PAYOUT_AGG_TTL_SEC", "300")))
+EARNED_WINDOW_DAYS = 30
 
 
 def processing_time_hint_zh() -> str:
@@ -124,6 +135,49 @@ def refund_withdrawal_hold(
         )
 
 
+def invalidate_payout_aggregates(user_ids: Iterable[Optional[int]]) -> None:
+    """任务奖励入账、提现申请 / 审批后调用。"""
+    for uid in {int(u) for u in user_ids if u}:
+        invalidate_cache_key(f"{AGG_KEY_PREFIX}{uid}")
+
+
+def invalidate_payout_aggregates_after_commit(db: Session, user_ids: Iterable[Optional[int]]) -> None:
+    """入账与调用方事务一起提交时用：提交后再失效，避免并发读在提交前把旧汇总写回缓存。"""
+    ids = {int(u) for u in user_ids if u}
+    if ids:
+        event.listen(db, "after_commit", lambda _s: invalidate_payout_aggregates(ids), once=True)
+
+
+def payout_aggregates(db: Session, user_id: int) -> Dict[str, int]:
+    """{"task_reward_earned", "task_reward_earned_30d", "held_balance", "pending_withdrawals"}：两条聚合查询，按用户缓存。"""
+    key = f"{AGG_KEY_PREFIX}{int(user_id)}"
+    cached = _cache_get(key)
+    if isinstance(cached, dict):
+        return cached
+    since = datetime.utcnow() - timedelta(days=EARNED_WINDOW_DAYS)
+    earned, earned_window = (
+        db.query(
+            func.coalesce(func.sum(CreditTransaction.amount), 0),
+            func.coalesce(func.sum(case((CreditTransaction.created_at >= since, CreditTransaction.amount), else_=0)), 0),
+        )
+        .filter(CreditTransaction.user_id == int(user_id), CreditTransaction.type == "task_reward")
+        .one()
+    )
+    pending, held = (
+        db.query(func.count(WithdrawalRequest.id), func.coalesce(func.sum(WithdrawalRequest.amount), 0))
+        .filter(WithdrawalRequest.user_id == int(user_id), WithdrawalRequest.status == "pending")
+        .one()
+    )
+    agg = {
+        "task_reward_earned": int(earned or 0),
+        "task_reward_earned_30d": int(earned_window or 0),
+        "held_balance": int(held or 0),
+        "pending_withdrawals": int(pending or 0),
+    }
+    _cache_set(key, agg, ttl=AGG_TTL_SEC)
+    return agg
+
+
 def compute_payout_eligibility(db: Session, user: User) -> Dict[str, Any]:
     credits = int(getattr(user, "credits", 0) or 0)
     commission = int(getattr(user, "commission_balance", 0) or 0)
@@ -133,19 +187,7 @@ def compute_payout_eligibility(db: Session, user: User) -> Dict[str, Any]:
     kyc_ok = _kyc.is_approved(user)
     recv_ok = bool(user.receiving_account_type and user.receiving_account_number)
 
-    pending_wd = (
-        db.query(WithdrawalRequest)
-        .filter(WithdrawalRequest.user_id == user.id, WithdrawalRequest.status == "pending")
-        .count()
-    )
-
-    task_reward_earned = (
-        db.query(CreditTransaction)
-        .filter(CreditTransaction.user_id == user.id, CreditTransaction.type == "task_reward")
-        .with_entities(CreditTransaction.amount)
-        .all()
-    )
-    task_earnings = sum(int(r[0] or 0) for r in task_reward_earned)
+    agg = payout_aggregates(db, user.id)
 
     blockers: List[str] = []
     if not kyc_ok:
@@ -166,7 +208,9 @@ def compute_payout_eligibility(db: Session, user: User) -> Dict[str, Any]:
         "credits_balance": credits,
         "commission_balance": commission,
         "withdrawable_balance": withdrawable,
-        "task_reward_earned": task_earnings,
+        "task_reward_earned": agg["task_reward_earned"],
+        "task_reward_earned_30d": agg["task_reward_earned_30d"],
+        "held_balance": agg["held_balance"],
         "min_withdraw_amount": min_amt,
         "withdrawal_fee_bp": withdrawal_fee_bp(),
         "processing_time_hint_zh": processing_time_hint_zh(),
@@ -174,7 +218,7 @@ def compute_payout_eligibility(db: Session, user: User) -> Dict[str, Any]:
         "kyc_approved": kyc_ok,
         "receiving_account_configured": recv_ok,
         "receiving_account_type": getattr(user, "receiving_account_type", None),
-        "pending_withdrawals": int(pending_wd),
+        "pending_withdrawals": agg["pending_withdrawals"],
         "eligible": eligible,
         "blockers": blockers,
         "manual_review": True,
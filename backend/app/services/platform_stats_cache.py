@@ -133,3 +133,10 @@ def get_cached_public_stats_bundle(db: Session) -> Dict[str, Any]:
     bundle = build_public_stats_bundle(db)
     _cache_set("clawjob:stats:public_bundle", bundle)
     return bundle
+
+
+def warm_platform_stats_cache(db: Session) -> Dict[str, Any]:
+    """Rebuild the public stats bundle ahead of TTL expiry (scheduler job)."""
+    bundle = build_public_stats_bundle(db)
+    _cache_set("clawjob:stats:public_bundle", bundle)
+    return bundle
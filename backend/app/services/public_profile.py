@@ -0,0 +1,143 @@
+"""Public user profile (GET /u/{username}) aggregation.
+
+Reputation for all of the user's agents comes from one grouped task scan
+(:func:`compute_bulk_reputations`, which also reuses per-agent cached cards);
+trust-card badges are assembled in memory from those cards plus one verified-skill
+lookup, so the query count does not grow with the number of agents or tasks.
+
+The assembled profile and its ETag are cached per username for
+``CLAWJOB_PUBLIC_PROFILE_TTL_SEC`` seconds (default 300) and dropped by the task
+lifecycle hooks via :func:`invalidate_public_profiles_for_agents`.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.database.relational_db import Agent, User
+from app.services.platform_stats_cache import _cache_get, _cache_set, invalidate_cache_key
+from app.services.reputation import compute_bulk_reputations
+from app.services.trust_card import _verified_skills_by_agent, build_trust_card
+from app.utils.datetime_iso import iso_utc
+
+PROFILE_CACHE_TTL_SEC = max(10, int(os.getenv("CLAWJOB_PUBLIC_PROFILE_TTL_SEC", "300")))
+PROFILE_AGENT_LIMIT = 20
+
+
+def _profile_key(username: str) -> str:
+    return f"clawjob:profile:user:{username}"
+
+
+def invalidate_public_profile(username: Optional[str]) -> None:
+    if username:
+        invalidate_cache_key(_profile_key(username))
+
+
+def invalidate_public_profiles_for_agents(db: Session, agent_ids: Iterable[Optional[int]]) -> None:
+    """Drop cached profiles of the owners of ``agent_ids`` (one owner lookup).
+
+    Usernames are resolved in the caller's transaction; the keys are dropped now and
+    again on ``after_commit``, so a crawler hit during settlement cannot keep the
+    pre-completion profile (and its ETag) cached for the full TTL.
+    """
+    ids = {int(a) for a in agent_ids if a}
+    if not ids:
+        return
+    try:
+        names = {
+            r[0]
+            for r in db.query(User.username).join(Agent, Agent.owner_id == User.id).filter(Agent.id.in_(ids)).distinct().all()
+        }
+    except Exception:
+        return
+    _drop_profiles(names)
+    event.listen(db, "after_commit", lambda _s: _drop_profiles(names), once=True)
+
+
+def _drop_profiles(usernames: Iterable[Optional[str]]) -> None:
+    for name in usernames:
+        invalidate_public_profile(name)
+
+
+def _etag(body: Dict[str, Any]) -> str:
+    raw = json.dumps(body, ensure_ascii=False, sort_keys=True, default=str)
+    return f'W/"u-{hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20]}"'
+
+
+def build_public_profile(db: Session, user: User) -> Dict[str, Any]:
+    agents = (
+        db.query(Agent)
+        .filter(Agent.owner_id == user.id, Agent.is_active == True)  # noqa: E712
+        .order_by(Agent.created_at.asc())
+        .limit(PROFILE_AGENT_LIMIT)
+        .all()
+    )
+    reps = compute_bulk_reputations(db, [a.id for a in agents]) if agents else {}
+    verified = _verified_skills_by_agent(db, agents) if agents else {}
+    api_base = os.getenv("CLAWJOB_API_URL", "https://api.clawjob.com.cn").rstrip("/")
+
+    agent_cards = []
+    total_completed = 0
+    total_earned = 0
+    best_score = 0
+    for a in agents:
+        card = reps.get(a.id) or {}
+        stats = card.get("stats") or {}
+        trust = build_trust_card(a, user, card, verified.get(a.id, [])) if stats else {}
+        score = int(card.get("reputation_score", 0) or 0)
+        completed = int(stats.get("completed_task_count", 0) or 0)
+        earned = int(stats.get("reward_points_total", 0) or 0)
+        total_completed += completed
+        total_earned += earned
+        best_score = max(best_score, score)
+        agent_cards.append({
+            "agent_id": a.id,
+            "id": a.id,
+            "name": a.name,
+            "description": (a.description or "")[:400],
+            "agent_type": a.agent_type,
+            "category": getattr(a, "category", None),
+            "capabilities": a.capabilities if isinstance(a.capabilities, list) else [],
+            "reputation_score": score,
+            "tasks_completed": completed,
+            "completed_tasks": completed,
+            "top_skills": stats.get("top_skills") or [],
+            "trust_card_url": f"{api_base}/agents/{a.id}/trust-card",
+            "trust_one_liner_zh": trust.get("one_liner_zh"),
+            "badges": trust.get("badges") or [],
+        })
+    return {
+        "username": user.username,
+        "user_id": user.id,
+        "joined_at": iso_utc(user.created_at),
+        "agents": agent_cards,
+        "summary": {
+            "agents_count": len(agent_cards),
+            "tasks_completed": total_completed,
+            "total_completed_tasks": total_completed,
+            "total_rewards_earned": total_earned,
+            "total_earned_points": total_earned,
+            "reputation_avg": round(best_score, 1) if agent_cards else None,
+            "best_reputation_score": best_score,
+        },
+    }
+
+
+def get_public_profile(db: Session, username: str) -> Optional[Dict[str, Any]]:
+    """``{"body", "etag"}`` for an active user, served from cache when possible; None if not found."""
+    key = _profile_key(username)
+    cached = _cache_get(key)
+    if isinstance(cached, dict) and isinstance(cached.get("body"), dict):
+        return cached
+    user = db.query(User).filter(User.username == username).first()
+    if not user or not getattr(user, "is_active", True):
+        return None
+    body = build_public_profile(db, user)
+    entry = {"body": body, "etag": _etag(body)}
+    _cache_set(key, entry, ttl=PROFILE_CACHE_TTL_SEC)
+    return entry
@@ -0,0 +1,186 @@
+"""
+注册后续动作（欢迎站内信 + 首次接单提醒）的延迟执行。
+
+注册接口只在注册事务里写一条 task_queue_jobs 行（enqueue_in_session，随注册一起提交），
+响应返回后由 BackgroundTasks 只领取并处理这一条（run_register_followup）；进程在此之前退出时
+由调度器任务 register_followups 批量补发。
+
+注册响应里的 next_steps 只拼静态链接并读取预热好的新手任务缓存（register_next_steps），
+不在注册请求内查库；欢迎站内信里的完整下一步在后续任务中生成，并顺带预热该缓存。
+"""
+from __future__ import annotations
+
+import logging
+import os
+from typing import Any, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from app.database.relational_db import Agent, InternalMessage, SessionLocal, TaskSubscription, User
+from app.domain.task_helpers import get_or_create_clawjob_system_agent
+from app.services.agent_discovery import highest_reward_open_task
+from app.services.onboarding_quest import onboarding_tasks_for_register
+from app.services.task_queue import DbTaskQueue, QueueJob, enqueue_in_session
+
+logger = logging.getLogger(__name__)
+
+QUEUE = "register_followups"
+BATCH_LIMIT = max(1, int(os.getenv("CLAWJOB_REGISTER_FOLLOWUP_BATCH", "50")))
+
+
+def enqueue_register_followups(db: Session, user_id: int, agent_id: int) -> int:
+    """登记到调用方事务并返回任务 id；调用方 commit 后才可被领取。"""
+    row = enqueue_in_session(db, {"user_id": int(user_id), "agent_id": int(agent_id)}, queue=QUEUE, priority="high")
+    db.flush()
+    return int(row.id)
+
+
+def register_next_steps(agent_id: int, db: Optional[Session] = None) -> dict:
+    """注册成功后给 Agent 的下一步指引（Growth v2/v4）。db 为 None 时只读缓存，不查库。"""
+    app_base = os.getenv("CLAWJOB_APP_URL", "https://app.clawjob.com.cn").rstrip("/")
+    api_base = os.getenv("CLAWJOB_API_URL", "https://api.clawjob.com.cn").rstrip("/")
+    steps = {
+        "browse_tasks_url": f"{api_base}/tasks?status_filter=open&limit=20&sort=created_at_desc",
+        "tasks_hall_url": f"{app_base}/#/tasks",
+        "community_url": f"{app_base}/#/community",
+        "join_url": f"{app_base}/#/join",
+        "playbook_url": f"{app_base}/#/playbook",
+        "skill_doc_url": f"{app_base}/skill.md",
+        "earnings_summary_url": f"{api_base}/agents/{agent_id}/earnings-summary",
+        "skill_packs_url": f"{api_base}/skills/packs",
+        "agent_manifest_url": f"{api_base}/.well-known/clawjob-agent.json",
+        "suggested_subscribe": {
+            "method": "POST",
+            "path": "/tasks/{task_id}/subscribe",
+            "body": {"agent_id": agent_id},
+            "hint": "Browse GET /tasks, pick an open task, then subscribe with your agent_id.",
+        },
+    }
+    steps.update(onboarding_tasks_for_register(db, agent_id))
+    return steps
+
+
+def send_first_subscribe_nudge(db: Session, user: User, agent: Agent) -> None:
+    """注册后若 Agent 尚无任务订阅，站内信推送最高奖励开放任务深链（Growth v5）。"""
+    try:
+        sub_count = (
+            db.query(TaskSubscription)
+            .filter(TaskSubscription.agent_id == agent.id)
+            .count()
+        )
+        if sub_count > 0:
+            return
+        top = highest_reward_open_task(db)
+        if not top:
+            return
+        sys_user, _ = get_or_create_clawjob_system_agent(db)
+        if not sys_user:
+            return
+        app_base = os.getenv("CLAWJOB_APP_URL", "https://app.clawjob.com.cn").rstrip("/")
+        api_base = os.getenv("CLAWJOB_API_URL", "https://api.clawjob.com.cn").rstrip("/")
+        task_url = f"{app_base}/#/tasks?taskId={top.id}"
+        reward = int(getattr(top, "reward_points", 0) or 0)
+        body = (
+            f"你好 {agent.name}，你还没有接取任何任务。\n\n"
+            f"推荐从当前最高奖励开放任务开始：\n"
+            f"「{top.title}」— {reward} 点\n"
+            f"任务大厅：{task_url}\n\n"
+            f"接取：POST {api_base}/tasks/{top.id}/subscribe\n"
+            f'Body: {{"agent_id": {agent.id}}}'
+        )
+        db.add(
+            InternalMessage(
+                sender_user_id=int(sys_user.id),
+                recipient_user_id=int(user.id),
+                title="接取你的第一个任务",
+                content=body[:8000],
+                related_task_id=int(top.id),
+            )
+        )
+    except Exception:
+        pass
+
+
+def send_register_welcome_inbox(db: Session, user: User, agent: Agent, next_steps: dict) -> None:
+    """最低摩擦注册后：系统站内信欢迎 + 深链（复用 community 系统 Agent 模式）。"""
+    try:
+        sys_user, _ = get_or_create_clawjob_system_agent(db)
+        if not sys_user:
+            return
+        tasks_url = next_steps.get("tasks_hall_url") or ""
+        community_url = next_steps.get("community_url") or ""
+        quest_ids = next_steps.get("onboarding_task_ids") or []
+        quest_line = (
+            f"4. 新手 Quest 任务 ID：{', '.join(str(i) for i in quest_ids)}\n"
+            if quest_ids
+            else ""
+        )
+        body = (
+            f"欢迎加入 ClawJob，{agent.name}！\n\n"
+            f"你的 Agent ID：{agent.id}，注册赠点已到账。\n\n"
+            f"下一步：\n"
+            f"1. 浏览开放任务：{tasks_url}\n"
+            f"2. 进入社区交流：{community_url}\n"
+            f"3. 阅读 Skill 文档：{next_steps.get('skill_doc_url', '')}\n"
+            f"{quest_line}\n"
+            "接取任务：GET /tasks 后 POST /tasks/{{task_id}}/subscribe，Body 含 agent_id。"
+        )
+        db.add(
+            InternalMessage(
+                sender_user_id=int(sys_user.id),
+                recipient_user_id=int(user.id),
+                title="欢迎加入 ClawJob",
+                content=body[:8000],
+                related_task_id=None,
+            )
+        )
+    except Exception:
+        pass
+
+
+def _send_followups(payload: Dict[str, Any]) -> None:
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.id == int(payload["user_id"])).first()
+        agent = db.query(Agent).filter(Agent.id == int(payload["agent_id"])).first()
+        if not user or not agent:
+            return
+        next_steps = register_next_steps(agent.id, db)
+        send_register_welcome_inbox(db, user, agent, next_steps)
+        send_first_subscribe_nudge(db, user, agent)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _process(queue: DbTaskQueue, job: QueueJob) -> bool:
+    try:
+        _send_followups(job.payload)
+    except Exception as e:
+        logger.warning("register followup failed job=%s: %s", job.id, e)
+        queue.fail_sync(job.id, str(e))
+        return False
+    queue.ack_sync(job.id)
+    return True
+
+
+def run_register_followup(job_id: int) -> bool:
+    """注册响应后处理本次注册自己的那一条；已被调度器领走时直接返回 False。"""
+    queue = DbTaskQueue()
+    job = queue.claim_job_sync(job_id, queue=QUEUE)
+    return _process(queue, job) if job is not None else False
+
+
+def run_register_followups(limit: int = BATCH_LIMIT) -> Dict[str, int]:
+    """调度器补发：领取并处理最多 limit 条待发送的注册后续动作；失败按队列策略重试 / 死信。"""
+    queue = DbTaskQueue()
+    sent = failed = 0
+    for job in queue.claim_sync(queue=QUEUE, limit=limit):
+        if _process(queue, job):
+            sent += 1
+        else:
+            failed += 1
+    return {"sent": sent, "failed": failed}
@@ -10,7 +10,6 @@ from collections import Counter
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional
 
-from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from app.database.relational_db import Agent, Task, User
@@ -98,125 +97,149 @@ def compute_agent_reputation(db: Session, agent_id: int, *, use_cache: bool = Tr
     return card
 
 
-def _compute_agent_reputation_uncached(db: Session, agent_id: int) -> Optional[Dict[str, Any]]:
-    agent = db.query(Agent).filter(Agent.id == int(agent_id)).first()
-    if not agent:
-        return None
-
-    owner: Optional[User] = db.query(User).filter(User.id == agent.owner_id).first()
-
-    accepted_count = int(
-        db.query(func.count(Task.id)).filter(Task.agent_id == agent.id).scalar() or 0
-    )
-    completed_count = int(
-        db.query(func.count(Task.id))
-        .filter(Task.agent_id == agent.id, Task.status == "completed")
-        .scalar()
-        or 0
-    )
-    reward_points_total = int(
-        db.query(func.coalesce(func.sum(Task.reward_points), 0))
-        .filter(Task.agent_id == agent.id, Task.status == "completed")
-        .scalar()
-        or 0
-    )
-
-    now = datetime.utcnow()
-    d30 = now - timedelta(days=30)
-    d90 = now - timedelta(days=90)
-    recent_30 = int(
-        db.query(func.count(Task.id))
-        .filter(
-            Task.agent_id == agent.id,
-            Task.status == "completed",
-            Task.completed_at.isnot(None),
-            Task.completed_at >= d30,
-        )
-        .scalar()
-        or 0
-    )
-    recent_90 = int(
-        db.query(func.count(Task.id))
-        .filter(
-            Task.agent_id == agent.id,
-            Task.status == "completed",
-            Task.completed_at.isnot(None),
-            Task.completed_at >= d90,
-        )
-        .scalar()
-        or 0
-    )
-
-    rejection_count = 0
-    dispute_count = 0
-    completion_durations_hours: List[float] = []
-    last_active_at: Optional[datetime] = None
-    completed_tasks_for_skills: List[Task] = []
-
-    task_rows = (
-        db.query(
-            Task.status,
-            Task.input_data,
-            Task.created_at,
-            Task.completed_at,
-            Task.updated_at,
-            Task.category,
-        )
-        .filter(Task.agent_id == agent.id)
-        .yield_per(200)
-    )
-    for status, input_data, created_at, completed_at, updated_at, category in task_rows:
+_TASK_ROW_COLUMNS = (
+    Task.status,
+    Task.input_data,
+    Task.created_at,
+    Task.completed_at,
+    Task.updated_at,
+    Task.category,
+    Task.reward_points,
+)
+
+
+class _StatsAccumulator:
+    """单趟扫描某 Agent 的任务行，累计信誉卡所需的全部指标。"""
+
+    def __init__(self, now: datetime):
+        self.d30 = now - timedelta(days=30)
+        self.d90 = now - timedelta(days=90)
+        self.accepted_count = 0
+        self.completed_count = 0
+        self.reward_points_total = 0
+        self.recent_30 = 0
+        self.recent_90 = 0
+        self.rejection_count = 0
+        self.dispute_count = 0
+        self.escrow_completed_count = 0
+        self.onboarding_completed_count = 0
+        self.completion_durations_hours: List[float] = []
+        self.last_active_at: Optional[datetime] = None
+        self.completed_tasks_for_skills: List[Task] = []
+
+    def add(self, status, input_data, created_at, completed_at, updated_at, category, reward_points) -> None:
+        self.accepted_count += 1
         extra = input_data if isinstance(input_data, dict) else {}
         if isinstance(extra, dict):
             escrow = extra.get("escrow") if isinstance(extra.get("escrow"), dict) else None
             if escrow and escrow.get(_DISPUTE_KEY):
-                dispute_count += 1
+                self.dispute_count += 1
             timeline = extra.get("timeline") if isinstance(extra.get("timeline"), list) else []
             for ev in timeline:
                 if not isinstance(ev, dict):
                     continue
                 kind = str(ev.get("kind") or ev.get("event") or "").lower()
                 if kind in {"rejected", "reject", "verification_rejected"}:
-                    rejection_count += 1
+                    self.rejection_count += 1
         if status == "completed":
+            self.completed_count += 1
+            self.reward_points_total += _safe_int(reward_points)
+            if isinstance(extra, dict):
+                escrow = extra.get("escrow")
+                if isinstance(escrow, dict) and escrow.get("milestones"):
+                    self.escrow_completed_count += 1
+                if extra.get("onboarding"):
+                    self.onboarding_completed_count += 1
+            if isinstance(completed_at, datetime):
+                if completed_at >= self.d30:
+                    self.recent_30 += 1
+                if completed_at >= self.d90:
+                    self.recent_90 += 1
             if isinstance(created_at, datetime) and isinstance(completed_at, datetime):
                 delta = completed_at - created_at
                 if delta.total_seconds() > 0:
-                    completion_durations_hours.append(delta.total_seconds() / 3600.0)
+                    self.completion_durations_hours.append(delta.total_seconds() / 3600.0)
             ts = completed_at or updated_at or created_at
-            if len(completed_tasks_for_skills) < 50:
-                completed_tasks_for_skills.append(
+            if len(self.completed_tasks_for_skills) < 50:
+                self.completed_tasks_for_skills.append(
                     Task(status=status, input_data=input_data, category=category, completed_at=completed_at)
                 )
         else:
             ts = updated_at or created_at
-        if isinstance(ts, datetime) and (last_active_at is None or ts > last_active_at):
-            last_active_at = ts
-
-    avg_completion_hours: Optional[float] = None
-    if completion_durations_hours:
-        avg_completion_hours = round(sum(completion_durations_hours) / len(completion_durations_hours), 2)
-
-    denom = max(completed_count, 1)
-    first_pass_rate: Optional[float] = None
-    if completed_count > 0:
-        first_pass_rate = round(max(0.0, (completed_count - rejection_count) / denom), 4)
-
-    accepted_denom = max(accepted_count, 1)
-    rejection_rate = round(rejection_count / accepted_denom, 4) if accepted_count else 0.0
-    dispute_rate = round(dispute_count / accepted_denom, 4) if accepted_count else 0.0
-    top_skills = _collect_top_skills(completed_tasks_for_skills)
-
-    score = _reputation_score(
-        completed=completed_count,
-        accepted=accepted_count,
-        rejection_count=rejection_count,
-        dispute_count=dispute_count,
-        first_pass_confirm_rate=first_pass_rate,
-        avg_completion_hours=avg_completion_hours,
-        recent_30d_completed=recent_30,
-    )
+        if isinstance(ts, datetime) and (self.last_active_at is None or ts > self.last_active_at):
+            self.last_active_at = ts
+
+    def result(self) -> Dict[str, Any]:
+        """返回 ``{"stats": ..., "reputation_score": ...}``。"""
+        completed_count = self.completed_count
+        accepted_count = self.accepted_count
+        avg_completion_hours: Optional[float] = None
+        if self.completion_durations_hours:
+            avg_completion_hours = round(
+                sum(self.completion_durations_hours) / len(self.completion_durations_hours), 2
+            )
+
+        denom = max(completed_count, 1)
+        first_pass_rate: Optional[float] = None
+        if completed_count > 0:
+            first_pass_rate = round(max(0.0, (completed_count - self.rejection_count) / denom), 4)
+
+        accepted_denom = max(accepted_count, 1)
+        rejection_rate = round(self.rejection_count / accepted_denom, 4) if accepted_count else 0.0
+        dispute_rate = round(self.dispute_count / accepted_denom, 4) if accepted_count else 0.0
+
+        score = _reputation_score(
+            completed=completed_count,
+            accepted=accepted_count,
+            rejection_count=self.rejection_count,
+            dispute_count=self.dispute_count,
+            first_pass_confirm_rate=first_pass_rate,
+            avg_completion_hours=avg_completion_hours,
+            recent_30d_completed=self.recent_30,
+        )
+        last_active_at = self.last_active_at
+        return {
+            "stats": {
+                "accepted_task_count": accepted_count,
+                "completed_task_count": completed_count,
+                "rejection_count": self.rejection_count,
+                "dispute_count": self.dispute_count,
+                "escrow_completed_count": self.escrow_completed_count,
+                "onboarding_completed_count": self.onboarding_completed_count,
+                "rejection_rate": rejection_rate,
+                "dispute_rate": dispute_rate,
+                "first_pass_confirm_rate": first_pass_rate,
+                "reward_points_total": self.reward_points_total,
+                "avg_completion_hours": avg_completion_hours,
+                "recent_30d_completed_count": self.recent_30,
+                "recent_90d_completed_count": self.recent_90,
+                "last_active_at": last_active_at.isoformat() if isinstance(last_active_at, datetime) else None,
+                "top_skills": _collect_top_skills(self.completed_tasks_for_skills),
+            },
+            "reputation_score": score,
+        }
+
 
+def compute_bulk_reputation_stats(db: Session, agent_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """一次查询为多个 Agent 计算信誉指标：``{agent_id: {"stats", "reputation_score"}}``。
+
+    只扫一遍这些 Agent 的任务行（按 agent_id 流式分组），不含 agent/owner 资料。
+    """
+    ids = sorted({int(a) for a in agent_ids if a is not None})
+    now = datetime.utcnow()
+    acc: Dict[int, _StatsAccumulator] = {aid: _StatsAccumulator(now) for aid in ids}
+    if ids:
+        rows = (
+            db.query(Task.agent_id, *_TASK_ROW_COLUMNS)
+            .filter(Task.agent_id.in_(ids))
+            .yield_per(500)
+        )
+        for agent_id, *row in rows:
+            acc[int(agent_id)].add(*row)
+    return {aid: a.result() for aid, a in acc.items()}
+
+
+def _build_card(agent: Agent, owner: Optional[User], computed: Dict[str, Any]) -> Dict[str, Any]:
     return {
         "agent": {
             "id": agent.id,
@@ -233,27 +256,23 @@ def _compute_agent_reputation_uncached(db: Session, agent_id: int) -> Optional[D
             "is_active": bool(agent.is_active),
             "created_at": agent.created_at.isoformat() if getattr(agent, "created_at", None) else None,
         },
-        "stats": {
-            "accepted_task_count": accepted_count,
-            "completed_task_count": completed_count,
-            "rejection_count": rejection_count,
-            "dispute_count": dispute_count,
-            "rejection_rate": rejection_rate,
-            "dispute_rate": dispute_rate,
-            "first_pass_confirm_rate": first_pass_rate,
-            "reward_points_total": reward_points_total,
-            "avg_completion_hours": avg_completion_hours,
-            "recent_30d_completed_count": recent_30,
-            "recent_90d_completed_count": recent_90,
-            "last_active_at": last_active_at.isoformat() if isinstance(last_active_at, datetime) else None,
-            "top_skills": top_skills,
-        },
-        "reputation_score": score,
+        "stats": computed["stats"],
+        "reputation_score": computed["reputation_score"],
     }
 
 
+def _compute_agent_reputation_uncached(db: Session, agent_id: int) -> Optional[Dict[str, Any]]:
+    agent = db.query(Agent).filter(Agent.id == int(agent_id)).first()
+    if not agent:
+        return None
+
+    owner: Optional[User] = db.query(User).filter(User.id == agent.owner_id).first()
+    computed = compute_bulk_reputation_stats(db, [int(agent.id)])[int(agent.id)]
+    return _build_card(agent, owner, computed)
+
+
 def compute_bulk_reputations(db: Session, agent_ids: List[int]) -> Dict[int, Dict[str, Any]]:
-    """为多个 Agent 计算信誉卡；优先读 Redis 缓存。"""
+    """为多个 Agent 计算信誉卡；优先读 Redis 缓存，未命中的一次性批量计算。"""
     out: Dict[int, Dict[str, Any]] = {}
     missing: List[int] = []
     from app.services.reputation_cache import get_cached_reputation, set_cached_reputation
@@ -267,15 +286,20 @@ def compute_bulk_reputations(db: Session, agent_ids: List[int]) -> Dict[int, Dic
             out[int(aid)] = cached
         else:
             missing.append(int(aid))
-    for aid in missing:
+    if not missing:
+        return out
+    try:
+        agents = db.query(Agent).filter(Agent.id.in_(missing)).all()
+        owner_ids = {a.owner_id for a in agents if a.owner_id is not None}
+        owners = {u.id: u for u in db.query(User).filter(User.id.in_(owner_ids)).all()} if owner_ids else {}
+        computed = compute_bulk_reputation_stats(db, [a.id for a in agents])
+    except Exception:
+        return out
+    for agent in agents:
+        card = _build_card(agent, owners.get(agent.owner_id), computed[int(agent.id)])
+        out[int(agent.id)] = card
         try:
-            card = _compute_agent_reputation_uncached(db, aid)
+            set_cached_reputation(int(agent.id), card)
         except Exception:
-            card = None
-        if card is not None:
-            out[aid] = card
-            try:
-                set_cached_reputation(aid, card)
-            except Exception:
-                pass
+            pass
     return out
@@ -1,4 +1,4 @@
-"""Refresh / invalidate agent reputation after task lifecycle events."""
+"""Refresh / invalidate agent reputation (and owner dashboards) after task lifecycle events."""
 from __future__ import annotations
 
 from typing import Optional
@@ -18,7 +18,31 @@ def touch_agent_reputation_for_task(db: Session, task: Task) -> None:
         ids.add(int(task.creator_agent_id))
     for aid in ids:
         invalidate_agent_reputation(aid)
+    _invalidate_derived(db, ids)
 
 
 def touch_agent_reputation(db: Session, agent_id: Optional[int]) -> None:
     invalidate_agent_reputation(agent_id)
+    _invalidate_derived(db, [agent_id])
+
+
+def _invalidate_derived(db: Session, agent_ids) -> None:
+    """Owner dashboards, public profiles and trust-card snapshots built on top of reputation."""
+    try:
+        from app.services.creator_studio import invalidate_creator_studio_for_agents
+
+        invalidate_creator_studio_for_agents(db, agent_ids)
+    except Exception:
+        pass
+    try:
+        from app.services.public_profile import invalidate_public_profiles_for_agents
+
+        invalidate_public_profiles_for_agents(db, agent_ids)
+    except Exception:
+        pass
+    try:
+        from app.services.trust_card import mark_trust_cards_stale
+
+        mark_trust_cards_stale(db, agent_ids)
+    except Exception:
+        pass
@@ -6,6 +6,12 @@ Provides a small, dependency-free pipeline that:
  2. Blocks text when it matches an in-process blacklist (env-configurable).
  3. Records a SafetyEvent for auditability when either redaction or block occurs.
 
+Patterns are compiled once: all PII regexes share one alternation and the
+blacklist is a single case-insensitive alternation rebuilt only when
+``SAFETY_BLACKLIST`` changes. ``scan_many`` / ``check_many`` /
+``sanitize_texts`` cover multi-field writes, with one audit transaction
+for all resulting SafetyEvent rows.
+
 The implementation is intentionally conservative: we never hard-block
 without explicit reason lists, and we prefer redaction over rejection
 so that long-form task descriptions don't silently disappear.
@@ -17,6 +23,7 @@ Environment variables:
 """
 from __future__ import annotations
 
+import bisect
 import os
 import re
 from dataclasses import dataclass, field
@@ -81,36 +88,152 @@ def _max_snippet() -> int:
         return 400
 
 
-def _redact(text: str) -> tuple[str, List[str]]:
-    found: List[str] = []
-    out = text
+# ---------------------------------------------------------------------------
+# Compiled scanner
+# ---------------------------------------------------------------------------
+# PII: each compiled pattern is scanned once; where matches of different
+# patterns overlap, the higher-priority one wins (an email containing digits
+# is redacted as a whole rather than leaving its domain behind a phone match).
+_PII_PATTERNS = (
+    ("email", EMAIL_RE, "[redacted-email]"),
+    ("id_card", ID_CARD_RE, "[redacted-id]"),
+    ("card", CARD_RE, "[redacted-card]"),
+    ("phone", PHONE_RE, "[redacted-phone]"),
+)
+_PII_ORDER = {tag: i for i, (tag, _, _) in enumerate(_PII_PATTERNS)}
+_PII_REPLACEMENT = {tag: rep for tag, _, rep in _PII_PATTERNS}
+
+# Blacklist: one case-insensitive alternation, rebuilt only when
+# SAFETY_BLACKLIST changes (or on reload_config()). The lookahead keeps
+# overlapping terms visible, like the substring check it replaces.
+_BLACKLIST_CACHE: Dict[str, Any] = {"raw": None, "regex": None}
+
+
+def reload_config() -> None:
+    """Drop the compiled blacklist so the next scan rebuilds it from env."""
+    _BLACKLIST_CACHE["raw"] = None
+    _BLACKLIST_CACHE["regex"] = None
+
+
+def _blacklist_regex() -> Optional[re.Pattern[str]]:
+    raw = os.getenv("SAFETY_BLACKLIST") or ""
+    if _BLACKLIST_CACHE["raw"] != raw:
+        words = sorted({w for w in _blacklist() if w}, key=len, reverse=True)
+        _BLACKLIST_CACHE["regex"] = (
+            re.compile("(?=(" + "|".join(re.escape(w) for w in words) + "))", re.IGNORECASE)
+            if words
+            else None
+        )
+        _BLACKLIST_CACHE["raw"] = raw
+    return _BLACKLIST_CACHE["regex"]
+
 
-    def _sub(pattern: re.Pattern[str], tag: str, replacement: str) -> None:
-        nonlocal out
-        if pattern.search(out):
-            found.append(tag)
-            out = pattern.sub(replacement, out)
+@dataclass(frozen=True)
+class ScanSpan:
+    start: int
+    end: int
+    kind: str  # "pii" | "blacklist"
+    label: str  # pii type, or the matched blacklist term (lower-cased)
 
-    _sub(EMAIL_RE, "email", "[redacted-email]")
-    _sub(ID_CARD_RE, "id_card", "[redacted-id]")
-    _sub(CARD_RE, "card", "[redacted-card]")
-    _sub(PHONE_RE, "phone", "[redacted-phone]")
-    # de-duplicate preserving order
-    seen, uniq = set(), []
-    for t in found:
-        if t not in seen:
-            uniq.append(t)
-            seen.add(t)
-    return out, uniq
 
+def _pii_spans(raw: str) -> List[ScanSpan]:
+    """Non-overlapping PII spans in text order, overlaps resolved by pattern priority.
 
-def _blocklist_hits(text: str) -> List[str]:
-    low = text.lower()
+    All candidate matches are collected as (priority, start, end) and sorted once;
+    accepting them greedily in that order against a start-sorted list of accepted
+    spans (bisect on the neighbours) keeps the whole resolution O(n log n).
+    """
+    candidates = [
+        (prio, m.start(), m.end(), tag)
+        for prio, (tag, rx, _) in enumerate(_PII_PATTERNS)
+        for m in rx.finditer(raw)
+        if m.end() > m.start()
+    ]
+    candidates.sort()
+    starts: List[int] = []
+    taken: List[ScanSpan] = []
+    for _, start, end, tag in candidates:
+        i = bisect.bisect_right(starts, start)
+        if i and taken[i - 1].end > start:
+            continue
+        if i < len(taken) and taken[i].start < end:
+            continue
+        starts.insert(i, start)
+        taken.insert(i, ScanSpan(start, end, "pii", tag))
+    return taken
+
+
+def scan(text: Optional[str], *, pii: bool = True) -> List[ScanSpan]:
+    """Return PII and blacklist spans for ``text`` (PII spans never overlap)."""
+    if not text:
+        return []
+    return scan_many([text], pii=pii)[0]
+
+
+def scan_many(texts: List[Optional[str]], *, pii: bool = True) -> List[List[ScanSpan]]:
+    """Scan many texts with the compiled patterns; result is aligned with ``texts``."""
+    bl = _blacklist_regex()
+    out: List[List[ScanSpan]] = []
+    for text in texts:
+        spans: List[ScanSpan] = []
+        if text:
+            raw = str(text)
+            if pii:
+                spans.extend(_pii_spans(raw))
+            if bl is not None:
+                for m in bl.finditer(raw):
+                    spans.append(ScanSpan(m.start(1), m.end(1), "blacklist", m.group(1).lower()))
+        out.append(spans)
+    return out
+
+
+def _redact_spans(text: str, spans: List[ScanSpan]) -> str:
+    parts: List[str] = []
+    pos = 0
+    for sp in spans:
+        if sp.kind != "pii":
+            continue
+        parts.append(text[pos:sp.start])
+        parts.append(_PII_REPLACEMENT[sp.label])
+        pos = sp.end
+    parts.append(text[pos:])
+    return "".join(parts)
+
+
+def _result_from_spans(raw: str, spans: List[ScanSpan], *, source: str) -> SafetyResult:
+    pii = sorted({sp.label for sp in spans if sp.kind == "pii"}, key=_PII_ORDER.__getitem__)
     hits: List[str] = []
-    for word in _blacklist():
-        if word and word in low:
-            hits.append(f"blacklist:{word}")
-    return hits
+    for sp in spans:
+        if sp.kind == "blacklist" and f"blacklist:{sp.label}" not in hits:
+            hits.append(f"blacklist:{sp.label}")
+    reasons = [f"pii:{t}" for t in pii] + hits
+    action = "block" if hits else ("redact" if pii else "pass")
+    return SafetyResult(
+        allowed=not hits,
+        action=action,
+        reasons=reasons,
+        pii_types=pii,
+        redacted_text=_redact_spans(raw, spans) if pii else raw,
+        original_length=len(raw),
+        detail={"source": source},
+    )
+
+
+def check_many(
+    texts: List[Optional[str]],
+    *,
+    source: str = "other",
+    redact_pii: Optional[bool] = None,
+) -> List[SafetyResult]:
+    """:func:`check_text` for many texts at once (one compiled pass per text)."""
+    do_redact = _redact_enabled() if redact_pii is None else bool(redact_pii)
+    results: List[SafetyResult] = []
+    for text, spans in zip(texts, scan_many(texts, pii=do_redact)):
+        if not text:
+            results.append(SafetyResult(allowed=True, action="pass", redacted_text="", original_length=0))
+        else:
+            results.append(_result_from_spans(str(text), spans, source=source))
+    return results
 
 
 def check_text(
@@ -125,54 +248,7 @@ def check_text(
     - PII is (by default) redacted, not blocked.
     - Empty/None text is always allowed.
     """
-    if not text:
-        return SafetyResult(allowed=True, action="pass", redacted_text="", original_length=0)
-
-    raw = str(text)
-    do_redact = _redact_enabled() if redact_pii is None else bool(redact_pii)
-
-    reasons: List[str] = []
-    pii: List[str] = []
-    redacted = raw
-
-    if do_redact:
-        redacted, pii = _redact(raw)
-        if pii:
-            reasons.extend(f"pii:{t}" for t in pii)
-
-    hits = _blocklist_hits(raw)
-    if hits:
-        reasons.extend(hits)
-        return SafetyResult(
-            allowed=False,
-            action="block",
-            reasons=reasons,
-            pii_types=pii,
-            redacted_text=redacted,
-            original_length=len(raw),
-            detail={"source": source},
-        )
-
-    if pii:
-        return SafetyResult(
-            allowed=True,
-            action="redact",
-            reasons=reasons,
-            pii_types=pii,
-            redacted_text=redacted,
-            original_length=len(raw),
-            detail={"source": source},
-        )
-
-    return SafetyResult(
-        allowed=True,
-        action="pass",
-        reasons=reasons,
-        pii_types=pii,
-        redacted_text=redacted,
-        original_length=len(raw),
-        detail={"source": source},
-    )
+    return check_many([text], source=source, redact_pii=redact_pii)[0]
 
 
 def record_event(
@@ -190,33 +266,7 @@ def record_event(
     even when the caller subsequently raises HTTPException (which would
     otherwise roll back the request-scoped session).
     """
-    if result.action == "pass":
-        return
-    try:
-        from app.database.relational_db import SafetyEvent, SessionLocal  # local import
-
-        ev = SafetyEvent(
-            user_id=user_id,
-            source=source,
-            related_task_id=related_task_id,
-            action=result.action,
-            reasons=list(result.reasons),
-            snippet=(snippet or result.redacted_text)[: _max_snippet()],
-            pii_types=list(result.pii_types),
-        )
-        audit_db = SessionLocal()
-        try:
-            audit_db.add(ev)
-            audit_db.commit()
-        except Exception:
-            try:
-                audit_db.rollback()
-            except Exception:
-                pass
-        finally:
-            audit_db.close()
-    except Exception:
-        pass
+    record_events([(result, snippet)], source=source, user_id=user_id, related_task_id=related_task_id)
 
 
 def guard_text(
@@ -266,3 +316,75 @@ def sanitize_text(
     if not r.allowed:
         raise ValueError(f"content blocked by safety policy: {','.join(r.reasons)[:200]}")
     return r.redacted_text if r.action == "redact" else (text or "")
+
+
+def record_events(
+    events: List[tuple[SafetyResult, Optional[str]]],
+    *,
+    source: str,
+    user_id: Optional[int] = None,
+    related_task_id: Optional[int] = None,
+) -> None:
+    """Persist many ``(result, snippet)`` outcomes in one audit transaction.
+
+    Same semantics as :func:`record_event` (``pass`` results are skipped),
+    but a single SessionLocal / commit covers the whole batch.
+    """
+    rows = [(r, s) for r, s in events if r.action != "pass"]
+    if not rows:
+        return
+    try:
+        from app.database.relational_db import SafetyEvent, SessionLocal  # local import
+
+        max_snip = _max_snippet()
+        audit_db = SessionLocal()
+        try:
+            audit_db.add_all([
+                SafetyEvent(
+                    user_id=user_id,
+                    source=source,
+                    related_task_id=related_task_id,
+                    action=r.action,
+                    reasons=list(r.reasons),
+                    snippet=(s or r.redacted_text)[:max_snip],
+                    pii_types=list(r.pii_types),
+                )
+                for r, s in rows
+            ])
+            audit_db.commit()
+        except Exception:
+            try:
+                audit_db.rollback()
+            except Exception:
+                pass
+        finally:
+            audit_db.close()
+    except Exception:
+        pass
+
+
+def sanitize_texts(
+    texts: List[Optional[str]],
+    *,
+    source: str,
+    user_id: Optional[int] = None,
+    related_task_id: Optional[int] = None,
+) -> List[str]:
+    """Batch variant of :func:`sanitize_text` for bulk writes.
+
+    Evaluates every text first, records all redact/block outcomes in one
+    audit transaction, then raises ``ValueError`` if any text is blocked.
+    The returned list is aligned with ``texts``.
+    """
+    results = check_many(texts, source=source)
+    record_events(
+        [(r, (t or "")[: _max_snippet()]) for r, t in zip(results, texts)],
+        source=source,
+        user_id=user_id,
+        related_task_id=related_task_id,
+    )
+    blocked = [r for r in results if not r.allowed]
+    if blocked:
+        reasons = sorted({x for r in blocked for x in r.reasons})
+        raise ValueError(f"content blocked by safety policy: {','.join(reasons)[:200]}")
+    return [r.redacted_text if r.action == "redact" else (t or "") for r, t in zip(results, texts)]
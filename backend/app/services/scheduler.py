@@ -0,0 +1,493 @@
+"""
+后台调度器：集群内单实例执行周期任务（leader 选举 + 租约续期）。
+
+每个 gunicorn worker 的 lifespan 都会启动 run_scheduler_loop，但只有持有 leader 租约的
+实例才会真正执行任务；租约存放在 Redis（SET NX EX + 校验 owner 续期）或数据库
+scheduler_leases 表（条件 UPDATE）。任务是否到期以 scheduled_job_runs 中最近一次启动时间
+为准，因此 leader 切换后也不会在同一周期内重复执行。
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import func, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.database.relational_db import ScheduledJobRun, SchedulerLease, SessionLocal, SystemLog
+
+logger = logging.getLogger("uvicorn.error")
+
+LEADER_LEASE_NAME = "scheduler-leader"
+_REDIS_KEY_PREFIX = "clawjob:scheduler:lease:"
+_REDIS_RENEW_LUA = (
+    "if redis.call('get', KEYS[1]) == ARGV[1] then "
+    "return redis.call('expire', KEYS[1], ARGV[2]) else return 0 end"
+)
+_REDIS_RELEASE_LUA = (
+    "if redis.call('get', KEYS[1]) == ARGV[1] then "
+    "return redis.call('del', KEYS[1]) else return 0 end"
+)
+
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+@dataclass
+class ScheduledJob:
+    name: str
+    interval_sec: int
+    func: Callable[[], Any]
+    jitter_sec: int = 0
+
+
+_JOBS: Dict[str, ScheduledJob] = {}
+_NEXT_JITTER: Dict[str, float] = {}
+
+
+def _tick_sec() -> int:
+    return max(1, int(os.getenv("CLAWJOB_SCHEDULER_TICK_SEC", "15")))
+
+
+def _lease_ttl_sec() -> int:
+    return max(_tick_sec() * 3, int(os.getenv("CLAWJOB_SCHEDULER_LEASE_TTL_SEC", "60")))
+
+
+def _lock_backend() -> str:
+    """auto：配置了 REDIS_URL / REDIS_HOST 时用 Redis，否则用数据库租约表。"""
+    backend = os.getenv("CLAWJOB_SCHEDULER_LOCK_BACKEND", "auto").strip().lower()
+    if backend in ("redis", "db"):
+        return backend
+    if os.getenv("REDIS_URL", "").strip() or os.getenv("REDIS_HOST", "").strip():
+        return "redis"
+    return "db"
+
+
+# ---------------------------------------------------------------------------
+# Lease primitives
+# ---------------------------------------------------------------------------
+
+
+def _redis_client():
+    from app.database.cache_db import get_redis_cache
+
+    return get_redis_cache().redis_client
+
+
+def _redis_try_acquire(name: str, owner: str, ttl: int) -> bool:
+    client = _redis_client()
+    key = _REDIS_KEY_PREFIX + name
+    if client.set(key, owner, nx=True, ex=ttl):
+        return True
+    return bool(client.eval(_REDIS_RENEW_LUA, 1, key, owner, ttl))
+
+
+def _redis_release(name: str, owner: str) -> None:
+    _redis_client().eval(_REDIS_RELEASE_LUA, 1, _REDIS_KEY_PREFIX + name, owner)
+
+
+def _redis_lease_info(name: str) -> Dict[str, Any]:
+    client = _redis_client()
+    key = _REDIS_KEY_PREFIX + name
+    owner = client.get(key)
+    ttl = client.ttl(key) if owner else None
+    expires_at = datetime.utcnow() + timedelta(seconds=int(ttl)) if ttl and ttl > 0 else None
+    return {"owner": owner, "expires_at": expires_at}
+
+
+def _db_try_acquire(name: str, owner: str, ttl: int) -> bool:
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=ttl)
+    db = SessionLocal()
+    try:
+        n = (
+            db.query(SchedulerLease)
+            .filter(
+                SchedulerLease.name == name,
+                or_(SchedulerLease.owner == owner, SchedulerLease.expires_at < now),
+            )
+            .update({"owner": owner, "expires_at": expires_at}, synchronize_session=False)
+        )
+        if n:
+            db.commit()
+            return True
+        if db.query(SchedulerLease.name).filter(SchedulerLease.name == name).first() is not None:
+            db.rollback()
+            return False
+        db.add(SchedulerLease(name=name, owner=owner, expires_at=expires_at))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            return False
+        return True
+    finally:
+        db.close()
+
+
+def _db_release(name: str, owner: str) -> None:
+    db = SessionLocal()
+    try:
+        db.query(SchedulerLease).filter(
+            SchedulerLease.name == name, SchedulerLease.owner == owner
+        ).update({"expires_at": datetime.utcnow()}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _db_lease_info(name: str) -> Dict[str, Any]:
+    db = SessionLocal()
+    try:
+        row = db.query(SchedulerLease).filter(SchedulerLease.name == name).first()
+        if not row or row.expires_at < datetime.utcnow():
+            return {"owner": None, "expires_at": None}
+        return {"owner": row.owner, "expires_at": row.expires_at}
+    finally:
+        db.close()
+
+
+def try_acquire_lease(name: str, owner: Optional[str] = None, ttl: Optional[int] = None) -> bool:
+    """获取或续期租约：未被占用/已过期/本实例持有时返回 True。"""
+    owner = owner or INSTANCE_ID
+    ttl = int(ttl or _lease_ttl_sec())
+    try:
+        if _lock_backend() == "redis":
+            return _redis_try_acquire(name, owner, ttl)
+        return _db_try_acquire(name, owner, ttl)
+    except Exception:
+        logger.exception("scheduler lease acquire failed name=%s", name)
+        return False
+
+
+def release_lease(name: str, owner: Optional[str] = None) -> None:
+    owner = owner or INSTANCE_ID
+    try:
+        if _lock_backend() == "redis":
+            _redis_release(name, owner)
+        else:
+            _db_release(name, owner)
+    except Exception:
+        logger.exception("scheduler lease release failed name=%s", name)
+
+
+def get_lease_info(name: str = LEADER_LEASE_NAME) -> Dict[str, Any]:
+    try:
+        info = _redis_lease_info(name) if _lock_backend() == "redis" else _db_lease_info(name)
+    except Exception:
+        info = {"owner": None, "expires_at": None}
+    exp = info.get("expires_at")
+    return {
+        "backend": _lock_backend(),
+        "owner": info.get("owner"),
+        "expires_at": exp.isoformat() if exp else None,
+        "is_self": info.get("owner") == INSTANCE_ID,
+        "instance_id": INSTANCE_ID,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Job registry
+# ---------------------------------------------------------------------------
+
+
+def register_job(name: str, interval_sec: int, func: Callable[[], Any], *, jitter_sec: int = 0) -> ScheduledJob:
+    job = ScheduledJob(name=name, interval_sec=max(1, int(interval_sec)), func=func, jitter_sec=max(0, int(jitter_sec)))
+    _JOBS[name] = job
+    return job
+
+
+def unregister_job(name: str) -> None:
+    _JOBS.pop(name, None)
+    _NEXT_JITTER.pop(name, None)
+
+
+def registered_jobs() -> List[ScheduledJob]:
+    return list(_JOBS.values())
+
+
+def _last_started_map(db: Session) -> Dict[str, datetime]:
+    rows = (
+        db.query(ScheduledJobRun.job_name, func.max(ScheduledJobRun.started_at))
+        .filter(ScheduledJobRun.job_name.in_(list(_JOBS.keys())))
+        .group_by(ScheduledJobRun.job_name)
+        .all()
+    )
+    return {name: ts for name, ts in rows if ts is not None}
+
+
+def _is_due(job: ScheduledJob, last_started: Optional[datetime], now: datetime) -> bool:
+    if last_started is None:
+        return True
+    jitter = _NEXT_JITTER.get(job.name, 0.0)
+    return now >= last_started + timedelta(seconds=job.interval_sec + jitter)
+
+
+def _run_job(job: ScheduledJob) -> None:
+    db = SessionLocal()
+    try:
+        run = ScheduledJobRun(job_name=job.name, owner=INSTANCE_ID, started_at=datetime.utcnow())
+        db.add(run)
+        db.commit()
+        t0 = time.perf_counter()
+        try:
+            result = job.func()
+            run.ok = True
+            if result is not None:
+                run.result = result if isinstance(result, dict) else {"value": result}
+        except Exception as e:
+            logger.exception("scheduler job %s failed", job.name)
+            run.ok = False
+            run.error = str(e)[:2000]
+        run.ended_at = datetime.utcnow()
+        run.duration_ms = int((time.perf_counter() - t0) * 1000)
+        db.commit()
+    finally:
+        db.close()
+    _NEXT_JITTER[job.name] = random.uniform(0, job.jitter_sec) if job.jitter_sec else 0.0
+
+
+def run_scheduler_tick() -> List[str]:
+    """同步执行一轮调度（在线程池中调用）：非 leader 直接返回；leader 执行所有到期任务。"""
+    if not try_acquire_lease(LEADER_LEASE_NAME):
+        return []
+    db = SessionLocal()
+    try:
+        last_started = _last_started_map(db)
+    finally:
+        db.close()
+    now = datetime.utcnow()
+    ran: List[str] = []
+    for job in list(_JOBS.values()):
+        if not _is_due(job, last_started.get(job.name), now):
+            continue
+        # 长任务之间续期，避免租约在执行中过期被其它实例接管
+        if not try_acquire_lease(LEADER_LEASE_NAME):
+            break
+        _run_job(job)
+        ran.append(job.name)
+    return ran
+
+
+async def run_scheduler_loop(stop: asyncio.Event) -> None:
+    register_default_jobs()
+    # 启动抖动：避免所有 worker 同时争抢租约
+    try:
+        await asyncio.wait_for(stop.wait(), timeout=random.uniform(0, min(5.0, _tick_sec())))
+        return
+    except asyncio.TimeoutError:
+        pass
+    try:
+        while not stop.is_set():
+            try:
+                await asyncio.to_thread(run_scheduler_tick)
+            except Exception:
+                logger.exception("scheduler tick failed")
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=_tick_sec())
+                return
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        await asyncio.to_thread(release_lease, LEADER_LEASE_NAME)
+
+
+# ---------------------------------------------------------------------------
+# Status view (/admin/jobs)
+# ---------------------------------------------------------------------------
+
+
+def _run_dict(r: ScheduledJobRun) -> Dict[str, Any]:
+    return {
+        "id": r.id,
+        "owner": r.owner,
+        "started_at": r.started_at.isoformat() if r.started_at else None,
+        "ended_at": r.ended_at.isoformat() if r.ended_at else None,
+        "ok": bool(r.ok),
+        "error": r.error,
+        "duration_ms": int(r.duration_ms or 0),
+        "result": r.result,
+    }
+
+
+def get_jobs_status(db: Session, *, history_limit: int = 10) -> Dict[str, Any]:
+    register_default_jobs()
+    last_started = _last_started_map(db)
+    jobs = []
+    for job in _JOBS.values():
+        runs = (
+            db.query(ScheduledJobRun)
+            .filter(ScheduledJobRun.job_name == job.name)
+            .order_by(ScheduledJobRun.started_at.desc(), ScheduledJobRun.id.desc())
+            .limit(max(1, history_limit))
+            .all()
+        )
+        last = last_started.get(job.name)
+        jobs.append(
+            {
+                "name": job.name,
+                "interval_sec": job.interval_sec,
+                "jitter_sec": job.jitter_sec,
+                "next_due_at": (last + timedelta(seconds=job.interval_sec)).isoformat() if last else None,
+                "last_run": _run_dict(runs[0]) if runs else None,
+                "history": [_run_dict(r) for r in runs],
+            }
+        )
+    return {"leader": get_lease_info(LEADER_LEASE_NAME), "tick_sec": _tick_sec(), "jobs": jobs}
+
+
+# ---------------------------------------------------------------------------
+# Default jobs
+# ---------------------------------------------------------------------------
+
+
+def _job_community_tick() -> None:
+    from app.services.community_jobs import run_community_tick
+
+    run_community_tick()
+
+
+def _job_stats_warmup() -> Dict[str, Any]:
+    from app.services.onboarding_quest import cached_onboarding_open_tasks
+    from app.services.platform_stats_cache import warm_platform_stats_cache
+
+    db = SessionLocal()
+    try:
+        bundle = warm_platform_stats_cache(db)
+        # 注册响应只读新手任务缓存，这里顺带保持其常热
+        cached_onboarding_open_tasks(db)
+        return {"tasks_total": bundle.get("tasks_total"), "agents_count": bundle.get("agents_count")}
+    finally:
+        db.close()
+
+
+def _job_auto_confirm() -> Dict[str, Any]:
+    from app.domain.task_helpers import auto_confirm_overdue_tasks
+
+    limit = int(os.getenv("CLAWJOB_AUTO_CONFIRM_BATCH_LIMIT", "200"))
+    db = SessionLocal()
+    try:
+        return {"confirmed": auto_confirm_overdue_tasks(db, limit=limit)}
+    finally:
+        db.close()
+
+
+def _job_unpicked_reminders() -> Dict[str, Any]:
+    from app.services.unpicked_reminders import run_unpicked_reminders
+
+    db = SessionLocal()
+    try:
+        return run_unpicked_reminders(db)
+    finally:
+        db.close()
+
+
+def _job_earnings_reconcile() -> Dict[str, Any]:
+    from app.services.agent_earnings import run_earnings_reconciliation
+
+    db = SessionLocal()
+    try:
+        return run_earnings_reconciliation(db)
+    finally:
+        db.close()
+
+
+def _job_ledger_checkpoints() -> Dict[str, Any]:
+    from app.services.credit_ledger import run_ledger_checkpoints
+
+    db = SessionLocal()
+    try:
+        return run_ledger_checkpoints(db)
+    finally:
+        db.close()
+
+
+def _job_retention() -> Dict[str, Any]:
+    now = datetime.utcnow()
+    log_days = max(1, int(os.getenv("CLAWJOB_SYSTEM_LOG_RETENTION_DAYS", "30")))
+    run_days = max(1, int(os.getenv("CLAWJOB_JOB_RUN_RETENTION_DAYS", "7")))
+    db = SessionLocal()
+    try:
+        logs = (
+            db.query(SystemLog)
+            .filter(SystemLog.created_at < now - timedelta(days=log_days))
+            .delete(synchronize_session=False)
+        )
+        runs = (
+            db.query(ScheduledJobRun)
+            .filter(ScheduledJobRun.started_at < now - timedelta(days=run_days))
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    from app.services.task_queue import DbTaskQueue
+
+    queue_days = max(1, int(os.getenv("CLAWJOB_TASK_QUEUE_RETENTION_DAYS", "7")))
+    queue_jobs = DbTaskQueue().purge_finished(timedelta(days=queue_days))
+    return {"system_logs_deleted": int(logs or 0), "job_runs_deleted": int(runs or 0), "queue_jobs_deleted": queue_jobs}
+
+
+def _job_register_followups() -> Dict[str, Any]:
+    from app.services.register_followups import run_register_followups
+
+    return run_register_followups()
+
+
+def _job_task_completed_hooks() -> Dict[str, Any]:
+    from app.services.batch_confirm import run_task_completed_hooks
+
+    return run_task_completed_hooks()
+
+
+def _job_mail_delivery() -> Dict[str, Any]:
+    from app.services.mailer import deliver_pending_mail
+
+    return deliver_pending_mail()
+
+
+def register_default_jobs() -> None:
+    """注册内置周期任务（幂等）；间隔可通过环境变量调整。"""
+    if "community_tick" not in _JOBS:
+        interval = max(60, int(os.getenv("CLAWJOB_COMMUNITY_DISPATCH_INTERVAL_SEC", "900")))
+        register_job("community_tick", interval, _job_community_tick, jitter_sec=30)
+    if "stats_warmup" not in _JOBS:
+        from app.services.platform_stats_cache import STATS_CACHE_TTL_SEC
+
+        interval = int(os.getenv("CLAWJOB_STATS_WARMUP_INTERVAL_SEC", str(max(15, STATS_CACHE_TTL_SEC // 2))))
+        register_job("stats_warmup", max(15, interval), _job_stats_warmup, jitter_sec=5)
+    if "auto_confirm" not in _JOBS:
+        interval = int(os.getenv("CLAWJOB_AUTO_CONFIRM_INTERVAL_SEC", "300"))
+        register_job("auto_confirm", max(30, interval), _job_auto_confirm, jitter_sec=15)
+    if "register_followups" not in _JOBS:
+        interval = int(os.getenv("CLAWJOB_REGISTER_FOLLOWUP_INTERVAL_SEC", "60"))
+        register_job("register_followups", max(15, interval), _job_register_followups, jitter_sec=5)
+    if "task_completed_hooks" not in _JOBS:
+        interval = int(os.getenv("CLAWJOB_TASK_HOOKS_INTERVAL_SEC", "60"))
+        register_job("task_completed_hooks", max(15, interval), _job_task_completed_hooks, jitter_sec=5)
+    if "mail_delivery" not in _JOBS:
+        interval = int(os.getenv("CLAWJOB_MAIL_DELIVERY_INTERVAL_SEC", "30"))
+        register_job("mail_delivery", max(15, interval), _job_mail_delivery, jitter_sec=5)
+    if "unpicked_reminders" not in _JOBS:
+        interval = int(os.getenv("CLAWJOB_UNPICKED_REMINDER_INTERVAL_SEC", "900"))
+        register_job("unpicked_reminders", max(60, interval), _job_unpicked_reminders, jitter_sec=30)
+    if "earnings_reconcile" not in _JOBS:
+        interval = int(os.getenv("CLAWJOB_EARNINGS_RECONCILE_INTERVAL_SEC", "3600"))
+        register_job("earnings_reconcile", max(300, interval), _job_earnings_reconcile, jitter_sec=120)
+    if "ledger_checkpoints" not in _JOBS:
+        interval = int(os.getenv("CLAWJOB_LEDGER_CHECKPOINT_INTERVAL_SEC", "3600"))
+        register_job("ledger_checkpoints", max(300, interval), _job_ledger_checkpoints, jitter_sec=120)
+    if "retention" not in _JOBS:
+        interval = int(os.getenv("CLAWJOB_RETENTION_INTERVAL_SEC", "86400"))
+        register_job("retention", max(3600, interval), _job_retention, jitter_sec=600)
@@ -8,15 +8,27 @@ can inspect what happened on a failed or slow run.
 The recorder is safe to use inside a normal FastAPI request session and
 never raises out of its own bookkeeping path — if DB writes fail we
 silently degrade rather than blocking the execution.
+
+Steps are buffered in memory and bulk-inserted at checkpoints (every
+``CLAWJOB_STEP_FLUSH_EVERY`` steps, default 50) and on ``finish``. Payloads
+larger than ``CLAWJOB_STEP_COMPRESS_MIN_BYTES`` (default 2048) are stored
+zlib-compressed; ``serialize_step`` transparently inflates them. Readers page
+through steps by ``idx`` (keyset) via ``iter_run_steps`` instead of loading
+a whole run.
 """
 from __future__ import annotations
 
+import base64
+import json
+import os
 import time
 import uuid
+import zlib
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 
 
@@ -52,6 +64,8 @@ class RunRecorder:
         self.user_id = user_id
         self.run_id = uuid.uuid4().hex
         self._steps: List[RecordedStep] = []
+        self._pending: List[Dict[str, Any]] = []
+        self._flush_every = _env_int("CLAWJOB_STEP_FLUSH_EVERY", 50)
         self._t0 = time.monotonic()
         self._run_row = None
 
@@ -92,8 +106,6 @@ class RunRecorder:
         tokens: int = 0,
         cost_credits: int = 0,
     ) -> None:
-        from app.database.relational_db import ExecutionStep
-
         idx = len(self._steps)
         rs = RecordedStep(
             idx=idx,
@@ -108,23 +120,33 @@ class RunRecorder:
             cost_credits=int(cost_credits or 0),
         )
         self._steps.append(rs)
+        self._pending.append({
+            "run_id": self.run_id,
+            "task_id": self.task_id,
+            "idx": idx,
+            "kind": kind,
+            "name": (name or "")[:120] or None,
+            "input": encode_payload(input),
+            "output": encode_payload(output),
+            "ok": bool(ok),
+            "error": (error or None),
+            "started_at": rs.started_at,
+            "duration_ms": rs.duration_ms,
+            "tokens": rs.tokens,
+            "cost_credits": rs.cost_credits,
+        })
+        if len(self._pending) >= self._flush_every:
+            self.checkpoint()
+
+    def checkpoint(self) -> None:
+        """Bulk-insert buffered steps (one executemany) into the current transaction."""
+        from app.database.relational_db import ExecutionStep
+
+        if not self._pending:
+            return
+        rows, self._pending = self._pending, []
         try:
-            row = ExecutionStep(
-                run_id=self.run_id,
-                task_id=self.task_id,
-                idx=idx,
-                kind=kind,
-                name=(name or "")[:120] or None,
-                input=_truncate_payload(input),
-                output=_truncate_payload(output),
-                ok=bool(ok),
-                error=(error or None),
-                duration_ms=int(duration_ms or 0),
-                tokens=int(tokens or 0),
-                cost_credits=int(cost_credits or 0),
-            )
-            self.db.add(row)
-            self.db.flush()
+            self.db.execute(insert(ExecutionStep), rows)
         except Exception:
             try:
                 self.db.rollback()
@@ -148,6 +170,7 @@ class RunRecorder:
             ok=bool(ok),
             error=error,
         )
+        self.checkpoint()
         if not self._run_row:
             return
         try:
@@ -178,30 +201,76 @@ class RunRecorder:
 # -------------------------------------------------------------------
 
 
-_MAX_JSON_BYTES = 4096
+_MAX_JSON_BYTES = 256 * 1024
+
 
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.getenv(name, str(default))))
+    except (TypeError, ValueError):
+        return default
 
-def _truncate_payload(obj: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+
+def _compress_min_bytes() -> int:
+    return _env_int("CLAWJOB_STEP_COMPRESS_MIN_BYTES", 2048)
+
+
+def encode_payload(obj: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Prepare a step payload for storage: small ones as-is, large ones zlib+base64."""
     if obj is None:
         return None
     try:
-        import json
-
         raw = json.dumps(obj, ensure_ascii=False, default=str)
-        if len(raw) <= _MAX_JSON_BYTES:
+        if len(raw) > _MAX_JSON_BYTES:
+            return {"_truncated": True, "_preview": raw[:4096]}
+        if len(raw) < _compress_min_bytes():
             return obj
-        return {"_truncated": True, "_preview": raw[: _MAX_JSON_BYTES]}
+        packed = base64.b64encode(zlib.compress(raw.encode("utf-8"), 6)).decode("ascii")
+        return {"_z": packed, "_len": len(raw)}
     except Exception:
         return {"_invalid": True}
 
 
+def decode_payload(obj: Any) -> Any:
+    if isinstance(obj, dict) and "_z" in obj:
+        try:
+            return json.loads(zlib.decompress(base64.b64decode(obj["_z"])).decode("utf-8"))
+        except Exception:
+            return {"_invalid": True}
+    return obj
+
+
+def iter_run_steps(
+    db: Session,
+    run_id: str,
+    *,
+    after_idx: Optional[int] = None,
+    page_size: int = 500,
+) -> Iterator[Any]:
+    """Yield a run's steps in idx order, fetching ``page_size`` rows per query."""
+    from app.database.relational_db import ExecutionStep
+
+    cursor = after_idx
+    while True:
+        q = db.query(ExecutionStep).filter(ExecutionStep.run_id == str(run_id))
+        if cursor is not None:
+            q = q.filter(ExecutionStep.idx > int(cursor))
+        rows = q.order_by(ExecutionStep.idx.asc()).limit(page_size).all()
+        for r in rows:
+            yield r
+            db.expunge(r)  # keep the identity map flat on long runs
+        if len(rows) < page_size:
+            return
+        cursor = int(rows[-1].idx)
+
+
 def serialize_step(s: Any) -> Dict[str, Any]:
     return {
         "idx": int(getattr(s, "idx", 0) or 0),
         "kind": getattr(s, "kind", None),
         "name": getattr(s, "name", None),
-        "input": getattr(s, "input", None),
-        "output": getattr(s, "output", None),
+        "input": decode_payload(getattr(s, "input", None)),
+        "output": decode_payload(getattr(s, "output", None)),
         "ok": bool(getattr(s, "ok", True)),
         "error": getattr(s, "error", None),
         "started_at": (
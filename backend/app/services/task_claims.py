@@ -0,0 +1,62 @@
+"""
+任务接取 / 选标 / 托管放款的原子状态迁移。
+
+所有「先读后写」的竞争点统一改为条件 UPDATE（compare-and-set）：
+``UPDATE tasks SET ... WHERE id = ? AND <期望的旧状态>``，以 rowcount 判定是否抢到。
+SQLite 与 PostgreSQL 均在行（或库）级写锁下重新评估 WHERE，因此并发请求中只有一个能成功，
+不依赖 ``SELECT ... FOR UPDATE``（SQLite 下为空操作）。调用方负责 commit / rollback。
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy.orm import Session
+
+from app.database.relational_db import Task
+
+CLAIMABLE_STATUSES = ("open", "pending")
+
+
+class TaskClaimConflict(Exception):
+    """条件更新未命中：任务已被其他请求抢先迁移。"""
+
+
+def claim_task_for_agent(
+    db: Session,
+    task_id: int,
+    agent_id: int,
+    *,
+    new_status: Optional[str] = None,
+) -> bool:
+    """原子接取：仅当任务未被接取且处于可接取状态时写入 agent_id（可选同时改状态）。"""
+    values: Dict[str, Any] = {"agent_id": int(agent_id)}
+    if new_status:
+        values["status"] = new_status
+    n = (
+        db.query(Task)
+        .filter(
+            Task.id == int(task_id),
+            Task.agent_id.is_(None),
+            Task.status.in_(CLAIMABLE_STATUSES),
+        )
+        .update(values, synchronize_session=False)
+    )
+    return n == 1
+
+
+def transition_task_status(
+    db: Session,
+    task_id: int,
+    *,
+    from_statuses: Iterable[str],
+    to_status: str,
+    extra: Optional[Dict[str, Any]] = None,
+) -> bool:
+    """原子状态迁移：仅当当前状态属于 from_statuses 时更新为 to_status。"""
+    values: Dict[str, Any] = {"status": to_status, **(extra or {})}
+    n = (
+        db.query(Task)
+        .filter(Task.id == int(task_id), Task.status.in_(list(from_statuses)))
+        .update(values, synchronize_session=False)
+    )
+    return n == 1
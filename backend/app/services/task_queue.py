@@ -0,0 +1,688 @@
+"""
+持久化任务队列：多 worker 共享、进程重启不丢失。
+
+两种后端（CLAWJOB_TASK_QUEUE_BACKEND）：
+- ``db``（默认）：task_queue_jobs 表。PostgreSQL 下 ``SELECT ... FOR UPDATE SKIP LOCKED``
+  批量领取；SQLite 下逐条条件 UPDATE（compare-and-set，同 task_claims），以 rowcount 判定是否抢到。
+- ``redis``：Redis Streams + consumer group。按优先级分 lane（每 lane 一个 stream），
+  可见性超时通过 XAUTOCLAIM 回收，延迟重试放在 ZSET 中到期后再投递。
+
+语义一致：优先级高者先领取；领取后在可见性超时内未 ack 会被重新投递；
+失败按指数退避重试，超过 max_attempts 进入死信（db：status=dead；redis：``:dead`` stream）。
+已完成数量按时间窗口统计，供 HealthMonitor 的 task_queue 检查使用（get_size / get_processing_rate）。
+
+所有对外方法均为 async，内部 IO 通过 asyncio.to_thread 执行，不阻塞事件循环。
+"""
+from __future__ import annotations
+
+import abc
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import and_, func, or_
+
+from app.database.relational_db import SessionLocal, TaskQueueJob
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE = "default"
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# TaskPriority 取值到数值优先级的映射（越大越先领取）
+PRIORITY_LEVELS: Dict[str, int] = {"low": 0, "medium": 5, "high": 10, "critical": 20}
+
+
+def _env_int(key: str, default: int, minimum: int = 0) -> int:
+    try:
+        return max(minimum, int(os.getenv(key, str(default)).strip()))
+    except (TypeError, ValueError):
+        return default
+
+
+def _visibility_timeout_sec() -> int:
+    return _env_int("CLAWJOB_TASK_QUEUE_VISIBILITY_SEC", 300, 1)
+
+
+def _max_attempts() -> int:
+    return _env_int("CLAWJOB_TASK_QUEUE_MAX_ATTEMPTS", 3, 1)
+
+
+def _retry_base_sec() -> int:
+    return _env_int("CLAWJOB_TASK_QUEUE_RETRY_BASE_SEC", 10)
+
+
+def _rate_window_sec() -> int:
+    return _env_int("CLAWJOB_TASK_QUEUE_RATE_WINDOW_SEC", 300, 60)
+
+
+def priority_value(priority: Any) -> int:
+    """接受数值、"high" 之类的字符串或带 .value 的枚举（如 TaskPriority）。"""
+    raw = getattr(priority, "value", priority)
+    if isinstance(raw, str):
+        return PRIORITY_LEVELS.get(raw.strip().lower(), PRIORITY_LEVELS["medium"])
+    try:
+        return int(raw)
+    except (TypeError, ValueError):
+        return PRIORITY_LEVELS["medium"]
+
+
+def retry_delay_sec(attempts: int) -> int:
+    """第 attempts 次失败后的退避：base * 2^(attempts-1)，上限 1 小时。"""
+    return min(3600, _retry_base_sec() * (2 ** max(0, int(attempts) - 1)))
+
+
+@dataclass
+class QueueJob:
+    id: str
+    queue: str
+    payload: Dict[str, Any] = field(default_factory=dict)
+    priority: int = 0
+    attempts: int = 0
+    max_attempts: int = 3
+
+
+class TaskQueueBackend(abc.ABC):
+    """后端接口：子类实现同步的 ``_xxx`` 方法，async 包装统一放到线程池执行。"""
+
+    name = "base"
+
+    async def enqueue(
+        self,
+        payload: Dict[str, Any],
+        *,
+        queue: str = DEFAULT_QUEUE,
+        priority: Any = 0,
+        delay_sec: int = 0,
+        max_attempts: Optional[int] = None,
+    ) -> str:
+        return await asyncio.to_thread(
+            self._enqueue, payload, queue, priority_value(priority), int(delay_sec or 0), int(max_attempts or _max_attempts())
+        )
+
+    async def claim(
+        self,
+        *,
+        queue: str = DEFAULT_QUEUE,
+        limit: int = 1,
+        worker_id: Optional[str] = None,
+        visibility_timeout: Optional[int] = None,
+    ) -> List[QueueJob]:
+        return await asyncio.to_thread(
+            self._claim, queue, max(1, int(limit)), worker_id or WORKER_ID, int(visibility_timeout or _visibility_timeout_sec())
+        )
+
+    async def ack(self, job_id: str, *, worker_id: Optional[str] = None) -> bool:
+        return await asyncio.to_thread(self._ack, str(job_id), worker_id or WORKER_ID)
+
+    async def fail(self, job_id: str, error: str, *, worker_id: Optional[str] = None) -> str:
+        """处理失败：返回 "retry"（已按退避重新入队）、"dead"（进入死信）或 "lost"（租约已失效）。"""
+        return await asyncio.to_thread(self._fail, str(job_id), str(error or "")[:2000], worker_id or WORKER_ID)
+
+    async def get_size(self, queue: Optional[str] = None) -> int:
+        return await asyncio.to_thread(self._size, queue)
+
+    async def get_processing_rate(self, queue: Optional[str] = None) -> float:
+        """最近 CLAWJOB_TASK_QUEUE_RATE_WINDOW_SEC 内每分钟完成的任务数。"""
+        return await asyncio.to_thread(self._processing_rate, queue)
+
+    async def get_stats(self, queue: Optional[str] = None) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._stats, queue)
+
+    # 同步入口：供调度器任务 / BackgroundTasks 等已在线程中运行的调用方使用
+    def claim_sync(
+        self,
+        *,
+        queue: str = DEFAULT_QUEUE,
+        limit: int = 1,
+        worker_id: Optional[str] = None,
+        visibility_timeout: Optional[int] = None,
+    ) -> List[QueueJob]:
+        return self._claim(queue, max(1, int(limit)), worker_id or WORKER_ID, int(visibility_timeout or _visibility_timeout_sec()))
+
+    def ack_sync(self, job_id: str, *, worker_id: Optional[str] = None) -> bool:
+        return self._ack(str(job_id), worker_id or WORKER_ID)
+
+    def fail_sync(self, job_id: str, error: str, *, worker_id: Optional[str] = None) -> str:
+        return self._fail(str(job_id), str(error or "")[:2000], worker_id or WORKER_ID)
+
+    @abc.abstractmethod
+    def _enqueue(self, payload: Dict[str, Any], queue: str, priority: int, delay_sec: int, max_attempts: int) -> str:
+        ...
+
+    @abc.abstractmethod
+    def _claim(self, queue: str, limit: int, worker_id: str, visibility_timeout: int) -> List[QueueJob]:
+        ...
+
+    @abc.abstractmethod
+    def _ack(self, job_id: str, worker_id: str) -> bool:
+        ...
+
+    @abc.abstractmethod
+    def _fail(self, job_id: str, error: str, worker_id: str) -> str:
+        ...
+
+    @abc.abstractmethod
+    def _size(self, queue: Optional[str]) -> int:
+        ...
+
+    @abc.abstractmethod
+    def _processing_rate(self, queue: Optional[str]) -> float:
+        ...
+
+    @abc.abstractmethod
+    def _stats(self, queue: Optional[str]) -> Dict[str, Any]:
+        ...
+
+
+# ---------------------------------------------------------------------------
+# Database backend
+# ---------------------------------------------------------------------------
+
+
+class DbTaskQueue(TaskQueueBackend):
+    name = "db"
+
+    @staticmethod
+    def _claimable(queue: str, now: datetime):
+        return and_(
+            TaskQueueJob.queue == queue,
+            or_(
+                and_(TaskQueueJob.status == "queued", TaskQueueJob.available_at <= now),
+                and_(TaskQueueJob.status == "processing", TaskQueueJob.locked_until < now),
+            ),
+        )
+
+    def _enqueue(self, payload, queue, priority, delay_sec, max_attempts) -> str:
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            row = TaskQueueJob(
+                queue=queue,
+                payload=payload or {},
+                priority=priority,
+                status="queued",
+                max_attempts=max_attempts,
+                available_at=now + timedelta(seconds=max(0, delay_sec)),
+                created_at=now,
+            )
+            db.add(row)
+            db.commit()
+            return str(row.id)
+        finally:
+            db.close()
+
+    def _claim(self, queue, limit, worker_id, visibility_timeout) -> List[QueueJob]:
+        now = datetime.utcnow()
+        values = self._claim_values(worker_id, visibility_timeout, now)
+        db = SessionLocal()
+        try:
+            # 租约过期且重试次数已用尽的任务直接进入死信，不再投递
+            db.query(TaskQueueJob).filter(
+                TaskQueueJob.queue == queue,
+                TaskQueueJob.status == "processing",
+                TaskQueueJob.locked_until < now,
+                TaskQueueJob.attempts >= TaskQueueJob.max_attempts,
+            ).update(
+                {"status": "dead", "finished_at": now, "locked_by": None, "last_error": "visibility timeout"},
+                synchronize_session=False,
+            )
+            candidates = (
+                db.query(TaskQueueJob.id)
+                .filter(self._claimable(queue, now))
+                .order_by(TaskQueueJob.priority.desc(), TaskQueueJob.id.asc())
+            )
+            if db.get_bind().dialect.name == "postgresql":
+                ids = [r[0] for r in candidates.limit(limit).with_for_update(skip_locked=True).all()]
+                if ids:
+                    db.query(TaskQueueJob).filter(TaskQueueJob.id.in_(ids)).update(values, synchronize_session=False)
+            else:
+                ids = []
+                for (jid,) in candidates.limit(limit * 4).all():
+                    if len(ids) >= limit:
+                        break
+                    n = (
+                        db.query(TaskQueueJob)
+                        .filter(TaskQueueJob.id == jid, self._claimable(queue, now))
+                        .update(values, synchronize_session=False)
+                    )
+                    if n == 1:
+                        ids.append(jid)
+            db.commit()
+            if not ids:
+                return []
+            rows = (
+                db.query(TaskQueueJob)
+                .filter(TaskQueueJob.id.in_(ids))
+                .order_by(TaskQueueJob.priority.desc(), TaskQueueJob.id.asc())
+                .all()
+            )
+            return [self._to_job(r) for r in rows]
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def claim_job_sync(
+        self,
+        job_id: Any,
+        *,
+        queue: str = DEFAULT_QUEUE,
+        worker_id: Optional[str] = None,
+        visibility_timeout: Optional[int] = None,
+    ) -> Optional[QueueJob]:
+        """只领取指定的一条任务（outbox 写入方提交后处理自己那条）；已被领取、已完成或不存在时返回 None。"""
+        if not str(job_id).isdigit():
+            return None
+        now = datetime.utcnow()
+        values = self._claim_values(worker_id or WORKER_ID, int(visibility_timeout or _visibility_timeout_sec()), now)
+        db = SessionLocal()
+        try:
+            n = (
+                db.query(TaskQueueJob)
+                .filter(TaskQueueJob.id == int(job_id), self._claimable(queue, now))
+                .update(values, synchronize_session=False)
+            )
+            db.commit()
+            if n != 1:
+                return None
+            row = db.get(TaskQueueJob, int(job_id))
+            return self._to_job(row) if row is not None else None
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def _claim_values(worker_id: str, visibility_timeout: int, now: datetime) -> Dict[str, Any]:
+        return {
+            "status": "processing",
+            "locked_by": worker_id,
+            "locked_until": now + timedelta(seconds=visibility_timeout),
+            "attempts": TaskQueueJob.attempts + 1,
+        }
+
+    @staticmethod
+    def _to_job(r: TaskQueueJob) -> QueueJob:
+        return QueueJob(
+            id=str(r.id),
+            queue=r.queue,
+            payload=dict(r.payload or {}),
+            priority=int(r.priority or 0),
+            attempts=int(r.attempts or 0),
+            max_attempts=int(r.max_attempts or 1),
+        )
+
+    def _ack(self, job_id, worker_id) -> bool:
+        if not str(job_id).isdigit():
+            return False
+        db = SessionLocal()
+        try:
+            n = (
+                db.query(TaskQueueJob)
+                .filter(
+                    TaskQueueJob.id == int(job_id),
+                    TaskQueueJob.status == "processing",
+                    TaskQueueJob.locked_by == worker_id,
+                )
+                .update(
+                    {"status": "done", "finished_at": datetime.utcnow(), "locked_by": None, "locked_until": None},
+                    synchronize_session=False,
+                )
+            )
+            db.commit()
+            return n == 1
+        finally:
+            db.close()
+
+    def _fail(self, job_id, error, worker_id) -> str:
+        if not str(job_id).isdigit():
+            return "lost"
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            row = db.query(TaskQueueJob).filter(TaskQueueJob.id == int(job_id)).first()
+            if not row or row.status != "processing" or row.locked_by != worker_id:
+                return "lost"
+            attempts = int(row.attempts or 0)
+            if attempts >= int(row.max_attempts or 1):
+                outcome = "dead"
+                values = {"status": "dead", "finished_at": now}
+            else:
+                outcome = "retry"
+                values = {"status": "queued", "available_at": now + timedelta(seconds=retry_delay_sec(attempts))}
+            values.update({"locked_by": None, "locked_until": None, "last_error": error})
+            n = (
+                db.query(TaskQueueJob)
+                .filter(
+                    TaskQueueJob.id == int(job_id),
+                    TaskQueueJob.status == "processing",
+                    TaskQueueJob.locked_by == worker_id,
+                    TaskQueueJob.attempts == attempts,
+                )
+                .update(values, synchronize_session=False)
+            )
+            db.commit()
+            return outcome if n == 1 else "lost"
+        finally:
+            db.close()
+
+    def _size(self, queue) -> int:
+        db = SessionLocal()
+        try:
+            q = db.query(func.count(TaskQueueJob.id)).filter(TaskQueueJob.status == "queued")
+            if queue:
+                q = q.filter(TaskQueueJob.queue == queue)
+            return int(q.scalar() or 0)
+        finally:
+            db.close()
+
+    def _processing_rate(self, queue) -> float:
+        window = _rate_window_sec()
+        db = SessionLocal()
+        try:
+            q = db.query(func.count(TaskQueueJob.id)).filter(
+                TaskQueueJob.status == "done",
+                TaskQueueJob.finished_at >= datetime.utcnow() - timedelta(seconds=window),
+            )
+            if queue:
+                q = q.filter(TaskQueueJob.queue == queue)
+            return round(int(q.scalar() or 0) * 60.0 / window, 2)
+        finally:
+            db.close()
+
+    def _stats(self, queue) -> Dict[str, Any]:
+        db = SessionLocal()
+        try:
+            q = db.query(TaskQueueJob.status, func.count(TaskQueueJob.id))
+            if queue:
+                q = q.filter(TaskQueueJob.queue == queue)
+            by_status = {str(s): int(c) for s, c in q.group_by(TaskQueueJob.status).all()}
+        finally:
+            db.close()
+        return {
+            "backend": self.name,
+            "queued": by_status.get("queued", 0),
+            "processing": by_status.get("processing", 0),
+            "done": by_status.get("done", 0),
+            "dead": by_status.get("dead", 0),
+            "processing_rate_per_minute": self._processing_rate(queue),
+        }
+
+    def purge_finished(self, older_than: timedelta) -> int:
+        """删除早于 older_than 完成的任务（死信保留，便于排查）。"""
+        db = SessionLocal()
+        try:
+            n = (
+                db.query(TaskQueueJob)
+                .filter(TaskQueueJob.status == "done", TaskQueueJob.finished_at < datetime.utcnow() - older_than)
+                .delete(synchronize_session=False)
+            )
+            db.commit()
+            return int(n or 0)
+        finally:
+            db.close()
+
+
+def enqueue_in_session(
+    db,
+    payload: Dict[str, Any],
+    *,
+    queue: str = DEFAULT_QUEUE,
+    priority: Any = 0,
+    delay_sec: int = 0,
+    max_attempts: Optional[int] = None,
+) -> TaskQueueJob:
+    """事务内入队（outbox）：任务行随调用方的事务一起提交，回滚则不会被投递。
+
+    始终写数据库后端，由 DbTaskQueue 领取，与 CLAWJOB_TASK_QUEUE_BACKEND 无关。调用方负责 commit。
+    """
+    now = datetime.utcnow()
+    row = TaskQueueJob(
+        queue=queue,
+        payload=payload or {},
+        priority=priority_value(priority),
+        status="queued",
+        max_attempts=int(max_attempts or _max_attempts()),
+        available_at=now + timedelta(seconds=max(0, int(delay_sec or 0))),
+        created_at=now,
+    )
+    db.add(row)
+    return row
+
+
+# ---------------------------------------------------------------------------
+# Redis Streams backend
+# ---------------------------------------------------------------------------
+
+_REDIS_PREFIX = "clawjob:tq:"
+_REDIS_GROUP = "clawjob-workers"
+# (lane, 最低优先级)：按顺序领取，高优先级 lane 先被读空
+_REDIS_LANES = (("critical", 20), ("high", 10), ("medium", 5), ("low", -(2 ** 31)))
+
+
+class RedisStreamTaskQueue(TaskQueueBackend):
+    name = "redis"
+
+    def __init__(self, client=None):
+        self._client = client
+        self._groups_ready: set = set()
+
+    @property
+    def client(self):
+        if self._client is None:
+            from app.database.cache_db import get_redis_cache
+
+            self._client = get_redis_cache().redis_client
+        return self._client
+
+    @staticmethod
+    def _lane_for(priority: int) -> str:
+        for lane, floor in _REDIS_LANES:
+            if priority >= floor:
+                return lane
+        return _REDIS_LANES[-1][0]
+
+    @staticmethod
+    def _stream(queue: str, lane: str) -> str:
+        return f"{_REDIS_PREFIX}{queue}:{lane}"
+
+    def _ensure_group(self, stream: str) -> None:
+        if stream in self._groups_ready:
+            return
+        try:
+            self.client.xgroup_create(stream, _REDIS_GROUP, id="0", mkstream=True)
+        except Exception as e:  # BUSYGROUP：组已存在
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._groups_ready.add(stream)
+
+    def _add(self, queue: str, priority: int, fields: Dict[str, Any]) -> str:
+        stream = self._stream(queue, self._lane_for(priority))
+        self._ensure_group(stream)
+        msg_id = self.client.xadd(stream, {k: str(v) for k, v in fields.items()})
+        return f"{stream}|{msg_id}"
+
+    def _enqueue(self, payload, queue, priority, delay_sec, max_attempts) -> str:
+        fields = {
+            "payload": json.dumps(payload or {}, ensure_ascii=False),
+            "priority": priority,
+            "attempts": 0,
+            "max_attempts": max_attempts,
+            "queue": queue,
+        }
+        if delay_sec > 0:
+            token = uuid.uuid4().hex
+            self.client.zadd(f"{_REDIS_PREFIX}{queue}:delayed", {json.dumps({**fields, "token": token}): time.time() + delay_sec})
+            return f"delayed|{token}"
+        return self._add(queue, priority, fields)
+
+    def _promote_delayed(self, queue: str) -> None:
+        key = f"{_REDIS_PREFIX}{queue}:delayed"
+        for member in self.client.zrangebyscore(key, "-inf", time.time(), start=0, num=100):
+            if self.client.zrem(key, member):  # 多 worker 并发时只有一个 ZREM 成功
+                fields = json.loads(member)
+                fields.pop("token", None)
+                self._add(queue, int(fields.get("priority") or 0), fields)
+
+    def _to_job(self, stream: str, msg_id: str, fields: Dict[str, Any], deliveries: int) -> QueueJob:
+        return QueueJob(
+            id=f"{stream}|{msg_id}",
+            queue=str(fields.get("queue") or DEFAULT_QUEUE),
+            payload=json.loads(fields.get("payload") or "{}"),
+            priority=int(fields.get("priority") or 0),
+            attempts=int(fields.get("attempts") or 0) + deliveries,
+            max_attempts=int(fields.get("max_attempts") or 1),
+        )
+
+    def _claim(self, queue, limit, worker_id, visibility_timeout) -> List[QueueJob]:
+        self._promote_delayed(queue)
+        jobs: List[QueueJob] = []
+        for lane, _floor in _REDIS_LANES:
+            if len(jobs) >= limit:
+                break
+            stream = self._stream(queue, lane)
+            self._ensure_group(stream)
+            # 可见性超时：回收超时未 ack 的消息；投递次数用尽的转入死信
+            reclaimed = self.client.xautoclaim(
+                stream, _REDIS_GROUP, worker_id, min_idle_time=visibility_timeout * 1000, start_id="0-0", count=limit - len(jobs)
+            )
+            for msg_id, fields in (reclaimed[1] if reclaimed else []) or []:
+                if not fields:
+                    continue
+                pending = self.client.xpending_range(stream, _REDIS_GROUP, min=msg_id, max=msg_id, count=1)
+                deliveries = int(pending[0]["times_delivered"]) if pending else 1
+                job = self._to_job(stream, msg_id, fields, deliveries)
+                if job.attempts > job.max_attempts:
+                    self._dead_letter(queue, stream, msg_id, fields, "visibility timeout")
+                    continue
+                jobs.append(job)
+            if len(jobs) >= limit:
+                break
+            resp = self.client.xreadgroup(_REDIS_GROUP, worker_id, {stream: ">"}, count=limit - len(jobs))
+            for _stream_name, messages in resp or []:
+                for msg_id, fields in messages:
+                    jobs.append(self._to_job(stream, msg_id, fields, 1))
+        return jobs[:limit]
+
+    def _dead_letter(self, queue: str, stream: str, msg_id: str, fields: Dict[str, Any], error: str) -> None:
+        pipe = self.client.pipeline()
+        pipe.xadd(f"{_REDIS_PREFIX}{queue}:dead", {**fields, "error": error[:2000]})
+        pipe.xack(stream, _REDIS_GROUP, msg_id)
+        pipe.xdel(stream, msg_id)
+        pipe.execute()
+
+    @staticmethod
+    def _split(job_id: str):
+        stream, _, msg_id = str(job_id).rpartition("|")
+        return stream, msg_id
+
+    def _ack(self, job_id, worker_id) -> bool:
+        stream, msg_id = self._split(job_id)
+        if not stream:
+            return False
+        acked = self.client.xack(stream, _REDIS_GROUP, msg_id)
+        if not acked:
+            return False
+        queue = stream[len(_REDIS_PREFIX):].rsplit(":", 1)[0]
+        bucket = f"{_REDIS_PREFIX}{queue}:done:{int(time.time() // 60)}"
+        pipe = self.client.pipeline()
+        pipe.xdel(stream, msg_id)
+        pipe.incr(bucket)
+        pipe.expire(bucket, _rate_window_sec() + 120)
+        pipe.execute()
+        return True
+
+    def _fail(self, job_id, error, worker_id) -> str:
+        stream, msg_id = self._split(job_id)
+        if not stream:
+            return "lost"
+        msgs = self.client.xrange(stream, min=msg_id, max=msg_id, count=1)
+        pending = self.client.xpending_range(stream, _REDIS_GROUP, min=msg_id, max=msg_id, count=1)
+        if not msgs or not pending or pending[0].get("consumer") != worker_id:
+            return "lost"
+        fields = dict(msgs[0][1])
+        queue = str(fields.get("queue") or DEFAULT_QUEUE)
+        attempts = int(fields.get("attempts") or 0) + int(pending[0]["times_delivered"])
+        if attempts >= int(fields.get("max_attempts") or 1):
+            self._dead_letter(queue, stream, msg_id, fields, error)
+            return "dead"
+        fields["attempts"] = attempts
+        self.client.zadd(
+            f"{_REDIS_PREFIX}{queue}:delayed",
+            {json.dumps({**fields, "token": uuid.uuid4().hex}): time.time() + retry_delay_sec(attempts)},
+        )
+        self.client.xack(stream, _REDIS_GROUP, msg_id)
+        self.client.xdel(stream, msg_id)
+        return "retry"
+
+    def _queues(self, queue: Optional[str]) -> List[str]:
+        if queue:
+            return [queue]
+        names = set()
+        for key in self.client.scan_iter(match=f"{_REDIS_PREFIX}*:delayed"):
+            names.add(str(key)[len(_REDIS_PREFIX):].rsplit(":", 1)[0])
+        for key in self.client.scan_iter(match=f"{_REDIS_PREFIX}*:low"):
+            names.add(str(key)[len(_REDIS_PREFIX):].rsplit(":", 1)[0])
+        return sorted(names) or [DEFAULT_QUEUE]
+
+    def _size(self, queue) -> int:
+        total = 0
+        for q in self._queues(queue):
+            for lane, _floor in _REDIS_LANES:
+                stream = self._stream(q, lane)
+                total += int(self.client.xlen(stream) or 0)
+                try:
+                    total -= int((self.client.xpending(stream, _REDIS_GROUP) or {}).get("pending") or 0)
+                except Exception:
+                    pass
+            total += int(self.client.zcard(f"{_REDIS_PREFIX}{q}:delayed") or 0)
+        return max(0, total)
+
+    def _processing_rate(self, queue) -> float:
+        window = _rate_window_sec()
+        minutes = max(1, window // 60)
+        now_min = int(time.time() // 60)
+        done = 0
+        for q in self._queues(queue):
+            keys = [f"{_REDIS_PREFIX}{q}:done:{now_min - i}" for i in range(minutes)]
+            done += sum(int(v or 0) for v in self.client.mget(keys))
+        return round(done / float(minutes), 2)
+
+    def _stats(self, queue) -> Dict[str, Any]:
+        dead = sum(int(self.client.xlen(f"{_REDIS_PREFIX}{q}:dead") or 0) for q in self._queues(queue))
+        return {
+            "backend": self.name,
+            "queued": self._size(queue),
+            "dead": dead,
+            "processing_rate_per_minute": self._processing_rate(queue),
+        }
+
+
+# ---------------------------------------------------------------------------
+# Factory
+# ---------------------------------------------------------------------------
+
+_QUEUE: Optional[TaskQueueBackend] = None
+
+
+def _backend_name() -> str:
+    backend = os.getenv("CLAWJOB_TASK_QUEUE_BACKEND", "db").strip().lower()
+    return backend if backend in ("db", "redis") else "db"
+
+
+def get_task_queue() -> TaskQueueBackend:
+    """进程内单例；后端由 CLAWJOB_TASK_QUEUE_BACKEND 选择（db | redis）。"""
+    global _QUEUE
+    if _QUEUE is None or _QUEUE.name != _backend_name():
+        _QUEUE = RedisStreamTaskQueue() if _backend_name() == "redis" else DbTaskQueue()
+    return _QUEUE
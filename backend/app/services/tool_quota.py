@@ -0,0 +1,205 @@
+"""
+Agent 工具调用配额：按 (agent, tool) 的令牌桶 + 按工具的在途并发上限。
+
+- 令牌桶：容量 burst（默认等于 rate_limit），每分钟补充 rate_limit 个令牌，按流逝时间连续补充，
+  不再是“用完即永久耗尽”的计数器。
+- 存储：Redis 上用一段 Lua 脚本原子地“补充 + 扣减”，一次往返、不加分布式锁，多进程共享同一份配额；
+  Redis 不可用时退回进程内存储（按 key 哈希分片加锁，1 万个 Agent 同时调用也不会争同一把锁），
+  并在 CLAWJOB_TOOL_QUOTA_REDIS_RETRY_SEC 内不再尝试 Redis，避免每次调用都等连接超时。
+- 并发：ToolMetadata.max_concurrency > 0 的慢工具限制进程内在途调用数，超出立即拒绝而不是排队；
+  先占并发名额再取令牌，因并发被拒的调用不消耗令牌。
+- 响应头：QuotaDecision.headers() 生成 X-RateLimit-Limit / Remaining / Reset，拒绝时附带 Retry-After。
+"""
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+_KEY_PREFIX = "clawjob:tool_quota:"
+_SHARDS = 64
+_SHARD_MAX_KEYS = 4096
+
+
+def _env_int(key: str, default: int, minimum: int = 0) -> int:
+    try:
+        return max(minimum, int(os.getenv(key, str(default)).strip()))
+    except (TypeError, ValueError):
+        return default
+
+
+REDIS_RETRY_SEC = _env_int("CLAWJOB_TOOL_QUOTA_REDIS_RETRY_SEC", 30, 1)
+
+# 返回 {allowed, tokens}；tokens 以字符串返回以保留小数（Lua number 转 Redis 整数会截断）
+_LUA_TAKE = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local b = redis.call('HMGET', KEYS[1], 't', 'ts')
+local tokens = tonumber(b[1]) or burst
+local ts = tonumber(b[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+@dataclass
+class QuotaDecision:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_sec: int
+    retry_after: int = 0
+    reason: Optional[str] = None  # rate_limited | concurrency_limited
+
+    def headers(self) -> Dict[str, str]:
+        out = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(self.reset_sec),
+        }
+        if not self.allowed:
+            out["Retry-After"] = str(max(1, self.retry_after))
+        return out
+
+
+def _bucket_params(rate_per_min: int, burst: Optional[int]) -> Tuple[float, int]:
+    rate = max(1, int(rate_per_min or 1)) / 60.0
+    return rate, max(1, int(burst or rate_per_min or 1))
+
+
+def _decision(allowed: bool, tokens: float, rate: float, burst: int, cost: int) -> QuotaDecision:
+    return QuotaDecision(
+        allowed=allowed,
+        limit=burst,
+        remaining=max(0, int(math.floor(tokens))),
+        reset_sec=int(math.ceil((burst - tokens) / rate)),
+        retry_after=0 if allowed else int(math.ceil((cost - tokens) / rate)),
+        reason=None if allowed else "rate_limited",
+    )
+
+
+class _LocalBuckets:
+    """进程内令牌桶：按 key 哈希分片，每片一把锁和一个字典。"""
+
+    def __init__(self, shards: int = _SHARDS):
+        self._shards: List[Tuple[threading.Lock, Dict[str, List[float]]]] = [
+            (threading.Lock(), {}) for _ in range(shards)
+        ]
+
+    def take(self, key: str, rate: float, burst: int, cost: int, now: float) -> Tuple[bool, float]:
+        lock, buckets = self._shards[hash(key) % len(self._shards)]
+        with lock:
+            entry = buckets.get(key)
+            if entry is None:
+                if len(buckets) >= _SHARD_MAX_KEYS:
+                    self._prune(buckets, now)
+                entry = buckets[key] = [float(burst), now, rate, burst]
+            tokens = min(float(burst), entry[0] + max(0.0, now - entry[1]) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            entry[0], entry[1], entry[2], entry[3] = tokens, now, rate, burst
+            return allowed, tokens
+
+    @staticmethod
+    def _prune(buckets: Dict[str, List[float]], now: float) -> None:
+        """丢弃已经补满的桶（与不存在等价）。"""
+        for k in [k for k, (t, ts, r, b) in buckets.items() if t + (now - ts) * r >= b]:
+            buckets.pop(k, None)
+
+
+class ToolQuota:
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self._local = _LocalBuckets()
+        self._redis_down_until = 0.0
+        self._script = None
+        self._inflight: Dict[str, int] = {}
+        self._inflight_lock = threading.Lock()
+
+    # -- token buckets -------------------------------------------------------
+
+    def _redis_take(self, key: str, rate: float, burst: int, cost: int, now: float) -> Optional[Tuple[bool, float]]:
+        if now < self._redis_down_until:
+            return None
+        try:
+            from app.database.cache_db import get_redis_cache
+
+            client = get_redis_cache().redis_client
+            if self._script is None:
+                self._script = client.register_script(_LUA_TAKE)
+            allowed, tokens = self._script(keys=[key], args=[rate, burst, now, cost], client=client)
+            return bool(int(allowed)), float(tokens)
+        except Exception:
+            self._redis_down_until = now + REDIS_RETRY_SEC
+            return None
+
+    def acquire(
+        self,
+        agent_id: str,
+        tool_name: str,
+        *,
+        rate_per_min: int,
+        burst: Optional[int] = None,
+        cost: int = 1,
+    ) -> QuotaDecision:
+        """从 (agent, tool) 的桶里取 cost 个令牌；不足时不扣减并返回 allowed=False。"""
+        rate, cap = _bucket_params(rate_per_min, burst)
+        cost = max(1, int(cost))
+        key = f"{_KEY_PREFIX}{tool_name}:{agent_id}"
+        now = self._clock()
+        got = self._redis_take(key, rate, cap, cost, now)
+        if got is None:
+            got = self._local.take(key, rate, cap, cost, now)
+        return _decision(got[0], got[1], rate, cap, cost)
+
+    def peek(self, agent_id: str, tool_name: str, *, rate_per_min: int, burst: Optional[int] = None) -> QuotaDecision:
+        """只查看 (agent, tool) 桶的当前余量（用于生成响应头），不扣减令牌。"""
+        rate, cap = _bucket_params(rate_per_min, burst)
+        key = f"{_KEY_PREFIX}{tool_name}:{agent_id}"
+        now = self._clock()
+        got = self._redis_take(key, rate, cap, 0, now)
+        if got is None:
+            got = self._local.take(key, rate, cap, 0, now)
+        return _decision(True, got[1], rate, cap, 1)
+
+    # -- concurrency ---------------------------------------------------------
+
+    @contextmanager
+    def concurrency_slot(self, tool_name: str, max_concurrency: int):
+        """占用一个在途名额；max_concurrency <= 0 表示不限制。yield 是否拿到名额。"""
+        if max_concurrency <= 0:
+            yield True
+            return
+        with self._inflight_lock:
+            n = self._inflight.get(tool_name, 0)
+            if n >= max_concurrency:
+                acquired = False
+            else:
+                self._inflight[tool_name] = n + 1
+                acquired = True
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                with self._inflight_lock:
+                    self._inflight[tool_name] -= 1
+
+    def inflight(self, tool_name: str) -> int:
+        return self._inflight.get(tool_name, 0)
+
+
+tool_quota = ToolQuota()
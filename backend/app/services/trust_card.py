@@ -1,88 +1,83 @@
-"""Agent 信任卡（Trust Card）：面向 Agent 开发者与爬虫的公开竞争力摘要。"""
+"""Agent 信任卡（Trust Card）：面向 Agent 开发者与爬虫的公开竞争力摘要。
+
+托管 / 新手任务计数与信誉指标来自同一趟聚合扫描（见 reputation），不再加载任务行。
+对外读取走 ``agent_trust_cards`` 快照：任务完成时标记 stale，读取时若 stale / 缺失 /
+超过 ``CLAWJOB_TRUST_CARD_MAX_AGE_SEC``（默认 900 秒）才重算；标记过期或内容变化时 version 递增，
+供接口生成 ETag，写回时按重算前读到的 version 做条件写入。
+"""
 
 from __future__ import annotations
 
+import hashlib
+import json
 import os
-from typing import Any, Dict, List, Optional
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from app.database.relational_db import Agent, PublishedSkill, Task, User
-from app.services.escrow_tasks import get_escrow
-from app.services.onboarding_quest import task_is_onboarding
+from app.database.relational_db import Agent, AgentTrustCardSnapshot, PublishedSkill, User
 from app.services.reputation import _agent_skill_token, compute_agent_reputation
 
-
-def _count_escrow_completed(agent_id: int, tasks: List[Task]) -> int:
-    n = 0
-    for t in tasks:
-        if t.status != "completed":
-            continue
-        if get_escrow(t):
-            n += 1
-    return n
-
-
-def _onboarding_quest_complete(agent_id: int, tasks: List[Task]) -> bool:
-    n = sum(1 for t in tasks if t.status == "completed" and task_is_onboarding(t))
-    return n >= 3
-
-
-def _verified_skills_for_agent(db: Session, agent: Agent) -> List[Dict[str, Any]]:
-    out: List[Dict[str, Any]] = []
-    seen: set[str] = set()
-    tok = _agent_skill_token(agent)
-    if tok:
-        row = (
+TRUST_CARD_MAX_AGE_SEC = max(60, int(os.getenv("CLAWJOB_TRUST_CARD_MAX_AGE_SEC", "900")))
+ONBOARDING_QUEST_SIZE = 3
+
+
+def _verified_skills_by_agent(db: Session, agents: List[Agent]) -> Dict[int, List[Dict[str, Any]]]:
+    """各 Agent 的认证 Skill：绑定 Skill（一次 IN 查询）+ 其拥有者最近发布的认证 Skill（每位拥有者一次）。"""
+    tokens = {a.id: _agent_skill_token(a) for a in agents}
+    wanted = {t for t in tokens.values() if t}
+    bound: Dict[str, PublishedSkill] = {}
+    if wanted:
+        bound = {
+            row.skill_token: row
+            for row in db.query(PublishedSkill)
+            .filter(PublishedSkill.skill_token.in_(wanted), PublishedSkill.verified.is_(True))
+            .all()
+        }
+    authored: Dict[int, List[PublishedSkill]] = {}
+    for owner_id in {a.owner_id for a in agents if a.owner_id is not None}:
+        authored[owner_id] = (
             db.query(PublishedSkill)
-            .filter(PublishedSkill.skill_token == tok, PublishedSkill.verified.is_(True))
-            .first()
+            .filter(PublishedSkill.author_user_id == owner_id, PublishedSkill.verified.is_(True))
+            .order_by(PublishedSkill.created_at.desc())
+            .limit(10)
+            .all()
         )
-        if row:
-            seen.add(tok)
-            out.append({
-                "skill_token": row.skill_token,
-                "name": row.name,
-                "verified": True,
-            })
-    rows = (
-        db.query(PublishedSkill)
-        .filter(PublishedSkill.author_user_id == agent.owner_id, PublishedSkill.verified.is_(True))
-        .order_by(PublishedSkill.created_at.desc())
-        .limit(10)
-        .all()
-    )
-    for row in rows:
-        if row.skill_token in seen:
-            continue
-        seen.add(row.skill_token)
-        out.append({
-            "skill_token": row.skill_token,
-            "name": row.name,
-            "verified": True,
-        })
-    return out[:8]
+    out: Dict[int, List[Dict[str, Any]]] = {}
+    for agent in agents:
+        rows = ([bound[tokens[agent.id]]] if tokens[agent.id] in bound else []) + authored.get(agent.owner_id, [])
+        seen: set[str] = set()
+        skills: List[Dict[str, Any]] = []
+        for row in rows:
+            if row.skill_token in seen:
+                continue
+            seen.add(row.skill_token)
+            skills.append({"skill_token": row.skill_token, "name": row.name, "verified": True})
+        out[agent.id] = skills[:8]
+    return out
 
 
-def compute_agent_trust_card(db: Session, agent_id: int) -> Optional[Dict[str, Any]]:
-    """聚合信任卡字段；Agent 不存在时返回 None。"""
-    agent = db.query(Agent).filter(Agent.id == int(agent_id)).first()
-    if not agent:
-        return None
+def _verified_skills_for_agent(db: Session, agent: Agent) -> List[Dict[str, Any]]:
+    return _verified_skills_by_agent(db, [agent])[agent.id]
 
-    rep = compute_agent_reputation(db, agent_id)
-    if not rep:
-        return None
 
+def build_trust_card(
+    agent: Agent,
+    owner: Optional[User],
+    rep: Dict[str, Any],
+    verified: List[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """由信誉卡与认证 Skill 组装信任卡（不查库）。"""
     accepted = int(rep["stats"]["accepted_task_count"])
     completed = int(rep["stats"]["completed_task_count"])
     completion_rate: Optional[float] = None
     if accepted > 0:
         completion_rate = round(completed / accepted, 4)
 
-    tasks: List[Task] = db.query(Task).filter(Task.agent_id == agent.id).all()
-    escrow_done = _count_escrow_completed(agent.id, tasks)
-    onboarding_done = _onboarding_quest_complete(agent.id, tasks)
+    escrow_done = int(rep["stats"].get("escrow_completed_count", 0) or 0)
+    onboarding_done = int(rep["stats"].get("onboarding_completed_count", 0) or 0) >= ONBOARDING_QUEST_SIZE
 
     badges: List[str] = []
     if onboarding_done:
@@ -91,7 +86,6 @@ def compute_agent_trust_card(db: Session, agent_id: int) -> Optional[Dict[str, A
         badges.append("escrow_executor")
     if completed >= 5:
         badges.append("proven_executor")
-    verified = _verified_skills_for_agent(db, agent)
     if verified:
         badges.append("verified_skill_author")
 
@@ -110,7 +104,6 @@ def compute_agent_trust_card(db: Session, agent_id: int) -> Optional[Dict[str, A
         + f", reputation {score}"
     )
 
-    owner: Optional[User] = db.query(User).filter(User.id == agent.owner_id).first()
     member_since = (
         agent.created_at.isoformat()
         if getattr(agent, "created_at", None)
@@ -137,3 +130,104 @@ def compute_agent_trust_card(db: Session, agent_id: int) -> Optional[Dict[str, A
             "cases": f"{api_base}/agents/{agent.id}/cases",
         },
     }
+
+
+def compute_agent_trust_card(db: Session, agent_id: int) -> Optional[Dict[str, Any]]:
+    """聚合信任卡字段；Agent 不存在时返回 None。"""
+    agent = db.query(Agent).filter(Agent.id == int(agent_id)).first()
+    if not agent:
+        return None
+
+    rep = compute_agent_reputation(db, agent_id)
+    if rep and "escrow_completed_count" not in (rep.get("stats") or {}):
+        rep = compute_agent_reputation(db, agent_id, use_cache=False)  # 旧版缓存缺少计数字段
+    if not rep:
+        return None
+
+    owner: Optional[User] = db.query(User).filter(User.id == agent.owner_id).first()
+    return build_trust_card(agent, owner, rep, _verified_skills_for_agent(db, agent))
+
+
+def _content_hash(card: Dict[str, Any]) -> str:
+    raw = json.dumps(card, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _store_snapshot(agent_id: int, card: Dict[str, Any], seen_version: Optional[int]) -> int:
+    """在独立会话中写入快照并返回 version（读取路径不污染请求事务）。
+
+    ``seen_version`` 是开始重算前读到的 version（无快照时为 None）。写入时锁行复核：
+    期间被 mark_trust_cards_stale 标记过（version 已变）说明重算可能基于提交前的数据，
+    此时不覆盖也不清除 stale，返回 0（调用方不据此生成 ETag）。
+    """
+    from app.database.relational_db import SessionLocal
+
+    digest = _content_hash(card)
+    for _ in range(2):
+        sdb = SessionLocal()
+        try:
+            row = (
+                sdb.query(AgentTrustCardSnapshot)
+                .filter(AgentTrustCardSnapshot.agent_id == int(agent_id))
+                .with_for_update()
+                .first()
+            )
+            if row is None:
+                row = AgentTrustCardSnapshot(agent_id=int(agent_id), version=1, content_hash=digest, card=card)
+                sdb.add(row)
+            elif seen_version is None or int(row.version or 0) != int(seen_version):
+                sdb.rollback()
+                return 0
+            else:
+                if row.content_hash != digest:
+                    row.version = int(row.version or 0) + 1
+                    row.content_hash = digest
+                row.card = card
+                row.stale = False
+                row.computed_at = datetime.utcnow()
+            sdb.commit()
+            return int(row.version)
+        except IntegrityError:
+            sdb.rollback()  # 并发首次写入：对方的结果为准
+            return 0
+        except Exception:
+            sdb.rollback()
+            break
+        finally:
+            sdb.close()
+    return 0
+
+
+def get_agent_trust_card(db: Session, agent_id: int) -> Optional[Tuple[Dict[str, Any], int]]:
+    """读取信任卡快照 ``(card, version)``；需要时重算。Agent 不存在时返回 None。"""
+    row = db.query(AgentTrustCardSnapshot).filter(AgentTrustCardSnapshot.agent_id == int(agent_id)).first()
+    fresh_after = datetime.utcnow() - timedelta(seconds=TRUST_CARD_MAX_AGE_SEC)
+    if (
+        row is not None
+        and not row.stale
+        and isinstance(row.card, dict)
+        and row.computed_at is not None
+        and row.computed_at >= fresh_after
+    ):
+        return dict(row.card), int(row.version)
+    seen_version = int(row.version or 0) if row is not None else None
+    card = compute_agent_trust_card(db, agent_id)
+    if card is None:
+        return None
+    version = _store_snapshot(int(agent_id), card, seen_version)
+    return card, version
+
+
+def mark_trust_cards_stale(db: Session, agent_ids: Iterable[Optional[int]]) -> None:
+    """任务完成等事件后标记快照过期并递增 version（随调用方事务提交）。
+
+    version 同时充当代次：在提交前开始重算的读取方写回时会发现 version 已变，不会用
+    提交前的数据清掉 stale。
+    """
+    ids = {int(a) for a in agent_ids if a}
+    if not ids:
+        return
+    db.query(AgentTrustCardSnapshot).filter(AgentTrustCardSnapshot.agent_id.in_(ids)).update(
+        {AgentTrustCardSnapshot.stale: True, AgentTrustCardSnapshot.version: AgentTrustCardSnapshot.version + 1},
+        synchronize_session=False,
+    )
@@ -0,0 +1,104 @@
+"""
+24h 无人接取提醒：给发布超过 24 小时仍未被接取的任务的发布方发一封站内信，每个任务只发一次。
+
+- 是否已提醒记录在 tasks.reminder_sent_at（索引 ix_tasks_reminder_due），查询只命中未提醒的行，
+  已提醒的任务不会在之后的每次运行里被重复扫描。
+- 每批最多 limit 行：先用一条条件 UPDATE（reminder_sent_at IS NULL）占位，再批量插入站内信，
+  同一事务提交；并发运行时占位行数不符则整体回滚，交给下一次运行。
+- 旧数据只在 input_data.reminder_24h_sent 上做过标记：遇到时只补写 reminder_sent_at，不再发信。
+- 由调度器任务 unpicked_reminders 周期执行；POST /tasks/send-unpicked-reminders 保留作手动触发 / dry_run。
+"""
+from __future__ import annotations
+
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import func, insert, update
+from sqlalchemy.orm import Session
+
+from app.database.relational_db import InternalMessage, Task
+
+REMIND_AFTER = timedelta(hours=24)
+BATCH_LIMIT = max(1, int(os.getenv("CLAWJOB_UNPICKED_REMINDER_BATCH", "500")))
+
+
+def _unpicked(db: Session, *columns, cutoff: datetime):
+    return db.query(*columns).filter(
+        Task.status == "open",
+        Task.agent_id.is_(None),
+        Task.created_at <= cutoff,
+    )
+
+
+def count_already_reminded(db: Session, *, now: Optional[datetime] = None) -> int:
+    cutoff = (now or datetime.utcnow()) - REMIND_AFTER
+    return int(_unpicked(db, func.count(Task.id), cutoff=cutoff).filter(Task.reminder_sent_at.isnot(None)).scalar() or 0)
+
+
+def _reminder_message(task_id: int, owner_id: int, title: str, now: datetime) -> Dict[str, Any]:
+    return {
+        "sender_user_id": owner_id,
+        "recipient_user_id": owner_id,
+        "title": f"任务 #{task_id} 已超 24h 无人接取",
+        "content": (
+            f"你发布的任务「{title}」已发布超过 24 小时，尚未有 Agent 接取。\n"
+            f"建议检查任务描述是否清晰、奖励点数是否合理，或手动邀请候选接单人。"
+        ),
+        "related_task_id": task_id,
+        "is_read": False,
+        "created_at": now,
+    }
+
+
+def send_unpicked_reminders(
+    db: Session,
+    *,
+    limit: int = BATCH_LIMIT,
+    dry_run: bool = False,
+    now: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """处理一批待提醒任务；返回本批提醒的任务 id，has_more 表示可能还有下一批。"""
+    now = now or datetime.utcnow()
+    rows = (
+        _unpicked(db, Task.id, Task.owner_id, Task.title, Task.input_data, cutoff=now - REMIND_AFTER)
+        .filter(Task.reminder_sent_at.is_(None))
+        .order_by(Task.id.asc())
+        .limit(max(1, int(limit)))
+        .all()
+    )
+    due = [r for r in rows if not (isinstance(r.input_data, dict) and r.input_data.get("reminder_24h_sent"))]
+    result = {
+        "reminded_task_ids": [r.id for r in due],
+        "legacy_marked": len(rows) - len(due),
+        "has_more": len(rows) >= max(1, int(limit)),
+    }
+    if dry_run or not rows:
+        return result
+    ids = [r.id for r in rows]
+    claimed = db.execute(
+        update(Task)
+        .where(Task.id.in_(ids), Task.reminder_sent_at.is_(None))
+        .values(reminder_sent_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if claimed != len(ids):
+        db.rollback()
+        return {"reminded_task_ids": [], "legacy_marked": 0, "has_more": True}
+    messages = [_reminder_message(r.id, int(r.owner_id), r.title, now) for r in due if r.owner_id]
+    if messages:
+        db.execute(insert(InternalMessage), messages)
+    db.commit()
+    return result
+
+
+def run_unpicked_reminders(db: Session, *, max_batches: int = 20) -> Dict[str, int]:
+    """调度器入口：连续处理若干批，直到没有待提醒任务。"""
+    reminded = legacy = 0
+    for _ in range(max(1, max_batches)):
+        got = send_unpicked_reminders(db)
+        reminded += len(got["reminded_task_ids"])
+        legacy += got["legacy_marked"]
+        if not got["has_more"]:
+            break
+    return {"reminded": reminded, "legacy_marked": legacy}
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""Backfill agent_cases for historical completed tasks, in task-id batches.
+
+Usage: python scripts/backfill_agent_cases.py [--batch 500]
+Safe to re-run: tasks that already have a case row are skipped.
+"""
+import argparse
+import os
+import sys
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, backend_dir)
+os.chdir(backend_dir)
+
+from app.database.relational_db import SessionLocal, init_db
+from app.services.agent_cases import BACKFILL_BATCH, backfill_agent_cases
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch", type=int, default=BACKFILL_BATCH)
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    scanned = inserted = 0
+    try:
+        after_id = 0
+        while True:
+            got = backfill_agent_cases(db, after_id=after_id, limit=args.batch)
+            scanned += got["scanned"]
+            inserted += got["inserted"]
+            after_id = got["next_after_id"]
+            if not after_id:
+                break
+    finally:
+        db.close()
+    print(f"completed tasks scanned: {scanned}, agent_cases rows inserted: {inserted}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
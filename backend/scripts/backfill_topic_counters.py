@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""Backfill chat_topics.message_count / member_count / last_message_at, in topic-id batches.
+
+Usage: python scripts/backfill_topic_counters.py [--batch 500]
+Run once after deploying the counter columns. Safe to re-run: each batch recomputes from
+chat_messages / chat_topic_members and overwrites the counters.
+"""
+import argparse
+import os
+import sys
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, backend_dir)
+os.chdir(backend_dir)
+
+from app.database.relational_db import SessionLocal, init_db
+from app.services.community import BACKFILL_BATCH, backfill_topic_counters
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch", type=int, default=BACKFILL_BATCH)
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    updated = 0
+    try:
+        after_id = 0
+        while True:
+            got = backfill_topic_counters(db, after_id=after_id, limit=args.batch)
+            updated += got["updated"]
+            after_id = got["next_after_id"]
+            if not after_id:
+                break
+    finally:
+        db.close()
+    print(f"chat_topics counters recomputed: {updated}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
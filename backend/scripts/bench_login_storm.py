@@ -0,0 +1,118 @@
+"""
+Login-storm benchmark: latency of an unrelated sync endpoint while /auth/login is hammered.
+
+Run with (from backend/):
+    python3 scripts/bench_login_storm.py
+
+Drives the app in-process over httpx's ASGI transport, so sync endpoints share the
+real AnyIO threadpool (40 threads) exactly as under uvicorn. It measures GET /stats
+idle and then during a storm of concurrent logins, and prints p50/p99 for both.
+Knobs: BENCH_USERS, BENCH_LOGIN_CONCURRENCY, BENCH_STORM_SEC, BENCH_PROBE_INTERVAL_MS,
+plus the hashing knobs from app.services.password_hashing (CLAWJOB_BCRYPT_ROUNDS,
+CLAWJOB_PASSWORD_HASH_WORKERS, CLAWJOB_PASSWORD_HASH_MAX_PENDING).
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND = os.path.abspath(os.path.join(HERE, ".."))
+if BACKEND not in sys.path:
+    sys.path.insert(0, BACKEND)
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_login.db")
+os.environ.setdefault("RATE_LIMIT_DEFAULT", "1000000/minute")
+os.environ.setdefault("CLAWJOB_LOGIN_MAX_FAILURES", "1000000")
+
+import httpx  # noqa: E402
+
+from app.main import app  # noqa: E402
+from app.database.relational_db import SessionLocal, User, init_db  # noqa: E402
+from app.services.password_hashing import hash_password_sync  # noqa: E402
+
+USERS = int(os.getenv("BENCH_USERS", "50"))
+CONCURRENCY = int(os.getenv("BENCH_LOGIN_CONCURRENCY", "200"))
+STORM_SEC = float(os.getenv("BENCH_STORM_SEC", "10"))
+PROBE_INTERVAL = float(os.getenv("BENCH_PROBE_INTERVAL_MS", "50")) / 1000.0
+PASSWORD = "bench-password"
+
+
+def _seed_users() -> List[str]:
+    init_db()
+    hashed = hash_password_sync(PASSWORD)
+    names = [f"bench_login_{i}" for i in range(USERS)]
+    db = SessionLocal()
+    try:
+        existing = {n for (n,) in db.query(User.username).filter(User.username.in_(names)).all()}
+        for n in names:
+            if n not in existing:
+                db.add(User(username=n, email=f"{n}@bench.local", hashed_password=hashed, credits=0))
+        db.commit()
+    finally:
+        db.close()
+    return names
+
+
+def _pct(samples: List[float], p: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))]
+
+
+async def _probe(client: httpx.AsyncClient, until: float) -> List[float]:
+    out: List[float] = []
+    while time.perf_counter() < until:
+        t0 = time.perf_counter()
+        r = await client.get("/stats")
+        r.raise_for_status()
+        out.append((time.perf_counter() - t0) * 1000.0)
+        await asyncio.sleep(PROBE_INTERVAL)
+    return out
+
+
+async def _login_worker(client: httpx.AsyncClient, names: List[str], idx: int, until: float, codes: Dict[int, int]) -> None:
+    i = idx
+    while time.perf_counter() < until:
+        r = await client.post("/auth/login", json={"username": names[i % len(names)], "password": PASSWORD})
+        codes[r.status_code] = codes.get(r.status_code, 0) + 1
+        i += 1
+        if r.status_code == 503:  # shed: back off (with jitter) as a well-behaved client would
+            await asyncio.sleep(float(r.headers.get("retry-after") or 1) * random.uniform(0.5, 1.5))
+
+
+def _report(label: str, samples: List[float]) -> None:
+    print(
+        f"{label:<14} n={len(samples):<5} p50={statistics.median(samples) if samples else 0:8.1f}ms "
+        f"p99={_pct(samples, 99):8.1f}ms max={max(samples) if samples else 0:8.1f}ms"
+    )
+
+
+async def main() -> None:
+    names = _seed_users()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        await client.get("/stats")  # warm caches / connections
+        idle = await _probe(client, time.perf_counter() + min(STORM_SEC, 3.0))
+
+        codes: Dict[int, int] = {}
+        until = time.perf_counter() + STORM_SEC
+        storm = [asyncio.create_task(_login_worker(client, names, i, until, codes)) for i in range(CONCURRENCY)]
+        during = await _probe(client, until)
+        await asyncio.gather(*storm)
+
+    _report("idle /stats", idle)
+    _report("storm /stats", during)
+    total = sum(codes.values())
+    print(f"logins: {total} in {STORM_SEC:.0f}s ({total / STORM_SEC:.1f}/s) status={dict(sorted(codes.items()))}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
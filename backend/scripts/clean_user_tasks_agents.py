@@ -14,7 +14,7 @@ _backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if _backend not in sys.path:
     sys.path.insert(0, _backend)
 
-from app.database.relational_db import SessionLocal, User, Task, Agent
+from app.database.relational_db import SessionLocal, User, Task, Agent, AgentEarnings
 
 
 def main():
@@ -53,6 +53,7 @@ def main():
             for a in db.query(Agent).filter(Agent.owner_id == u.id).all():
                 print(f"  {'[DRY RUN] would delete agent' if dry_run else 'deleted agent'} id={a.id} name={a.name}")
                 if not dry_run:
+                    db.query(AgentEarnings).filter(AgentEarnings.agent_id == a.id).delete(synchronize_session=False)
                     db.delete(a)
                 agents_deleted += 1
         if (tasks_deleted or agents_deleted) and not dry_run:
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""Verify users.credits against the credit_transactions ledger (checkpoint + rows since), in user-id batches.
+
+Usage: python scripts/reconcile_credit_ledger.py [--batch 500] [--dry-run]
+--dry-run only reports; otherwise due balance checkpoints are written as well.
+Exits 1 when any user's balance disagrees with the ledger.
+"""
+import argparse
+import os
+import sys
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, backend_dir)
+os.chdir(backend_dir)
+
+from app.database.relational_db import SessionLocal, init_db
+from app.services.credit_ledger import RECONCILE_BATCH, reconcile_credit_ledger
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch", type=int, default=RECONCILE_BATCH)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    checked = written = 0
+    mismatches = []
+    try:
+        after_id = 0
+        while True:
+            got = reconcile_credit_ledger(db, after_id=after_id, limit=args.batch, write_checkpoints=not args.dry_run)
+            checked += got["checked"]
+            written += got["checkpoints"]
+            mismatches.extend(got["mismatches"])
+            after_id = got["next_after_id"]
+            if not after_id:
+                break
+    finally:
+        db.close()
+    for m in mismatches:
+        print(f"user {m['user_id']}: credits={m['credits']} ledger={m['ledger_balance']} diff={m['credits'] - m['ledger_balance']}")
+    print(f"users checked: {checked}, checkpoints written: {written}, mismatches: {len(mismatches)}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
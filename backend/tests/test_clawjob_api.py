@@ -1,6 +1,7 @@
 """
 ClawJob API 功能测试：认证、任务大厅、发布任务、注册 Agent、订阅任务、账户、验收流程。
 """
+import json
 import os
 import time
 from typing import Optional
@@ -3622,9 +3623,12 @@ def test_execution_runs_and_step_replay():
 
     exp = client.get(f"/tasks/{task_id}/runs/{run_id}/export", headers=h)
     assert exp.status_code == 200
-    doc = exp.json()
+    lines = [json.loads(x) for x in exp.text.splitlines() if x.strip()]
+    doc = lines[0]
+    assert doc["type"] == "run"
     assert doc["task_id"] == task_id
     assert doc["run"]["run_id"] == run_id
+    assert [x["kind"] for x in lines[1:]] == kinds
 
 
 def test_execution_runs_forbidden_to_stranger():
@@ -5782,3 +5786,1568 @@ def test_mcp_tools_publish_list_and_marketplace():
     r4 = client.delete(f"/mcp-tools/{tool_id}", headers=headers)
     assert r4.status_code == 200, r4.text
     assert r4.json().get("ok") is True
+
+
+def test_scheduler_lease_single_leader_and_job_runs_once_per_interval():
+    """调度器：租约同一时刻只有一个持有者；周期任务在间隔内跨实例只执行一次。"""
+    from app.services import scheduler as _sched
+
+    lease = f"test-lease-{_unique()}"
+    assert _sched.try_acquire_lease(lease, owner="worker-a", ttl=30) is True
+    assert _sched.try_acquire_lease(lease, owner="worker-b", ttl=30) is False
+    assert _sched.try_acquire_lease(lease, owner="worker-a", ttl=30) is True  # renew
+    _sched.release_lease(lease, owner="worker-a")
+    assert _sched.try_acquire_lease(lease, owner="worker-b", ttl=30) is True
+    _sched.release_lease(lease, owner="worker-b")
+
+    calls = []
+    job_name = f"test_job_{_unique()}"
+    leader = f"test-leader-{_unique()}"
+    with patch.dict(_sched._JOBS, {}, clear=True), patch.object(_sched, "LEADER_LEASE_NAME", leader):
+        _sched.register_job(job_name, 3600, lambda: calls.append(1) or {"n": len(calls)})
+        with patch.object(_sched, "INSTANCE_ID", "worker-a"):
+            assert job_name in _sched.run_scheduler_tick()
+            assert job_name not in _sched.run_scheduler_tick()
+        # 另一个实例接管 leader 后也不会在同一周期内重复执行
+        _sched.release_lease(leader, owner="worker-a")
+        with patch.object(_sched, "INSTANCE_ID", "worker-b"):
+            assert job_name not in _sched.run_scheduler_tick()
+        _sched.release_lease(leader, owner="worker-b")
+    assert len(calls) == 1
+
+
+def test_admin_jobs_status_view():
+    """/admin/jobs 返回 leader 信息与内置周期任务列表，仅超管可访问。"""
+    normal = f"jobsnorm_{_unique()}"
+    tk_n = _register_user(normal, f"{normal}@example.com", "pw")["access_token"]
+    assert client.get("/admin/jobs", headers={"Authorization": f"Bearer {tk_n}"}).status_code == 403
+
+    tk_a = _make_admin_token(f"jobsadm_{_unique()}")
+    r = client.get("/admin/jobs", headers={"Authorization": f"Bearer {tk_a}"})
+    assert r.status_code == 200, r.text
+    data = r.json()
+    assert "leader" in data and data["leader"]["backend"] in ("db", "redis")
+    names = {j["name"] for j in data["jobs"]}
+    assert {"community_tick", "stats_warmup", "auto_confirm", "retention"} <= names
+
+
+def test_subscribe_task_concurrent_agents_single_winner():
+    """并发接取：多个 Agent 同时订阅同一任务，只有一个成功写入 agent_id，其余 403/409。"""
+    import threading
+
+    pub = _register_user(f"claimpub_{_unique()}", f"claimpub_{_unique()}@example.com", "pw")
+    h_pub = {"Authorization": f"Bearer {pub['access_token']}"}
+    rt = client.post("/tasks", json={"title": "concurrent-claim", "description": "race"}, headers=h_pub)
+    assert rt.status_code == 200, rt.text
+    task_id = rt.json()["id"]
+
+    contenders = []
+    for i in range(6):
+        name = f"claimexe{i}_{_unique()}"
+        tk = _register_user(name, f"{name}@example.com", "pw")["access_token"]
+        h = {"Authorization": f"Bearer {tk}"}
+        ra = client.post("/agents/register", json={"name": f"ClaimAgent{i}", "description": "x"}, headers=h)
+        assert ra.status_code == 200, ra.text
+        contenders.append((h, ra.json()["id"]))
+
+    barrier = threading.Barrier(len(contenders))
+    results = []
+
+    def _claim(h, agent_id):
+        barrier.wait()
+        r = client.post(f"/tasks/{task_id}/subscribe", json={"agent_id": agent_id}, headers=h)
+        results.append((agent_id, r.status_code))
+
+    threads = [threading.Thread(target=_claim, args=c) for c in contenders]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    winners = [aid for aid, code in results if code == 200]
+    assert len(winners) == 1, results
+    assert all(code in (403, 409) for aid, code in results if aid not in winners), results
+    detail = client.get(f"/tasks/{task_id}", headers=h_pub).json()
+    assert detail.get("agent_id") == winners[0]
+
+    from app.database.relational_db import SessionLocal, TaskSubscription as SubModel
+    db = SessionLocal()
+    try:
+        assert db.query(SubModel).filter(SubModel.task_id == task_id).count() == 1
+    finally:
+        db.close()
+
+
+def test_subscribe_task_idempotency_key_replays_first_result():
+    """Idempotency-Key：重试返回首次订阅结果，不重复写入。"""
+    name = f"idemsub_{_unique()}"
+    h = {"Authorization": f"Bearer {_register_user(name, f'{name}@example.com', 'pw')['access_token']}"}
+    task_id = client.post("/tasks", json={"title": "idem-claim", "description": "x"}, headers=h).json()["id"]
+    agent_id = client.post("/agents/register", json={"name": "IdemAgent", "description": "x"}, headers=h).json()["id"]
+    hk = {**h, "Idempotency-Key": f"sub-{_unique()}"}
+    r1 = client.post(f"/tasks/{task_id}/subscribe", json={"agent_id": agent_id}, headers=hk)
+    assert r1.status_code == 200, r1.text
+    r2 = client.post(f"/tasks/{task_id}/subscribe", json={"agent_id": agent_id}, headers=hk)
+    assert r2.status_code == 200
+    assert r2.json()["subscription_id"] == r1.json()["subscription_id"]
+    assert r2.json().get("idempotent") is True
+    # 同一个 key 用在另一任务上不会回放前一任务的结果
+    other = client.post("/tasks", json={"title": "idem-claim-2", "description": "x"}, headers=h).json()["id"]
+    r3 = client.post(f"/tasks/{other}/subscribe", json={"agent_id": agent_id}, headers=hk)
+    assert r3.status_code == 200, r3.text
+    assert r3.json()["subscription_id"] != r1.json()["subscription_id"]
+    assert r3.json().get("idempotent") is None
+
+
+def test_batch_publish_single_debit_with_per_task_ledger_lines():
+    """批量发布：一次扣点、逐任务流水；超过 500 条或余额不足整批拒绝。"""
+    name = f"batchpub_{_unique()}"
+    h = {"Authorization": f"Bearer {_register_user(name, f'{name}@example.com', 'pw')['access_token']}"}
+    client.post("/account/recharge", json={"amount": 100}, headers=h)
+    common = {
+        "title": "",
+        "settlement_mode": "platform_credits",
+        "completion_webhook_url": "https://example.com/hook",
+    }
+    items = [
+        {"title": f"batch-{i}", "description": "d", "category": "data", "reward_points": 10, "skills": ["Python"]}
+        for i in range(4)
+    ]
+    items.append({"title": "batch-free", "description": "d", "category": "writing"})
+    r = client.post("/tasks/batch", json={"tasks": items, "common": common}, headers=h)
+    assert r.status_code == 200, r.text
+    created = r.json()["created"]
+    assert r.json()["total"] == 5
+    assert all("median_points" in c["estimate"] for c in created)
+    assert client.get("/account/balance", headers=h).json()["credits"] == 60
+    txs = client.get("/account/transactions", headers=h).json().get("transactions", [])
+    pub = [t for t in txs if t.get("type") == "task_publish"]
+    assert len(pub) == 4
+    detail = client.get(f"/tasks/{created[0]['id']}", headers=h).json()
+    assert detail["reward_points"] == 10
+
+    too_costly = [{"title": f"x{i}", "reward_points": 20} for i in range(4)]
+    r = client.post("/tasks/batch", json={"tasks": too_costly, "common": common}, headers=h)
+    assert r.status_code == 400
+    assert client.get("/account/balance", headers=h).json()["credits"] == 60
+
+    r = client.post("/tasks/batch", json={"tasks": [{"title": "t"}] * 501}, headers=h)
+    assert r.status_code == 400
+
+
+def test_safety_scan_many_spans_and_blacklist_reload(monkeypatch):
+    """编译扫描器：scan_many 按文本返回 span；黑名单随环境变量变化重建。"""
+    from app.services import safety_pipeline as _sf
+
+    monkeypatch.setenv("SAFETY_BLACKLIST", "Bad_Word,word")
+    texts = ["mail foo@bar.com, call +1 415 555 1212", None, "a BAD_WORD here", "clean"]
+    spans = _sf.scan_many(texts)
+    assert [s.label for s in spans[0]] == ["email", "phone"]
+    assert spans[1] == [] and spans[3] == []
+    assert {s.label for s in spans[2] if s.kind == "blacklist"} == {"bad_word", "word"}
+    assert texts[2][spans[2][0].start:spans[2][0].end].lower() == "bad_word"
+
+    results = _sf.check_many(texts, source="test")
+    assert results[0].action == "redact"
+    assert results[0].redacted_text == "mail [redacted-email], call [redacted-phone]"
+    assert results[2].action == "block" and not results[2].allowed
+    # 重叠时按优先级：邮箱整体脱敏，不因前面的号码匹配而泄露域名
+    overlap = _sf.check_text("mail 400 800 1234@corp.cn")
+    assert "corp.cn" not in overlap.redacted_text
+    assert overlap.redacted_text == "mail 400 800 [redacted-email]"
+    # 大段号码类文本：候选排序一次后贪心接受，不随已接受 span 数平方增长
+    dense = " ".join(f"138{i:08d}" for i in range(2000))
+    dense_spans = _sf.scan(dense)
+    assert len(dense_spans) == 2000 and {s.label for s in dense_spans} == {"phone"}
+    assert all(a.end <= b.start for a, b in zip(dense_spans, dense_spans[1:]))
+
+    monkeypatch.setenv("SAFETY_BLACKLIST", "other")
+    assert _sf.check_text("a BAD_WORD here").action == "pass"
+    with pytest.raises(ValueError):
+        _sf.sanitize_texts(["fine", "some other thing"], source="test")
+
+
+def test_run_recorder_buffers_compresses_and_pages_steps(monkeypatch):
+    """RunRecorder 按检查点批量写步骤、大载荷压缩存储；/steps 按 idx 游标翻页。"""
+    from app.database.relational_db import ExecutionStep, SessionLocal
+    from app.services import step_replay as _rp
+
+    monkeypatch.setenv("CLAWJOB_STEP_FLUSH_EVERY", "10")
+    pub = f"runbuf_{_unique()}"
+    h = {"Authorization": f"Bearer {_register_user(pub, f'{pub}@example.com', 'pw')['access_token']}"}
+    task_id = client.post("/tasks", json={"title": "run-buffer-task", "description": "x"}, headers=h).json()["id"]
+    big = {"blob": "y" * 20000}
+
+    db = SessionLocal()
+    try:
+        rec = _rp.RunRecorder(db, task_id=task_id)
+        run_id = rec.start()
+        for i in range(7):
+            rec.step("tool", name=f"t{i}", input={"i": i})
+        assert db.query(ExecutionStep).filter(ExecutionStep.run_id == run_id).count() == 0
+        for i in range(7, 24):
+            rec.step("tool", name=f"t{i}", input={"i": i}, output=big if i == 20 else None)
+        assert db.query(ExecutionStep).filter(ExecutionStep.run_id == run_id).count() == 20
+        rec.finish(ok=True)
+        stored = db.query(ExecutionStep).filter(ExecutionStep.run_id == run_id, ExecutionStep.idx == 21).first()
+        assert "_z" in stored.output
+    finally:
+        db.close()
+
+    seen, cursor = [], None
+    for _ in range(10):
+        params = {"limit": 7} if cursor is None else {"limit": 7, "after_idx": cursor}
+        page = client.get(f"/tasks/{task_id}/runs/{run_id}/steps", params=params, headers=h).json()
+        seen.extend(page["steps"])
+        cursor = page["next_after_idx"]
+        if cursor is None:
+            break
+    assert [s["idx"] for s in seen] == list(range(26))
+    assert seen[21]["output"] == big
+
+
+def test_creator_studio_grouped_series_and_cache_invalidation():
+    """Creator Studio：按天聚合收入、待交付计数；按 owner 缓存，任务生命周期钩子失效。"""
+    from datetime import datetime as _dt
+
+    from app.database.relational_db import SessionLocal, Task
+    from app.services.reputation_hooks import touch_agent_reputation_for_task
+
+    u = f"studio2_{_unique()}"
+    data = _register_user(u, f"{u}@example.com", "pw")
+    h = {"Authorization": f"Bearer {data['access_token']}"}
+    agent_id = client.post("/agents/register", json={"name": "StudioAgent2", "description": "x"}, headers=h).json()["id"]
+    uid = _user_id_of(data["access_token"])
+
+    db = SessionLocal()
+    try:
+        now = _dt.utcnow()
+        db.add_all([
+            Task(title="s-done-1", owner_id=uid, agent_id=agent_id, task_type="general", status="completed", reward_points=7, completed_at=now),
+            Task(title="s-done-2", owner_id=uid, agent_id=agent_id, task_type="general", status="completed", reward_points=5, completed_at=now),
+            Task(title="s-wip", owner_id=uid, agent_id=agent_id, task_type="general", status="in_progress"),
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+    body = client.get("/agents/mine/studio?days=7", headers=h).json()
+    assert body["summary"]["completed_task_count"] == 2
+    assert body["summary"]["reward_points_total"] == 12
+    assert body["summary"]["pending_delivery"] == 1
+    today = [p for p in body["income_series"] if p["date"] == now.strftime("%Y-%m-%d")]
+    assert today and today[0]["tasks"] == 2 and today[0]["rewards"] == 12
+
+    db = SessionLocal()
+    try:
+        t = Task(title="s-done-3", owner_id=uid, agent_id=agent_id, task_type="general", status="completed", reward_points=3, completed_at=now)
+        db.add(t)
+        db.commit()
+        cached = client.get("/agents/mine/studio?days=7", headers=h).json()
+        assert cached["summary"]["completed_task_count"] == 2
+        touch_agent_reputation_for_task(db, t)
+    finally:
+        db.close()
+    fresh = client.get("/agents/mine/studio?days=7", headers=h).json()
+    assert fresh["summary"]["completed_task_count"] == 3
+
+    # 结算事务内失效：提交前的并发读回填的旧汇总在提交后被再次丢弃
+    db = SessionLocal()
+    try:
+        t = Task(title="s-done-4", owner_id=uid, agent_id=agent_id, task_type="general", status="completed", reward_points=1, completed_at=now)
+        db.add(t)
+        db.flush()
+        touch_agent_reputation_for_task(db, t)
+        assert client.get("/agents/mine/studio?days=7", headers=h).json()["summary"]["completed_task_count"] == 3
+        db.commit()
+    finally:
+        db.close()
+    assert client.get("/agents/mine/studio?days=7", headers=h).json()["summary"]["completed_task_count"] == 4
+
+
+def test_trust_card_snapshot_etag_and_refresh_on_completion():
+    """信任卡：快照 + ETag/304；任务完成钩子标记过期后重算并递增版本。"""
+    from app.database.relational_db import SessionLocal, Task
+    from app.services.reputation_hooks import touch_agent_reputation_for_task
+
+    u = f"tcsnap_{_unique()}"
+    data = _register_user(u, f"{u}@example.com", "pw")
+    h = {"Authorization": f"Bearer {data['access_token']}"}
+    agent_id = client.post("/agents/register", json={"name": "tc-snap", "description": "d"}, headers=h).json()["id"]
+    uid = _user_id_of(data["access_token"])
+
+    r1 = client.get(f"/agents/{agent_id}/trust-card")
+    assert r1.status_code == 200
+    etag = r1.headers["etag"]
+    assert r1.json()["escrow_tasks_completed"] == 0
+    r2 = client.get(f"/agents/{agent_id}/trust-card", headers={"If-None-Match": etag})
+    assert r2.status_code == 304
+
+    db = SessionLocal()
+    try:
+        t = Task(
+            title="tc-escrow", task_type="general", owner_id=uid, agent_id=agent_id, status="completed",
+            reward_points=10, input_data={"escrow": {"milestones": [{"title": "a"}, {"title": "b"}]}},
+        )
+        db.add(t)
+        db.flush()
+        touch_agent_reputation_for_task(db, t)
+        db.commit()
+    finally:
+        db.close()
+
+    r3 = client.get(f"/agents/{agent_id}/trust-card", headers={"If-None-Match": etag})
+    assert r3.status_code == 200
+    assert r3.headers["etag"] != etag
+    assert r3.json()["escrow_tasks_completed"] == 1
+    assert "escrow_executor" in r3.json()["badges"]
+
+    # 在结算提交前开始重算的读取方：写回时 version 已被标记递增，不覆盖也不清除 stale
+    from app.database.relational_db import AgentTrustCardSnapshot
+    from app.services.trust_card import _store_snapshot, mark_trust_cards_stale
+
+    db = SessionLocal()
+    try:
+        seen = db.get(AgentTrustCardSnapshot, agent_id).version
+        mark_trust_cards_stale(db, [agent_id])
+        db.commit()
+        assert _store_snapshot(agent_id, {"pre_commit": True}, seen) == 0
+        db.expire_all()
+        row = db.get(AgentTrustCardSnapshot, agent_id)
+        assert row.stale and row.version == seen + 1 and "pre_commit" not in row.card
+    finally:
+        db.close()
+    r4 = client.get(f"/agents/{agent_id}/trust-card")
+    assert r4.json()["escrow_tasks_completed"] == 1 and r4.headers["etag"] != r3.headers["etag"]
+
+
+def test_health_live_and_ready_use_cached_non_blocking_checks():
+    """存活探针无 IO；就绪探针只看数据库连通性（超时即未就绪）；/health 保持轻量，资源/业务指标在 /health/checks"""
+    import asyncio
+    from app.core import health_monitor as hm
+
+    r = client.get("/health/live")
+    assert r.status_code == 200
+    assert r.json()["status"] == "alive"
+
+    hm.health_monitor._cached = None
+    hm.health_monitor._ready = None
+    r = client.get("/health/ready")
+    assert r.status_code == 200
+    data = r.json()
+    assert data["status"] == "ready"
+    assert data["database"]["message"] == "Database healthy"
+    assert "metrics" not in data
+    first_check = data["last_check"]
+    assert client.get("/health/ready").json()["last_check"] == first_check
+
+    assert "checks" not in client.get("/health").json()
+    checks = client.get("/health/checks").json()
+    assert checks["messages"]["database"] == "Database healthy"
+    assert "success_rate" in checks["metrics"]["agents"] or checks["metrics"]["agents"]["agent_count"] == 0
+
+    async def _hang():
+        await asyncio.sleep(10)
+
+    orig_timeout = hm.CHECK_TIMEOUT_SEC
+    hm.CHECK_TIMEOUT_SEC = 0.05
+    try:
+        res = asyncio.run(hm.health_monitor._guarded("database", _hang))
+        assert res.status == hm.HealthSeverity.WARNING
+        assert res.metrics["timed_out"] is True
+
+        # 就绪探针里数据库 ping 超时即未就绪
+        hm.health_monitor._ready = None
+        orig_check = hm.health_monitor._check_database_health
+        hm.health_monitor._check_database_health = _hang
+        try:
+            r = client.get("/health/ready")
+        finally:
+            hm.health_monitor._check_database_health = orig_check
+            hm.health_monitor._ready = None
+        assert r.status_code == 503
+        assert r.json()["status"] == "not_ready"
+        assert r.json()["database"]["metrics"]["timed_out"] is True
+    finally:
+        hm.CHECK_TIMEOUT_SEC = orig_timeout
+
+
+def test_db_task_queue_priority_visibility_retry_and_dead_letter():
+    """数据库任务队列：按优先级领取、可见性超时重投、退避重试、死信与吞吐统计"""
+    import asyncio
+    from datetime import datetime, timedelta
+    from app.database.relational_db import SessionLocal, TaskQueueJob
+    from app.services import task_queue as tq
+
+    q = tq.DbTaskQueue()
+    name = "test_" + _unique()
+
+    async def scenario():
+        low = await q.enqueue({"n": "low"}, queue=name, priority="low")
+        high = await q.enqueue({"n": "high"}, queue=name, priority="high", max_attempts=2)
+        assert await q.get_size(name) == 2
+
+        first = await q.claim(queue=name, worker_id="w1")
+        assert [j.id for j in first] == [high] and first[0].attempts == 1
+        # 另一个 worker 不会拿到已被领取的任务
+        second = await q.claim(queue=name, worker_id="w2", limit=5)
+        assert [j.id for j in second] == [low]
+        assert await q.claim(queue=name, worker_id="w3") == []
+
+        assert await q.ack(low, worker_id="w1") is False
+        assert await q.ack(low, worker_id="w2") is True
+        assert await q.fail(high, "boom", worker_id="w1") == "retry"
+        return low, high
+
+    low, high = asyncio.run(scenario())
+
+    db = SessionLocal()
+    try:
+        row = db.query(TaskQueueJob).filter(TaskQueueJob.id == int(high)).first()
+        assert row.status == "queued" and row.last_error == "boom"
+        # 跳过退避等待，并模拟领取后 worker 崩溃（租约过期）
+        row.available_at = datetime.utcnow() - timedelta(seconds=1)
+        db.commit()
+    finally:
+        db.close()
+
+    async def scenario2():
+        again = await q.claim(queue=name, worker_id="w4", visibility_timeout=1)
+        assert [j.id for j in again] == [high] and again[0].attempts == 2
+        db2 = SessionLocal()
+        try:
+            db2.query(TaskQueueJob).filter(TaskQueueJob.id == int(high)).update(
+                {"locked_until": datetime.utcnow() - timedelta(seconds=1)}, synchronize_session=False
+            )
+            db2.commit()
+        finally:
+            db2.close()
+        # 重试次数已用尽：过期任务进入死信而不是再次投递
+        assert await q.claim(queue=name, worker_id="w5") == []
+        stats = await q.get_stats(name)
+        assert stats["dead"] == 1 and stats["done"] == 1 and stats["queued"] == 0
+        assert await q.get_processing_rate(name) > 0
+
+    asyncio.run(scenario2())
+
+
+def test_task_system_worker_drains_enqueued_agent_task():
+    """TaskSystem 后台 worker：create_task 入队的任务被领取、执行并 ack"""
+    import asyncio
+    from types import SimpleNamespace
+    from app.agents.task_system import TaskSystem
+    from app.services import task_queue as tq
+
+    class _Store:
+        def __init__(self):
+            self.rows = {}
+
+        async def store_task(self, data):
+            self.rows[data["task_id"]] = dict(data)
+
+        async def update_task(self, task_id, fields):
+            self.rows[task_id].update(fields)
+
+        async def get_task(self, task_id):
+            return self.rows.get(task_id)
+
+        async def set_task(self, task_id, data):
+            self.rows[task_id] = dict(data)
+
+        async def store_task_embedding(self, *args):
+            return None
+
+        async def store_result_embedding(self, *args):
+            return None
+
+    store, cache = _Store(), _Store()
+    ts = TaskSystem(vector_db=_Store(), relational_db=store, cache_db=cache, task_queue=tq.DbTaskQueue())
+    ts.QUEUE_NAME = "test_agent_tasks_" + _unique()
+    ts.agent_manager.agents["ag1"] = SimpleNamespace(id="ag1")
+
+    async def scenario():
+        task_id = await ts.create_task("summarize inbox", "ag1")
+        assert await ts.task_queue.get_size(ts.QUEUE_NAME) == 1
+        ts.active_tasks.clear()  # 模拟由另一个进程入队
+        stop = asyncio.Event()
+        worker = asyncio.create_task(ts.run_worker(stop, idle_sec=0.05, worker_id="w-test"))
+        try:
+            for _ in range(100):
+                if store.rows[task_id].get("status") == "completed":
+                    break
+                await asyncio.sleep(0.05)
+        finally:
+            stop.set()
+            await asyncio.wait_for(worker, timeout=5)
+        return task_id
+
+    task_id = asyncio.run(scenario())
+    assert store.rows[task_id]["status"] == "completed"
+    assert store.rows[task_id]["result"]["agent_id"] == "ag1"
+
+    async def stats():
+        return await ts.task_queue.get_stats(ts.QUEUE_NAME)
+
+    got = asyncio.run(stats())
+    assert got["done"] == 1 and got["queued"] == 0
+
+    # 排队中被取消的任务：被领取后不执行，直接 ack
+    async def cancelled_while_queued():
+        task_id = await ts.create_task("never run me", "ag1")
+        assert await ts.cancel_task(task_id)
+        ts.active_tasks.clear()
+        return task_id, await ts.process_next(worker_id="w-test")
+
+    task_id, handled = asyncio.run(cancelled_while_queued())
+    assert handled["ok"] and handled["result"] == {"task_id": task_id, "status": "cancelled", "skipped": True}
+    assert store.rows[task_id]["status"] == "cancelled" and store.rows[task_id].get("started_at") is None
+    got = asyncio.run(stats())
+    assert got["done"] == 2 and got["queued"] == 0
+    with pytest.raises(TypeError):
+        tq.TaskQueueBackend()
+
+
+def test_login_rehashes_to_configured_cost_and_locks_after_failures():
+    """登录：成本因子变更后透明重新哈希；连续失败达到上限后锁定且不再校验密码"""
+    from app.database.relational_db import SessionLocal, User as UserModel
+    from app.services import password_hashing as pwh
+
+    name = "lg_" + _unique()
+    _register_user(name, f"{name}@example.com", "pw-ok")
+    orig_rounds, orig_max = pwh.BCRYPT_ROUNDS, pwh.LOGIN_MAX_FAILURES
+    pwh.BCRYPT_ROUNDS, pwh.LOGIN_MAX_FAILURES = 4, 3
+    try:
+        r = client.post("/auth/login", json={"username": name, "password": "pw-ok"})
+        assert r.status_code == 200
+        db = SessionLocal()
+        try:
+            hashed = db.query(UserModel.hashed_password).filter(UserModel.username == name).scalar()
+        finally:
+            db.close()
+        assert pwh.hash_rounds(hashed) == 4
+        assert client.post("/auth/login", json={"username": name, "password": "pw-ok"}).status_code == 200
+
+        for _ in range(3):
+            assert client.post("/auth/login", json={"username": name, "password": "bad"}).status_code == 401
+        assert client.post("/auth/login", json={"username": name, "password": "pw-ok"}).status_code == 429
+        pwh.reset_login_failures(name)
+        assert client.post("/auth/login", json={"username": name, "password": "pw-ok"}).status_code == 200
+    finally:
+        pwh.BCRYPT_ROUNDS, pwh.LOGIN_MAX_FAILURES = orig_rounds, orig_max
+        pwh.reset_login_failures(name)
+
+    # 并发失败计数不丢增量
+    from concurrent.futures import ThreadPoolExecutor
+
+    racer = "race_" + _unique()
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        counts = list(ex.map(lambda _: pwh.record_login_failure(racer), range(40)))
+    assert sorted(counts) == list(range(1, 41))
+    assert pwh.login_locked(racer)
+    pwh.reset_login_failures(racer)
+
+
+def test_register_agent_minimal_single_commit_with_deferred_followups():
+    """最低摩擦注册：业务写入单次提交；欢迎站内信经出队记录在响应后发送"""
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session as OrmSession
+    from app.database.relational_db import InternalMessage, SessionLocal, SystemLog, TaskQueueJob
+    from app.services import register_followups as rf
+
+    commits = []
+
+    def _on_commit(session):
+        pending = list(session.new)
+        # 请求日志中间件的独立提交、随机用户名插入的保存点均不计入
+        if pending and all(isinstance(o, SystemLog) and o.category == "request" for o in pending):
+            return
+        if session.in_nested_transaction():
+            return
+        commits.append(1)
+
+    event.listen(OrmSession, "before_commit", _on_commit)
+    orig_run = rf.run_register_followup
+    rf.run_register_followup = lambda *a, **k: None  # 只统计注册本身的提交
+    try:
+        r = client.post("/auth/register-agent-minimal", json={"agent_name": f"One_{_unique()}"})
+        other = client.post("/auth/register-agent-minimal", json={"agent_name": f"Two_{_unique()}"})
+    finally:
+        rf.run_register_followup = orig_run
+        event.remove(OrmSession, "before_commit", _on_commit)
+    assert r.status_code == 200, r.text
+    assert len(commits) == 2
+    user_id = r.json()["user_id"]
+    other_id = other.json()["user_id"]
+
+    db = SessionLocal()
+    try:
+        jobs = {
+            j.payload["user_id"]: j.id
+            for j in db.query(TaskQueueJob).filter(TaskQueueJob.queue == rf.QUEUE, TaskQueueJob.status == "queued")
+        }
+        assert user_id in jobs and other_id in jobs
+        assert db.query(InternalMessage).filter(InternalMessage.recipient_user_id == user_id).count() == 0
+    finally:
+        db.close()
+
+    # 响应后的后台任务只处理本次注册那一条，其它用户的留给调度器
+    first_job = jobs[user_id]
+    assert rf.run_register_followup(first_job) is True
+    assert rf.run_register_followup(first_job) is False
+    db = SessionLocal()
+    try:
+        titles = {m.title for m in db.query(InternalMessage).filter(InternalMessage.recipient_user_id == user_id)}
+        assert "欢迎加入 ClawJob" in titles
+        assert db.query(TaskQueueJob.status).filter(TaskQueueJob.id == first_job).scalar() == "done"
+        assert db.query(TaskQueueJob.status).filter(TaskQueueJob.id == jobs[other_id]).scalar() == "queued"
+        assert db.query(InternalMessage).filter(InternalMessage.recipient_user_id == other_id).count() == 0
+    finally:
+        db.close()
+    assert rf.run_register_followups()["sent"] >= 1
+
+    # 随机用户名撞唯一约束时只回滚到保存点，同一事务里先前的写入保留
+    from unittest import mock
+    from app.database.relational_db import User as UserModel
+    from app.routers import auth as auth_router
+
+    db = SessionLocal()
+    try:
+        taken = db.query(UserModel.username).filter(UserModel.id == user_id).scalar()
+        db.add(SystemLog(level="info", category="auth", message="savepoint_probe_" + _unique()))
+        probe = db.new.copy()
+        tokens = iter([taken.split("_", 1)[1], "f" + _unique()[:11]])
+        with mock.patch.object(auth_router.secrets, "token_hex", lambda n: next(tokens)):
+            created = auth_router._insert_unique_random_user(db, taken.split("_", 1)[0])
+        assert created is not None and created.username != taken
+        assert all(o in db for o in probe)
+        db.rollback()
+    finally:
+        db.close()
+
+
+def test_send_verification_code_queues_mail_and_throttles(monkeypatch):
+    """验证码邮件：事务内入队、响应后经内存 sink 投递；同一地址限流；发送失败进入重试"""
+    from app.database.relational_db import SessionLocal, TaskQueueJob
+    from app.services import mailer
+
+    monkeypatch.delenv("VERIFICATION_CODE_DEV", raising=False)
+    monkeypatch.setenv("CLAWJOB_MAIL_TRANSPORT", "memory")
+    transport = mailer.get_transport()
+    email = f"mail_{_unique()}@example.com"
+
+    r = client.post("/auth/send-verification-code", json={"email": email})
+    assert r.status_code == 200, r.text
+    assert r.json()["email_sent"] is True
+    sent = [m for m in transport.outbox if m["to"] == email]
+    assert len(sent) == 1 and sent[0]["kind"] == "verification_code"
+
+    r2 = client.post("/auth/send-verification-code", json={"email": email})
+    assert r2.status_code == 429
+    assert int(r2.headers["retry-after"]) > 0
+
+    class _Down:
+        def send(self, message):
+            raise ConnectionError("smtp down")
+
+    other = f"mail_{_unique()}@example.com"
+    monkeypatch.setattr(mailer, "get_transport", lambda: _Down())
+    r3 = client.post("/auth/send-verification-code", json={"email": other})
+    assert r3.status_code == 200
+    db = SessionLocal()
+    try:
+        job = (
+            db.query(TaskQueueJob)
+            .filter(TaskQueueJob.queue == mailer.MAIL_QUEUE)
+            .order_by(TaskQueueJob.id.desc())
+            .first()
+        )
+        assert job.payload["to"] == other
+        assert job.status == "queued" and job.attempts == 1
+        assert "smtp down" in (job.last_error or "")
+    finally:
+        db.close()
+
+    # 验证码事务提交失败：限流名额归还，立即重试不会被 429
+    flaky = f"mail_{_unique()}@example.com"
+
+    def _boom(*a, **k):
+        raise RuntimeError("db down")
+
+    monkeypatch.setattr(mailer, "queue_mail", _boom)
+    with pytest.raises(RuntimeError):
+        client.post("/auth/send-verification-code", json={"email": flaky})
+    monkeypatch.undo()
+    monkeypatch.setenv("CLAWJOB_MAIL_TRANSPORT", "memory")
+    assert client.post("/auth/send-verification-code", json={"email": flaky}).status_code == 200
+
+
+def test_tools_catalog_snapshot_etag_and_single_join(monkeypatch):
+    """GET /tools：一次 join 构建快照；ETag 命中返回 304；发布/删除后版本变化"""
+    from sqlalchemy import event
+    from app.database.relational_db import SessionLocal, engine
+    from app.services import mcp_tools_store
+
+    suffix = _unique()
+    user = _register_user(f"tcat{suffix}", f"tcat{suffix}@example.com", "pass12345")
+    headers = {"Authorization": f"Bearer {user['access_token']}"}
+    for i in range(3):
+        r = client.post("/mcp-tools/publish", json={"name": f"cat_tool_{suffix}_{i}"}, headers=headers)
+        assert r.status_code == 200, r.text
+
+    statements = []
+
+    def _count(conn, cursor, statement, params, context, executemany):
+        if "mcp_tools" in statement:
+            statements.append(statement)
+
+    mcp_tools_store.bump_catalog_version()
+    event.listen(engine, "before_cursor_execute", _count)
+    try:
+        items, _ = mcp_tools_store.get_catalog_snapshot(SessionLocal)
+        mcp_tools_store.get_catalog_snapshot(SessionLocal)
+    finally:
+        event.remove(engine, "before_cursor_execute", _count)
+    assert len(statements) == 1
+    mine = [it for it in items if it["name"].startswith(f"cat_tool_{suffix}_")]
+    assert len(mine) == 3 and all(it["publisher_username"] == f"tcat{suffix}" for it in mine)
+
+    r1 = client.get("/tools")
+    assert r1.status_code == 200
+    etag = r1.headers["etag"]
+    assert client.get("/tools", headers={"If-None-Match": etag}).status_code == 304
+
+    tool_id = mine[0]["id"]
+    assert client.delete(f"/mcp-tools/{tool_id}", headers=headers).status_code == 200
+    r2 = client.get("/tools", headers={"If-None-Match": etag})
+    assert r2.status_code == 200 and r2.headers["etag"] != etag
+    assert all(it.get("id") != tool_id for it in r2.json() if it.get("source") == "market")
+
+    # 分类过滤在查询里做：即使该分类的工具不在全站最新 CATALOG_LIMIT 条里也能列出
+    cat = f"cat{suffix}"
+    r = client.post("/mcp-tools/publish", json={"name": f"cat_only_{suffix}", "category": cat}, headers=headers)
+    assert r.status_code == 200, r.text
+    assert client.post("/mcp-tools/publish", json={"name": f"cat_newer_{suffix}"}, headers=headers).status_code == 200
+    monkeypatch.setattr(mcp_tools_store, "CATALOG_LIMIT", 1)
+    names = [it["name"] for it in client.get("/tools", params={"category": cat}).json() if it.get("source") == "market"]
+    assert names == [f"cat_only_{suffix}"]
+
+
+def test_use_tool_token_bucket_quota_headers_and_concurrency_cap(monkeypatch):
+    """工具配额：(agent, tool) 令牌桶按时间补充、按 Agent 隔离；响应带配额头；慢工具并发上限"""
+    import asyncio
+    from app.agents.tool_system import AgentTool, ToolMetadata
+    from app.core.systems import tool_system
+    from app.services import tool_quota as tq
+
+    suffix = _unique()
+    user = _register_user(f"tq{suffix}", f"tq{suffix}@example.com", "pass12345")
+    headers = {"Authorization": f"Bearer {user['access_token']}"}
+
+    async def _echo(**kwargs):
+        return kwargs
+
+    name = f"quota_echo_{suffix}"
+    meta = ToolMetadata(name=name, description="", parameters={}, return_type="object", rate_limit=60, burst=2)
+    monkeypatch.setitem(tool_system.tools, name, AgentTool(meta, _echo))
+    clock = [time.time()]
+    monkeypatch.setattr(tq.tool_quota, "_clock", lambda: clock[0])
+
+    a1, a2 = (
+        client.post("/agents/register", json={"name": f"TQ{i}_{suffix}", "description": "quota"}, headers=headers).json()["id"]
+        for i in range(2)
+    )
+    other = _register_user(f"tqo{suffix}", f"tqo{suffix}@example.com", "pass12345")
+    foreign = client.post(
+        "/agents/register", json={"name": f"TQX_{suffix}", "description": "quota"},
+        headers={"Authorization": f"Bearer {other['access_token']}"},
+    ).json()["id"]
+
+    def _call(agent):
+        return client.post(f"/agents/{agent}/use-tool", json={"tool_name": name, "params": {"x": 1}}, headers=headers)
+
+    # 只能以自己名下真实存在的 Agent 调用，配额按其 id 记账
+    assert _call("a1").status_code == 403
+    assert _call(foreign).status_code == 403
+    r1, r2, r3 = _call(a1), _call(a1), _call(a1)
+    assert r1.status_code == 200 and r1.json()["data"] == {"x": 1}
+    assert r1.headers["x-ratelimit-limit"] == "2" and r1.headers["x-ratelimit-remaining"] == "1"
+    assert r2.headers["x-ratelimit-remaining"] == "0"
+    assert r3.status_code == 429 and r3.json()["reason"] == "rate_limited"
+    assert r3.headers["retry-after"] == "1"
+    assert _call(a2).status_code == 200
+
+    clock[0] += 1.0
+    assert _call(a1).status_code == 200
+
+    gate = asyncio.Event()
+
+    async def _slow(**kwargs):
+        await gate.wait()
+        return "done"
+
+    slow = f"quota_slow_{suffix}"
+    slow_meta = ToolMetadata(name=slow, description="", parameters={}, return_type="object", max_concurrency=1)
+    monkeypatch.setitem(tool_system.tools, slow, AgentTool(slow_meta, _slow))
+
+    async def _race():
+        first = asyncio.ensure_future(tool_system.use_tool("b1", {"tool_name": slow}))
+        await asyncio.sleep(0)
+        second = await tool_system.use_tool("b2", {"tool_name": slow})
+        gate.set()
+        return await first, second
+
+    first, second = asyncio.run(_race())
+    assert first["success"] is True and first["data"] == "done"
+    assert second["success"] is False and second["quota"].reason == "concurrency_limited"
+    assert tq.tool_quota.inflight(slow) == 0
+    # 因并发被拒的调用不消耗令牌
+    left = tq.tool_quota.peek("b2", slow, rate_per_min=slow_meta.rate_limit, burst=slow_meta.burst)
+    assert left.remaining == left.limit
+
+
+def test_mcp_tools_keyset_pages_tag_filter_cached_counts_and_slugs():
+    """MCP 市场：cursor_id 翻页不重不漏；分类/标签筛选；计数随发布/删除更新；slug 冲突交给唯一约束"""
+    suffix = _unique()
+    a = _register_user(f"mka{suffix}", f"mka{suffix}@example.com", "pass12345")
+    b = _register_user(f"mkb{suffix}", f"mkb{suffix}@example.com", "pass12345")
+    ha = {"Authorization": f"Bearer {a['access_token']}"}
+    hb = {"Authorization": f"Bearer {b['access_token']}"}
+    category = f"cat{suffix}"[:64]
+    ids = []
+    for i in range(5):
+        r = client.post(
+            "/mcp-tools/publish",
+            json={"name": f"kt_{suffix}_{i}", "category": category, "tags": ["Even" if i % 2 == 0 else "odd", "kt"]},
+            headers=ha,
+        )
+        assert r.status_code == 200, r.text
+        ids.append(r.json()["item"]["id"])
+    assert r.json()["item"]["tags"] == ["even", "kt"]
+
+    seen, cursor = [], None
+    for _ in range(10):
+        params = {"category": category, "limit": 2}
+        if cursor is not None:
+            params["cursor_id"] = cursor
+        page = client.get("/mcp-tools", params=params).json()
+        seen += [it["id"] for it in page["items"] if it["source"] == "market"]
+        cursor = page["next_cursor_id"]
+        if cursor is None:
+            break
+    assert seen == sorted(ids, reverse=True)
+    assert page["total"] == 5
+
+    even = client.get("/mcp-tools", params={"category": category, "tag": "even"}).json()
+    assert [it["id"] for it in even["items"]] == [ids[4], ids[2], ids[0]]
+    assert even["total"] == 3
+
+    before = client.get("/mcp-tools/stats").json()["tool_count"]
+    dup = client.post("/mcp-tools/publish", json={"name": f"kt_{suffix}_0", "category": category}, headers=hb)
+    assert dup.status_code == 200, dup.text
+    assert dup.json()["item"]["tool_slug"] == f"u{_user_id_of(b['access_token'])}-kt_{suffix}_0"
+    again = client.post(
+        "/mcp-tools/publish", json={"name": f"other_{suffix}", "tool_slug": f"kt_{suffix}_0"}, headers=hb
+    )
+    assert again.status_code == 200, again.text
+    assert again.json()["item"]["tool_slug"].startswith(f"u{_user_id_of(b['access_token'])}-kt_{suffix}_0-")
+    assert client.get("/mcp-tools/stats").json()["tool_count"] == before + 2
+
+    assert client.delete(f"/mcp-tools/{ids[0]}", headers=ha).status_code == 200
+    assert client.get("/mcp-tools/stats").json()["tool_count"] == before + 1
+    even = client.get("/mcp-tools", params={"category": category, "tag": "even"}).json()
+    assert [it["id"] for it in even["items"]] == [ids[4], ids[2]]
+
+    # 社区工具占用了内置工具的 slug：内置那条不展示，也不计入 total
+    r = client.post(
+        "/mcp-tools/publish",
+        json={"name": "search_knowledge_base", "tool_slug": "search_knowledge_base", "category": "knowledge"},
+        headers=ha,
+    )
+    assert r.status_code == 200, r.text
+    listing = client.get("/mcp-tools", params={"category": "knowledge", "limit": 200}).json()
+    assert listing["next_cursor_id"] is None
+    assert [it["source"] for it in listing["items"] if it["tool_slug"] == "search_knowledge_base"] == ["market"]
+    assert listing["total"] == len(listing["items"])
+
+
+def test_task_row_serializer_fixed_query_count_for_list_endpoints():
+    """任务列表：/tasks/mine、/agents/{id}/tasks、/tasks/created-by-me 100 行时查询数不随行数增长"""
+    from sqlalchemy import event
+    from app.database.relational_db import Agent, PublishedSkill, SessionLocal, Task, TaskComment, engine
+
+    suffix = _unique()
+    worker = _register_user(f"trw{suffix}", f"trw{suffix}@example.com", "pass12345")
+    publisher = _register_user(f"trp{suffix}", f"trp{suffix}@example.com", "pass12345")
+    wid, pid = _user_id_of(worker["access_token"]), _user_id_of(publisher["access_token"])
+    token = f"skt_{suffix}"
+    db = SessionLocal()
+    try:
+        db.add(PublishedSkill(name=f"sk{suffix}", skill_token=token, author_user_id=pid))
+        agent = Agent(name=f"tra{suffix}", agent_type="general", owner_id=wid, config={"skill_bound_token": token})
+        creator = Agent(name=f"trc{suffix}", agent_type="general", owner_id=pid)
+        db.add_all([agent, creator])
+        db.flush()
+        tasks = [
+            Task(
+                title=f"tr-{suffix}-{i}", owner_id=pid, agent_id=agent.id, creator_agent_id=creator.id,
+                task_type="general", status="in_progress",
+            )
+            for i in range(100)
+        ]
+        db.add_all(tasks)
+        db.flush()
+        db.add(TaskComment(task_id=tasks[0].id, user_id=wid, content="hi"))
+        db.commit()
+        agent_id, first_task_id = agent.id, tasks[0].id
+    finally:
+        db.close()
+
+    selects = []
+
+    def _count(conn, cursor, statement, params, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "system_logs" not in statement:
+            selects.append(statement)
+
+    def _get(path, token):
+        selects.clear()
+        event.listen(engine, "before_cursor_execute", _count)
+        try:
+            r = client.get(path, params={"limit": 100}, headers={"Authorization": f"Bearer {token}"})
+        finally:
+            event.remove(engine, "before_cursor_execute", _count)
+        assert r.status_code == 200, r.text
+        return r.json()["tasks"]
+
+    mine = _get("/tasks/mine", worker["access_token"])
+    assert len(mine) == 100 and len(selects) <= 6, selects
+    assert mine[0]["publisher_name"] == f"trp{suffix}" and mine[0]["agent_name"] == f"tra{suffix}"
+    assert mine[0]["related_skill"]["skill_token"] == token and mine[0]["related_skill"]["source"] == "assigned_agent"
+
+    by_agent = _get(f"/agents/{agent_id}/tasks", worker["access_token"])
+    assert len(by_agent) == 100 and len(selects) <= 6, selects
+
+    created = _get("/tasks/created-by-me", publisher["access_token"])
+    assert len(created) == 100 and len(selects) <= 6, selects
+    row = next(t for t in created if t["id"] == first_task_id)
+    assert row["comment_count"] == 1 and row["subscription_count"] == 0
+    assert row["creator_agent_name"] == f"trc{suffix}"
+
+
+def test_comment_threads_keyset_pages_and_fixed_query_count():
+    """评论串：before_id 翻页不重不漏；作者 / Agent / 任务一次 join；论坛总数走缓存"""
+    from sqlalchemy import event
+    from app.database.relational_db import Agent, SessionLocal, Task, TaskComment, engine
+
+    suffix = _unique()
+    user = _register_user(f"cth{suffix}", f"cth{suffix}@example.com", "pass12345")
+    uid = _user_id_of(user["access_token"])
+    headers = {"Authorization": f"Bearer {user['access_token']}"}
+    db = SessionLocal()
+    try:
+        agent = Agent(name=f"cta{suffix}", agent_type="general", owner_id=uid)
+        task = Task(title=f"cth-{suffix}", owner_id=uid, task_type="general", status="open")
+        db.add_all([agent, task])
+        db.flush()
+        db.add_all([
+            TaskComment(task_id=task.id, user_id=uid, agent_id=agent.id if i % 2 else None, content=f"m{i}")
+            for i in range(25)
+        ])
+        db.commit()
+        task_id = task.id
+    finally:
+        db.close()
+
+    selects = []
+
+    def _count(conn, cursor, statement, params, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "task_comments" in statement:
+            selects.append(statement)
+
+    contents, before = [], None
+    event.listen(engine, "before_cursor_execute", _count)
+    try:
+        while True:
+            params = {"limit": 10}
+            if before is not None:
+                params["before_id"] = before
+            page = client.get(f"/a2a/tasks/{task_id}/messages", params=params, headers=headers).json()
+            contents = [m["content"] for m in page["messages"]] + contents
+            before = page["next_before_id"]
+            if before is None:
+                break
+    finally:
+        event.remove(engine, "before_cursor_execute", _count)
+    assert contents == [f"m{i}" for i in range(25)]
+    assert len(selects) == 3
+
+    r = client.get(f"/tasks/{task_id}/comments", params={"limit": 5}).json()
+    assert [c["content"] for c in r["comments"]] == [f"m{i}" for i in range(20, 25)]
+    assert r["comments"][1]["agent_name"] == f"cta{suffix}" and r["comments"][1]["author_name"] == f"cth{suffix}"
+
+    feed = client.get("/forum/recent-posts", params={"limit": 3}).json()
+    assert feed["items"][0]["task"]["title"] == f"cth-{suffix}"
+    assert feed["items"][0]["comment"]["content"] == "m24"
+    total = feed["total"]
+    client.post(f"/tasks/{task_id}/comments", json={"content": "one more"}, headers=headers)
+    assert client.get("/forum/recent-posts", params={"limit": 1}).json()["total"] == total
+
+
+def test_unpicked_reminder_job_is_set_based_and_skips_reminded_rows():
+    """24h 提醒任务：只选未提醒的行、批量写站内信、一条 UPDATE 打标；旧 JSON 标记只补列不重发"""
+    from datetime import datetime, timedelta
+    from sqlalchemy import event
+    from app.database.relational_db import InternalMessage, SessionLocal, Task, engine
+    from app.services.unpicked_reminders import run_unpicked_reminders, send_unpicked_reminders
+
+    suffix = _unique()
+    owner = _register_user(f"urm{suffix}", f"urm{suffix}@example.com", "pass12345")
+    uid = _user_id_of(owner["access_token"])
+    old = datetime.utcnow() - timedelta(hours=30)
+    db = SessionLocal()
+    try:
+        run_unpicked_reminders(db)  # 清掉其它用例留下的待提醒任务
+        fresh = [Task(title=f"urm-{suffix}-{i}", owner_id=uid, task_type="general", status="open", created_at=old) for i in range(3)]
+        legacy = Task(
+            title=f"urm-{suffix}-legacy", owner_id=uid, task_type="general", status="open", created_at=old,
+            input_data={"reminder_24h_sent": True},
+        )
+        db.add_all(fresh + [legacy])
+        db.commit()
+        fresh_ids, legacy_id = [t.id for t in fresh], legacy.id
+
+        statements = []
+
+        def _count(conn, cursor, statement, params, context, executemany):
+            statements.append((statement.lstrip().split()[0].upper(), executemany))
+
+        event.listen(engine, "before_cursor_execute", _count)
+        try:
+            got = send_unpicked_reminders(db, limit=10)
+        finally:
+            event.remove(engine, "before_cursor_execute", _count)
+        assert sorted(got["reminded_task_ids"]) == sorted(fresh_ids) and got["legacy_marked"] == 1
+        assert [k for k, _ in statements if k in ("SELECT", "UPDATE", "INSERT")] == ["SELECT", "UPDATE", "INSERT"]
+
+        db.expire_all()
+        rows = db.query(Task).filter(Task.id.in_(fresh_ids + [legacy_id])).all()
+        assert all(t.reminder_sent_at is not None for t in rows)
+        msgs = db.query(InternalMessage).filter(InternalMessage.related_task_id.in_(fresh_ids + [legacy_id])).all()
+        assert sorted(m.related_task_id for m in msgs) == sorted(fresh_ids)
+
+        again = send_unpicked_reminders(db)
+        assert not set(again["reminded_task_ids"]) & set(fresh_ids)
+    finally:
+        db.close()
+
+
+def test_batch_confirm_settles_in_bulk_with_per_user_credit_and_deferred_hooks():
+    """批量验收：一次结算整批，每个收款用户一条 credits UPDATE，逐任务流水，社区钩子延后执行"""
+    from sqlalchemy import event
+    from app.database.relational_db import (
+        CreditTransaction, SessionLocal, Task, TaskQueueJob, User, UserCommissionRecord, engine,
+    )
+    from app.services.community_task_hooks import COMMUNITY_HOOKS_FLAG
+
+    suffix = _unique()
+    owner = _register_user(f"bco{suffix}", f"bco{suffix}@example.com", "pass12345")
+    uid = _user_id_of(owner["access_token"])
+    executors = []
+    for tag in ("a", "b"):
+        ex = _register_user(f"bce{tag}{suffix}", f"bce{tag}{suffix}@example.com", "pass12345")
+        ar = client.post(
+            "/agents/register",
+            json={"name": f"bc-{tag}-{suffix}", "agent_type": "general"},
+            headers={"Authorization": f"Bearer {ex['access_token']}"},
+        )
+        assert ar.status_code == 200, ar.text
+        executors.append((_user_id_of(ex["access_token"]), ar.json()["id"]))
+    (ua, aa), (ub, ab) = executors
+
+    db = SessionLocal()
+    try:
+        before = {u.id: int(u.credits or 0) for u in db.query(User).filter(User.id.in_([ua, ub, uid])).all()}
+        pending = [
+            Task(title=f"bc-{suffix}-{i}", owner_id=uid, task_type="general", status="pending_verification",
+                 agent_id=agent_id, reward_points=1000)
+            for i, agent_id in enumerate([aa, aa, aa, ab])
+        ]
+        free = Task(title=f"bc-{suffix}-free", owner_id=uid, task_type="general", status="open", reward_points=0)
+        busy = Task(title=f"bc-{suffix}-busy", owner_id=uid, task_type="general", status="in_progress", agent_id=aa)
+        db.add_all(pending + [free, busy])
+        db.commit()
+        ids = [t.id for t in pending] + [free.id, busy.id, 10 ** 9]
+    finally:
+        db.close()
+
+    user_updates = []
+
+    def _count(conn, cursor, statement, params, context, executemany):
+        if statement.lstrip().upper().startswith("UPDATE USERS"):
+            user_updates.append(executemany)
+
+    event.listen(engine, "before_cursor_execute", _count)
+    try:
+        r = client.post(
+            "/tasks/batch-confirm",
+            json={"task_ids": ids},
+            headers={"Authorization": f"Bearer {owner['access_token']}"},
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", _count)
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert [x["task_id"] for x in body["results"]] == ids
+    assert [x["ok"] for x in body["results"]] == [True] * 5 + [False, False]
+    assert body["results"][5]["reason"] == "not_pending_verification"
+    assert body["results"][6]["reason"] == "not_found_or_forbidden"
+    assert body["summary"]["total_reward_points"] == 4000
+    # 收款方一条 executemany + 发布方佣金一条
+    assert user_updates == [True, False]
+
+    db = SessionLocal()
+    try:
+        after = {u.id: u for u in db.query(User).filter(User.id.in_([ua, ub, uid])).all()}
+        assert int(after[ua].credits) - before[ua] == 3 * 990
+        assert int(after[ub].credits) - before[ub] == 990
+        pending_ids = ids[:4]
+        ledger = db.query(CreditTransaction).filter(
+            CreditTransaction.type == "task_reward", CreditTransaction.ref_id.in_(pending_ids)
+        ).all()
+        assert sorted(t.ref_id for t in ledger) == sorted(pending_ids)
+        assert db.query(UserCommissionRecord).filter(UserCommissionRecord.task_id.in_(pending_ids)).count() == 4
+        done = db.query(Task).filter(Task.id.in_(ids[:5])).all()
+        assert all(t.status == "completed" and t.completed_at is not None for t in done)
+        # BackgroundTasks 已在响应后处理完成钩子
+        assert all((t.output_data or {}).get(COMMUNITY_HOOKS_FLAG) for t in done)
+        job = db.query(TaskQueueJob).filter(TaskQueueJob.queue == "task_completed_hooks").order_by(TaskQueueJob.id.desc()).first()
+        assert job is not None and job.status == "done"
+    finally:
+        db.close()
+
+    again = client.post(
+        "/tasks/batch-confirm",
+        json={"task_ids": ids[:2]},
+        headers={"Authorization": f"Bearer {owner['access_token']}"},
+    )
+    assert [x.get("message") for x in again.json()["results"]] == ["already_completed"] * 2
+
+
+def test_public_profile_grouped_queries_cache_etag_and_invalidation():
+    """/u/{username}：信誉一趟分组扫描任务表；整页缓存 + ETag/304；名下 Agent 完成任务后失效"""
+    from sqlalchemy import event
+    from app.database.relational_db import SessionLocal, Task, engine
+    from app.services.reputation_cache import invalidate_agents_reputation
+    from app.services.reputation_hooks import touch_agent_reputation_for_task
+
+    u = f"pprof{_unique()}"
+    tk = _register_user(u, f"{u}@example.com", "pw")["access_token"]
+    h = {"Authorization": f"Bearer {tk}"}
+    agent_ids = []
+    for i in range(3):
+        r = client.post("/agents/register", json={"name": f"pp-{i}", "description": "d"}, headers=h)
+        assert r.status_code == 200, r.text
+        agent_ids.append(r.json()["id"])
+    uid = _user_id_of(tk)
+    db = SessionLocal()
+    try:
+        db.add_all([
+            Task(title=f"pp-{i}", owner_id=uid, task_type="general", status="completed", agent_id=aid, reward_points=10)
+            for i, aid in enumerate(agent_ids * 2)
+        ])
+        db.commit()
+    finally:
+        db.close()
+    invalidate_agents_reputation(agent_ids)
+
+    task_scans = []
+
+    def _count(conn, cursor, statement, params, context, executemany):
+        sql = " ".join(statement.split()).lower()
+        if sql.startswith("select") and "from tasks" in sql:
+            task_scans.append(sql)
+
+    event.listen(engine, "before_cursor_execute", _count)
+    try:
+        first = client.get(f"/u/{u}")
+        cached = client.get(f"/u/{u}")
+    finally:
+        event.remove(engine, "before_cursor_execute", _count)
+    assert first.status_code == 200, first.text
+    assert len(task_scans) == 1
+    assert first.json()["summary"]["tasks_completed"] == 6
+    assert cached.json() == first.json()
+    etag = first.headers["ETag"]
+    assert cached.headers["ETag"] == etag and "public" in first.headers["Cache-Control"]
+    assert client.get(f"/u/{u}", headers={"If-None-Match": etag}).status_code == 304
+
+    db = SessionLocal()
+    try:
+        t = Task(title="pp-late", owner_id=uid, task_type="general", status="completed", agent_id=agent_ids[0], reward_points=5)
+        db.add(t)
+        db.commit()
+        touch_agent_reputation_for_task(db, t)
+        db.commit()
+    finally:
+        db.close()
+    fresh = client.get(f"/u/{u}", headers={"If-None-Match": etag})
+    assert fresh.status_code == 200
+    assert fresh.json()["summary"]["tasks_completed"] == 7
+    assert fresh.headers["ETag"] != etag
+
+    # 结算事务内失效后、提交前的爬虫请求回填了旧资料：提交后再次丢弃
+    db = SessionLocal()
+    try:
+        t = Task(title="pp-race", owner_id=uid, task_type="general", status="completed", agent_id=agent_ids[1], reward_points=5)
+        db.add(t)
+        db.flush()
+        touch_agent_reputation_for_task(db, t)
+        assert client.get(f"/u/{u}").json()["summary"]["tasks_completed"] == 7
+        db.commit()
+    finally:
+        db.close()
+    assert client.get(f"/u/{u}").json()["summary"]["tasks_completed"] == 8
+
+
+def test_agent_earnings_snapshot_updates_on_payout_and_reconciles():
+    """earnings-summary 读 agent_earnings 快照：注册即建行；老 Agent 无快照时现算不写库、对账补建；结算时同事务累加，对账修正漂移"""
+    from sqlalchemy import event
+    from app.database.relational_db import AgentEarnings, SessionLocal, Task, engine
+    from app.domain.task_helpers import pay_task_reward
+    from app.services.agent_earnings import reconcile_agent_earnings
+
+    suffix = _unique()
+    owner = _register_user(f"aeo{suffix}", f"aeo{suffix}@example.com", "pass12345")
+    exe = _register_user(f"aee{suffix}", f"aee{suffix}@example.com", "pass12345")
+    h = {"Authorization": f"Bearer {exe['access_token']}"}
+    agent_id = client.post("/agents/register", json={"name": f"ae-{suffix}", "agent_type": "general"}, headers=h).json()["id"]
+    uid = _user_id_of(owner["access_token"])
+    db = SessionLocal()
+    try:
+        # 注册时同事务建立全零快照行；删掉它来模拟上线前的老 Agent
+        row = db.get(AgentEarnings, agent_id)
+        assert (row.tasks_completed, row.points_earned, row.credited_points) == (0, 0, 0)
+        db.delete(row)
+        db.add_all([
+            Task(title=f"ae-{suffix}-done", owner_id=uid, task_type="general", status="completed", agent_id=agent_id, reward_points=40),
+            Task(title=f"ae-{suffix}-pv", owner_id=uid, task_type="general", status="pending_verification", agent_id=agent_id, reward_points=100),
+            Task(title=f"ae-{suffix}-ip", owner_id=uid, task_type="general", status="in_progress", agent_id=agent_id),
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+    first = client.get(f"/agents/{agent_id}/earnings-summary", headers=h)
+    assert first.status_code == 200, first.text
+    body = first.json()
+    assert (body["tasks_completed"], body["reward_points_earned"]) == (1, 40)
+    assert (body["pending_verification"], body["in_progress"], body["need_submit"]) == (1, 1, 1)
+
+    from app.services.reputation import compute_agent_reputation
+
+    db = SessionLocal()
+    try:
+        # 没有信任卡快照时信誉分取现算值，而不是 0
+        assert body["reputation_score"] == compute_agent_reputation(db, agent_id)["reputation_score"] > 0
+        assert db.get(AgentEarnings, agent_id) is None  # GET 不写库
+        assert reconcile_agent_earnings(db, after_id=agent_id - 1, limit=1)["checked"] == 1
+        assert db.get(AgentEarnings, agent_id).points_earned == 40
+        pv = db.query(Task).filter(Task.title == f"ae-{suffix}-pv").one()
+        pay_task_reward(pv, db)
+        db.commit()
+    finally:
+        db.close()
+
+    task_aggregates = []
+
+    def _count(conn, cursor, statement, params, context, executemany):
+        sql = " ".join(statement.split()).lower()
+        if "from tasks" in sql and "sum(" in sql and "tasks.agent_id" in sql:
+            task_aggregates.append(sql)
+
+    event.listen(engine, "before_cursor_execute", _count)
+    try:
+        second = client.get(f"/agents/{agent_id}/earnings-summary", headers=h).json()
+    finally:
+        event.remove(engine, "before_cursor_execute", _count)
+    assert task_aggregates == []
+    assert (second["tasks_completed"], second["reward_points_earned"]) == (2, 140)
+    assert second["credited_points"] == 99
+    assert second["pending_verification"] == 0
+
+    db = SessionLocal()
+    try:
+        row = db.get(AgentEarnings, agent_id)
+        row.credited_points = 1
+        db.commit()
+        got = reconcile_agent_earnings(db, after_id=agent_id - 1, limit=1)
+        assert got == {"checked": 1, "drifted": 1, "next_after_id": agent_id}
+        db.expire_all()
+        assert db.get(AgentEarnings, agent_id).credited_points == 99
+    finally:
+        db.close()
+
+
+def test_payout_eligibility_sums_in_sql_and_caches_per_user():
+    """提现资格：任务奖励在 SQL 里汇总（含近 30 天窗口）并按用户缓存；入账 / 提现后失效"""
+    from datetime import datetime, timedelta
+    from sqlalchemy import event, inspect
+    from app.database.relational_db import CreditTransaction, SessionLocal, WithdrawalRequest, engine
+    from app.services.payout import invalidate_payout_aggregates
+
+    u = f"pel{_unique()}"
+    tk = _register_user(u, f"{u}@example.com", "pass12345")["access_token"]
+    uid = _user_id_of(tk)
+    h = {"Authorization": f"Bearer {tk}"}
+    db = SessionLocal()
+    try:
+        db.add_all([
+            CreditTransaction(user_id=uid, amount=30, type="task_reward", ref_id=1, created_at=datetime.utcnow()),
+            CreditTransaction(user_id=uid, amount=20, type="task_reward", ref_id=2, created_at=datetime.utcnow() - timedelta(days=45)),
+            CreditTransaction(user_id=uid, amount=500, type="recharge", ref_id=None),
+            WithdrawalRequest(user_id=uid, amount=7, status="pending"),
+            WithdrawalRequest(user_id=uid, amount=9, status="paid"),
+        ])
+        db.commit()
+    finally:
+        db.close()
+    assert "ix_credit_tx_user_type_created" in {i["name"] for i in inspect(engine).get_indexes("credit_transactions")}
+
+    ledger_reads = []
+
+    def _count(conn, cursor, statement, params, context, executemany):
+        sql = " ".join(statement.split()).lower()
+        if sql.startswith("select") and "from credit_transactions" in sql:
+            ledger_reads.append(sql)
+
+    event.listen(engine, "before_cursor_execute", _count)
+    try:
+        first = client.get("/account/payout-eligibility", headers=h).json()
+        second = client.get("/account/payout-eligibility", headers=h).json()
+    finally:
+        event.remove(engine, "before_cursor_execute", _count)
+    assert len(ledger_reads) == 1 and "sum(" in ledger_reads[0]
+    assert (first["task_reward_earned"], first["task_reward_earned_30d"]) == (50, 30)
+    assert (first["pending_withdrawals"], first["held_balance"]) == (1, 7)
+    assert second == first
+
+    db = SessionLocal()
+    try:
+        db.add(CreditTransaction(user_id=uid, amount=5, type="task_reward", ref_id=3))
+        db.commit()
+    finally:
+        db.close()
+    invalidate_payout_aggregates([uid])
+    assert client.get("/account/payout-eligibility", headers=h).json()["task_reward_earned"] == 55
+
+    # 结算入账在提交后才失效：提交前并发读回填的旧汇总不会留在缓存里
+    from app.database.relational_db import Task
+    from app.domain.task_helpers import pay_task_reward
+
+    agent_id = client.post("/agents/register", json={"name": f"pel-{_unique()}", "agent_type": "general"}, headers=h).json()["id"]
+    db = SessionLocal()
+    try:
+        task = Task(title=f"pel-{agent_id}", owner_id=uid, task_type="general", status="pending_verification", agent_id=agent_id, reward_points=100)
+        db.add(task)
+        db.commit()
+        pay_task_reward(task, db)
+        db.flush()
+        assert client.get("/account/payout-eligibility", headers=h).json()["task_reward_earned"] == 55
+        db.commit()
+    finally:
+        db.close()
+    assert client.get("/account/payout-eligibility", headers=h).json()["task_reward_earned"] > 55
+
+
+def test_credit_ledger_balance_after_keyset_pages_and_reconciliation():
+    """流水：入账时写 balance_after；按 (created_at, id) keyset 翻页不重不漏；对账写检查点并发现余额不符"""
+    from app.database.relational_db import CreditBalanceCheckpoint, SessionLocal, User
+    from app.services.credit_ledger import reconcile_credit_ledger
+
+    u = f"ldg{_unique()}"
+    tk = _register_user(u, f"{u}@example.com", "pass12345")["access_token"]
+    uid = _user_id_of(tk)
+    h = {"Authorization": f"Bearer {tk}"}
+    start = client.get("/account/balance", headers=h).json()["credits"]
+    for amt in (10, 20, 30, 40, 50):
+        assert client.post("/account/recharge", json={"amount": amt}, headers=h).status_code == 200
+
+    full = client.get("/account/transactions", params={"limit": 50}, headers=h).json()
+    assert full["next_cursor"] is None
+    recharges = [t for t in full["transactions"] if t["type"] == "recharge"]
+    assert [t["balance_after"] for t in recharges] == [start + 150, start + 100, start + 60, start + 30, start + 10]
+
+    seen, cursor = [], None
+    for _ in range(10):
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/account/transactions", params=params, headers=h).json()
+        seen.extend(t["id"] for t in page["transactions"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert seen == [t["id"] for t in full["transactions"]]
+    assert client.get("/account/transactions", params={"cursor": "bogus"}, headers=h).status_code == 400
+    assert client.get("/account/transactions", params={"cursor": str(seen[1]), "skip": 1}, headers=h).json()[
+        "transactions"][0]["id"] == seen[2]
+
+    db = SessionLocal()
+    try:
+        got = reconcile_credit_ledger(db, after_id=uid - 1, limit=1)
+        assert (got["checked"], got["checkpoints"], got["mismatches"]) == (1, 1, [])
+        cp = db.query(CreditBalanceCheckpoint).filter(CreditBalanceCheckpoint.user_id == uid).one()
+        assert (cp.balance, cp.last_tx_id) == (start + 150, full["transactions"][0]["id"])
+        assert reconcile_credit_ledger(db, after_id=uid - 1, limit=1)["checkpoints"] == 0
+
+        db.query(User).filter(User.id == uid).update({User.credits: User.credits + 7})
+        db.commit()
+        got = reconcile_credit_ledger(db, after_id=uid - 1, limit=1, write_checkpoints=False)
+        assert got["mismatches"] == [{"user_id": uid, "credits": start + 157, "ledger_balance": start + 150}]
+        assert not db.in_transaction()  # 用户行锁随批次提交释放
+    finally:
+        db.close()
+
+
+def test_agent_cases_projection_keyset_pages_cache_and_backfill():
+    """案例库：完成时追加 agent_cases，keyset 翻页，命中缓存不查投影表；历史完成任务可回填"""
+    from datetime import datetime, timedelta
+    from sqlalchemy import event
+    from app.database.relational_db import AgentCase, SessionLocal, Task, engine
+    from app.services.agent_cases import backfill_agent_cases
+
+    suffix = _unique()
+    owner = _register_user(f"aco{suffix}", f"aco{suffix}@example.com", "pass12345")
+    uid = _user_id_of(owner["access_token"])
+    ex = _register_user(f"ace{suffix}", f"ace{suffix}@example.com", "pass12345")
+    ag = client.post(
+        "/agents/register",
+        json={"name": f"ac-{suffix}", "agent_type": "general"},
+        headers={"Authorization": f"Bearer {ex['access_token']}"},
+    ).json()["id"]
+
+    db = SessionLocal()
+    try:
+        pending = [
+            Task(title=f"ac-{suffix}-{i}", owner_id=uid, task_type="general", status="pending_verification",
+                 agent_id=ag, reward_points=10, input_data={"skills": ["writing"]},
+                 created_at=datetime.utcnow() - timedelta(hours=2))
+            for i in range(3)
+        ]
+        invited = Task(title=f"ac-{suffix}-inv", owner_id=uid, task_type="general", status="pending_verification",
+                       agent_id=ag, reward_points=10, invited_agent_ids=[ag])
+        legacy = Task(title=f"ac-{suffix}-old", owner_id=uid, task_type="general", status="completed",
+                      agent_id=ag, reward_points=5, completed_at=datetime.utcnow() - timedelta(days=30))
+        db.add_all(pending + [invited, legacy])
+        db.commit()
+        ids = [t.id for t in pending] + [invited.id]
+        legacy_id = legacy.id
+    finally:
+        db.close()
+
+    r = client.post("/tasks/batch-confirm", json={"task_ids": ids},
+                    headers={"Authorization": f"Bearer {owner['access_token']}"})
+    assert r.status_code == 200, r.text
+
+    first = client.get(f"/agents/{ag}/cases", params={"limit": 2}).json()
+    assert [c["task_id"] for c in first["cases"]] == [ids[2], ids[1]]
+    c0 = first["cases"][0]
+    assert (c0["publisher_name"], c0["skill"], c0["reward_points"]) == (f"aco{suffix}", "writing", 10)
+    assert c0["duration_seconds"] >= 7000
+    rest = client.get(f"/agents/{ag}/cases", params={"limit": 2, "cursor": first["next_cursor"]}).json()
+    assert [c["task_id"] for c in rest["cases"]] == [ids[0]] and rest["next_cursor"] is None
+    assert client.get(f"/agents/{ag}/cases", params={"cursor": "x"}).status_code == 400
+
+    case_reads = []
+
+    def _count(conn, cursor, statement, params, context, executemany):
+        if "from agent_cases" in " ".join(statement.split()).lower():
+            case_reads.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _count)
+    try:
+        assert client.get(f"/agents/{ag}/cases", params={"limit": 2}).json()["cases"] == first["cases"]
+    finally:
+        event.remove(engine, "before_cursor_execute", _count)
+    assert case_reads == []
+
+    db = SessionLocal()
+    try:
+        got = backfill_agent_cases(db, after_id=legacy_id - 1, limit=1)
+        assert (got["scanned"], got["inserted"]) == (1, 1)
+        assert backfill_agent_cases(db, after_id=legacy_id - 1, limit=1)["inserted"] == 0
+        assert db.query(AgentCase).filter(AgentCase.agent_id == ag).count() == 4
+    finally:
+        db.close()
+    allc = client.get(f"/agents/{ag}/cases", params={"limit": 20}).json()["cases"]
+    assert [c["task_id"] for c in allc] == [ids[2], ids[1], ids[0], legacy_id]
+
+
+def test_community_topic_list_denormalized_counters_and_cursor_pages():
+    """话题列表：计数来自话题行冗余列（发言 / 新成员时累加），keyset 翻页（热度游标不随重算漂移），固定两条查询"""
+    from sqlalchemy import event
+    from app.database.relational_db import ChatTopic, SessionLocal, engine
+    from app.services.community import backfill_topic_counters
+
+    suffix = _unique()
+    tag = f"ct{suffix}".lower()
+    authors = []
+    for who in ("a", "b"):
+        tk = _register_user(f"ct{who}{suffix}", f"ct{who}{suffix}@example.com", "pass12345")["access_token"]
+        h = {"Authorization": f"Bearer {tk}"}
+        aid = client.post("/agents/register", json={"name": f"ct-{who}-{suffix}"}, headers=h).json()["id"]
+        authors.append((h, aid))
+    (ha, aa), (hb, ab) = authors
+    gen = client.post("/community/topics/auto-generate", json={"agent_id": aa, "skill_tags": [tag], "force": True}, headers=ha)
+    topic_ids = [int(t["id"]) for t in gen.json()["created"]]
+    assert len(topic_ids) == 2
+    busy = topic_ids[0]
+    for h, aid in ((ha, aa), (hb, ab), (hb, ab)):
+        r = client.post(f"/community/topics/{busy}/messages", json={"content": "hi", "agent_id": aid}, headers=h)
+        assert r.status_code == 200, r.text
+
+    statements = []
+
+    def _count(conn, cursor, statement, params, context, executemany):
+        if "system_logs" not in statement:
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _count)
+    try:
+        first = client.get("/community/topics", params={"skill_tag": tag, "limit": 1}).json()
+    finally:
+        event.remove(engine, "before_cursor_execute", _count)
+    assert len(statements) == 2
+    assert first["total"] == 2 and first["next_cursor"].endswith(f":{busy}")
+    top = first["items"][0]
+    assert (top["id"], top["message_count"], top["member_count"]) == (busy, 3, 2)
+    assert top["last_message_at"]
+
+    db = SessionLocal()
+    try:
+        # 热度被重算到比下一条还低：游标带着返回时的热度值，下一页仍从剩下那条开始，不会被跳过
+        db.query(ChatTopic).filter(ChatTopic.id == busy).update({ChatTopic.heat_score: -1.0})
+        db.commit()
+    finally:
+        db.close()
+    rest = client.get("/community/topics", params={"skill_tag": tag, "limit": 1, "cursor": first["next_cursor"]}).json()
+    assert [t["id"] for t in rest["items"]] == [topic_ids[1]]
+    assert rest["items"][0]["member_count"] == 1
+    assert client.get("/community/topics", params={"cursor": "bogus"}).status_code == 400
+
+    newest = client.get("/community/topics", params={"skill_tag": tag, "limit": 1, "sort": "newest"}).json()
+    older = client.get(
+        "/community/topics", params={"skill_tag": tag, "limit": 1, "sort": "newest", "cursor": newest["next_cursor"]}
+    ).json()
+    assert sorted(t["id"] for t in newest["items"] + older["items"]) == sorted(topic_ids)
+
+    db = SessionLocal()
+    try:
+        db.query(ChatTopic).filter(ChatTopic.id == busy).update({ChatTopic.message_count: 0, ChatTopic.member_count: 0})
+        db.commit()
+        after_id = 0
+        while True:
+            after_id = backfill_topic_counters(db, after_id=after_id, limit=200)["next_after_id"]
+            if not after_id:
+                break
+        row = db.get(ChatTopic, busy)
+        assert (row.message_count, row.member_count) == (3, 2)
+    finally:
+        db.close()
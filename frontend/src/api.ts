@@ -439,8 +439,9 @@ export interface TaskCommentItem {
   content: string
   created_at: string | null
 }
-export function getTaskComments(taskId: number) {
-  return api.get<{ comments: TaskCommentItem[] }>(`/tasks/${taskId}/comments`)
+/** 最新一页（时间正序）；next_before_id 非空时传作 before_id 取更早的评论 */
+export function getTaskComments(taskId: number, params?: { before_id?: number; limit?: number }) {
+  return api.get<{ comments: TaskCommentItem[]; next_before_id?: number | null }>(`/tasks/${taskId}/comments`, { params })
 }
 export function postTaskComment(taskId: number, data: { content: string; agent_id?: number; kind?: string }) {
   return api.post<TaskCommentItem>(`/tasks/${taskId}/comments`, data)
@@ -465,8 +466,8 @@ export function a2aGetTask(taskId: number) {
 export function a2aPostMessage(taskId: number, data: { content: string; agent_id?: number; kind?: string }) {
   return api.post<{ id: number; task_id: number; agent_id?: number; agent_name?: string; kind: string; content: string; created_at: string | null }>(`/a2a/tasks/${taskId}/messages`, data)
 }
-export function a2aListMessages(taskId: number) {
-  return api.get<{ messages: TaskCommentItem[] }>(`/a2a/tasks/${taskId}/messages`)
+export function a2aListMessages(taskId: number, params?: { before_id?: number; limit?: number }) {
+  return api.get<{ messages: TaskCommentItem[]; next_before_id?: number | null }>(`/a2a/tasks/${taskId}/messages`, { params })
 }
 
 // NOTE: translated comment in English.
@@ -1767,14 +1768,20 @@ export function listTaskRuns(taskId: number, limit = 20) {
   return api.get<{ items: ExecutionRunItem[] }>(`/tasks/${taskId}/runs`, { params: { limit } })
 }
 
-export function fetchTaskRunSteps(taskId: number, runId: string) {
-  return api.get<{ run: ExecutionRunItem; steps: ExecutionStepItem[] }>(
+export function fetchTaskRunSteps(
+  taskId: number,
+  runId: string,
+  params?: { after_idx?: number; limit?: number },
+) {
+  return api.get<{ run: ExecutionRunItem; steps: ExecutionStepItem[]; next_after_idx: number | null }>(
     `/tasks/${taskId}/runs/${runId}/steps`,
+    { params },
   )
 }
 
+/** NDJSON：首行为 run 头，其后每行一个 step */
 export function exportTaskRun(taskId: number, runId: string) {
-  return api.get(`/tasks/${taskId}/runs/${runId}/export`)
+  return api.get(`/tasks/${taskId}/runs/${runId}/export`, { responseType: 'blob' })
 }
 
 // =======================
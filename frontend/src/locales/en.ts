@@ -1024,12 +1024,14 @@ export default {
     lastExecuteError: 'Error summary',
     executeRetryApiHint: 'POST /tasks/{id}/execute accepts retry_count (0–3). The server backs off between attempts; JSON may include retried.',
     stepReplayTitle: 'Execution replay',
-    stepReplayHint: 'Inspect each run’s tool calls, A2A messages and intermediate outputs; export an audit JSON.',
+    stepReplayHint: 'Inspect each run’s tool calls, A2A messages and intermediate outputs; export an NDJSON audit log.',
     stepReplayLoad: 'Load runs',
     stepReplayEmpty: 'No execution runs yet.',
-    stepReplayExport: 'Export audit JSON',
+    stepReplayExport: 'Export audit log (NDJSON)',
     stepReplayIo: 'Input / Output',
     stepReplayNoSteps: 'No steps recorded for this run.',
+    stepReplayLoadMore: 'Load more steps',
+    commentsLoadOlder: 'Load earlier comments',
     workflowGraphTitle: 'Dependency topology (SVG)',
     webhookDeliveryTitle: 'Completion webhook delivery',
     webhookDeliveryHint: 'On submit-completion, the platform POSTs to the publisher webhook; transient failures are retried (up to 3 attempts).',
@@ -1991,6 +1993,7 @@ export default {
     selectTaskAll: 'All tasks',
     loadMessages: 'Load messages',
     noMessages: 'No messages yet.',
+    loadOlder: 'Load earlier messages',
     composeAsUser: 'Send as user',
     kindMessage: 'message',
     kindStatus: 'status',
@@ -1023,12 +1023,14 @@ export default {
     lastExecuteError: '错误摘要',
     executeRetryApiHint: 'POST /tasks/{id}/execute 支持查询参数 retry_count（0–3）；失败时服务端自动退避重试，响应 JSON 可含 retried 字段。',
     stepReplayTitle: '执行回放',
-    stepReplayHint: '查看每次执行的工具调用、A2A 消息与中间输出，可导出审计 JSON。',
+    stepReplayHint: '查看每次执行的工具调用、A2A 消息与中间输出，可导出 NDJSON 审计日志。',
     stepReplayLoad: '加载运行记录',
     stepReplayEmpty: '暂无执行运行记录。',
-    stepReplayExport: '导出审计 JSON',
+    stepReplayExport: '导出审计日志（NDJSON）',
     stepReplayIo: '输入 / 输出',
     stepReplayNoSteps: '该运行无步骤记录。',
+    stepReplayLoadMore: '加载更多步骤',
+    commentsLoadOlder: '加载更早的评论',
     workflowGraphTitle: '依赖拓扑（SVG 示意）',
     webhookDeliveryTitle: '完成回调投递',
     webhookDeliveryHint: '接取方提交完成时，平台向发布方填写的回调 URL 发起 POST；网络或 5xx 时会自动重试（最多 3 次）。',
@@ -2003,6 +2005,7 @@ export default {
     selectTaskAll: '全部任务',
     loadMessages: '加载消息',
     noMessages: '暂无消息。',
+    loadOlder: '加载更早的消息',
     composeAsUser: '以用户身份发送',
     kindMessage: 'message',
     kindStatus: 'status',